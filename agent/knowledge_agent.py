@@ -7,10 +7,13 @@ from utils.logger import Logger
 
 from dotenv import load_dotenv
 import json
+from typing import Iterator
 
 # 在文件开头添加环境变量加载
 load_dotenv()
 
+KG_SOURCE_FOOTER = "<br>数据来源：<mcfile name='kg_importer.py' path='knowledge_graph/kg_importer.py'></mcfile>"
+
 class Knowledge_Graph_Agent:
     def __init__(self):
         self.logger = Logger("KnowledgeAgent")
@@ -45,13 +48,75 @@ class Knowledge_Graph_Agent:
                 return self.format_industry_info(result['data'], industry)
             else:
                 return self.format_stock_info(result['data'])  # 统一返回格式化后的结果，无需区分 supply_chain_info 或 industry_info
-                     
+        elif result['status'] == 'pending':
+            return self.format_pending(result)
         else:
             return {
                 'success':False,
                 'message':f"查询失败：{result['message']}\n错误类型：{result['error_type']}"
             }
 
+    def answer_question_stream(self, question: str) -> Iterator[dict]:
+        """流式问答代理：按查询进度逐段产出格式化后的HTML片段
+
+        每个片段为 {"event": 事件类型, "message": HTML片段}，error 事件后不再产出内容。
+        """
+        for item in self.kg_query.unified_query_stream(question):
+            event, data = item['event'], item['data']
+            if event == 'entity':
+                yield {'event': event, 'message': self.format_entity(data)}
+            elif event == 'supply_chain':
+                yield {'event': event, 'message': self.format_supply_chain_row(data)}
+            elif event == 'industry':
+                yield {'event': event, 'message': self.format_industry_row(data)}
+            elif event == 'basic_info':
+                yield {'event': event, 'message': self.format_basic_info(data)}
+            elif event == 'realtime':
+                yield {'event': event, 'message': self.format_realtime_info(data)}
+            elif event == 'pending':
+                yield {'event': event, 'message': self.format_pending_message(data['message'], data['job'])}
+            elif event == 'error':
+                self.logger.error(f"流式查询失败: {data['message']}")
+                yield {'event': event, 'message': f"查询失败：{data['message']}<br>错误类型：{data['error_type']}"}
+                return
+            elif event == 'done':
+                footer = KG_SOURCE_FOOTER if data.get('message_type') not in ('stock_info', 'pending') else ""
+                yield {'event': event, 'message': footer}
+
+    def format_entity(self, parsed: dict) -> str:
+        """格式化解析出的查询实体（流式首段）"""
+        intent = parsed.get('intent')
+        if intent == 'supply_chain':
+            return f"供应链关系分析（{parsed.get('stock_code', '')}）：<br>"
+        elif intent == 'industry':
+            return f"{parsed.get('industry', '未知行业')}行业主要上市公司：<br>"
+        return f"股票基本信息与实时数据（{parsed.get('stock_code', '')}）：<br>"
+
+    def format_supply_chain_row(self, item: dict) -> str:
+        """格式化单条供应链关系"""
+        # 同时显示公司名称和代码
+        return f"<br>• 公司 {item['company_name']} ({item['company_code']}) 是 {item['parter_name']}({item['partner_code']}) 的 {item['relation']}"
+
+    def format_industry_row(self, company: dict) -> str:
+        """格式化单家行业公司"""
+        return f"• {company['name']} ({company['code']})<br>"
+
+    def format_basic_info(self, basic_info: dict) -> str:
+        """格式化股票基本信息部分"""
+        return f"股票名：{basic_info.get('name', '')}<br>" \
+            f"股票代码：{basic_info.get('stock_code', '')}<br>" \
+            f"所属行业：{basic_info.get('industry_primary', '')}<br>" \
+            f"二级行业：{basic_info.get('industry_secondary', '')}<br>" \
+            f"上市时间：{basic_info.get('listing_time', '')}<br>"
+
+    def format_realtime_info(self, real_time_info: dict) -> str:
+        """格式化实时行情部分"""
+        return f"成交量：{real_time_info.get('volume', '')}<br>" \
+            f"成交额：{real_time_info.get('turnover', '')}<br>" \
+            f"最高价：{real_time_info.get('high', '')}<br>" \
+            f"当前价格：{real_time_info.get('price', '')}<br>" \
+            f"最低价：{real_time_info.get('low', '')}<br>"
+
     def format_supply_chain(self, data: list) -> dict:
         """格式化供应链查询结果"""
         if not data:
@@ -62,10 +127,9 @@ class Knowledge_Graph_Agent:
         
         output = ["供应链关系分析："]
         for item in data:  # 直接遍历查询结果
-            # 修改：同时显示公司名称和代码（假设 item 包含 name 字段）
-            output.append(f"<br>• 公司 {item['company_name']} ({item['company_code']}) 是 {item['parter_name']}({item['partner_code']}) 的 {item['relation']}")
+            output.append(self.format_supply_chain_row(item))
         
-        output.append("<br>数据来源：<mcfile name='kg_importer.py' path='knowledge_graph/kg_importer.py'></mcfile>")
+        output.append(KG_SOURCE_FOOTER)
         ans = "<br>".join(output)
         self.logger.info(f"供应链查询格式化结果: {ans}")
     
@@ -81,14 +145,29 @@ class Knowledge_Graph_Agent:
             
         output = [f"{industry}行业主要上市公司："]
         for company in data:
-            output.append(f"• {company['name']} ({company['code']})<br>")
+            output.append(self.format_industry_row(company))
         
-        output.append("<br>数据来源：<mcfile name='kg_importer.py' path='knowledge_graph/kg_importer.py'></mcfile>")
+        output.append(KG_SOURCE_FOOTER)
         ans = "<br>".join(output)
         return {
            'success': True,
            'message': ans,  # 返回格式化后的结果
         }
+    def format_pending_message(self, message: str, job: dict) -> str:
+        """格式化后台补全提示"""
+        return f"知识图谱中暂无 {job['key']} 的相关数据，{message}，请稍后再次查询。"
+
+    def format_pending(self, result: dict) -> dict:
+        """格式化部分结果：补全任务提示，附带已获取的股票基本信息"""
+        output = [self.format_pending_message(result['message'], result['job'])]
+        basic_info = result.get('data', {}).get('basic_info')
+        if basic_info and not basic_info.get('error'):
+            output.append(self.format_basic_info(basic_info))
+        return {
+            'success': True,
+            'message': "<br>".join(output)
+        }
+
     def format_stock_info(self, result:dict) -> dict:
         if not result:
             return {'success': False,'message': f"未找到相关股票数据"}
@@ -97,16 +176,7 @@ class Knowledge_Graph_Agent:
         basic_info = result.get('basic_info', {})
         real_time_info =result.get('realtime_data',{})
         ans ="股票基本信息与实时数据：<br>"
-        ans += f"股票名：{basic_info.get('name', "")}<br>" \
-            f"股票代码：{basic_info.get('stock_code',"")}<br>" \
-            f"所属行业：{basic_info.get('industry_primary',"")}<br>" \
-            f"二级行业：{basic_info.get('industry_secondary',"")}<br>" \
-            f"上市时间：{basic_info.get('listing_time',"")}<br>" \
-            f"成交量：{real_time_info.get('volume',"")}<br>" \
-            f"成交额：{real_time_info.get('turnover',"")}<br>" \
-            f"最高价：{real_time_info.get('high',"")}<br>" \
-            f"当前价格：{real_time_info.get('price',"")}<br>" \
-            f"最低价：{real_time_info.get('low',"")}<br>" 
+        ans += self.format_basic_info(basic_info) + self.format_realtime_info(real_time_info)
         self.logger.info(f"股票基本信息格式化结果: {ans}")  # 打印格式化结果，方便调试和理解
         return {
             'success': True,
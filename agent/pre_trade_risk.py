@@ -0,0 +1,350 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+from data.portfolio_analytics import BUY, SELL, get_portfolio_analytics
+from utils.logger import Logger
+from utils.tracing import traced
+
+RISK_MAX_POSITION_WEIGHT = float(os.getenv("RISK_MAX_POSITION_WEIGHT", "0.3"))  # 单只股票市值占总资产的上限
+RISK_MAX_INDUSTRY_WEIGHT = float(os.getenv("RISK_MAX_INDUSTRY_WEIGHT", "0.5"))  # 单个一级行业市值占总资产的上限
+RISK_MAX_VAR_RATIO = float(os.getenv("RISK_MAX_VAR_RATIO", "0.05"))  # 组合单日VaR占总资产的上限
+RISK_VAR_CONFIDENCE = float(os.getenv("RISK_VAR_CONFIDENCE", "0.95"))  # VaR置信度
+RISK_LOOKBACK_DAYS = int(os.getenv("RISK_LOOKBACK_DAYS", "60"))  # 估计协方差所用的历史天数
+RISK_RETURNS_TTL = float(os.getenv("RISK_RETURNS_TTL", "3600"))  # 单只股票历史收益率的缓存时长（秒）
+RISK_CACHE_SIZE = int(os.getenv("RISK_CACHE_SIZE", "1000"))  # 进程内缓存风险状态的用户数
+
+logger = Logger("PreTradeRisk")
+
+
+def local_history(code: str, days: int) -> list:
+    """本地日线行情（data/bar_store.py）中的历史K线；未构建或未收录时返回空列表，不使用随机生成的兜底数据"""
+    from data.bar_store import get_bar_store
+    store = get_bar_store()
+    return store.history(code, days) if store is not None else []
+
+
+class ReturnsCache:
+    """各股票的日收益率序列（按交易日期索引），默认取自本地日线行情
+
+    请求路径上只用 peek_many 读取缓存，缺失或过期的股票交给后台线程获取；每次获取完成后 generation 加一。
+    """
+    def __init__(self, history=None, lookback: int = RISK_LOOKBACK_DAYS, ttl: float = RISK_RETURNS_TTL):
+        self.history = history or local_history
+        self.lookback = lookback
+        self.ttl = ttl
+        self.series = {}  # 股票代码 -> (获取时间, pd.Series)
+        self.pending = set()  # 已提交后台获取的股票
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="risk-history")
+
+    def _fetch(self, code: str):
+        import pandas as pd
+        try:
+            rows = self.history(code, days=self.lookback + 1)
+        except Exception as e:
+            logger.warning(f"获取 {code} 历史数据失败: {str(e)}")
+            rows = None
+        closes = pd.Series([row["close"] for row in rows or []], index=[row["trade_date"] for row in rows or []],
+                           dtype="float64")
+        returns = closes.pct_change().iloc[1:].dropna()
+        with self.lock:
+            self.series[code] = (time.monotonic(), returns)
+            self.generation += 1
+        return returns
+
+    def _refresh(self, codes: list) -> None:
+        try:
+            for code in codes:
+                self._fetch(code)
+        finally:
+            with self.lock:
+                self.pending.difference_update(codes)
+
+    def get_many(self, codes: list) -> tuple:
+        """同步获取：返回 ({股票代码: 收益率序列}, 其中最早的获取时间)，缺失或过期的股票并发获取"""
+        now = time.monotonic()
+        with self.lock:
+            cached = {code: self.series[code] for code in codes
+                      if code in self.series and now - self.series[code][0] < self.ttl}
+        missing = [code for code in codes if code not in cached]
+        for code, returns in zip(missing, self.executor.map(self._fetch, missing)):
+            cached[code] = (now, returns)
+        oldest = min((fetched_at for fetched_at, _ in cached.values()), default=now)
+        return {code: returns for code, (_, returns) in cached.items()}, oldest
+
+    def peek_many(self, codes: list) -> tuple:
+        """只读缓存：返回 ({股票代码: 收益率序列}, 其中最早的获取时间, 缺失或过期的股票)
+
+        缺失或过期的股票提交后台获取，过期的序列在刷新完成前继续使用。
+        """
+        now = time.monotonic()
+        with self.lock:
+            cached = {code: self.series[code] for code in codes if code in self.series}
+            stale = [code for code in dict.fromkeys(codes) if code not in cached or now - cached[code][0] >= self.ttl]
+            submit = [code for code in stale if code not in self.pending]
+            self.pending.update(submit)
+        if submit:
+            self.executor.submit(self._refresh, submit)
+        oldest = min((fetched_at for fetched_at, _ in cached.values()), default=now)
+        return {code: returns for code, (_, returns) in cached.items()}, oldest, stale
+
+
+def align_returns(dates, codes: list, returns: dict):
+    """各股票收益率对齐到 dates 并去均值的矩阵（T×K），缺失日期和没有历史行情的股票按0计"""
+    import numpy as np
+    matrix = np.zeros((len(dates), len(codes)))
+    for k, code in enumerate(codes):
+        series = returns.get(code)
+        if series is None:
+            continue
+        rows = dates.get_indexer(series.index)
+        found = rows >= 0
+        matrix[rows[found], k] = series.to_numpy(np.float64)[found]
+    return matrix - matrix.mean(axis=0) if len(dates) else matrix
+
+
+class PortfolioRisk:
+    """单个用户持仓的风险状态：持仓市值向量 v、行业市值、去均值的收益率矩阵 R（T×N）和 Σv = R'Rv/(T-1)
+
+    持仓按最近成交价估值；持仓变化时只为新股票追加列并重新计算 Rv 和 Σv（O(TN)），评估订单时不构造协方差矩阵。
+    清仓的股票保留在矩阵中，市值为0。有市值的股票缺少历史行情时 var_available 为 False；
+    pending 表示构建时有股票的收益率缺失或过期，后台获取完成（generation 变化）后整体重建。
+    """
+    def __init__(self, dates, fetched_at: float):
+        import numpy as np
+        self.dates = dates
+        self.periods = max(len(dates) - 1, 1)
+        self.fetched_at = fetched_at
+        self.codes, self.index, self.industries = [], {}, []
+        self.covered = []  # 各列是否有历史行情
+        self.returns = np.zeros((len(dates), 0))
+        self.state = self.version = None
+        self.generation, self.pending = 0, False
+
+    def add_columns(self, codes: list, industries: list, returns: dict) -> None:
+        import numpy as np
+        self.returns = np.hstack([self.returns, align_returns(self.dates, codes, returns)])
+        self.covered += [len(returns.get(code, ())) > 0 for code in codes]
+        for code, industry in zip(codes, industries):
+            self.index[code] = len(self.codes)
+            self.codes.append(code)
+            self.industries.append(industry)
+
+    def revalue(self, state) -> None:
+        import numpy as np
+        holdings = [state.holdings.get(code) for code in self.codes]
+        self.quantities = np.array([holding.quantity if holding else 0 for holding in holdings], dtype=np.float64)
+        self.values = self.quantities * np.array([holding.last_price if holding else 0.0 for holding in holdings])
+        self.industry_values = {}
+        for industry, value in zip(self.industries, self.values.tolist()):
+            self.industry_values[industry] = self.industry_values.get(industry, 0.0) + value
+        self.portfolio_returns = self.returns @ self.values  # Rv，长度 T
+        self.sigma_v = self.returns.T @ self.portfolio_returns / self.periods  # Σv
+        self.variance = float(self.values @ self.sigma_v)
+        self.var_available = all(covered or value == 0 for covered, value in zip(self.covered, self.values.tolist()))
+        self.state, self.version = state, state.version
+
+    def order_returns(self, codes: list, returns: dict):
+        """订单股票的去均值收益率矩阵（T×K）；已在矩阵中的股票直接取对应的列"""
+        import numpy as np
+        new_codes = [code for code in dict.fromkeys(codes) if code not in self.index]
+        new_columns = dict(zip(new_codes, align_returns(self.dates, new_codes, returns).T))
+        return np.column_stack([self.returns[:, self.index[code]] if code in self.index else new_columns[code]
+                                for code in codes]) if codes else np.zeros((len(self.dates), 0))
+
+
+class PreTradeRisk:
+    """下单前的组合风险检查：按用户缓存持仓风险状态，对一组待下单订单一次向量化计算边际风险
+
+    对每笔订单计算成交后的单股集中度、行业暴露和组合参数法VaR（v'Σv 按 σ² + 2δ(Σv)_j + δ²Σ_jj 增量更新）。
+    只有使对应指标上升且成交后超过上限的订单被拒绝，减仓总是允许。
+    检查只读已缓存的收益率，历史行情在后台获取（登录时 warm 预热）；缺少历史行情时VaR视为不可用，不据此拒绝。
+    """
+    def __init__(self, returns: ReturnsCache = None, cache_size: int = RISK_CACHE_SIZE,
+                 max_position_weight: float = RISK_MAX_POSITION_WEIGHT,
+                 max_industry_weight: float = RISK_MAX_INDUSTRY_WEIGHT,
+                 max_var_ratio: float = RISK_MAX_VAR_RATIO, confidence: float = RISK_VAR_CONFIDENCE):
+        self.returns = returns or ReturnsCache()
+        self.cache_size = cache_size
+        self.max_position_weight = max_position_weight
+        self.max_industry_weight = max_industry_weight
+        self.max_var_ratio = max_var_ratio
+        self.z = NormalDist().inv_cdf(confidence)
+        self.states = OrderedDict()
+        self.user_locks = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="risk-warm")
+        self.counters = {"checks": 0, "rejected": 0, "builds": 0, "updates": 0, "var_unavailable": 0}
+
+    def _user_lock(self, uid: str) -> threading.RLock:
+        with self.lock:
+            return self.user_locks.setdefault(uid, threading.RLock())
+
+    @traced()
+    def risk_state(self, db, uid: str) -> PortfolioRisk:
+        """与持仓同步的风险状态：持仓重建或后台取到缺失/过期的收益率后整体重建，否则只追加新股票并重新估值
+
+        不在调用方线程获取历史行情：收益率过期时先沿用旧的状态，缺失的股票按无历史行情处理。
+        """
+        import numpy as np
+        import pandas as pd
+        analytics = get_portfolio_analytics()
+        state = analytics.state(db, uid)
+        with self.lock:
+            risk = self.states.get(uid)
+        held = [code for code, holding in state.holdings.items() if holding.quantity > 0]
+        if risk is not None and not risk.pending and time.monotonic() - risk.fetched_at >= self.returns.ttl:
+            risk.pending = bool(self.returns.peek_many(held)[2])  # 提交后台刷新
+        if risk is None or risk.state is not state or (risk.pending and risk.generation != self.returns.generation):
+            generation = self.returns.generation  # 先于读取缓存，之后完成的获取会触发下一次重建
+            returns, fetched_at, stale = self.returns.peek_many(held)
+            dates = pd.Index(np.unique(np.concatenate([series.index.to_numpy(str) for series in returns.values()]))
+                             if returns else [])
+            risk = PortfolioRisk(dates, fetched_at)
+            risk.add_columns(held, [analytics.industry(code) for code in held], returns)
+            risk.revalue(state)
+            risk.generation, risk.pending = generation, bool(stale)
+            result = "builds"
+        elif risk.version != state.version:
+            new_codes = [code for code in held if code not in risk.index]
+            if new_codes:
+                returns, _, stale = self.returns.peek_many(new_codes)
+                risk.add_columns(new_codes, [analytics.industry(code) for code in new_codes], returns)
+                risk.pending = risk.pending or bool(stale)
+            risk.revalue(state)
+            result = "updates"
+        else:
+            return risk
+        with self.lock:
+            self.counters[result] += 1
+            self.states[uid] = risk
+            self.states.move_to_end(uid)
+            while len(self.states) > self.cache_size:
+                self.states.popitem(last=False)
+        return risk
+
+    def warm(self, uid: str, db_factory=None) -> None:
+        """在后台线程获取用户持仓的历史行情并构建风险状态（登录时调用），db_factory 默认为 DatabaseManager"""
+        self.executor.submit(self._warm, uid, db_factory)
+
+    def _warm(self, uid: str, db_factory) -> None:
+        if db_factory is None:
+            from utils.db_utils import DatabaseManager
+            db_factory = DatabaseManager
+        db = db_factory()
+        try:
+            state = get_portfolio_analytics().state(db, uid)
+            self.returns.get_many([code for code, holding in state.holdings.items() if holding.quantity > 0])
+            with self._user_lock(uid):
+                self.risk_state(db, uid)
+        except Exception as e:
+            logger.warning(f"预热 {uid} 的风险状态失败: {str(e)}")
+        finally:
+            db.close()
+
+    @traced()
+    def evaluate(self, db, uid: str, orders: list) -> list:
+        """orders 为 [(action, stock_code, quantity, price)]，逐笔（相互独立）返回成交后的风险指标和是否允许"""
+        with self._user_lock(uid):  # 风险状态按用户原地更新
+            return self._evaluate(db, uid, self.risk_state(db, uid), orders)
+
+    def _evaluate(self, db, uid: str, risk: PortfolioRisk, orders: list) -> list:
+        import numpy as np
+        analytics = get_portfolio_analytics()
+        cash = float(db.get_user_funds(uid) or 0.0)
+        total = cash + float(risk.values.sum())  # 总资产（买卖只在现金与持仓之间转换）
+        codes = [code for _, code, _, _ in orders]
+        returns, _, _ = self.returns.peek_many([code for code in dict.fromkeys(codes) if code not in risk.index])
+        covered = np.array([risk.covered[risk.index[code]] if code in risk.index else len(returns.get(code, ())) > 0
+                            for code in codes], dtype=bool)
+        var_available = covered & risk.var_available
+
+        held = np.array([risk.quantities[risk.index[code]] if code in risk.index else 0.0 for code in codes])
+        last_values = np.array([risk.values[risk.index[code]] if code in risk.index else 0.0 for code in codes])
+        is_buy = np.array([action == BUY for action, _, _, _ in orders])
+        quantity = np.array([quantity for _, _, quantity, _ in orders], dtype=np.float64)
+        price = np.array([price for _, _, _, price in orders], dtype=np.float64)
+        traded = np.where(is_buy, quantity, np.minimum(quantity, held))  # 超出持仓的卖出部分不计入
+        delta = np.where(is_buy, 1.0, -1.0) * traded * price
+
+        # 订单股票的现有持仓与成交部分都按订单价格估值；相对风险状态（按最近成交价）中该股票市值的变化量
+        position_before = held * price
+        position_after = position_before + delta
+        revalued = position_before - last_values
+        change = position_after - last_values
+        total_after = total + revalued
+
+        # 集中度与行业暴露
+        industries = [risk.industries[risk.index[code]] if code in risk.index else analytics.industry(code) for code in codes]
+        industry_after = np.maximum(np.array([risk.industry_values.get(industry, 0.0) for industry in industries]) + change, 0.0)
+
+        # 参数法VaR：σ'² = σ² + 2δ(Σv)_j + δ²Σ_jj，成交前后分别以重新估值和成交后的市值变化代入 δ
+        columns = risk.order_returns(codes, returns)
+        if len(risk.dates):
+            covariance = columns.T @ risk.portfolio_returns / risk.periods
+            variance_j = (columns * columns).sum(axis=0) / risk.periods
+        else:  # 尚无持仓：直接用订单股票自身的收益率
+            covariance = np.zeros(len(codes))
+            variance_j = np.array([float(returns[code].var(ddof=1)) if len(returns.get(code, ())) > 1 else 0.0
+                                   for code in codes])
+        variance = lambda shift: np.maximum(risk.variance + 2 * shift * covariance + shift * shift * variance_j, 0.0)
+        var_before, var_after = self.z * np.sqrt(variance(revalued)), self.z * np.sqrt(variance(change))
+
+        ratio = lambda values: np.divide(values, total_after, out=np.zeros(len(values)), where=total_after > 0)
+        position_weight, industry_weight, var_ratio = ratio(position_after), ratio(industry_after), ratio(var_after)
+        results = []
+        for k, (action, code, order_quantity, _) in enumerate(orders):
+            reasons = []
+            if action == SELL and order_quantity > held[k]:
+                reasons.append(f"卖出数量{order_quantity}超过持仓{int(held[k])}")
+            if delta[k] > 0 and position_weight[k] > self.max_position_weight:
+                reasons.append(f"{code}持仓占比将达{position_weight[k]:.1%}（上限{self.max_position_weight:.0%}）")
+            if delta[k] > 0 and industry_weight[k] > self.max_industry_weight:
+                reasons.append(f"{industries[k]}行业占比将达{industry_weight[k]:.1%}（上限{self.max_industry_weight:.0%}）")
+            if var_available[k] and var_after[k] > var_before[k] and var_ratio[k] > self.max_var_ratio:
+                reasons.append(f"组合单日VaR将达总资产的{var_ratio[k]:.2%}（上限{self.max_var_ratio:.0%}）")
+            results.append({
+                "allowed": not reasons,
+                "reasons": reasons,
+                "position_weight": round(float(position_weight[k]), 4),
+                "industry": industries[k],
+                "industry_weight": round(float(industry_weight[k]), 4),
+                "var_available": bool(var_available[k]),  # 缺少历史行情时以下VaR指标为 None
+                "var": round(float(var_after[k]), 2) if var_available[k] else None,
+                "var_ratio": round(float(var_ratio[k]), 4) if var_available[k] else None,
+                "marginal_var": round(float(var_after[k] - var_before[k]), 2) if var_available[k] else None
+            })
+        with self.lock:
+            self.counters["checks"] += len(results)
+            self.counters["rejected"] += sum(not result["allowed"] for result in results)
+            self.counters["var_unavailable"] += int(len(results) - var_available.sum())
+        return results
+
+    def check(self, db, uid: str, action: str, stock_code: str, quantity: int, price: float) -> dict:
+        """单笔订单的组合风险检查"""
+        return self.evaluate(db, uid, [(action, stock_code, quantity, price)])[0]
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"cached_users": len(self.states), **self.counters}
+
+
+_risk = None
+_risk_lock = threading.Lock()
+
+
+def get_pre_trade_risk() -> PreTradeRisk:
+    global _risk
+    if _risk is None:
+        with _risk_lock:
+            if _risk is None:
+                _risk = PreTradeRisk()
+    return _risk
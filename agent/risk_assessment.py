@@ -1,7 +1,8 @@
+import math
+from data.indicators import get_indicator_stream
 from data.web_data import StockDataFetcher
 from utils.logger import Logger
-import numpy as np
-import pandas as pd
+from utils.tracing import traced
 
 class RiskAssessment:
     def __init__(self):
@@ -12,21 +13,20 @@ class RiskAssessment:
         self.market_cap_weight = 0.3
         self.price_trend_weight = 0.2
 
+    @traced()
     def evaluate_risk(self, stock_code: str) -> float:
         """评估股票风险"""
+        import numpy as np
         try:
-            # 获取历史数据
-            historical_data = self.stock_api.get_stock_history(stock_code, days=30)
-            # self.logger.info(f"获取{stock_code}的历史数据: {historical_data}")
-            if not historical_data:
+            # 最新技术指标（增量状态，随实时行情更新，不再每次重新计算历史窗口）
+            indicators = get_indicator_stream().snapshot(stock_code)
+            if not indicators or any(math.isnan(indicators[key]) for key in ("volatility", "ema5", "ema20", "boll_std")):
                 self.logger.warning(f"无法获取{stock_code}的历史数据")
                 return 0.8  # 默认高风险
-            
-            # 计算波动率 (简化版)
-            prices = [data["close"] for data in historical_data]
-            returns = np.diff(prices) / prices[:-1]
-            volatility = np.std(returns)
-            
+
+            # 波动率：最近 INDICATOR_WINDOW 个日收益率的标准差
+            volatility = indicators["volatility"]
+
             # 获取市值信息
             # 使用web_data模块获取实时数据
             real_time_data = self.stock_api.get_real_time_eastmoney(stock_code)
@@ -35,23 +35,16 @@ class RiskAssessment:
             # 或使用模拟数据（如果无法获取真实数据）
             # market_cap = random.uniform(1e9, 1e12)  # 生成1亿到1000亿之间的随机市值
             
-            # 计算价格趋势 (简化版)
-            recent_prices = prices[-5:]  # 最近5天
-            price_trend = (recent_prices[-1] - recent_prices[0]) / recent_prices[0]
-            
-            # 计算价格趋势（增强版）
-            # 使用指数加权移动平均分析趋势
-            ewma_5 = pd.Series(prices).ewm(span=5).mean().values
-            ewma_20 = pd.Series(prices).ewm(span=20).mean().values
-            trend_strength = (ewma_5[-1] - ewma_20[-1]) / ewma_20[-1]
-            
+            # 价格趋势：短期与长期指数加权移动平均的相对差
+            trend_strength = (indicators["ema5"] - indicators["ema20"]) / indicators["ema20"]
+
             # 动态归一化指标
             norm_volatility = np.tanh(volatility / 0.03)  # 双曲正切函数平滑处理
             norm_market_cap = 1 / (1 + np.exp(-(np.log(market_cap) - 23)))  # 对数sigmoid转换
             norm_trend = 1 / (1 + np.exp(-10*trend_strength))  # 趋势强度概率化
             
             # 动态权重调整（根据市场波动率）
-            total_volatility = np.std(prices)
+            total_volatility = indicators["boll_std"]
             dynamic_weights = self._calculate_dynamic_weights(total_volatility)
             
             # 风险评分计算
@@ -69,6 +62,7 @@ class RiskAssessment:
 
     def _calculate_dynamic_weights(self, total_volatility):
         """根据市场波动动态调整权重"""
+        import numpy as np
         volatility_factor = np.tanh(total_volatility / 0.05)
         return {
             'volatility': min(self.volatility_weight * (1 + volatility_factor), 0.7),
@@ -5,15 +5,23 @@ sys.path.append(str(Path(__file__).parent.parent))
 from api.stock_api import StockAPI
 from utils.logger import Logger
 import random
-from openai import OpenAI
 import os
-import json
 from knowledge_graph.kg_query import KnowledgeGraphQuery  # 新增知识图谱查询导入
-from knowledge_graph.kg_importer import KGImporter  # 新增知识图谱导入器导入
+from agent.strategy_tables import get_strategy_tables, rank_industries, query_leaders
+from knowledge_graph.similarity_index import get_similarity_index
+from utils.structured_output import chat_structured, StrategyResult, StructuredOutputError
+from utils.prompts import STRATEGY_SYSTEM_PROMPT, strategy_context
+from utils.tracing import traced
+from utils.metrics import CacheCounter
 import traceback  # 新增错误追踪模块
-api_key = os.getenv("DEEPSEEK_API_KEY")
-api_base_url = "https://api.deepseek.com/v1"
 model_name = "deepseek-chat"
+STRATEGY_PROMPT_TOKEN_BUDGET = int(os.getenv("STRATEGY_PROMPT_TOKEN_BUDGET", "600"))  # 策略上下文数据的token上限
+STRATEGY_TABLES_CACHE = CacheCounter("strategy_tables")  # 行业排序、龙头列表读取预计算表的命中情况
+STRATEGY_ERROR_SUGGESTIONS = [
+    "检查输入是否符合格式要求（示例：生成稳健型新能源行业投资策略，资金规模500万元，风险等级低，投资期限3年）",
+    "确认网络连接正常（确保能访问AI模型和知识图谱服务）",
+    "联系技术支持并提供日志文件（路径：查看程序运行日志输出）"
+]
 
 
 class StrategyAgent:
@@ -21,10 +29,19 @@ class StrategyAgent:
         self.logger = Logger("strategy_agent")
         self.logger.info("策略代理初始化完成")
         self.stock_api = StockAPI()
-        self.chat_model = OpenAI(api_key=api_key, base_url=api_base_url)
-        self.kg_import = KGImporter()
+        # 知识图谱导入器在首次使用时创建
+        self._kg_import = None
+
+    @property
+    def kg_import(self):
+        """知识图谱导入器"""
+        if self._kg_import is None:
+            from knowledge_graph.kg_importer import KGImporter
+            self._kg_import = KGImporter()
+        return self._kg_import
     
 
+    @traced()
     def generate_strategy(self, instruction: str) -> dict:  # 返回类型改为字典
         """策略生成主流程
         参数处理流程：
@@ -63,7 +80,8 @@ class StrategyAgent:
             # 供应链参数处理（第34行）：
             recommended_stocks = self.get_supply_chain_stocks(
                 industries,    # 上一步选择的行业
-                kg_query       # 知识图谱查询实例
+                kg_query,      # 知识图谱查询实例
+                market_data['snapshot_version']  # 优先读取该快照的预计算表
             )
             self.logger.info(f"推荐的股票: {recommended_stocks}")
             
@@ -77,140 +95,147 @@ class StrategyAgent:
             self.logger.error(f"策略生成失败: {str(e)}")
             return self.handle_strategy_error(e)  # 直接返回错误字典
 
-    def get_supply_chain_stocks(self, industries: list, kg_query: KnowledgeGraphQuery) -> list:
+    @traced()
+    def get_supply_chain_stocks(self, industries: list, kg_query: KnowledgeGraphQuery, snapshot_version: int = None) -> list:
         """基于供应链的核心企业推荐（最终优化：降低动态阈值）"""
+        tables = get_strategy_tables().get(snapshot_version) if snapshot_version is not None else None
         core_companies = []
         for industry in industries:
-            
-            # 检查是否存在特定行业的公司数量
-            self.logger.info(f"开始查询行业 '{industry}' 的信息")
-            if not kg_query.query_industry_info(industry):
-                self.logger.warning(f"未找到行业 '{industry}' 的信息，或者生成数据失败！！！！")
+            leaders = tables['leaders'].get(industry) if tables else None
+            if leaders:
+                STRATEGY_TABLES_CACHE.hit()
+                self.logger.info(f"读取行业 '{industry}' 的预计算龙头: {leaders}")
+            else:
+                STRATEGY_TABLES_CACHE.miss()
+                leaders = self.query_industry_leaders(industry, kg_query)
+            if not leaders:
+                continue
+
+            if all(company.get('pagerank') is not None for company in leaders):
+                # 已有预计算中心性：选取PageRank不低于行业龙头平均值的企业
+                avg_rank = sum(company['pagerank'] for company in leaders) / len(leaders)
+                for company in sorted(leaders, key=lambda x: x['pagerank'], reverse=True):
+                    if company['pagerank'] >= avg_rank and company['weighted_degree'] > 0:
+                        core_companies.append({
+                            'code': company['code'],
+                            'name': company['name'],
+                            'supply_relations': company['supply_relations'],
+                            'pagerank': round(company['pagerank'], 6),
+                            'betweenness': round(company['betweenness'], 2)
+                        })
                 continue
-            self.logger.info(f"查询特定行业'{industry}'完成")
-            
-            cypher = f"MATCH (c:Company) WHERE c.industry_primary='{industry}' RETURN c ORDER BY c.market_cap DESC LIMIT 5"
-            leaders = kg_query.graph.run(cypher).data()
-            self.logger.info(f"获取行业龙头: {leaders}")
             
             # 计算行业内企业的平均供应链关系数（关键优化）
-            supply_counts = []
-            for company in leaders:
-                company_node = company['c']
-                supply_chain = kg_query.query_supply_chain(company_node['code'])
-                supply_counts.append(len(supply_chain))
+            supply_counts = [company['supply_relations'] for company in leaders]
             avg_supply = sum(supply_counts) / len(supply_counts) if supply_counts else 0
             threshold = max(2, int(avg_supply * 1.0))  # 调整倍数为1.0（原1.2），最低阈值2（原3）
             self.logger.info(f"行业'{industry}'的平均供应链关系数: {avg_supply}, 动态阈值: {threshold}")  # 保留调试日志
             
             # 筛选供应链关系丰富的企业
             for company in leaders:
-                company_node = company['c']
-                supply_chain = kg_query.query_supply_chain(company_node['code'])
-                if len(supply_chain) > threshold:  # 使用降低后的阈值
+                if company['supply_relations'] > threshold:  # 使用降低后的阈值
                     core_companies.append({
-                        'code': company_node['code'],
-                        'name': company_node['name'],
-                        'supply_relations': len(supply_chain),
+                        'code': company['code'],
+                        'name': company['name'],
+                        'supply_relations': company['supply_relations'],
                         'threshold': threshold  # 记录当前阈值（便于调试）
                     })
-        return core_companies[:6]  # 返回前6家核心企业
+        return self.diversify_stocks(core_companies)[:6]  # 返回前6家核心企业
+
+    @traced()
+    def diversify_stocks(self, stocks: list, max_similarity: float = 0.8) -> list:
+        """分散化筛选：依次保留与已选企业相似度不超过阈值的企业（基于相似公司索引，无需图遍历）"""
+        index = get_similarity_index()
+        if index is None:
+            return stocks
+        selected = []
+        for stock in stocks:
+            if all(index.similarity(stock['code'], chosen['code']) <= max_similarity for chosen in selected):
+                selected.append(stock)
+            else:
+                self.logger.info(f"企业 {stock['name']}({stock['code']}) 与已选企业过于相似，跳过")
+        return selected
+
+    @traced()
+    def query_industry_leaders(self, industry: str, kg_query: KnowledgeGraphQuery) -> list:
+        """实时查询行业龙头及其供应链关系数（预计算表未就绪时使用）"""
+        # 检查是否存在特定行业的公司数量
+        self.logger.info(f"开始查询行业 '{industry}' 的信息")
+        if not kg_query.query_industry_info(industry):
+            self.logger.warning(f"未找到行业 '{industry}' 的信息，或者生成数据失败！！！！")
+            return []
+        self.logger.info(f"查询特定行业'{industry}'完成")
+        leaders = query_leaders(kg_query, [industry])[industry]
+        self.logger.info(f"获取行业龙头: {leaders}")
+        return leaders
 
+    @traced()
     def get_enhanced_market_data(self) -> dict:
-        """获取增强版市场数据（包含详细估值指标）"""
-        valuation = self.stock_api.get_market_valuation()
+        """获取增强版市场数据（包含详细估值指标，同一快照周期内的请求共享同一份数据）"""
+        snapshot = self.stock_api.get_market_snapshot()
+        valuation = snapshot['valuation']
         return {
+            "snapshot_version": snapshot['version'],
             "valuation": {
                 "pe": valuation.get('pe_ratio'),  
                 "pb": valuation.get('pb_ratio'), 
                 "dividend_yield": valuation.get('dividend_yield')
             },
-            "supply_chain_index": self.stock_api.get_supply_chain_index(),
-            "industry_rotation": self.stock_api.get_industry_rotation()
+            "supply_chain_index": snapshot['supply_chain_index'],
+            "industry_rotation": snapshot['industry_rotation']
         }
 
+    @traced()
     def select_industries(self, strategy_type: str, market_data: dict) -> list:
-        """优化后的行业选择算法（返回行业名称列表）"""
-        # 获取市场估值指标
-        pe_ratio = market_data['valuation']['pe']
-        pb_ratio = market_data['valuation']['pb']
-        
-        # 动态调整权重系数并排序（返回行业名称列表）
-        sorted_industries = []
-        if strategy_type == "稳健型":
-            sorted_list = sorted(market_data['industry_rotation'],
-                        key=lambda x: (x['stability'] * 0.6 + 
-                                      (1 - abs(x['pe'] - pe_ratio)) * 0.2 +
-                                      (1 - abs(x['pb'] - pb_ratio)) * 0.2),
-                        reverse=True)[:3]
-        elif strategy_type == "激进型":
-            sorted_list = sorted(market_data['industry_rotation'],
-                        key=lambda x: (x['growth_potential'] * 0.7 +
-                                      (x['pe'] / pe_ratio) * 0.3),
-                        reverse=True)[:3]
-        else:  # 平衡型
-            sorted_list = sorted(market_data['industry_rotation'],
-                        key=lambda x: (x['stability'] * 0.4 + 
-                                      x['growth_potential'] * 0.4 +
-                                      (1 - abs(x['pb'] - pb_ratio)) * 0.2),
-                        reverse=True)[:3]
-        
-        # 提取行业名称（关键修复：从字典中提取industry字段）
-        return [item['industry'] for item in sorted_list]
+        """优化后的行业选择算法（返回行业名称列表，优先读取快照预计算表）"""
+        tables = get_strategy_tables().get(market_data.get('snapshot_version'))
+        if tables:
+            STRATEGY_TABLES_CACHE.hit()
+            return tables['industries'][strategy_type]
+        # 预计算表尚未生成时按相同规则现场排序
+        STRATEGY_TABLES_CACHE.miss()
+        return rank_industries(strategy_type, market_data['industry_rotation'],
+                               market_data['valuation']['pe'], market_data['valuation']['pb'])
 
+    @traced()
     def build_strategy_prompt(self, market_data: dict, strategy_type: str, 
                             industries: list, stocks: list) -> str:
-        """构建策略提示词（新增供应链要素）"""
-        prompt = f"""当前市场估值水平：{market_data['valuation']}，供应链景气指数：{market_data['supply_chain_index']}，
-        策略类型：{strategy_type}，优选行业：{'、'.join(industries)}，核心供应链企业："""
-        for stock in stocks:
-            prompt += f"\n- {stock['name']}({stock['code']}) 供应链关系数：{stock['supply_relations']}"
-        prompt += """\n请基于以上要素生成包含以下内容的投资策略：
-        1. 行业配置逻辑（结合供应链稳定性）
-        2. 个股选择依据（供应链核心地位）
-        3. 风险控制措施（供应链断裂风险）"""
-        return self.clean_prompt(prompt)
+        """构建策略提示词（只含上下文数据，紧凑格式；生成要求放在固定的系统消息中）"""
+        return strategy_context(market_data, strategy_type, industries, stocks, STRATEGY_PROMPT_TOKEN_BUDGET)
 
+    @traced()
     def generate_final_strategy(self, prompt: str, recommended_stocks: list) -> dict:  # 新增recommended_stocks参数
         """生成结构化策略数据（包含推荐股票信息）"""
         try:
-            response = self.chat_model.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    # 关键修改：系统提示要求返回推荐股票字段
-                    {"role": "system", "content": """你是一位精通供应链分析的首席投资顾问，请返回严格符合以下格式的JSON数据（无额外文本）：
-                    {"title": "策略标题", "description": "策略描述", "annualReturn": "预期年化收益率（百分比）", "riskLevel": "低/中/高", "recommendedStocks": [{"name": "股票名称", "code": "股票代码"}]}
-                    示例（仅供格式参考）：{"title": "稳健型新能源投资策略", "description": "聚焦新能源行业核心供应链企业...", "annualReturn": "8%", "riskLevel": "低", "recommendedStocks": [{"name": "宁德时代", "code": "300750"}]}"""},
+            result = chat_structured(
+                "strategy.final_strategy",
+                [
+                    # 系统提示要求返回推荐股票字段（固定内容，各次策略请求共享同一前缀）
+                    {"role": "system", "content": STRATEGY_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.3
+                StrategyResult,
+                model=model_name,
+                temperature=0.3,
+                response_format={"type": "json_object"}
             )
-            response_content = response.choices[0].message.content
-            # 清理Markdown标记和换行符
-            response_content = (
-                response_content
-                .replace("```json", "")
-                .replace("```", "")
-                .replace("\n", " ")
-                .strip()
-            )
-            self.logger.info(f"AI模型返回内容: {response_content}")
-            
-            # 解析JSON并补充推荐股票信息（若AI未自动生成则手动添加）
-            strategy_data = json.loads(response_content)
-            # 确保返回数据包含recommendedStocks字段（兼容AI未生成的情况）
-            strategy_data.setdefault("recommendedStocks", [
-                {"name": stock["name"], "code": stock["code"]} 
-                for stock in recommended_stocks
-            ])
-            return strategy_data  # 第187行返回包含股票信息的字典
-        except json.JSONDecodeError as e:
-            self.logger.error(f"AI返回内容非有效JSON: {response_content}")
+        except StructuredOutputError as e:
+            self.logger.error(f"AI返回内容不符合策略结构: {e}")
             return {
                 "error": True,
                 "message": "AI模型返回内容格式错误，请检查提示词或模型配置",
-                "raw_response": response_content  # 返回原始内容辅助调试
+                "suggestions": list(STRATEGY_ERROR_SUGGESTIONS),
+                "raw_response": e.raw  # 返回原始内容辅助调试
             }
+        self.logger.info(f"AI模型返回策略: {result.title}")
+
+        # 补充推荐股票信息（若AI未生成则使用本地选出的股票）
+        strategy_data = result.model_dump(exclude_none=True)
+        strategy_data.setdefault("recommendedStocks", [
+            {"name": stock["name"], "code": stock["code"]} 
+            for stock in recommended_stocks
+        ])
+        return strategy_data
 
     def handle_strategy_error(self, e: Exception) -> dict:
         """增强型策略错误处理（返回结构化错误信息）"""
@@ -219,11 +244,7 @@ class StrategyAgent:
         return {
             "error": True,  # 标记错误状态
             "message": error_msg,
-            "suggestions": [
-                "检查输入是否符合格式要求（示例：生成稳健型新能源行业投资策略，资金规模500万元，风险等级低，投资期限3年）",
-                "确认网络连接正常（确保能访问AI模型和知识图谱服务）",
-                "联系技术支持并提供日志文件（路径：查看程序运行日志输出）"
-            ]
+            "suggestions": list(STRATEGY_ERROR_SUGGESTIONS)
         }
 
     def parse_strategy_type(self, instruction: str) -> str:
@@ -246,17 +267,6 @@ class StrategyAgent:
                     return strategy_type
         
         raise ValueError("无法识别投资策略类型，请明确说明投资偏好（稳健型/激进型/平衡型）")
-        
-
-    def clean_prompt(self, prompt: str) -> str:
-        """提示词净化处理"""
-        # 移除多余空白字符并标准化换行
-        cleaned = '\n'.join([line.strip() for line in prompt.split('\n')])
-        # 去除连续空行
-        cleaned = '\n'.join([line for line in cleaned.split('\n') if line.strip()])
-        # 限制最大长度（保留核心要素）
-        return cleaned[:2000]  # 根据模型上下文窗口设置合理阈值
-
 
 
 if __name__ =="__main__":
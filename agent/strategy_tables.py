@@ -0,0 +1,155 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import threading
+from utils.logger import Logger
+from api.market_snapshot import get_market_snapshot_service
+from utils.job_queue import PRIORITY_LOW
+
+STRATEGY_TYPES = ("稳健型", "激进型", "平衡型")
+TOP_INDUSTRIES = 3  # 每种策略类型的优选行业数
+TOP_LEADERS = 5  # 每个行业的龙头企业数
+
+# 已有中心性分值（见 knowledge_graph/centrality.py）时按PageRank选龙头，否则按市值
+LEADERS_CYPHER = """
+UNWIND $industries AS industry
+MATCH (c:Company)
+WHERE c.industry_primary = industry
+WITH industry, c ORDER BY coalesce(c.pagerank, 0.0) DESC, c.market_cap DESC
+WITH industry, collect(c)[..$limit] AS leaders
+UNWIND leaders AS c
+RETURN industry, c.code AS code, c.name AS name, c.market_cap AS market_cap,
+       c.pagerank AS pagerank, c.weighted_degree AS weighted_degree,
+       c.betweenness AS betweenness, c.supply_degree AS supply_degree
+"""
+
+# 尚未计算中心性的公司，现场统计2跳内的供应链伙伴数
+SUPPLY_COUNT_CYPHER = """
+UNWIND $codes AS code
+MATCH (c:Company {code: code})
+OPTIONAL MATCH (c)-[:SUPPLY_CHAIN*1..2]->(partner:Company)
+RETURN code, count(DISTINCT partner) AS supply_relations
+"""
+
+
+def score_industry(strategy_type: str, item: dict, pe_ratio: float, pb_ratio: float) -> float:
+    """按策略类型计算行业得分"""
+    if strategy_type == "稳健型":
+        return (item['stability'] * 0.6 +
+                (1 - abs(item['pe'] - pe_ratio)) * 0.2 +
+                (1 - abs(item['pb'] - pb_ratio)) * 0.2)
+    elif strategy_type == "激进型":
+        return (item['growth_potential'] * 0.7 +
+                (item['pe'] / pe_ratio) * 0.3)
+    # 平衡型
+    return (item['stability'] * 0.4 +
+            item['growth_potential'] * 0.4 +
+            (1 - abs(item['pb'] - pb_ratio)) * 0.2)
+
+
+def rank_industries(strategy_type: str, industry_rotation: list, pe_ratio: float, pb_ratio: float,
+                    top_n: int = TOP_INDUSTRIES) -> list:
+    """按策略类型对行业轮动数据排序，返回前 top_n 个行业名称"""
+    sorted_list = sorted(industry_rotation,
+                         key=lambda x: score_industry(strategy_type, x, pe_ratio, pb_ratio),
+                         reverse=True)[:top_n]
+    return [item['industry'] for item in sorted_list]
+
+
+def query_leaders(kg_query, industries: list, limit: int = TOP_LEADERS) -> dict:
+    """一次查询取出多个行业的龙头企业及其供应链关系数、中心性分值"""
+    leaders = {industry: [] for industry in industries}
+    rows = kg_query.graph.run(LEADERS_CYPHER, industries=industries, limit=limit).data()
+    missing = [row['code'] for row in rows if row['supply_degree'] is None]
+    counts = {}
+    if missing:
+        for row in kg_query.graph.run(SUPPLY_COUNT_CYPHER, codes=missing).data():
+            counts[row['code']] = row['supply_relations']
+    for row in rows:
+        leaders[row['industry']].append({
+            'code': row['code'],
+            'name': row['name'],
+            'market_cap': row['market_cap'],
+            'supply_relations': row['supply_degree'] if row['supply_degree'] is not None else counts.get(row['code'], 0),
+            'pagerank': row['pagerank'],
+            'weighted_degree': row['weighted_degree'],
+            'betweenness': row['betweenness']
+        })
+    return leaders
+
+
+class StrategyTables:
+    """策略预计算表
+
+    每生成一个市场快照，预先计算各策略类型的优选行业和各行业的龙头企业（含供应链关系数），
+    策略生成时只需读表，不再逐请求排序和查询图数据库。
+    """
+    def __init__(self, history: int = 2):
+        self.logger = Logger("StrategyTables")
+        self.history = history
+        self.tables = {}  # 键：快照版本号，值：预计算表
+        self.lock = threading.Lock()
+        self.kg_query = None
+
+    def get(self, version: int) -> dict:
+        """读取指定快照版本的预计算表，尚未生成时返回None"""
+        return self.tables.get(version)
+
+    def schedule_refresh(self, snapshot: dict) -> None:
+        """快照回调：在后台线程中生成该快照的预计算表"""
+        threading.Thread(target=self.refresh, args=(snapshot,),
+                         name=f"strategy-tables-{snapshot['version']}", daemon=True).start()
+
+    def refresh(self, snapshot: dict) -> dict:
+        """生成指定快照的预计算表"""
+        version = snapshot['version']
+        with self.lock:
+            if version in self.tables:
+                return self.tables[version]
+            valuation = snapshot['valuation']
+            industries = {
+                strategy_type: rank_industries(strategy_type, snapshot['industry_rotation'],
+                                               valuation['pe_ratio'], valuation['pb_ratio'])
+                for strategy_type in STRATEGY_TYPES
+            }
+            candidates = sorted({name for names in industries.values() for name in names})
+            try:
+                leaders = self.query_leaders(candidates)
+            except Exception as e:
+                self.logger.error(f"行业龙头预计算失败: {str(e)}")
+                leaders = {}
+            table = {"version": version, "industries": industries, "leaders": leaders}
+            self.tables[version] = table
+            for old_version in sorted(self.tables)[:-self.history]:
+                del self.tables[old_version]
+            self.logger.info(f"策略预计算表生成完成，快照版本: {version}，行业: {candidates}")
+            return table
+
+    def query_leaders(self, industries: list, limit: int = TOP_LEADERS) -> dict:
+        """取出所有候选行业的龙头企业（行业数据缺失时提交后台补全任务，不占用用户请求）"""
+        if self.kg_query is None:
+            from knowledge_graph.kg_query import KnowledgeGraphQuery
+            self.kg_query = KnowledgeGraphQuery()
+        for industry in industries:
+            # 本地无数据的行业以低优先级提交补全任务，下一个快照周期即可使用
+            self.kg_query.query_industry_info(industry, priority=PRIORITY_LOW)
+        return query_leaders(self.kg_query, industries, limit)
+
+
+_strategy_tables = None
+
+
+def get_strategy_tables() -> StrategyTables:
+    """进程内共享的策略预计算表（创建时注册为市场快照回调）"""
+    global _strategy_tables
+    if _strategy_tables is None:
+        _strategy_tables = StrategyTables()
+        get_market_snapshot_service().add_listener(_strategy_tables.schedule_refresh)
+    return _strategy_tables
+
+
+if __name__ == "__main__":
+    tables = get_strategy_tables()
+    table = tables.refresh(get_market_snapshot_service().current())
+    print(table)
@@ -2,17 +2,15 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from openai import OpenAI
 from api.stock_api import StockAPI
 from agent.risk_assessment import RiskAssessment
-from api.transaction_api import TransactionAPI
+from agent.pre_trade_risk import get_pre_trade_risk
 from utils.logger import Logger
 from utils.db_utils import DatabaseManager
 import os
 from data.web_data import StockDataFetcher
+from utils.llm_gateway import get_llm_gateway
 
-api_key = os.getenv("DEEPSEEK_API_KEY")
-api_base_url = "https://api.deepseek.com/v1"
 model_name = "deepseek-chat"
 
 class TransactionAgent:
@@ -52,8 +50,15 @@ class TransactionAgent:
             if risk_score > 0.7:  # 风险阈值
                 result['message']=f"股票 {stock_code} 风险过高，无法执行交易"
                 return result
-    
-                        
+
+            # 组合层面的风险：集中度、行业暴露和VaR
+            portfolio_risk = get_pre_trade_risk().check(self.transaction_api, uid, action, stock_code, quantity, current_price)
+            self.logger.info(f"股票 {stock_code} 组合风险: {portfolio_risk}")
+            if not portfolio_risk["allowed"]:
+                result['message']=f"组合风险超限，无法执行交易: {'；'.join(portfolio_risk['reasons'])}"
+                result['risk']=portfolio_risk
+                return result
+
             # 执行交易
             result = self.transaction_api.add_transaction(
                 uid=uid, 
@@ -80,7 +85,6 @@ class TransactionAgent:
     
     def parse_instruction_with_llm(self, instruction):
         """使用LLM解析交易指令"""
-        client = OpenAI(api_key=api_key, base_url=api_base_url)
         system_message = "你是一个专业的交易指令解析助手，能准确从交易指令中提取操作、数量和股票代码/名称。"
         prompt = f"""请从以下交易指令中准确提取操作、数量和股票代码/名称，并按照“操作,数量,股票代码”的格式输出结果。操作只能是“买入”或“卖出”，数量必须是正整数。
         股票代码格式示例：600519.SH（沪市）或 000001.SZ（深市）
@@ -96,15 +100,15 @@ class TransactionAgent:
         
         指令：{instruction}"""
         
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
+        result = get_llm_gateway().chat(
+            "transaction.parse_instruction",
+            [
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": prompt},
             ],
-            stream=False
+            hedge=True,
+            model=model_name
         )
-        result = response.choices[0].message.content
         # print(f'result: {result}, type: {type(result)}, length: {len(result)}')
         try:
             action, quantity, stock_name = result.strip().split(",")
@@ -0,0 +1,166 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from utils.logger import Logger
+
+MARKET_SNAPSHOT_INTERVAL = int(os.getenv("MARKET_SNAPSHOT_INTERVAL", "300"))  # 快照刷新周期（秒）
+MARKET_SOURCE = os.getenv("MARKET_SOURCE", "seeded")
+MARKET_SOURCE_SEED = int(os.getenv("MARKET_SOURCE_SEED", "0"))
+
+ROTATION_INDUSTRIES = ["科技", "新能源", "房地产", "汽车", "金融", "消费", "有色金属"]
+
+
+class SeededMarketSource:
+    """离线市场数据源：以快照版本号为随机种子，同一版本生成的数据完全一致"""
+    def __init__(self, seed: int = MARKET_SOURCE_SEED):
+        self.seed = seed
+
+    def load(self, version: int) -> dict:
+        rng = random.Random(f"{self.seed}:{version}")
+        return {
+            "valuation": self.get_market_valuation(),
+            "supply_chain_index": self.get_supply_chain_index(rng),
+            "industry_rotation": self.get_industry_rotation(rng)
+        }
+
+    def get_market_valuation(self) -> dict:
+        """市场估值数据（示例数据）"""
+        return {
+            "pe_ratio": 15.2,
+            "pb_ratio": 2.1,
+            "dividend_yield": 2.5,
+        }
+
+    def get_supply_chain_index(self, rng: random.Random) -> dict:
+        """供应链景气指数（保留1位小数）"""
+        return {
+            "core_components": round(rng.uniform(100, 120), 1),  # 核心组件：100-120
+            "semiconductors": round(rng.uniform(105, 130), 1),  # 半导体：105-130
+            "new_energy": round(rng.uniform(110, 130), 1)  # 新能源：110-130
+        }
+
+    def get_industry_rotation(self, rng: random.Random) -> list:
+        """行业轮动数据（含pe/pb字段）"""
+        return [
+            {
+                "industry": industry,
+                "stability": round(rng.uniform(0.6, 1.0), 2),  # 稳定性：0.6-1.0
+                "growth_potential": round(rng.uniform(0.5, 1.0), 2),  # 增长潜力：0.5-1.0
+                "pe": round(rng.uniform(10, 40), 1),  # PE：10-40
+                "pb": round(rng.uniform(1, 5), 1)  # PB：1-5
+            }
+            for industry in ROTATION_INDUSTRIES
+        ]
+
+
+# 可插拔数据源：名称 -> 工厂函数（生产环境注册真实行情源）
+MARKET_SOURCES = {
+    "seeded": SeededMarketSource,
+}
+
+
+def register_market_source(name: str, factory) -> None:
+    """注册市场数据源，factory() 返回带 load(version) -> dict 方法的对象"""
+    MARKET_SOURCES[name] = factory
+
+
+class MarketSnapshotService:
+    """市场快照服务
+
+    按固定周期计算一次估值、供应链景气指数和行业轮动数据，保存为带版本号的快照。
+    同一周期内的所有策略请求共享同一份快照，结果可缓存、可比较。
+    """
+    def __init__(self, source=None, interval: int = MARKET_SNAPSHOT_INTERVAL, history: int = 4):
+        self.logger = Logger("MarketSnapshotService")
+        self.source = source if source is not None else MARKET_SOURCES[MARKET_SOURCE]()
+        self.interval = interval
+        self.history = history
+        self.snapshots = {}  # 键：版本号，值：快照
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.refresh_thread = None
+
+    def current_version(self) -> int:
+        return int(time.time() // self.interval)
+
+    def current(self) -> dict:
+        """获取当前周期的快照（同一周期内只计算一次）"""
+        version = self.current_version()
+        snapshot = self.snapshots.get(version)
+        if snapshot is not None:
+            return snapshot
+        with self.lock:
+            snapshot = self.snapshots.get(version)
+            created = snapshot is None
+            if created:
+                snapshot = self._build(version)
+        if created:
+            self._notify(snapshot)
+        return snapshot
+
+    def get(self, version: int) -> dict:
+        """按版本号获取历史快照（仅保留最近几个版本）"""
+        return self.snapshots.get(version)
+
+    def add_listener(self, listener) -> None:
+        """注册新快照回调，listener(snapshot) 在每个新版本生成后调用一次"""
+        self.listeners.append(listener)
+
+    def _build(self, version: int) -> dict:
+        data = self.source.load(version)
+        snapshot = {
+            "version": version,
+            "created_at": datetime.now().isoformat(),
+            "valuation": data["valuation"],
+            "supply_chain_index": data["supply_chain_index"],
+            "industry_rotation": data["industry_rotation"]
+        }
+        self.snapshots[version] = snapshot
+        for old_version in sorted(self.snapshots)[:-self.history]:
+            del self.snapshots[old_version]
+        self.logger.info(f"生成市场快照，版本: {version}")
+        return snapshot
+
+    def _notify(self, snapshot: dict) -> None:
+        for listener in self.listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                self.logger.error(f"快照回调执行失败: {str(e)}")
+
+    def start(self) -> None:
+        """启动后台刷新线程，在每个周期开始时预先生成快照"""
+        if self.refresh_thread is not None:
+            return
+
+        def run():
+            while True:
+                self.current()
+                time.sleep(self.interval - time.time() % self.interval + 0.01)
+
+        self.refresh_thread = threading.Thread(target=run, name="market-snapshot", daemon=True)
+        self.refresh_thread.start()
+
+
+_snapshot_service = None
+
+
+def get_market_snapshot_service() -> MarketSnapshotService:
+    """进程内共享的市场快照服务"""
+    global _snapshot_service
+    if _snapshot_service is None:
+        _snapshot_service = MarketSnapshotService()
+    return _snapshot_service
+
+
+if __name__ == "__main__":
+    service = MarketSnapshotService(interval=2)
+    first = service.current()
+    print(first["version"], first["industry_rotation"][0])
+    print("同一周期数据一致:", service.current() is first)
@@ -0,0 +1,201 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import asyncio
+import os
+import random
+import time
+from data.fundamentals_store import normalize_stock_code
+from utils.logger import Logger
+
+QUOTE_SOURCE = os.getenv("QUOTE_SOURCE", "eastmoney")  # eastmoney / fake
+QUOTE_POLL_INTERVAL = float(os.getenv("QUOTE_POLL_INTERVAL", "3"))  # 单个股票的上游轮询间隔（秒）
+QUOTE_QUEUE_SIZE = int(os.getenv("QUOTE_QUEUE_SIZE", "32"))  # 每个订阅者的待发送队列长度
+QUOTE_MAX_SYMBOLS = int(os.getenv("QUOTE_MAX_SYMBOLS", "50"))  # 每个订阅者（连接）最多订阅的股票数
+
+
+class EastmoneyQuoteSource:
+    """东方财富实时行情源（同步接口，由行情中心放到线程池中调用）"""
+    def __init__(self):
+        from data.web_data import StockDataFetcher
+        self.fetcher = StockDataFetcher()
+
+    def fetch(self, symbol: str) -> dict:
+        return self.fetcher.get_real_time_eastmoney(symbol)
+
+
+class FakeQuoteSource:
+    """本地模拟行情源：按股票代码生成可复现的随机游走价格，用于离线开发与测试"""
+    def __init__(self, seed: int = 0, latency: float = 0.0):
+        self.seed = seed
+        self.latency = latency
+        self.prices = {}
+        self.rngs = {}
+        self.fetch_count = 0
+
+    def fetch(self, symbol: str) -> dict:
+        self.fetch_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if symbol not in self.rngs:
+            self.rngs[symbol] = random.Random(f"{self.seed}:{symbol}")
+            self.prices[symbol] = round(self.rngs[symbol].uniform(10, 500), 2)
+        rng = self.rngs[symbol]
+        price = round(self.prices[symbol] * (1 + rng.uniform(-0.01, 0.01)), 2)
+        self.prices[symbol] = price
+        return {
+            "name": symbol,
+            "price": price,
+            "open": price,
+            "high": round(price * 1.01, 2),
+            "low": round(price * 0.99, 2),
+            "volume": rng.randint(100000, 10000000),
+            "turnover": round(price * rng.randint(100000, 10000000), 2)
+        }
+
+
+def create_quote_source(name: str = QUOTE_SOURCE):
+    """根据配置创建行情源"""
+    if name == "fake":
+        return FakeQuoteSource()
+    return EastmoneyQuoteSource()
+
+
+class QuoteSubscriber:
+    """单个客户端的订阅：有界队列，消费过慢时丢弃最旧的行情"""
+    def __init__(self, maxsize: int = QUOTE_QUEUE_SIZE):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.symbols = set()
+        self.dropped = 0
+
+    def offer(self, quote: dict) -> None:
+        """非阻塞投递行情；队列已满时丢弃最旧一条，保证客户端总能拿到最新价格"""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(quote)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+
+class QuoteHub:
+    """实时行情推送中心
+
+    每个被订阅的股票只运行一个上游轮询任务，拉取到的行情分发给所有订阅者。
+    上游请求量只与不同股票数有关，与用户数和刷新次数无关。
+    """
+    def __init__(self, source=None, interval: float = QUOTE_POLL_INTERVAL, max_symbols: int = QUOTE_MAX_SYMBOLS):
+        self.logger = Logger("QuoteHub")
+        self.source = source if source is not None else create_quote_source()
+        self.interval = interval
+        self.max_symbols = max_symbols
+        self.subscribers = {}  # 键：股票代码，值：订阅者集合
+        self.pollers = {}  # 键：股票代码，值：轮询任务
+        self.last_quotes = {}  # 键：股票代码，值：最近一次行情
+        self.listeners = []  # 每条行情的回调（在事件循环中同步调用，不能阻塞）
+        self.upstream_fetches = 0
+        self.upstream_errors = 0
+
+    def subscribe(self, subscriber: QuoteSubscriber, symbols: list) -> list:
+        """订阅股票行情（需在事件循环中调用），已有缓存行情会立即推送
+
+        股票代码统一为 sh/sz+6位数字；返回未订阅的代码（无法识别或超出每个订阅者的股票数上限）。
+        """
+        rejected = []
+        for raw in symbols:
+            symbol = normalize_stock_code(raw)
+            if symbol is None:
+                rejected.append(raw)
+                continue
+            if symbol in subscriber.symbols:
+                continue
+            if len(subscriber.symbols) >= self.max_symbols:
+                rejected.append(raw)
+                continue
+            subscriber.symbols.add(symbol)
+            self.subscribers.setdefault(symbol, set()).add(subscriber)
+            if symbol in self.last_quotes:
+                subscriber.offer(self.last_quotes[symbol])
+            if symbol not in self.pollers:
+                self.pollers[symbol] = asyncio.create_task(self._poll(symbol))
+                self.logger.info(f"启动行情轮询: {symbol}")
+        return rejected
+
+    def unsubscribe(self, subscriber: QuoteSubscriber, symbols: list = None) -> None:
+        """取消订阅；symbols 为空时取消该订阅者的全部订阅"""
+        targets = list(subscriber.symbols) if symbols is None else [normalize_stock_code(s) for s in symbols]
+        for symbol in targets:
+            if symbol is None:
+                continue
+            subscriber.symbols.discard(symbol)
+            subs = self.subscribers.get(symbol)
+            if subs is None:
+                continue
+            subs.discard(subscriber)
+            if not subs:
+                # 最后一个订阅者离开时停止该股票的上游轮询
+                del self.subscribers[symbol]
+                poller = self.pollers.pop(symbol, None)
+                if poller:
+                    poller.cancel()
+                self.last_quotes.pop(symbol, None)
+                self.logger.info(f"停止行情轮询: {symbol}")
+
+    async def _poll(self, symbol: str) -> None:
+        """单个股票的上游轮询循环"""
+        while symbol in self.subscribers:
+            try:
+                self.upstream_fetches += 1
+                data = await asyncio.to_thread(self.source.fetch, symbol)
+                if data and not data.get("error"):
+                    self._publish(symbol, {"code": symbol, "timestamp": time.time(), **data})
+                else:
+                    self.upstream_errors += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.upstream_errors += 1
+                self.logger.error(f"行情轮询失败 {symbol}: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def _publish(self, symbol: str, quote: dict) -> None:
+        self.last_quotes[symbol] = quote
+        for listener in self.listeners:
+            try:
+                listener(quote)
+            except Exception as e:
+                self.logger.error(f"行情回调失败 {symbol}: {str(e)}")
+        for subscriber in list(self.subscribers.get(symbol, ())):
+            subscriber.offer(quote)
+
+    def stats(self) -> dict:
+        """行情中心运行统计"""
+        subscribers = {sub for subs in self.subscribers.values() for sub in subs}
+        return {
+            "symbols": len(self.pollers),
+            "subscribers": len(subscribers),
+            "upstream_fetches": self.upstream_fetches,
+            "upstream_errors": self.upstream_errors,
+            "dropped": sum(sub.dropped for sub in subscribers),
+            "queued": sum(sub.queue.qsize() for sub in subscribers)
+        }
+
+
+if __name__ == "__main__":
+    async def demo():
+        hub = QuoteHub(source=FakeQuoteSource(), interval=0.2)
+        fast, slow = QuoteSubscriber(), QuoteSubscriber(maxsize=2)
+        hub.subscribe(fast, ["sh600519", "sz002594"])
+        hub.subscribe(slow, ["sh600519"])
+        for _ in range(6):
+            print(await fast.get())
+        print(hub.stats())
+        hub.unsubscribe(fast)
+        hub.unsubscribe(slow)
+
+    asyncio.run(demo())
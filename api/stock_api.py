@@ -5,6 +5,8 @@ sys.path.append(str(Path(__file__).parent.parent))
 # from data.mock_data import MockData
 from data.web_data import StockDataFetcher
 from utils.logger import Logger
+from api.market_snapshot import get_market_snapshot_service
+import copy
 
 class StockAPI:
     def __init__(self):
@@ -40,58 +42,18 @@ class StockAPI:
         """获取行业估值指标"""
         return self.mock_data.get_industry_valuation(industry)
 
+    def get_market_snapshot(self) -> dict:
+        """获取当前周期的市场快照（估值、供应链景气指数、行业轮动，带版本号）"""
+        return get_market_snapshot_service().current()
+
     def get_market_valuation(self) -> dict:
-        """获取市场估值数据（示例数据）"""
-        return {
-            "pe_ratio": 15.2,
-            "pb_ratio": 2.1,
-            "dividend_yield": 2.5,
-            
-        }
+        """获取市场估值数据（来自当前市场快照）"""
+        return copy.deepcopy(self.get_market_snapshot()["valuation"])
 
     def get_supply_chain_index(self) -> dict:
-        """获取供应链景气指数（随机生成数据）"""
-        import random  # 引入随机数模块
-        
-        # 定义各指标的随机数生成函数（保留1位小数）
-        def rand_core_components():
-            return round(random.uniform(100, 120), 1)  # 核心组件：100-120
-        
-        def rand_semiconductors():
-            return round(random.uniform(105, 130), 1)  # 半导体：105-130
-        
-        def rand_new_energy():
-            return round(random.uniform(110, 130), 1)  # 新能源：110-130
-
-        return {
-            "core_components": rand_core_components(),
-            "semiconductors": rand_semiconductors(),
-            "new_energy": rand_new_energy()
-        }
+        """获取供应链景气指数（来自当前市场快照，同一周期内保持不变）"""
+        return copy.deepcopy(self.get_market_snapshot()["supply_chain_index"])
 
     def get_industry_rotation(self) -> list:
-        """获取行业轮动数据（补充pe/pb字段）"""
-        import random  # 引入随机数模块
-        
-        # 定义随机数生成范围（根据金融数据常见范围设定）
-        def rand_stability():
-            return round(random.uniform(0.6, 1.0), 2)  # 稳定性：0.6-1.0，保留2位小数
-        
-        def rand_growth():
-            return round(random.uniform(0.5, 1.0), 2)  # 增长潜力：0.5-1.0，保留2位小数
-        
-        def rand_pe():
-            return round(random.uniform(10, 40), 1)  # PE：10-40，保留1位小数
-        
-        def rand_pb():
-            return round(random.uniform(1, 5), 1)  # PB：1-5，保留1位小数
-
-        return [
-            {"industry": "科技", "stability": rand_stability(), "growth_potential": rand_growth(), "pe": rand_pe(), "pb": rand_pb()},
-            {"industry": "新能源", "stability": rand_stability(), "growth_potential": rand_growth(), "pe": rand_pe(), "pb": rand_pb()},
-            {"industry": "房地产", "stability": rand_stability(), "growth_potential": rand_growth(), "pe": rand_pe(), "pb": rand_pb()},
-            {"industry": "汽车", "stability": rand_stability(), "growth_potential": rand_growth(), "pe": rand_pe(), "pb": rand_pb()},
-            {"industry": "金融", "stability": rand_stability(), "growth_potential": rand_growth(), "pe": rand_pe(), "pb": rand_pb()},
-            {"industry": "消费", "stability": rand_stability(), "growth_potential": rand_growth(), "pe": rand_pe(), "pb": rand_pb()},
-            {"industry": "有色金属", "stability": rand_stability(), "growth_potential": rand_growth(), "pe": rand_pe(), "pb": rand_pb()}
-        ]
\ No newline at end of file
+        """获取行业轮动数据（来自当前市场快照，同一周期内保持不变）"""
+        return copy.deepcopy(self.get_market_snapshot()["industry_rotation"])
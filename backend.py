@@ -7,11 +7,28 @@ sys.path.append(project_root)
 
 from pydantic import BaseModel
 import uuid
+import json
+import asyncio
+import time
 from utils.db_utils import DatabaseManager
-from agent.transaction_agent import TransactionAgent
-from agent.strategy_agent import StrategyAgent
-from agent.knowledge_agent import Knowledge_Graph_Agent
-from fastapi import FastAPI, Depends, HTTPException
+from api.quote_feed import QuoteHub, QuoteSubscriber
+from api.market_snapshot import get_market_snapshot_service
+from agent.strategy_tables import get_strategy_tables
+from data.portfolio_analytics import PORTFOLIO_NAV_DAYS, get_portfolio_analytics
+from data.indicators import get_indicator_stream
+from data.fundamentals_store import normalize_stock_code
+from data.screener import SCREEN_PAGE_SIZE, ScreenError, get_screen_table
+from knowledge_graph.import_guard import get_import_guard
+from utils.job_queue import get_job_queue
+from utils.llm_gateway import get_llm_gateway
+from utils.structured_output import structured_output_stats
+from utils.tracing import TRACE_ENABLED, start_trace, detach_trace, finish_trace, get_trace_exporter
+from utils.replay import replay_stats
+from utils.metrics import gauge_callback, register_cache, observe_request, expose_metrics
+from utils.process_stats import memory_usage, mapped_file_usage
+from utils.shared_data import SERVER_WORKERS, prepare_shared_datasets, attach_shared_datasets
+from fastapi import FastAPI, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from typing import Annotated
 from fastapi.security import OAuth2PasswordBearer
 import secrets
@@ -36,6 +53,69 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def route_template(request: Request) -> str:
+    """按路由模板归类（如 /jobs/{job_id}），避免指标标签值无限增长"""
+    route = request.scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+async def observe_requests(request: Request, call_next):
+    """请求指标与追踪：耗时按路由计入 http_request_duration_seconds；开启追踪时各阶段耗时汇总写入 Server-Timing 响应头
+
+    耗时和完整追踪记录都在响应体发送完后结算（流式响应包含整个推送过程）。
+    """
+    started = time.perf_counter()
+    trace = token = None
+    if TRACE_ENABLED:
+        trace, token = start_trace(f"{request.method} {request.url.path}", request.headers.get("x-trace-id"))
+    try:
+        response = await call_next(request)
+    except Exception:
+        observe_request(request.method, route_template(request), 500, time.perf_counter() - started)
+        if trace is not None:
+            finish_trace(trace)
+        raise
+    finally:
+        if token is not None:
+            detach_trace(token)
+    route = route_template(request)
+    if trace is not None:
+        trace.name = f"{request.method} {route}"
+        trace.attrs["status"] = response.status_code
+        response.headers["Server-Timing"] = trace.server_timing()
+        response.headers["Timing-Allow-Origin"] = "*"
+        response.headers["X-Trace-Id"] = trace.trace_id
+    body = response.body_iterator
+
+    async def body_then_finish():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+            if trace is not None:
+                finish_trace(trace)
+    response.body_iterator = body_then_finish()
+    return response
+
+app.middleware("http")(observe_requests)
+
+@app.on_event("startup")
+def start_market_snapshot():
+    """启动市场快照定时刷新（每个新快照自动生成策略预计算表）"""
+    get_strategy_tables()
+    get_market_snapshot_service().start()
+
+@app.on_event("startup")
+def start_enrichment_workers():
+    """知识图谱补全为 queue 模式时在进程内启动补全线程（ENRICHMENT_EMBEDDED_WORKERS=0 时只用独立的补全进程）"""
+    from knowledge_graph.enrichment_worker import start_embedded_workers
+    start_embedded_workers()
+
+@app.on_event("startup")
+def attach_shared_data():
+    """映射主进程预先构建的只读数据集（多工作进程共享同一份物理内存）"""
+    attach_shared_datasets()
+
 class UserRegister(BaseModel):
     username: str
     password: str
@@ -84,6 +164,9 @@ def login(credentials: UserLogin):
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         token_data = {"sub": user_id, "exp": expire}
         token = jwt.encode(token_data, SECRET_KEY, algorithm=ALGORITHM)
+
+        from agent.pre_trade_risk import get_pre_trade_risk  # 延迟导入，加快服务启动
+        get_pre_trade_risk().warm(user_id)  # 后台预热持仓的历史收益率，首笔交易的风险检查不等待
         
         return {
             "user_id": user_id,
@@ -136,6 +219,17 @@ def get_user_positions(user_id: Annotated[str, Depends(get_current_user_id)]):
     finally:
         db.close()
 
+@app.get("/portfolio")
+def get_portfolio(user_id: Annotated[str, Depends(get_current_user_id)], nav_days: int = PORTFOLIO_NAV_DAYS):
+    """组合分析：持仓成本（FIFO/平均成本）、已实现与浮动盈亏、行业暴露、日净值序列和波动率"""
+    db = DatabaseManager()
+    try:
+        if not db.get_user_by_uid(user_id):
+            raise HTTPException(404, "用户不存在")
+        return {"success": True, "data": get_portfolio_analytics().report(db, user_id, max(1, min(nav_days, 3650)))}
+    finally:
+        db.close()
+
 class TradeRequest(BaseModel):
     action: str  # buy/sell
     stock_code: str
@@ -158,6 +252,7 @@ def execute_trade(request: TradeRequest, user_id: Annotated[str, Depends(get_cur
         request.stock_code = request.stock_code.strip().lower()
         instruction = f"{request.action}{request.quantity}股{request.stock_code}"
         print(f"交易指令: {instruction}")
+        from agent.transaction_agent import TransactionAgent  # 延迟导入，加快服务启动
         agent = TransactionAgent()
         result = agent.process_transaction(
             instruction,user_id
@@ -170,7 +265,7 @@ def execute_trade(request: TradeRequest, user_id: Annotated[str, Depends(get_cur
             #     detail={"success": False, "message": f"交易失败: {result.get('message', '未知错误')}"}
             # )
             return {"success": False,"status_code":400, 
-            "message": f"交易失败: {result.get("message", "未知错误")}"}
+            "message": f"交易失败: {result.get('message', '未知错误')}"}
         return {"success": True, 
         "message": result.get("message", "交易成功"),
         "transaction_id": str(uuid.uuid4()),  # 新增交易唯一ID
@@ -186,6 +281,7 @@ class StrategyRequestBody(BaseModel):
 def generate_investment_strategy(request: StrategyRequestBody):
     """投资策略生成接口（修复后）"""
     print("enter strategy!!!")
+    from agent.strategy_agent import StrategyAgent  # 延迟导入，加快服务启动
     agent = StrategyAgent()
     strategy_content = agent.generate_strategy(request.instruction)  # 结果可能是成功字典或错误字典
     
@@ -194,7 +290,7 @@ def generate_investment_strategy(request: StrategyRequestBody):
         return {
             "success": False,
             "message": strategy_content["message"],
-            "suggestions": strategy_content["suggestions"]
+            "suggestions": strategy_content.get("suggestions", [])
         }
     else:
         # 构造正常响应（原逻辑）
@@ -213,6 +309,32 @@ def generate_investment_strategy(request: StrategyRequestBody):
         }
 
 
+class ScreenRequest(BaseModel):
+    filters: dict = {}  # 如 {"industry_primary": ["银行"], "market_cap": {"gte": 1e9}, "momentum": {"gt": 0}}
+    sort: str = None  # 排序字段，"-" 前缀为降序
+    page: int = 1
+    page_size: int = SCREEN_PAGE_SIZE
+
+def current_screen_table():
+    table = get_screen_table()
+    if table is None:
+        raise HTTPException(503, "列式基本面数据尚未构建，请先运行 python -m data.fundamentals_columnar build")
+    return table
+
+@app.post("/screen")
+def screen_stocks(request: ScreenRequest):
+    """选股：在内存列式表上按行业、上市年限、市值、波动率、动量、供应链伙伴数等条件筛选、排序并分页"""
+    table = current_screen_table()
+    try:
+        return {"success": True, "data": table.query(request.filters, request.sort, request.page, request.page_size)}
+    except ScreenError as e:
+        raise HTTPException(400, str(e))
+
+@app.get("/screen/fields")
+def screen_fields():
+    """选股可用的字段：行业取值和各数值字段的范围"""
+    return {"success": True, "data": current_screen_table().fields()}
+
 class KnowledgeRequest(BaseModel):
     question: str  # 明确请求体包含 instruction 字段
 
@@ -235,6 +357,7 @@ def answer_stock_question(request: KnowledgeRequest):
         logger.info(f"知识问答请求: 问题={request.question}")  # 修改此处
 
         # 调用知识图谱代理
+        from agent.knowledge_agent import Knowledge_Graph_Agent  # 延迟导入，加快服务启动
         agent = Knowledge_Graph_Agent()
         result = agent.answer_question(request.question)
 
@@ -258,6 +381,202 @@ def answer_stock_question(request: KnowledgeRequest):
             "message": "服务器内部错误，请稍后重试"
         }
 
+# ========== 实时行情推送 ==========
+quote_hub = None
+
+def get_quote_hub() -> QuoteHub:
+    """进程内共享的行情推送中心（首次使用时创建）"""
+    global quote_hub
+    if quote_hub is None:
+        quote_hub = QuoteHub()
+        quote_hub.listeners.append(get_indicator_stream().on_quote)
+    return quote_hub
+
+@app.websocket("/ws/quotes")
+async def quote_feed(websocket: WebSocket, token: str = ""):
+    """实时行情推送接口（WebSocket）
+
+    客户端发送 {"action": "subscribe"/"unsubscribe", "symbols": [...]}，
+    服务端推送订阅股票的最新行情；客户端消费过慢时丢弃旧行情。
+    格式错误、无法识别或超出 QUOTE_MAX_SYMBOLS 的订阅会收到 {"error": ...} 消息。
+    """
+    try:
+        jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.JWTError:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    hub = get_quote_hub()
+    subscriber = QuoteSubscriber()
+
+    async def sender():
+        while True:
+            quote = await subscriber.get()
+            await websocket.send_json(quote)
+
+    sender_task = asyncio.create_task(sender())
+    try:
+        while True:
+            message = await websocket.receive_json()
+            symbols = message.get("symbols") if isinstance(message, dict) else None
+            if not isinstance(symbols, list):
+                await websocket.send_json({"error": "消息格式应为 {\"action\": ..., \"symbols\": [...]}"})
+                continue
+            if message.get("action") == "subscribe":
+                rejected = hub.subscribe(subscriber, symbols)
+                if rejected:
+                    await websocket.send_json({"error": f"无效股票代码或超出订阅上限（{hub.max_symbols}只）",
+                                               "symbols": rejected})
+            elif message.get("action") == "unsubscribe":
+                hub.unsubscribe(subscriber, symbols)
+    except (WebSocketDisconnect, ValueError):
+        pass
+    finally:
+        sender_task.cancel()
+        hub.unsubscribe(subscriber)
+
+@app.get("/quotes/stats")
+def quote_feed_stats():
+    """行情推送运行统计（上游请求数、订阅数、丢弃数）"""
+    return {"success": True, "data": get_quote_hub().stats()}
+
+@app.get("/indicators/stats")
+def indicator_stats():
+    """技术指标增量状态统计（股票数、初始化次数、实时行情更新次数）"""
+    return {"success": True, "data": get_indicator_stream().stats()}
+
+@app.get("/indicators/{stock_code}")
+def get_indicators(stock_code: str):
+    """股票的最新技术指标（含当日实时行情）：均线、EMA、RSI、MACD、ATR、布林带、波动率和动量"""
+    code = normalize_stock_code(stock_code)
+    if code is None:
+        raise HTTPException(400, "无效股票代码")
+    snapshot = get_indicator_stream().snapshot(code)
+    if snapshot is None:
+        raise HTTPException(404, "无法获取该股票的历史数据")
+    return {"success": True, "data": {key: None if value != value else value for key, value in snapshot.items()}}
+
+@app.get("/knowledge/import_stats")
+def knowledge_import_stats():
+    """联网导入保护运行统计（负缓存命中数、合并等待数、实际导入次数）"""
+    return {"success": True, "data": get_import_guard().stats()}
+
+@app.get("/llm/stats")
+def llm_stats():
+    """大模型调用网关统计（按调用点：请求数、重试、超时、对冲次数与耗时分位数；结构化输出的修复率与失败率）"""
+    return {"success": True, "data": {**get_llm_gateway().stats(), "structured_output": structured_output_stats()}}
+
+@app.get("/jobs")
+def list_jobs(status: str = None, limit: int = 50):
+    """知识图谱补全任务列表（可按状态筛选：pending/running/done/failed）"""
+    return {"success": True, "data": get_job_queue().list_jobs(status, min(limit, 200))}
+
+@app.get("/jobs/stats")
+def job_stats():
+    """知识图谱补全任务各状态数量"""
+    return {"success": True, "data": get_job_queue().stats()}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: int):
+    """查询单个补全任务的状态"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {"success": True, "data": job}
+
+def _sse_event(event: str, data: dict) -> str:
+    """编码一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/knowledge/stream")
+def answer_stock_question_stream(request: KnowledgeRequest):
+    """股票知识问答流式接口（SSE）：先返回解析出的实体，再逐条返回供应链/行业结果与实时行情"""
+    if not request.question.strip():
+        return {
+            "success": False,
+            "code": 400,
+            "message": "问题不能为空"
+        }
+
+    def event_stream():
+        from agent.knowledge_agent import Knowledge_Graph_Agent  # 延迟导入，加快服务启动
+        agent = Knowledge_Graph_Agent()
+        try:
+            for chunk in agent.answer_question_stream(request.question):
+                yield _sse_event(chunk["event"], {"message": chunk["message"]})
+        except Exception as e:
+            yield _sse_event("error", {"message": f"知识问答接口异常: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def register_metric_collectors() -> None:
+    """登记导出时读取的指标：各队列深度和已有统计中的缓存命中情况（请求路径上没有额外开销）"""
+    llm_sites = lambda key: [((site,), stats[key]) for site, stats in get_llm_gateway().stats()["sites"].items()]
+    gauge_callback("llm_in_flight", "大模型调用点正在进行的请求数", ("site",), lambda: llm_sites("in_flight"))
+    gauge_callback("llm_waiting", "大模型调用点等待名额或令牌的调用数", ("site",), lambda: llm_sites("waiting"))
+    gauge_callback("llm_tokens_total", "大模型调用token数（kind: prompt/completion/cached_prompt）", ("site", "kind"),
+                   lambda: [((site, kind), stats[f"{kind}_tokens"])
+                            for site, stats in get_llm_gateway().stats()["sites"].items()
+                            for kind in ("prompt", "completion", "cached_prompt")], "counter")
+    gauge_callback("llm_events_total", "大模型调用点事件计数（event: successes/failures/retries/timeouts/rejected/hedges）",
+                   ("site", "event"),
+                   lambda: [((site, event), stats[event]) for site, stats in get_llm_gateway().stats()["sites"].items()
+                            for event in ("successes", "failures", "retries", "timeouts", "rejected", "hedges")],
+                   "counter")
+    gauge_callback("job_queue_depth", "知识图谱补全任务数（按状态）", ("status",),
+                   lambda: [((status,), count) for status, count in get_job_queue().stats().items()
+                            if status in ("pending", "running")])
+    gauge_callback("quote_subscriber_queued", "行情推送订阅者队列中待发送的行情数", (),
+                   lambda: [((), quote_hub.stats()["queued"] if quote_hub else 0)])
+    gauge_callback("trace_export_pending", "等待写入文件的请求追踪数", (),
+                   lambda: [((), get_trace_exporter().stats()["pending"])])
+    gauge_callback("kg_import_in_flight", "正在执行的知识图谱联网导入数", (),
+                   lambda: [((), get_import_guard().stats()["in_flight"])])
+    gauge_callback("replay_fixtures_total", "录制/回放计数（result: hits/misses/recorded，未开启时不输出）", ("upstream", "result"),
+                   lambda: [((upstream, result), stats[result]) for upstream, stats in replay_stats().items()
+                            for result in ("hits", "misses", "recorded")], "counter")
+
+    def import_guard_cache():
+        stats = get_import_guard().stats()
+        return stats["local_hits"] + stats["negative_hits"], stats["imports"] + stats["coalesced"]
+
+    def llm_prefix_cache():
+        sites = get_llm_gateway().stats()["sites"].values()
+        cached = sum(stats["cached_prompt_tokens"] for stats in sites)
+        return cached, sum(stats["prompt_tokens"] for stats in sites) - cached
+
+    def portfolio_state_cache():
+        stats = get_portfolio_analytics().stats()
+        return stats["unchanged"] + stats["incremental"], stats["builds"]
+
+    register_cache("kg_local", import_guard_cache)  # 本地图谱命中（含负缓存）与需联网导入的查询
+    register_cache("llm_prompt_prefix", llm_prefix_cache)  # 按输入token计的服务端前缀缓存命中
+    register_cache("portfolio_state", portfolio_state_cache)  # 组合分析状态复用（含增量更新）与整体重建
+
+register_metric_collectors()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus 格式的运行指标（每个工作进程各自统计）"""
+    return PlainTextResponse(expose_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug/traces")
+def recent_traces(user_id: Annotated[str, Depends(get_current_user_id)], limit: int = 20, name: str = None):
+    """本进程最近的请求追踪（各阶段的父子关系、开始偏移和耗时），name 按路由筛选（如 POST /strategy）；需登录"""
+    exporter = get_trace_exporter()
+    return {"success": True, "data": {"stats": exporter.stats(), "traces": exporter.recent_traces(min(limit, 200), name)}}
+
+@app.get("/debug/memory")
+def worker_memory():
+    """当前工作进程的内存占用（KB）及共享数据集的映射情况"""
+    return {"success": True, "data": {**memory_usage(), "mapped": mapped_file_usage("fundamentals_columnar")}}
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # 只读数据集在主进程中构建一次，工作进程通过 mmap 共享
+    prepare_shared_datasets()
+    uvicorn.run("backend:app", host="0.0.0.0", port=8000, workers=SERVER_WORKERS)
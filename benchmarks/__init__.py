@@ -0,0 +1 @@
+# 此文件为空，用于标识benchmarks为一个Python包
\ No newline at end of file
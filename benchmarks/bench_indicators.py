@@ -0,0 +1,91 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import math
+import time
+
+
+def make_bars(stocks: int, days: int, seed: int) -> tuple:
+    """可复现的几何随机游走日线 (high, low, close)，各为 交易日 × 股票 矩阵"""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    close = rng.uniform(5, 100, stocks) * np.exp(np.cumsum(0.02 * rng.standard_normal((days, stocks)), axis=0))
+    return close * (1 + 0.01 * rng.random(close.shape)), close * (1 - 0.01 * rng.random(close.shape)), close
+
+
+def recompute_window(closes: list) -> tuple:
+    """对照组：改造前 RiskAssessment 每次调用的计算（最近30日收益率标准差、EWMA趋势、价格标准差）"""
+    import numpy as np
+    import pandas as pd
+    prices = closes[-30:]
+    returns = np.diff(prices) / prices[:-1]
+    ewma_5 = pd.Series(prices).ewm(span=5).mean().values
+    ewma_20 = pd.Series(prices).ewm(span=20).mean().values
+    return np.std(returns), (ewma_5[-1] - ewma_20[-1]) / ewma_20[-1], np.std(prices)
+
+
+def run(args) -> dict:
+    import numpy as np
+    from data import indicators
+    from utils.llm_gateway import percentile
+    high, low, close = make_bars(args.stocks, args.days, args.seed)
+    us = lambda started: (time.perf_counter() - started) * 1e6
+
+    started = time.perf_counter()
+    batch = indicators.compute(high, low, close)
+    batch_ms = us(started) / 1000
+
+    # 增量状态与批量结果一致性：逐根K线更新后的指标与批量计算的最后一行对照
+    errors = {}
+    states = []
+    warmup = []
+    for j in range(min(args.stocks, args.verify_stocks)):
+        started = time.perf_counter()
+        state = indicators.IndicatorState.from_history(
+            [{"close": c, "high": h, "low": l} for h, l, c in zip(high[:, j], low[:, j], close[:, j])])
+        warmup.append(us(started))
+        states.append(state)
+        for key, value in state.values.items():
+            expected = batch[key][-1, j]
+            if not math.isnan(expected):
+                errors[key] = max(errors.get(key, 0.0), abs(value - expected) / max(abs(expected), 1e-9))
+
+    rng = np.random.default_rng(args.seed)
+    ticks, recompute = [], []
+    closes = close[:, 0].tolist()
+    for _ in range(args.ticks):
+        state = states[int(rng.integers(len(states)))]
+        price = state.previous_close * (1 + 0.01 * rng.standard_normal())
+        started = time.perf_counter()
+        state.preview({"close": price, "high": price, "low": price})
+        ticks.append(us(started))
+    for _ in range(min(args.ticks, 2000)):
+        started = time.perf_counter()
+        recompute_window(closes)
+        recompute.append(us(started))
+    return {
+        "stocks": args.stocks, "days": args.days,
+        "batch_ms": round(batch_ms, 2),
+        "incremental_tick_us": {"p50": round(percentile(ticks, 0.5), 2), "p95": round(percentile(ticks, 0.95), 2)},
+        "recompute_window_us": {"p50": round(percentile(recompute, 0.5), 2), "p95": round(percentile(recompute, 0.95), 2)},
+        "warmup_us_per_stock": round(percentile(warmup, 0.5), 1),
+        "max_relative_error_incremental_vs_batch": max(errors.values()) if errors else None
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="技术指标：全市场批量计算、增量更新与每次重算窗口的耗时对比")
+    parser.add_argument("--stocks", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=250)
+    parser.add_argument("--verify-stocks", type=int, default=200, help="与批量结果对照的股票数")
+    parser.add_argument("--ticks", type=int, default=20000, help="增量更新的实时行情条数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    text = json.dumps(run(args), ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
@@ -0,0 +1,101 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.stubs.fake_llm import start_fake_llm
+from utils.llm_gateway import LLMGateway, percentile
+
+SITE = "bench.chat"
+MESSAGES = [{"role": "user", "content": "将股票查询问题解析为JSON格式：查询贵州茅台的供应链"}]
+
+
+def direct_caller(url: str):
+    """改造前的调用方式：各模块自建客户端，SDK默认超时（600秒）和默认重试，无并发上限"""
+    from openai import OpenAI
+    client = OpenAI(api_key="fake", base_url=url)
+
+    def call() -> str:
+        return client.chat.completions.create(model="fake", messages=MESSAGES).choices[0].message.content
+    return call, None
+
+
+def gateway_caller(url: str, hedge: bool, concurrency: int, timeout: float):
+    gateway = LLMGateway(api_key="fake", base_url=url, model="fake", max_concurrency=concurrency,
+                         site_concurrency=concurrency, rate=0, timeout=timeout,
+                         hedge_percentile=0.9 if hedge else 0)
+
+    def call() -> str:
+        return gateway.chat(SITE, MESSAGES, hedge=hedge)
+    return call, gateway
+
+
+def run_scenario(name: str, make_caller, server_config: dict, clients: int, calls: int) -> dict:
+    server = start_fake_llm(**server_config)
+    call, gateway = make_caller(server.url)
+    latencies, failures = [], 0
+
+    def one(_) -> None:
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            call()
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            failures += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(one, range(calls)))
+    wall = time.perf_counter() - started
+    server.shutdown()
+    result = {
+        "scenario": name,
+        "succeeded": len(latencies),
+        "failed": failures,
+        "throughput_per_s": round(len(latencies) / wall, 1),
+        "latency_ms": {f"p{int(p * 100)}": round(percentile(latencies, p) * 1000, 1) for p in (0.5, 0.95, 0.99)},
+        "server": dict(server.stats)
+    }
+    if gateway is not None:
+        site = gateway.stats()["sites"][SITE]
+        result["gateway"] = {key: site[key] for key in
+                             ("requests", "retries", "timeouts", "hedges", "hedge_wins", "peak_in_flight")}
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="大模型调用网关基准：本地假服务注入延迟长尾与错误")
+    parser.add_argument("--burst-clients", type=int, default=32, help="突发负载的并发调用线程数（超过服务端处理能力）")
+    parser.add_argument("--steady-clients", type=int, default=4, help="平稳负载的并发调用线程数（低于服务端处理能力）")
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8, help="网关并发上限")
+    parser.add_argument("--timeout", type=float, default=0.5, help="网关单次请求超时（秒）")
+    parser.add_argument("--capacity", type=int, default=8, help="假服务的处理能力，超出后耗时按过载倍数增长")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tail-ratio", type=float, default=0.05)
+    parser.add_argument("--tail-latency", type=float, default=1.5)
+    parser.add_argument("--error-ratio", type=float, default=0.03)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    server_config = {"latency": args.latency, "capacity": args.capacity, "tail_ratio": args.tail_ratio,
+                     "tail_latency": args.tail_latency, "error_ratio": args.error_ratio, "seed": args.seed}
+    scenarios = [
+        ("direct", direct_caller),
+        ("gateway", lambda url: gateway_caller(url, False, args.concurrency, args.timeout)),
+        ("gateway_hedged", lambda url: gateway_caller(url, True, args.concurrency, args.timeout))
+    ]
+    results = {"server": server_config, "calls": args.calls, "profiles": {}}
+    for profile, clients in (("burst", args.burst_clients), ("steady", args.steady_clients)):
+        results["profiles"][profile] = {
+            "clients": clients,
+            "scenarios": [run_scenario(name, make, server_config, clients, args.calls) for name, make in scenarios]
+        }
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import threading
+import time
+from bisect import bisect_left
+from utils.metrics import Histogram, LATENCY_BUCKETS, observe_upstream
+
+
+class LockedHistogram:
+    """对照组：所有线程共用一把锁的直方图"""
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self.lock:
+            self.counts[bisect_left(self.bounds, value)] += 1
+            self.total += value
+
+
+def run_threads(threads: int, calls: int, record) -> float:
+    """threads 个线程各记录 calls 次，返回单次记录的平均耗时（纳秒，按总墙钟时间 / 总次数）"""
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for i in range(calls):
+            record(i)
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for worker_thread in workers:
+        worker_thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.join()
+    return (time.perf_counter() - started) / (threads * calls) * 1e9
+
+
+def run(threads_list: list, calls: int) -> dict:
+    results = {}
+    for threads in threads_list:
+        sharded = Histogram("bench_sharded", "").labels()
+        locked = LockedHistogram()
+
+        def upstream(_):
+            with observe_upstream("bench", "noop"):
+                pass
+        results[f"{threads}_threads"] = {
+            "thread_sharded_observe_ns": round(run_threads(threads, calls, lambda i: sharded.observe(i * 1e-6)), 1),
+            "single_lock_observe_ns": round(run_threads(threads, calls, lambda i: locked.observe(i * 1e-6)), 1),
+            "observe_upstream_ns": round(run_threads(threads, calls, upstream), 1)
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="指标记录在热路径上的开销：按线程分片与单锁直方图对比")
+    parser.add_argument("--threads", default="1,4,16", help="并发记录线程数（逗号分隔）")
+    parser.add_argument("--calls", type=int, default=100000, help="每个线程的记录次数")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    results = {"calls_per_thread": args.calls,
+               "results": run([int(item) for item in args.threads.split(",")], args.calls)}
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
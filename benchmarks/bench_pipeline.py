@@ -0,0 +1,358 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = Path(__file__).parent.parent
+ENDPOINTS = ("trade", "positions", "strategy", "knowledge")
+FUNCTIONS = ("evaluate_risk", "get_user_positions", "fuzzy_match_stock_name")
+
+
+def configure_environment(workdir: str, seed: int) -> None:
+    """导入项目模块之前设置：所有本地文件写入临时目录，大模型不限速，追踪不落盘"""
+    os.environ.update({
+        "DEEPSEEK_API_KEY": "fake",
+        "LLM_RATE_LIMIT": "0",
+        "MARKET_SOURCE": "seeded",
+        "MARKET_SOURCE_SEED": str(seed),
+        "QUOTE_SOURCE": "eastmoney",
+        "TRACE_FILE": "",
+        "JOB_QUEUE_PATH": os.path.join(workdir, "job_queue.db"),
+        "FUNDAMENTALS_DB_PATH": os.path.join(workdir, "fundamentals.db"),
+        "FUNDAMENTALS_COLUMNAR_PATH": os.path.join(workdir, "fundamentals_columnar"),
+        "SIMILARITY_INDEX_PATH": os.path.join(workdir, "similarity_index"),
+        "CENTRALITY_PATH": os.path.join(workdir, "centrality")
+    })
+    os.chdir(workdir)  # DatabaseManager 使用当前目录下的 stock_assistant.db
+
+
+def make_responder(universe: dict, questions: list):
+    """按请求的提示词返回与真实接口格式一致的回复（问题解析、交易指令、策略、联网补全）"""
+    from utils.prompts import QUESTION_PARSER_PROMPT, STRATEGY_SYSTEM_PROMPT, DATA_SYSTEM_PROMPT
+    companies = universe["companies"]
+    parsed_by_question = {item["question"]: item["parsed"] for item in questions}
+
+    def responder(body: dict) -> str:
+        messages = body.get("messages") or []
+        system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+        prompt = messages[-1]["content"] if messages else ""
+        if system == QUESTION_PARSER_PROMPT:
+            return json.dumps(parsed_by_question.get(prompt, {"intent": "stock_info"}), ensure_ascii=False)
+        if system == STRATEGY_SYSTEM_PROMPT:
+            codes = [code for code in dict.fromkeys(re.findall(r"(?:sh|sz)\d{6}", prompt)) if code in companies][:5]
+            return json.dumps({
+                "title": "供应链核心企业配置策略",
+                "description": "行业配置逻辑……个股选择依据……风险控制措施……",
+                "annualReturn": "8%",
+                "riskLevel": "中",
+                "recommendedStocks": [{"name": companies[code]["name"], "code": code} for code in codes]
+            }, ensure_ascii=False)
+        if system == DATA_SYSTEM_PROMPT:
+            code = (re.findall(r"(?:sh|sz)\d{6}", prompt) or [""])[-1]
+            company = companies.get(code, {"name": "未知", "industry_primary": "未知",
+                                           "industry_secondary": "未知", "listing_time": "未知"})
+            if "supply_chain_relationships" in prompt:
+                return json.dumps({"supply_chain_relationships": [
+                    {"partner_code": edge["partner_code"], "name": edge["partner_name"],
+                     "type": edge["relation"], "weight": edge["weight"]} for edge in universe["edges"].get(code, [])
+                ]}, ensure_ascii=False)
+            if "industry_companies" in prompt:
+                industry = prompt.rsplit("行业：", 1)[-1].strip()
+                return json.dumps({"industry_companies": [
+                    {"stock_code": member, "stock_name": companies[member]["name"], "industry_primary": industry,
+                     "industry_secondary": companies[member]["industry_secondary"],
+                     "listing_time": companies[member]["listing_time"]}
+                    for member in universe["industries"].get(industry, [])[:10]
+                ]}, ensure_ascii=False)
+            return json.dumps({"stock_basic_info": {
+                "name": company["name"], "stock_code": code, "industry_primary": company["industry_primary"],
+                "industry_secondary": company["industry_secondary"], "listing_time": company["listing_time"],
+                "source": "network"
+            }}, ensure_ascii=False)
+        match = re.search(r"指令：(买入|卖出)(\d+)股(\S+)", prompt)
+        if match:
+            return ",".join(match.groups())
+        return "这条指令的类型是：**未知指令**"
+    return responder
+
+
+ERROR_SAMPLES = 3  # 每个场景保留的错误信息样例数
+
+
+def summarize(latencies: list, failures: list, elapsed: float) -> dict:
+    """failures 为 [(错误类型, 错误信息)]"""
+    from collections import Counter
+    from utils.llm_gateway import percentile
+    return {
+        "requests": len(latencies),
+        "errors": len(failures),
+        "error_rate": round(len(failures) / len(latencies), 4) if latencies else 0.0,
+        "error_types": dict(Counter(kind for kind, _ in failures)),
+        "error_samples": list(dict.fromkeys(f"{kind}: {message}" for kind, message in failures))[:ERROR_SAMPLES],
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3)
+    }
+
+
+def run_scenario(items: list, call, concurrency: int) -> dict:
+    """concurrency 个线程并发执行 call(item)；call 返回 False 或抛出异常计为错误，按异常类型计数并保留信息样例"""
+    latencies, failures = [], []
+    lock = threading.Lock()
+
+    def timed(item):
+        started = time.perf_counter()
+        failure = None
+        try:
+            if call(item) is False:
+                failure = ("returned_false", repr(item)[:200])
+        except Exception as e:
+            failure = (type(e).__name__, str(e)[:200])
+        latency = time.perf_counter() - started
+        with lock:
+            latencies.append(latency)
+            if failure:
+                failures.append(failure)
+    started = time.perf_counter()
+    if concurrency == 1:  # 单线程时在调用线程中执行（SQLite 连接不能跨线程使用）
+        for item in items:
+            timed(item)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, items))
+    return summarize(latencies, failures, time.perf_counter() - started)
+
+
+def failed_scenarios(results: dict) -> list:
+    """全部请求都出错的场景（通常是环境或接口本身坏了，而不是性能问题）"""
+    return [name for group in ("endpoints", "functions") for name, result in results.get(group, {}).items()
+            if result.get("requests") and result.get("error_rate") == 1.0]
+
+
+def start_stubs(universe: dict, questions: list, args) -> dict:
+    """启动三个上游替身（须在导入项目模块之前，以便通过环境变量设置大模型和行情接口地址）"""
+    from benchmarks.stubs.fake_llm import start_fake_llm
+    from benchmarks.stubs.fake_eastmoney import start_fake_eastmoney
+    from benchmarks.stubs.fake_neo4j import FakeGraph
+    llm = start_fake_llm(responder=make_responder(universe, questions), latency=args.llm_latency, seed=args.seed)
+    eastmoney = start_fake_eastmoney({code: company["name"] for code, company in universe["companies"].items()},
+                                     latency=args.quote_latency, seed=args.seed)
+    os.environ.update({"LLM_BASE_URL": llm.url, "EASTMONEY_QUOTE_URL": eastmoney.url})
+    return {"llm": llm, "eastmoney": eastmoney, "graph": FakeGraph(universe, latency=args.graph_latency)}
+
+
+def start_backend(universe: dict, graph) -> tuple:
+    """接入图数据库替身、写入本地基本面数据和相似公司索引后，在后台线程启动后端服务，返回 (服务, 地址)"""
+    import socket
+    import uvicorn
+    from knowledge_graph.graph_client import use_graph
+    from knowledge_graph.similarity_index import SimilarityIndex
+    from data.fundamentals_store import get_fundamentals_store
+    use_graph(graph)
+    SimilarityIndex.build_from_graph(graph).save()
+    get_fundamentals_store().upsert_many([
+        {"stock_code": code, "stock_name": company["name"], "industry_primary": company["industry_primary"],
+         "industry_secondary": company["industry_secondary"], "listing_time": company["listing_time"]}
+        for code, company in universe["companies"].items()
+    ])
+    import backend
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(backend.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("后端服务启动超时")
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def seed_users(universe: dict, args) -> list:
+    """写入测试用户，每人预置几笔买入记录供 /positions 和 get_user_positions 使用"""
+    import uuid
+    from benchmarks.datasets import generate_users
+    from utils.db_utils import DatabaseManager
+    rng = random.Random(args.seed)
+    codes = list(universe["companies"])
+    users = generate_users(args.users, seed=args.seed)
+    db = DatabaseManager()
+    for user in users:
+        user["uid"] = str(uuid.uuid4())
+        db.add_user(username=user["username"], uid=user["uid"], funds=user["initial_funds"],
+                    hashed_password=user["password"])
+        for code in rng.sample(codes, args.holdings):
+            db.add_transaction(user["uid"], "买入", code, 100, round(rng.uniform(5, 200), 2))
+    db.close()
+    return users
+
+
+def bench_endpoints(base_url: str, universe: dict, questions: list, users: list, args) -> dict:
+    import requests
+    from benchmarks.datasets import generate_trades, generate_strategy_instructions
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    for user in users:
+        login = session().post(f"{base_url}/login", json={"username": user["username"], "password": user["password"]})
+        login.raise_for_status()
+        user["token"] = login.json()["token"]
+
+    def headers(i: int) -> dict:
+        return {"Authorization": f"Bearer {users[i % len(users)]['token']}"}
+
+    def check(response) -> None:
+        """HTTP错误或 success 为 false 时抛出异常，错误信息计入场景结果"""
+        response.raise_for_status()
+        body = response.json()
+        if isinstance(body, dict) and body.get("success") is False:
+            raise RuntimeError(str(body.get("message") or body.get("error") or body)[:200])
+
+    def post(path: str, payload: dict, auth: dict = None) -> None:
+        check(session().post(f"{base_url}{path}", json=payload, headers=auth or {}, timeout=120))
+
+    trades = generate_trades(universe, args.requests, seed=args.seed)
+    instructions = generate_strategy_instructions(args.requests, seed=args.seed)
+    calls = {
+        "trade": (list(enumerate(trades)), lambda item: post("/trade", item[1], headers(item[0]))),
+        "positions": (list(range(args.requests)), lambda i: check(session().get(
+            f"{base_url}/positions", headers=headers(i), timeout=120))),
+        "strategy": (instructions, lambda instruction: post("/strategy", {"instruction": instruction})),
+        "knowledge": ([item["question"] for item in questions], lambda question: post("/knowledge", {"question": question}))
+    }
+    results = {}
+    for name in args.endpoints:
+        items, call = calls[name]
+        results[f"POST /{name}" if name != "positions" else "GET /positions"] = run_scenario(items, call, args.concurrency)
+    return results
+
+
+def bench_functions(universe: dict, args) -> dict:
+    """核心函数的单线程耗时（不经过HTTP）"""
+    rng = random.Random(args.seed)
+    codes = list(universe["companies"])
+    results = {}
+    for name in args.functions:
+        try:
+            if name == "evaluate_risk":
+                from agent.risk_assessment import RiskAssessment
+                # 与 /trade 一致，每次评估使用新的实例
+                items = [(RiskAssessment(), rng.choice(codes)) for _ in range(args.function_calls)]
+                results[name] = run_scenario(items, lambda item: item[0].evaluate_risk(item[1]), 1)
+            elif name == "get_user_positions":
+                from utils.db_utils import DatabaseManager
+                import api.stock_api  # get_user_positions 内部延迟导入，缺少依赖时在此跳过而不是逐次计为错误
+                db = DatabaseManager()
+                uids = [row[0] for row in db.get_all_users()]
+                results[name] = run_scenario([rng.choice(uids) for _ in range(args.function_calls)],
+                                             db.get_user_positions, 1)
+                db.close()
+            elif name == "fuzzy_match_stock_name":
+                import Levenshtein  # _fuzzy_match_stock_name 内部延迟导入，缺少依赖时在此跳过而不是逐次计为错误
+                from benchmarks.datasets import generate_alias_mapping
+                from knowledge_graph.kg_query import KnowledgeGraphQuery
+                mapping = generate_alias_mapping(universe, seed=args.seed)
+                names = [rng.choice(mapping[rng.choice(codes)]["aliases"]) for _ in range(args.function_calls)]
+                kg_query = KnowledgeGraphQuery()
+                results[name] = run_scenario(names, lambda item: kg_query._fuzzy_match_stock_name(item, mapping) != "", 1)
+        except ImportError as e:
+            results[name] = {"skipped": f"缺少依赖: {e.name}"}
+    return results
+
+
+def compare(results: dict, baseline: dict) -> dict:
+    """与基线结果对比：各场景吞吐量与延迟分位数的相对变化（正数表示变慢/吞吐下降）"""
+    deltas = {}
+    for group in ("endpoints", "functions"):
+        for name, current in results.get(group, {}).items():
+            previous = baseline.get(group, {}).get(name)
+            if not previous or "skipped" in current or "skipped" in previous:
+                continue
+            change = lambda key, sign=1: round(sign * (current[key] - previous[key]) / previous[key] * 100, 1) \
+                if previous[key] else None
+            deltas[name] = {"p50_pct": change("p50_ms"), "p95_pct": change("p95_ms"), "p99_pct": change("p99_ms"),
+                            "throughput_drop_pct": change("throughput_rps", -1)}
+    return deltas
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    configure_environment(workdir, args.seed)
+    from benchmarks.datasets import generate_universe, generate_questions
+    universe = generate_universe(args.companies, seed=args.seed)
+    questions = generate_questions(universe, args.requests, seed=args.seed)
+    stubs = start_stubs(universe, questions, args)
+    users = seed_users(universe, args)
+    results = {"commit": git_commit(), "config": {key: value for key, value in vars(args).items()
+                                                  if key not in ("output", "baseline")}}
+    try:
+        server, base_url = start_backend(universe, stubs["graph"])
+    except ImportError as e:
+        results["endpoints"] = {name: {"skipped": f"缺少依赖: {e.name}"} for name in args.endpoints}
+    else:
+        results["endpoints"] = bench_endpoints(base_url, universe, questions, users, args)
+        server.should_exit = True
+    results["functions"] = bench_functions(universe, args)
+    results["upstream_requests"] = {"llm": stubs["llm"].stats["requests"],
+                                    "eastmoney": stubs["eastmoney"].stats["requests"],
+                                    "neo4j": stubs["graph"].stats["queries"]}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="整条请求链路的基准测试：本地替身模拟大模型、东方财富和Neo4j，"
+                                                 "测量各接口与核心函数的吞吐量和延迟分位数")
+    parser.add_argument("--companies", type=int, default=300, help="合成股票池的公司数")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--holdings", type=int, default=5, help="每个用户预置的持仓股票数")
+    parser.add_argument("--requests", type=int, default=200, help="每个接口的请求数")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发客户端数")
+    parser.add_argument("--function-calls", type=int, default=500, help="每个核心函数的调用次数")
+    parser.add_argument("--endpoints", type=lambda value: value.split(","), default=list(ENDPOINTS))
+    parser.add_argument("--functions", type=lambda value: value.split(","), default=list(FUNCTIONS))
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="假大模型单次请求耗时（秒）")
+    parser.add_argument("--quote-latency", type=float, default=0.005, help="假行情接口单次请求耗时（秒）")
+    parser.add_argument("--graph-latency", type=float, default=0.002, help="假图数据库单次查询耗时（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--baseline", help="之前提交的结果JSON，输出各场景的相对变化")
+    args = parser.parse_args()
+    output = Path(args.output).resolve() if args.output else None
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+    results = run(args)
+    if baseline:
+        results["baseline_commit"] = baseline.get("commit")
+        results["delta_vs_baseline"] = compare(results, baseline)
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if output:
+        output.write_text(text, encoding="utf-8")
+    print(text)
+    failed = failed_scenarios(results)
+    if failed:
+        print(f"全部请求失败的场景: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
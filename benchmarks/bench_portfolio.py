@@ -0,0 +1,106 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import time
+
+
+def generate_ledger(trades: int, stocks: int, days: int, seed: int = 0) -> list:
+    """合成交易记录 (id, action, stock_code, quantity, price, created_at)：以买入为主，少量超过持仓的卖出"""
+    rng = random.Random(seed)
+    codes = [f"sh{600000 + i}" for i in range(stocks)]
+    prices = {code: rng.uniform(5, 100) for code in codes}
+    started = time.time() - days * 86400
+    rows = []
+    for i in range(1, trades + 1):
+        code = rng.choice(codes)
+        prices[code] = max(1.0, prices[code] * math.exp(rng.gauss(0, 0.02)))
+        action = "买入" if rng.random() < 0.6 else "卖出"
+        rows.append((i, action, code, rng.choice([100, 200, 500, 1000]), round(prices[code], 2),
+                     started + days * 86400 * i / trades))
+    return rows
+
+
+def same_state(a, b) -> bool:
+    if a.holdings.keys() != b.holdings.keys() or a.marks != b.marks:
+        return False
+    close = lambda x, y: math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-6)
+    return all(
+        x.quantity == y.quantity and [list(lot) for lot in x.lots] == [list(lot) for lot in y.lots]
+        and all(close(getattr(x, field), getattr(y, field)) for field in ("cost_average", "realized_fifo", "realized_average"))
+        for x, y in ((a.holdings[code], b.holdings[code]) for code in a.holdings)
+    )
+
+
+def timed(call) -> tuple:
+    started = time.perf_counter()
+    result = call()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def run(args) -> dict:
+    os.environ["QUOTE_SOURCE"] = "fake"
+    from api.quote_feed import create_quote_source
+    from data.portfolio_analytics import PortfolioAnalytics, PortfolioState, QuoteCache
+    from utils.db_utils import DatabaseManager
+    from utils.llm_gateway import percentile
+
+    rows = generate_ledger(args.trades, args.stocks, args.days, args.seed)
+    PortfolioState.build(rows[:100])  # 预热 pandas 导入
+    built, build_ms = timed(lambda: PortfolioState.build(rows))
+    sequential = PortfolioState()
+    _, apply_ms = timed(lambda: sequential.apply(rows))
+
+    workdir = tempfile.mkdtemp(prefix="bench_portfolio_")
+    db = DatabaseManager(os.path.join(workdir, "portfolio.db"))
+    db.create_tables()
+    db.add_user("bench", "bench", 1e12, "")
+    db.conn.executemany('INSERT INTO transactions (id, uid, action, stock_code, quantity, price, created_at) '
+                        'VALUES (?, "bench", ?, ?, ?, ?, ?)', rows)
+    db.conn.commit()
+
+    analytics = PortfolioAnalytics(QuoteCache(create_quote_source()))
+    _, cold_ms = timed(lambda: analytics.report(db, "bench"))
+    warm = [timed(lambda: analytics.report(db, "bench"))[1] for _ in range(args.repeats)]
+    incremental = []
+    rng = random.Random(args.seed)
+    for _ in range(args.repeats):
+        db.add_transaction("bench", "买入", f"sh{600000 + rng.randrange(args.stocks)}", 100, 10.0)
+        incremental.append(timed(lambda: analytics.report(db, "bench"))[1])
+    updated = analytics.report(db, "bench")
+    rebuilt = PortfolioAnalytics(analytics.quotes).report(db, "bench")
+    db.close()
+    return {
+        "trades": args.trades,
+        "stocks": args.stocks,
+        "vectorized_build_ms": round(build_ms, 2),
+        "sequential_apply_ms": round(apply_ms, 2),
+        "build_matches_sequential": same_state(built, sequential),
+        "report_cold_ms": round(cold_ms, 2),
+        "report_unchanged_ms": {"p50": round(percentile(warm, 0.5), 2), "p95": round(percentile(warm, 0.95), 2)},
+        "report_after_new_trade_ms": {"p50": round(percentile(incremental, 0.5), 2),
+                                      "p95": round(percentile(incremental, 0.95), 2)},
+        "incremental_matches_rebuild": updated == rebuilt,
+        "analytics": analytics.stats()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="组合分析：向量化重建、逐笔增量更新与接口报告的耗时")
+    parser.add_argument("--trades", type=int, default=50000, help="用户交易记录条数")
+    parser.add_argument("--stocks", type=int, default=200, help="交易涉及的股票数")
+    parser.add_argument("--days", type=int, default=730, help="交易记录覆盖的天数")
+    parser.add_argument("--repeats", type=int, default=50, help="报告接口的重复测量次数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    text = json.dumps(run(args), ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
@@ -0,0 +1,141 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def make_history(days: int, seed: int = 0, factors: int = 8):
+    """可复现的单因子模型历史行情：同一因子（按代码分组）的股票收益率相关"""
+    def history(code: str, days: int = days) -> list:
+        rng = random.Random(f"{seed}:{code}")
+        factor_rng = random.Random(f"{seed}:factor:{int(code[2:]) % factors}")
+        price, rows = rng.uniform(5, 100), []
+        for i in range(days, 0, -1):
+            price *= math.exp(0.015 * factor_rng.gauss(0, 1) + 0.01 * rng.gauss(0, 1))
+            rows.append({"trade_date": (datetime(2024, 1, 1) + timedelta(days=days - i)).strftime("%Y%m%d"),
+                         "close": round(price, 4)})
+        return rows
+    return history
+
+
+def naive_var(risk, returns_cache, order: tuple, z: float) -> float:
+    """对照组：每笔订单重新拼收益率矩阵、计算完整协方差矩阵后求组合VaR"""
+    import numpy as np
+    import pandas as pd
+    action, code, quantity, price = order
+    codes = list(dict.fromkeys(risk.codes + [code]))
+    series, _ = returns_cache.get_many(codes)
+    frame = pd.concat([series[c] for c in codes], axis=1, sort=True).reindex(risk.dates).fillna(0.0)
+    covariance = np.cov(frame.to_numpy(), rowvar=False, ddof=1)
+    values = np.append(risk.values, 0.0) if code not in risk.index else risk.values.copy()
+    j = codes.index(code)
+    held = risk.quantities[j] if code in risk.index else 0.0
+    # 与引擎一致：该股票按订单价格估值，超出持仓的卖出不计入
+    values[j] = (held + quantity if action == "买入" else held - min(quantity, held)) * price
+    return z * math.sqrt(max(float(values @ covariance @ values), 0.0))
+
+
+def run(args) -> dict:
+    from utils.llm_gateway import percentile
+    from agent.pre_trade_risk import PreTradeRisk, ReturnsCache
+    from data.portfolio_analytics import get_portfolio_analytics
+    from utils.db_utils import DatabaseManager
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_pre_trade_risk_")
+    db = DatabaseManager(os.path.join(workdir, "risk.db"))
+    db.create_tables()
+    returns_cache = ReturnsCache(make_history(args.lookback + 1, args.seed), lookback=args.lookback)
+    engine = PreTradeRisk(returns_cache)
+    ms = lambda started: (time.perf_counter() - started) * 1000
+    results = {}
+    for holdings in [int(item) for item in args.holdings.split(",")]:
+        uid = f"bench{holdings}"
+        db.add_user(uid, uid, 1e9, "")
+        codes = [f"sh{600000 + i}" for i in range(holdings)]
+        db.conn.executemany('INSERT INTO transactions (uid, action, stock_code, quantity, price, created_at) '
+                            'VALUES (?, "买入", ?, ?, ?, ?)',
+                            [(uid, code, rng.choice([100, 500, 1000]), rng.uniform(5, 100), time.time()) for code in codes])
+        db.conn.commit()
+        returns_cache.get_many(codes + [f"sz{i:06d}" for i in range(1, args.orders + 1)])  # 历史行情预先取好，只测计算
+        started = time.perf_counter()
+        risk = engine.risk_state(db, uid)
+        build_ms = ms(started)
+
+        orders = [(rng.choice(["买入", "卖出"]), rng.choice(codes) if rng.random() < 0.5 else f"sz{rng.randint(1, args.orders):06d}",
+                   rng.choice([100, 1000, 10000]), rng.uniform(5, 100)) for _ in range(args.orders)]
+        single = []
+        for order in orders:
+            started = time.perf_counter()
+            engine.check(db, uid, *order)
+            single.append(ms(started))
+        started = time.perf_counter()
+        batch = engine.evaluate(db, uid, orders)
+        batch_ms = ms(started)
+
+        naive, errors = [], []
+        for order, result in list(zip(orders, batch))[:args.naive_orders]:
+            started = time.perf_counter()
+            expected = naive_var(risk, returns_cache, order, engine.z)
+            naive.append(ms(started))
+            if result["var_available"]:
+                errors.append(abs(expected - result["var"]) / max(expected, 1.0))
+
+        after_trade = []
+        for i in range(args.trades):  # 成交后首笔检查：持仓变化，只追加新股票的列并重新估值
+            db.add_transaction(uid, "买入", f"sz{i + 1:06d}", 100, 10.0)
+            started = time.perf_counter()
+            engine.check(db, uid, *orders[i % len(orders)])
+            after_trade.append(ms(started))
+
+        cold_uid, cold_codes = f"cold{holdings}", [f"sz{300000 + holdings + i}" for i in range(holdings)]
+        db.add_user(cold_uid, cold_uid, 1e9, "")
+        db.conn.executemany('INSERT INTO transactions (uid, action, stock_code, quantity, price, created_at) '
+                            'VALUES (?, "买入", ?, 100, 10.0, ?)', [(cold_uid, code, time.time()) for code in cold_codes])
+        db.conn.commit()
+        get_portfolio_analytics().state(db, cold_uid)
+        for code in cold_codes:  # 行业查询结果在进程内各用户共享，这里只测历史行情未缓存的情况
+            get_portfolio_analytics().industry(code)
+        started = time.perf_counter()  # 历史行情未缓存：检查不等待获取，VaR 暂不可用
+        cold = engine.check(db, cold_uid, "买入", cold_codes[0], 100, 10.0)
+        cold_ms = ms(started)
+
+        results[f"{holdings}_holdings"] = {
+            "state_build_ms": round(build_ms, 2),
+            "check_ms": {"p50": round(percentile(single, 0.5), 3), "p95": round(percentile(single, 0.95), 3)},
+            "batch_ms_per_order": round(batch_ms / len(orders), 4),
+            "check_after_trade_ms": {"p50": round(percentile(after_trade, 0.5), 3),
+                                     "p95": round(percentile(after_trade, 0.95), 3)},
+            "naive_full_covariance_ms": {"p50": round(percentile(naive, 0.5), 3), "p95": round(percentile(naive, 0.95), 3)},
+            "cold_check_ms": round(cold_ms, 2),
+            "cold_check_var_available": cold["var_available"],
+            "max_var_relative_error": max(errors) if errors else None,
+            "rejected": sum(not result["allowed"] for result in batch)
+        }
+    db.close()
+    return {"lookback_days": args.lookback, "orders": args.orders, "results": results,
+            "engine": engine.stats(), "analytics": get_portfolio_analytics().stats()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="下单前组合风险检查：缓存风险状态的增量计算与每笔重算完整协方差的对比")
+    parser.add_argument("--holdings", default="10,200,2000", help="用户持仓股票数（逗号分隔）")
+    parser.add_argument("--orders", type=int, default=200, help="每种持仓规模下检查的订单数")
+    parser.add_argument("--trades", type=int, default=20, help="测量成交后首笔检查耗时的成交次数")
+    parser.add_argument("--naive-orders", type=int, default=20, help="对照组计算的订单数")
+    parser.add_argument("--lookback", type=int, default=60, help="协方差估计的历史天数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    text = json.dumps(run(args), ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
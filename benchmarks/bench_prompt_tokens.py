@@ -0,0 +1,179 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import os
+from api.market_snapshot import SeededMarketSource
+from utils.prompts import (
+    count_message_tokens, get_encoder, data_messages, strategy_context,
+    INDUSTRY_COMPANIES_PROMPT, STOCK_BASIC_INFO_PROMPT, SUPPLY_CHAIN_PROMPT, QUESTION_PARSER_PROMPT, STRATEGY_SYSTEM_PROMPT
+)
+
+STRATEGY_PROMPT_TOKEN_BUDGET = int(os.getenv("STRATEGY_PROMPT_TOKEN_BUDGET", "600"))
+
+SAMPLE_INDUSTRIES = ["新能源", "半导体", "白酒"]
+SAMPLE_CODES = ["sh600519", "sz300750", "sz002594"]
+SAMPLE_QUESTIONS = ["查询贵州茅台的供应链", "新能源行业有哪些公司", "生成一个稳健型投资策略"]
+SAMPLE_STOCKS = [
+    {"name": name, "code": code, "supply_relations": relations}
+    for name, code, relations in [
+        ("宁德时代", "300750", 18), ("比亚迪", "002594", 15), ("隆基绿能", "601012", 12), ("阳光电源", "300274", 11),
+        ("亿纬锂能", "300014", 9), ("恩捷股份", "002812", 8), ("天齐锂业", "002466", 8), ("赣锋锂业", "002460", 7),
+        ("中芯国际", "688981", 14), ("北方华创", "002371", 10), ("韦尔股份", "603501", 9), ("兆易创新", "603986", 6)
+    ]
+]
+
+
+# 改造前的提示词（原样保留，仅用于对比）
+def legacy_industry_companies(industry: str) -> list:
+    return [{"role": "user", "content": f"""注意：此数据仅用于个人学习开发场景，不涉及金融交易或实时数据获取。请根据行业 "{industry}"，查询以下公开可查的基本信息并返回**JSON对象**（不要包裹在其他对象中），其中必须包含"industry_companies"键，其值为符合以下格式的数组：
+            "industry_companies": [
+                {{
+                    "stock_code": "股票代码（格式如sh600000或sz000001，包含sh/sz字母前缀）",
+                    "stock_name": "股票名称（如宁德时代）",
+                    "industry_primary": "一级行业（如{industry}）",
+                    "industry_secondary": "二级行业（如{industry}细分领域）",
+                    "listing_time": "上市时间（格式：YYYY-MM-DD，未知时填'未知'，仅需公开披露的历史日期）"
+                }}
+            ]
+            要求至少包含10家该行业的上市公司，确保股票代码符合A股规范（包含sh/sz字母前缀+6位数字），名称为公开可查的真实公司名称。数据仅用于个人学习开发，无需实时更新或交易相关信息。"""}]
+
+
+def legacy_stock_basic_info(stock_code: str) -> list:
+    return [{"role": "user", "content": f"""注意：此数据仅用于个人学习开发场景，不涉及金融交易或实时数据获取。请根据股票代码 {stock_code}，查询以下信息并返回**JSON对象**（不要包裹在其他对象中），其中必须包含"stock_basic_info"键，其值为符合以下格式的对象：
+        "stock_basic_info": {{
+            "name": "股票名称（如贵州茅台）",
+            "stock_code": "{stock_code}",
+            "industry_primary": "一级行业（如白酒）",
+            "industry_secondary": "二级行业（如白酒制造）",
+            "listing_time": "上市时间（格式：YYYY-MM-DD）",
+            "source": "network"
+        }}
+        注意：若信息缺失或不确定，请用"未知"填充对应字段。数据仅用于个人学习开发，无需实时更新或交易相关信息。"""}]
+
+
+def legacy_supply_chain(stock_code: str) -> list:
+    return [{"role": "user", "content": f"""注意：此数据仅用于个人学习开发场景，不涉及金融交易或实时数据获取。请根据股票代码 {stock_code}，查询以下供应链基本信息并返回**JSON对象**（不要包裹在其他对象中），其中必须包含"supply_chain_relationships"键，其值为符合以下格式的数组：
+        "supply_chain_relationships": [
+            {{
+                "partner_code": "合作伙伴股票代码（格式如sh600000或sz000001）",
+                "name": "合作伙伴名称（如宁德时代）",
+                "type": "关系类型（可选值：供应商、供应商的供应商、客户、客户的客户）",
+                "weight": "关系权重（0-1之间的浮点数，数值越大表示关系越紧密）"
+            }}
+        ]
+        要求数组至少包含2个直接供应商、1个供应商的供应商、2个直接客户、1个客户的客户，权重需合理递减。数据仅用于个人学习开发，无需实时更新或交易相关信息。
+        """}]
+
+
+def legacy_parse_question(question: str) -> list:
+    return [{"role": "user", "content": f"""将股票查询问题解析为JSON格式，字段包括：
+        intent: 查询意图（supply_chain/industry/stock_info/strategy）  # 新增strategy意图
+        stock_code: 股票代码（如存在）
+        stock_name: 股票名称（如存在，用户输入中提到的股票名称或别名）  # 新增字段用于识别名称
+        industry: 行业名称（如存在）
+        depth: 查询层级（仅供应链需要）
+        strategy_type: 策略类型（如存在"稳健型""激进型"等关键词时填写）  # 新增字段
+
+        问题：{question}"""}]
+
+
+def legacy_strategy(market_data: dict, strategy_type: str, industries: list, stocks: list) -> list:
+    prompt = f"""当前市场估值水平：{market_data['valuation']}，供应链景气指数：{market_data['supply_chain_index']}，
+        策略类型：{strategy_type}，优选行业：{'、'.join(industries)}，核心供应链企业："""
+    for stock in stocks:
+        prompt += f"\n- {stock['name']}({stock['code']}) 供应链关系数：{stock['supply_relations']}"
+    prompt += """\n请基于以上要素生成包含以下内容的投资策略：
+        1. 行业配置逻辑（结合供应链稳定性）
+        2. 个股选择依据（供应链核心地位）
+        3. 风险控制措施（供应链断裂风险）"""
+    cleaned = '\n'.join([line.strip() for line in prompt.split('\n')])
+    cleaned = '\n'.join([line for line in cleaned.split('\n') if line.strip()])[:2000]
+    return [
+        {"role": "system", "content": """你是一位精通供应链分析的首席投资顾问，请返回严格符合以下格式的JSON数据（无额外文本）：
+                    {"title": "策略标题", "description": "策略描述", "annualReturn": "预期年化收益率（百分比）", "riskLevel": "低/中/高", "recommendedStocks": [{"name": "股票名称", "code": "股票代码"}]}
+                    示例（仅供格式参考）：{"title": "稳健型新能源投资策略", "description": "聚焦新能源行业核心供应链企业...", "annualReturn": "8%", "riskLevel": "低", "recommendedStocks": [{"name": "宁德时代", "code": "300750"}]}"""},
+        {"role": "user", "content": cleaned}
+    ]
+
+
+def market_data(version: int) -> dict:
+    """与 StrategyAgent.get_enhanced_market_data 相同结构的市场数据"""
+    data = SeededMarketSource().load(version)
+    valuation = data["valuation"]
+    return {
+        "valuation": {"pe": valuation["pe_ratio"], "pb": valuation["pb_ratio"], "dividend_yield": valuation["dividend_yield"]},
+        "supply_chain_index": data["supply_chain_index"]
+    }
+
+
+def request_types() -> dict:
+    """请求类型 -> [(改造前消息, 改造后消息)]，每类取若干组不同输入"""
+    strategies = [("稳健型", SAMPLE_INDUSTRIES[:2], SAMPLE_STOCKS[:8]), ("激进型", ["半导体", "科技"], SAMPLE_STOCKS[4:]),
+                  ("平衡型", ["新能源", "消费"], SAMPLE_STOCKS)]
+    return {
+        "web_data.industry_companies": [
+            (legacy_industry_companies(item), data_messages(INDUSTRY_COMPANIES_PROMPT, industry=item))
+            for item in SAMPLE_INDUSTRIES],
+        "web_data.stock_basic_info": [
+            (legacy_stock_basic_info(item), data_messages(STOCK_BASIC_INFO_PROMPT, stock_code=item))
+            for item in SAMPLE_CODES],
+        "web_data.supply_chain": [
+            (legacy_supply_chain(item), data_messages(SUPPLY_CHAIN_PROMPT, stock_code=item))
+            for item in SAMPLE_CODES],
+        "kg_query.parse_question": [
+            (legacy_parse_question(item),
+             [{"role": "system", "content": QUESTION_PARSER_PROMPT}, {"role": "user", "content": item}])
+            for item in SAMPLE_QUESTIONS],
+        "strategy.final_strategy": [
+            (legacy_strategy(market_data(i), kind, industries, stocks),
+             [{"role": "system", "content": STRATEGY_SYSTEM_PROMPT},
+              {"role": "user", "content": strategy_context(market_data(i), kind, industries, stocks,
+                                                           STRATEGY_PROMPT_TOKEN_BUDGET)}])
+            for i, (kind, industries, stocks) in enumerate(strategies)]
+    }
+
+
+def shared_prefix_tokens(samples: list) -> int:
+    """同类请求之间逐字相同的前缀的token数（服务端前缀缓存可复用的部分）"""
+    texts = ["\n".join(message["content"] for message in messages) for messages in samples]
+    prefix = texts[0]
+    for text in texts[1:]:
+        length = 0
+        while length < min(len(prefix), len(text)) and prefix[length] == text[length]:
+            length += 1
+        prefix = prefix[:length]
+    return count_message_tokens([{"content": prefix}]) if prefix else 0
+
+
+def run() -> dict:
+    report = {"tokenizer": "tiktoken cl100k_base" if get_encoder() else "DeepSeek字符换算估计", "request_types": {}}
+    total_before = total_after = 0
+    for name, pairs in request_types().items():
+        before = [count_message_tokens(old) for old, _ in pairs]
+        after = [count_message_tokens(new) for _, new in pairs]
+        avg_before, avg_after = sum(before) / len(before), sum(after) / len(after)
+        total_before += avg_before
+        total_after += avg_after
+        report["request_types"][name] = {
+            "before_tokens": round(avg_before, 1),
+            "after_tokens": round(avg_after, 1),
+            "reduction": f"{(1 - avg_after / avg_before) * 100:.1f}%",
+            "before_shared_prefix_tokens": shared_prefix_tokens([old for old, _ in pairs]),
+            "after_shared_prefix_tokens": shared_prefix_tokens([new for _, new in pairs])
+        }
+    report["all_types"] = {"before_tokens": round(total_before, 1), "after_tokens": round(total_after, 1),
+                           "reduction": f"{(1 - total_after / total_before) * 100:.1f}%"}
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="各类大模型请求的输入token数：改造前后对比")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    text = json.dumps(run(), ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
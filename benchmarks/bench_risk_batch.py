@@ -0,0 +1,144 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+import tempfile
+import time
+
+
+def make_bars(stocks: int, days: int, industries: int, seed: int):
+    """可复现的行业因子模型日线：同一行业（按列号分组）的股票收益率相关，少量缺失值模拟停牌"""
+    import numpy as np
+    from data.bar_store import BAR_FIELDS, BarStore
+    rng = np.random.default_rng(seed)
+    groups = np.arange(stocks) % industries
+    returns = 0.01 * rng.standard_normal((days, 1)) + 0.015 * rng.standard_normal((days, industries))[:, groups] \
+        + 0.01 * rng.standard_normal((days, stocks))
+    closes = rng.uniform(5, 100, stocks) * np.exp(np.cumsum(returns, axis=0))
+    closes[rng.random(closes.shape) < 0.01] = np.nan
+    fields = {field: closes.copy() for field in BAR_FIELDS}
+    fields["volume"] = rng.uniform(1e5, 1e7, closes.shape)
+    codes = np.array([f"sh{600000 + j}".encode("ascii") for j in range(stocks)], dtype="S8")
+    dates = np.arange(20200101, 20200101 + days, dtype=np.int32)
+    return BarStore(codes, dates, fields), [f"行业{g}" for g in groups]
+
+
+def make_positions(path: str, users: int, positions: int, stocks: int, seed: int) -> None:
+    """用户表和交易记录：每个用户平均 positions 只股票，含部分卖出和未收录的股票"""
+    import numpy as np
+    from utils.db_utils import DatabaseManager
+    db = DatabaseManager(path)
+    db.create_tables()
+    db.close()
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    uids = [f"u{i:07d}" for i in range(users)]
+    conn.executemany("INSERT INTO users (uid, username, funds, hashed_password) VALUES (?, ?, 1e6, '')",
+                     [(uid, uid) for uid in uids])
+    counts = rng.poisson(positions, users) + 1
+    owners = np.repeat(np.arange(users), counts)
+    columns = rng.integers(0, stocks + stocks // 100 + 1, len(owners))  # 约1%不在日线行情中
+    quantities = rng.choice([100, 500, 1000], len(owners))
+    sells = rng.random(len(owners)) < 0.2
+    rows = [(uids[o], "买入", f"sh{600000 + c}", int(q), 10.0, 0.0) for o, c, q in zip(owners, columns, quantities)]
+    rows += [(uids[o], "卖出", f"sh{600000 + c}", int(q) // 2, 10.0, 0.0)
+             for o, c, q in zip(owners[sells], columns[sells], quantities[sells])]
+    conn.executemany("INSERT INTO transactions (uid, action, stock_code, quantity, price, created_at) VALUES (?,?,?,?,?,?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def direct_metrics(bars, uid: str, conn, scenarios: list, industries: list, lookback: int, confidence: float) -> dict:
+    """对照组：逐笔累加单个用户的持仓，构造完整的收益率矩阵后直接计算"""
+    import numpy as np
+    from statistics import NormalDist
+    from data.risk_batch import stress_matrix
+    quantities = {}
+    for action, code, quantity in conn.execute("SELECT action, stock_code, quantity FROM transactions WHERE uid = ?", (uid,)):
+        quantities[code] = quantities.get(code, 0) + (quantity if action == "买入" else -quantity)
+    codes = [code for code, quantity in quantities.items() if quantity > 0]
+    columns = bars.indices(codes)
+    held = columns >= 0
+    values = np.array([quantities[code] for code in codes], dtype=float)[held] * \
+        np.nan_to_num(bars.latest_close(), nan=0.0)[columns[held]]
+    pnl = bars.returns(lookback)[:, columns[held]] @ values
+    ordered = np.sort(pnl)
+    tail = int(math.floor((1 - confidence) * len(pnl)))
+    stress = stress_matrix(scenarios, industries)[:, columns[held]] @ values
+    return {"market_value": float(values.sum()), "var_historical": float(-ordered[tail]),
+            "es_historical": float(-ordered[:tail + 1].mean()),
+            "var_parametric": float(NormalDist().inv_cdf(confidence) * pnl.std(ddof=1)),
+            "worst_stress_pnl": float(stress.min())}
+
+
+def run(args) -> dict:
+    from data.risk_batch import RiskBatchJob, default_scenarios
+    workdir = tempfile.mkdtemp(prefix="bench_risk_batch_")
+    bar_path, db_path = os.path.join(workdir, "bars"), os.path.join(workdir, "risk.db")
+    bars, industries = make_bars(args.stocks, args.days, args.industries, args.seed)
+    bars.save(bar_path)
+    started = time.perf_counter()
+    make_positions(db_path, args.users, args.positions, args.stocks, args.seed)
+    setup_seconds = time.perf_counter() - started
+    scenarios = default_scenarios(industries)
+
+    import data.risk_batch as risk_batch
+    risk_batch.stock_industries = lambda codes: industries  # 合成行情的行业不在列式基本面数据中
+    runs = {}
+    for workers in [int(item) for item in args.workers.split(",")]:
+        job = RiskBatchJob(db_path, bar_path, scenarios, lookback=args.lookback, confidence=args.confidence,
+                           chunk_users=args.chunk_users)
+        started = time.perf_counter()
+        summary = job.run(workers)
+        seconds = time.perf_counter() - started
+        runs[workers] = summary
+        summary["users_per_second"] = round(summary["users"] / seconds, 1)
+
+    conn = sqlite3.connect(db_path)
+    run_ids = [summary["run_id"] for summary in runs.values()]
+    columns = "uid, positions, unpriced, market_value, var_historical, var_parametric, es_historical, worst_scenario, worst_stress_pnl, stress"
+    outputs = [conn.execute(f"SELECT {columns} FROM risk_results WHERE run_id = ? ORDER BY uid", (run_id,)).fetchall()
+               for run_id in run_ids]
+    errors = []
+    for uid in [f"u{i:07d}" for i in range(0, args.users, max(args.users // args.verify_users, 1))]:
+        expected = direct_metrics(bars, uid, conn, scenarios, industries, args.lookback, args.confidence)
+        row = conn.execute("SELECT market_value, var_historical, es_historical, var_parametric, worst_stress_pnl "
+                           "FROM risk_results WHERE run_id = ? AND uid = ?", (run_ids[0], uid)).fetchone()
+        actual = dict(zip(["market_value", "var_historical", "es_historical", "var_parametric", "worst_stress_pnl"], row))
+        errors.append(max(abs(actual[key] - value) for key, value in expected.items()))
+    conn.close()
+    return {
+        "users": args.users, "stocks": args.stocks, "lookback_days": args.lookback, "scenarios": len(scenarios),
+        "setup_seconds": round(setup_seconds, 2),
+        "runs": {f"{workers}_workers": {key: summary[key] for key in ("users", "chunks", "seconds", "users_per_second")}
+                 for workers, summary in runs.items()},
+        "firm": runs[max(runs)]["firm"] | {"stress": len(runs[max(runs)]["firm"]["stress"])},
+        "identical_across_workers": all(output == outputs[0] for output in outputs),
+        "max_abs_error_vs_direct": max(errors) if errors else None  # 结果保留两位小数
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全部用户VaR/压力测试批量计算的吞吐量，以及与逐用户直接计算的一致性")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--positions", type=int, default=10, help="每个用户的平均持仓股票数")
+    parser.add_argument("--stocks", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=300, help="日线行情的交易日数")
+    parser.add_argument("--industries", type=int, default=30)
+    parser.add_argument("--lookback", type=int, default=250)
+    parser.add_argument("--confidence", type=float, default=0.99)
+    parser.add_argument("--chunk-users", type=int, default=1000)
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="对比的进程数（逗号分隔）")
+    parser.add_argument("--verify-users", type=int, default=50, help="与直接计算对照的用户数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    text = json.dumps(run(args), ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
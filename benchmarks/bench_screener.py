@@ -0,0 +1,109 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import random
+import time
+
+QUERIES = [
+    ({"industry_primary": ["行业1", "行业2"]}, "-market_cap"),
+    ({"listing_age": {"gte": 5}, "volatility": {"lt": 0.02}}, "-momentum"),
+    ({"momentum": {"gt": 0}, "rsi": {"gte": 30, "lte": 70}}, "volatility"),
+    ({"supply_degree": {"gte": 3}, "industry_primary": "行业3"}, "-pagerank"),
+    ({"market_cap": {"gte": 1e8}, "listing_age": {"lt": 10}, "momentum": {"gt": -0.05}}, None),
+    ({}, "-supply_degree"),
+]
+
+
+def make_table(stocks: int, days: int, industries: int, seed: int):
+    """合成的5000只股票：基本面、日线行情和中心性侧表"""
+    import numpy as np
+    from benchmarks.bench_risk_batch import make_bars
+    from data.fundamentals_columnar import ColumnarFundamentals
+    from data.screener import ScreenTable
+    rng = random.Random(seed)
+    bars, groups = make_bars(stocks, days, industries, seed)
+    rows = [{"stock_code": f"sh{600000 + j}", "stock_name": f"公司{j}", "industry_primary": groups[j],
+             "industry_secondary": f"{groups[j]}-{j % 5}",
+             "listing_time": f"{rng.randint(1990, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"}
+            for j in range(stocks)]
+    columnar = ColumnarFundamentals.build(rows)
+    graph_rng = np.random.default_rng(seed)
+    in_graph = graph_rng.random(stocks) < 0.6
+    centrality = {"codes": np.array([f"{600000 + j}" for j in np.flatnonzero(in_graph)]),
+                  "supply_degree": graph_rng.poisson(3, int(in_graph.sum())),
+                  "pagerank": graph_rng.random(int(in_graph.sum())) / stocks}
+    started = time.perf_counter()
+    table = ScreenTable.build(columnar, bars, centrality)
+    return table, (time.perf_counter() - started) * 1000
+
+
+def naive_query(frame, filters: dict, sort: str) -> list:
+    """对照组：pandas 逐条件过滤后排序"""
+    import numpy as np
+    mask = np.ones(len(frame), dtype=bool)
+    for field, condition in filters.items():
+        if isinstance(condition, dict):
+            for op, value in condition.items():
+                column = frame[field]
+                mask &= {"gt": column > value, "gte": column >= value, "lt": column < value, "lte": column <= value}[op].to_numpy()
+        else:
+            mask &= frame[field].isin([condition] if isinstance(condition, str) else condition).to_numpy()
+    result = frame[mask]
+    if sort:
+        result = result.sort_values(sort.lstrip("-"), ascending=not sort.startswith("-"), kind="stable", na_position="last")
+    return result["stock_code"].tolist()
+
+
+def run(args) -> dict:
+    import pandas as pd
+    from data.screener import SCREEN_MAX_PAGE_SIZE
+    from utils.llm_gateway import percentile
+    table, build_ms = make_table(args.stocks, args.days, args.industries, args.seed)
+    frame = pd.DataFrame({"stock_code": [code.decode("ascii") for code in table.codes],
+                          **{field: [table.labels[field][i] for i in table.categories[field]] for field in table.categories},
+                          **table.numeric})
+    results, mismatches = {}, 0
+    for n, (filters, sort) in enumerate(QUERIES):
+        latencies = []
+        for page in range(1, args.repeat + 1):
+            started = time.perf_counter()
+            table.query(filters, sort, page=page % 5 + 1, page_size=args.page_size)
+            latencies.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        expected = naive_query(frame, filters, sort)
+        naive_ms = (time.perf_counter() - started) * 1000
+        actual, page, total = [], 1, None
+        while total is None or len(actual) < total:  # 逐页取完全部结果
+            full = table.query(filters, sort, page=page, page_size=SCREEN_MAX_PAGE_SIZE)
+            actual += [item["stock_code"] for item in full["items"]]
+            total, page = full["total"], page + 1
+        if sort and sort.startswith("-"):  # 降序时相等值的先后顺序可能不同，只比较排序键
+            field = sort[1:]
+            keys = lambda codes: frame.set_index("stock_code").loc[codes, field].fillna(-1e300).tolist()
+            mismatches += keys(actual) != keys(expected) or set(actual) != set(expected)
+        else:
+            mismatches += actual != expected
+        results[f"query_{n}"] = {"filters": filters, "sort": sort, "total": full["total"],
+                                 "p50_ms": round(percentile(latencies, 0.5), 3), "p95_ms": round(percentile(latencies, 0.95), 3),
+                                 "pandas_ms": round(naive_ms, 3)}
+    return {"stocks": args.stocks, "build_ms": round(build_ms, 1), "page_size": args.page_size,
+            "queries": results, "mismatches_vs_pandas": int(mismatches)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="选股表：预排序索引与位图上的筛选/排序/分页耗时，并与 pandas 结果对照")
+    parser.add_argument("--stocks", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--industries", type=int, default=30)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200, help="每个查询的重复次数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    text = json.dumps(run(args), ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
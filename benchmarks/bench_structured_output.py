@@ -0,0 +1,118 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import random
+import threading
+import time
+from benchmarks.stubs.fake_llm import start_fake_llm
+from utils.llm_gateway import LLMGateway
+import utils.llm_gateway as llm_gateway
+from utils.structured_output import (
+    chat_structured, parse_structured, structured_output_stats, StrategyResult, StructuredOutputError
+)
+
+SITE = "bench.strategy"
+MESSAGES = [{"role": "system", "content": "只输出JSON"}, {"role": "user", "content": "生成一个稳健型投资策略"}]
+STRATEGY = {
+    "title": "稳健型新能源投资策略", "description": "聚焦新能源行业核心供应链企业" * 5, "annualReturn": "8%",
+    "riskLevel": "低", "recommendedStocks": [{"name": f"股票{i}", "code": f"{600000 + i}"} for i in range(8)]
+}
+
+
+def reply_kinds(text: str) -> dict:
+    """模型回复的几种常见形态"""
+    cut = text.rindex("},")
+    return {
+        "clean": text,
+        "fenced": f"以下是生成的策略：\n```json\n{text}\n```\n如需调整请告知。",
+        "truncated": text[:cut + 1],  # 输出被截断，推荐股票列表不完整
+        "missing_field": json.dumps({key: value for key, value in STRATEGY.items() if key != "riskLevel"},
+                                    ensure_ascii=False),
+        "not_json": "抱歉，我无法提供具体的投资建议。"
+    }
+
+
+def make_responder(mix: dict, seed: int):
+    """按比例返回各种形态的回复；修复请求（最后一条消息要求修正JSON）总是返回合法JSON"""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    kinds = reply_kinds(json.dumps(STRATEGY, ensure_ascii=False))
+    names, weights = zip(*mix.items())
+
+    def respond(body: dict) -> str:
+        if "修正后的完整JSON" in body["messages"][-1]["content"]:
+            return kinds["clean"]
+        with lock:
+            return kinds[rng.choices(names, weights)[0]]
+    return respond
+
+
+def legacy_parse(text: str) -> dict:
+    """改造前的解析方式：去掉代码块标记后直接 json.loads，不校验字段"""
+    return json.loads(text.replace("```json", "").replace("```", "").replace("\n", " ").strip())
+
+
+def bench_parse(iterations: int) -> dict:
+    """纯解析耗时（不含网络）：改造前 json.loads 与 pydantic 解析+校验对比"""
+    results = {}
+    for name, text in reply_kinds(json.dumps(STRATEGY, ensure_ascii=False)).items():
+        row = {}
+        for method, parse in (("legacy_json_loads", legacy_parse),
+                              ("structured", lambda value: parse_structured(value, StrategyResult))):
+            ok = 0
+            started = time.perf_counter()
+            for _ in range(iterations):
+                try:
+                    parse(text)
+                    ok += 1
+                except ValueError:
+                    pass
+            row[method] = {"parsed": ok == iterations,
+                           "avg_us": round((time.perf_counter() - started) / iterations * 1e6, 2)}
+        results[name] = row
+    return results
+
+
+def bench_end_to_end(calls: int, mix: dict, latency: float, seed: int) -> dict:
+    """经本地假服务的完整调用：首次即通过、修复后通过、最终失败的比例，以及修复请求的耗时占比"""
+    server = start_fake_llm(latency=latency, responder=make_responder(mix, seed), seed=seed)
+    llm_gateway._gateway = LLMGateway(api_key="fake", base_url=server.url, model="fake", rate=0, hedge_percentile=0)
+    legacy_failures = 0
+    for _ in range(calls):
+        try:
+            chat_structured(SITE, MESSAGES, StrategyResult, model="fake", response_format={"type": "json_object"})
+        except StructuredOutputError:
+            pass
+    # 改造前：同一组回复直接 json.loads，无法解析即失败（truncated/not_json），缺字段的回复会被当成有效结果
+    for _ in range(calls):
+        try:
+            legacy_parse(llm_gateway._gateway.chat("bench.legacy", MESSAGES))
+        except ValueError:
+            legacy_failures += 1
+    server.shutdown()
+    return {"mix": mix, "calls": calls, "structured": structured_output_stats()[SITE],
+            "legacy_parse_failure_rate": round(legacy_failures / calls, 4)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="大模型结构化输出解析基准：解析耗时与修复率")
+    parser.add_argument("--iterations", type=int, default=20000, help="纯解析测试每种回复的解析次数")
+    parser.add_argument("--calls", type=int, default=300, help="端到端测试的调用次数")
+    parser.add_argument("--latency", type=float, default=0.02, help="假服务单次请求耗时（秒）")
+    parser.add_argument("--mix", default="clean=0.8,fenced=0.1,truncated=0.05,missing_field=0.03,not_json=0.02",
+                        help="各种回复形态的比例")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    mix = {name: float(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+    results = {
+        "parse": bench_parse(args.iterations),
+        "end_to_end": bench_end_to_end(args.calls, mix, args.latency, args.seed)
+    }
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
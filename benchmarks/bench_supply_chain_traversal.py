@@ -0,0 +1,127 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import random
+import time
+from knowledge_graph.traversal import bounded_bfs
+
+
+def generate_graph(num_nodes: int = 20000, num_edges: int = 100000, seed: int = 0) -> dict:
+    """生成合成供应链图：一半的边两端偏向少数枢纽企业（幂律分布，模拟核心供应商之间的密集往来），其余随机"""
+    rng = random.Random(seed)
+    codes = [f"sz{i:06d}" for i in range(num_nodes)]
+    adjacency = {code: [] for code in codes}
+    relations = ["供应商", "客户", "供应商的供应商", "客户的客户"]
+
+    def pick() -> str:
+        if rng.random() < 0.5:
+            return codes[min(int(rng.paretovariate(1.0)) - 1, num_nodes - 1)]
+        return codes[rng.randrange(num_nodes)]
+
+    for _ in range(num_edges):
+        source, target = pick(), pick()
+        if source != target:
+            adjacency[source].append({
+                "partner_code": target,
+                "partner_name": f"公司{target[-6:]}",
+                "relation": rng.choice(relations),
+                "weight": round(rng.uniform(0.1, 1.0), 4)
+            })
+    for edges in adjacency.values():
+        edges.sort(key=lambda edge: edge["weight"], reverse=True)
+    return adjacency
+
+
+def memory_neighbors(adjacency: dict, stats: dict):
+    """内存版邻居展开函数，与 graph_neighbors 的返回格式一致，并统计按层查询次数"""
+    def neighbors(codes: list, fanout: int) -> dict:
+        stats["queries"] += 1
+        return {code: {"name": f"公司{code[-6:]}", "edges": adjacency[code][:fanout]} for code in codes}
+    return neighbors
+
+
+def enumerate_paths(adjacency: dict, start: str, depth: int, max_paths: int) -> dict:
+    """模拟 MATCH (c)-[r:SUPPLY_CHAIN*1..depth]->(partner) 的路径枚举（关系不重复），统计路径数与去重后的伙伴数"""
+    paths = 0
+    partners = set()
+    first_rows = []
+    stack = [(start, 0, frozenset())]
+    while stack:
+        node, length, used = stack.pop()
+        if length == depth:
+            continue
+        for index, edge in enumerate(adjacency[node]):
+            key = (node, index)
+            if key in used:
+                continue
+            paths += 1
+            partners.add(edge["partner_code"])
+            if len(first_rows) < 50:
+                first_rows.append(edge["partner_code"])
+            if paths >= max_paths:
+                return {"paths": paths, "partners": len(partners), "truncated": True,
+                        "distinct_in_first_50": len(set(first_rows))}
+            stack.append((edge["partner_code"], length + 1, used | {key}))
+    return {"paths": paths, "partners": len(partners), "truncated": False,
+            "distinct_in_first_50": len(set(first_rows))}
+
+
+def pick_starts(adjacency: dict, count: int, seed: int) -> list:
+    """选取出度最高的若干公司作为查询起点（最容易发生路径爆炸的情况）"""
+    ranked = sorted(adjacency, key=lambda code: len(adjacency[code]), reverse=True)
+    rng = random.Random(seed)
+    return ranked[:count // 2] + rng.sample(ranked, count - count // 2)
+
+
+def run(num_nodes: int, num_edges: int, depths: list, starts: int, max_paths: int, seed: int) -> dict:
+    adjacency = generate_graph(num_nodes, num_edges, seed)
+    start_codes = pick_starts(adjacency, starts, seed)
+    results = {"graph": {"nodes": num_nodes, "edges": sum(len(edges) for edges in adjacency.values())},
+               "starts": len(start_codes), "depths": {}}
+    for depth in depths:
+        began = time.perf_counter()
+        naive = [enumerate_paths(adjacency, code, depth, max_paths) for code in start_codes]
+        naive_seconds = time.perf_counter() - began
+
+        stats = {"queries": 0}
+        neighbors = memory_neighbors(adjacency, stats)
+        began = time.perf_counter()
+        bfs = [list(bounded_bfs(code, neighbors, depth)) for code in start_codes]
+        bfs_seconds = time.perf_counter() - began
+
+        results["depths"][str(depth)] = {
+            "path_enumeration": {
+                "avg_ms": round(naive_seconds / len(start_codes) * 1000, 3),
+                "avg_paths": round(sum(item["paths"] for item in naive) / len(naive), 1),
+                "max_paths": max(item["paths"] for item in naive),
+                "truncated_queries": sum(item["truncated"] for item in naive),
+                "avg_distinct_in_first_50_rows": round(sum(item["distinct_in_first_50"] for item in naive) / len(naive), 1)
+            },
+            "bounded_bfs": {
+                "avg_ms": round(bfs_seconds / len(start_codes) * 1000, 3),
+                "avg_partners": round(sum(len(rows) for rows in bfs) / len(bfs), 1),
+                "max_hop": max((row["hop"] for rows in bfs for row in rows), default=0),
+                "avg_hop_queries": round(stats["queries"] / len(start_codes), 2)
+            }
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="供应链遍历基准：路径枚举 vs 有界广度优先遍历")
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument("--edges", type=int, default=100000)
+    parser.add_argument("--depths", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--starts", type=int, default=20)
+    parser.add_argument("--max-paths", type=int, default=1000000, help="单次路径枚举的上限，防止基准本身失控")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    result = run(args.nodes, args.edges, args.depths, args.starts, args.max_paths, args.seed)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
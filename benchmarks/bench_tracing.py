@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import os
+import subprocess
+import time
+
+TRACE_CASES = ("plain", "traced_outside_request", "traced_in_request")
+
+
+def measure(case: str, calls: int) -> float:
+    """单次调用的平均耗时（纳秒），被测函数本身几乎不做事，结果即为追踪带来的额外开销"""
+    from utils.tracing import traced, start_trace, detach_trace, finish_trace
+
+    def work(value):
+        return value + 1
+
+    func = work if case == "plain" else traced("bench.work")(work)
+    trace = token = None
+    if case == "traced_in_request":
+        trace, token = start_trace("bench")
+    started = time.perf_counter()
+    for i in range(calls):
+        func(i)
+        if trace is not None and i % 400 == 399:
+            # 单个请求内的阶段数有上限，定期换一个新的请求追踪
+            detach_trace(token)
+            trace, token = start_trace("bench")
+    elapsed = time.perf_counter() - started
+    if trace is not None:
+        detach_trace(token)
+    return elapsed / calls * 1e9
+
+
+def run_case(case: str, calls: int, enabled: bool) -> float:
+    """在独立进程中测量（TRACE_ENABLED 在导入时读取）"""
+    env = dict(os.environ, TRACE_ENABLED="1" if enabled else "0", TRACE_FILE="")
+    output = subprocess.run(
+        [sys.executable, __file__, "--case", case, "--calls", str(calls)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])["ns_per_call"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="请求追踪的开销：开启/关闭追踪时装饰器的单次调用耗时")
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--case", choices=TRACE_CASES, help="仅测量单个场景（内部使用）")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    if args.case:
+        print(json.dumps({"ns_per_call": measure(args.case, args.calls)}))
+        sys.exit(0)
+    results = {"calls": args.calls, "ns_per_call": {
+        "disabled": {case: round(run_case(case, args.calls, False), 1) for case in TRACE_CASES[:2]},
+        "enabled": {case: round(run_case(case, args.calls, True), 1) for case in TRACE_CASES}
+    }}
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
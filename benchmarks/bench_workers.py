@@ -0,0 +1,122 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import difflib
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from data.fundamentals_columnar import ColumnarFundamentals
+from utils.process_stats import memory_usage, mapped_file_usage
+
+INDUSTRIES = ["白酒", "新能源", "半导体", "银行", "医药", "有色金属", "汽车", "房地产", "消费", "科技"]
+
+
+def build_synthetic(path: str, stocks: int, seed: int = 0) -> None:
+    """生成合成基本面数据（用于放大数据量，观察多进程下的内存共享效果）"""
+    rng = random.Random(seed)
+    rows = [{
+        "stock_code": f"sh{600000 + i}" if i % 2 else f"sz{i:06d}",
+        "stock_name": f"公司{i}",
+        "industry_primary": rng.choice(INDUSTRIES),
+        "industry_secondary": f"细分{rng.randrange(200)}",
+        "listing_time": f"{rng.randrange(1990, 2024)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}"
+    } for i in range(stocks)]
+    ColumnarFundamentals.build(rows).save(path)
+    # 刚写入的文件页在回写前是脏页，会被计入各进程的 Private_Dirty，先落盘再测量
+    os.sync()
+
+
+def risk_score(prices: list) -> float:
+    """风险评分的CPU密集部分：收益率波动、EWMA趋势与归一化（与 RiskAssessment 的计算同构）"""
+    import numpy as np
+    prices = np.asarray(prices)
+    returns = np.diff(prices) / prices[:-1]
+    volatility = np.std(returns)
+    alpha5, alpha20 = 2 / 6, 2 / 21
+    ewma5 = ewma20 = prices[0]
+    for price in prices[1:]:
+        ewma5 = alpha5 * price + (1 - alpha5) * ewma5
+        ewma20 = alpha20 * price + (1 - alpha20) * ewma20
+    trend = (ewma5 - ewma20) / ewma20
+    return float(0.5 * np.tanh(volatility / 0.03) + 0.5 / (1 + np.exp(-10 * trend)))
+
+
+def unit_of_work(columnar: ColumnarFundamentals, rng: random.Random, names: list) -> str:
+    """一次请求中的CPU密集部分：代码查询、行业筛选、风险评分、名称模糊匹配与结果格式化"""
+    code = columnar.records["code"][rng.randrange(len(columnar))].decode("ascii")
+    basic = columnar.get(code)
+    peers = columnar.codes(industry_primary=basic["industry_primary"])[:20]
+    prices = [100.0]
+    for _ in range(29):
+        prices.append(prices[-1] * (1 + rng.uniform(-0.05, 0.05)))
+    score = risk_score(prices)
+    query = basic["stock_name"][:-1] + "集团"
+    best = max(names, key=lambda name: difflib.SequenceMatcher(None, query, name).ratio())
+    return (f"股票名：{basic['stock_name']}<br>股票代码：{code}<br>所属行业：{basic['industry_primary']}<br>"
+            f"同业：{len(peers)}家<br>风险评分：{score:.3f}<br>匹配：{best}")
+
+
+def worker(path: str, mmap: bool, ops: int, seed: int, barrier, results) -> None:
+    columnar = ColumnarFundamentals.load(path, mmap=mmap)
+    # 触及全部数据页，使映射页真正驻留内存
+    checksum = int(columnar.records["listing_date"].sum()) + len(columnar.industry_counts())
+    rng = random.Random(seed)
+    names = [str(name) for name in columnar.records["name"][:200]]
+    barrier.wait()
+    started = time.perf_counter()
+    for _ in range(ops):
+        unit_of_work(columnar, rng, names)
+    elapsed = time.perf_counter() - started
+    mapped = sum(item["rss"] for item in mapped_file_usage(path).values())
+    results.put({"elapsed": elapsed, "ops": ops, "checksum": checksum, "mapped_rss_kb": mapped, **memory_usage()})
+
+
+def run(path: str, processes: int, mmap: bool, total_ops: int) -> dict:
+    context = multiprocessing.get_context("spawn")  # 与 uvicorn 多工作进程一致
+    barrier = context.Barrier(processes + 1)
+    results = context.Queue()
+    workers = [context.Process(target=worker, args=(path, mmap, total_ops // processes, i, barrier, results))
+               for i in range(processes)]
+    for process in workers:
+        process.start()
+    barrier.wait()
+    started = time.perf_counter()
+    stats = [results.get() for _ in workers]
+    wall = time.perf_counter() - started
+    for process in workers:
+        process.join()
+    return {
+        "processes": processes,
+        "mmap": mmap,
+        "throughput_ops": round(sum(item["ops"] for item in stats) / wall, 1),
+        "avg_private_dirty_kb": round(sum(item.get("private_dirty", 0) for item in stats) / len(stats)),
+        "avg_pss_kb": round(sum(item.get("pss", 0) for item in stats) / len(stats)),
+        "avg_mapped_rss_kb": round(sum(item["mapped_rss_kb"] for item in stats) / len(stats))
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多工作进程吞吐与内存基准")
+    parser.add_argument("--stocks", type=int, default=300000, help="合成数据规模（股票数）")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--ops", type=int, default=4000, help="每组总操作数（平均分给各进程）")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        build_synthetic(directory, args.stocks)
+        results = {"cpus": multiprocessing.cpu_count(), "stocks": args.stocks, "runs": []}
+        for mmap in (True, False):
+            for processes in args.processes:
+                results["runs"].append(run(directory, processes, mmap, args.ops))
+        base = {run["mmap"]: run["throughput_ops"] for run in results["runs"] if run["processes"] == args.processes[0]}
+        for item in results["runs"]:
+            item["speedup"] = round(item["throughput_ops"] / base[item["mmap"]], 2)
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
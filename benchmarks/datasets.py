@@ -0,0 +1,115 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import random
+from api.market_snapshot import ROTATION_INDUSTRIES
+
+NAME_SYLLABLES = "华中国泰安宁德时代比亚迪茅台隆基阳光恒瑞海天万科格力美的招商平安兴业长江东方南方北方新源科创联信达通"
+RELATIONS = ["供应商", "客户", "供应商的供应商", "客户的客户"]
+SECONDARY_SUFFIXES = ["设备", "材料", "服务", "制造"]
+
+
+def company_code(index: int) -> str:
+    """第 index 家公司的代码（沪深交替，均为合法的A股代码格式）"""
+    if index % 2 == 0:
+        return f"sh{600000 + index // 2}"
+    return f"sz{1 + index // 2:06d}"
+
+
+def generate_universe(companies: int = 300, edges_per_company: int = 6, seed: int = 0,
+                      industries: list = ROTATION_INDUSTRIES) -> dict:
+    """合成股票池与供应链图
+
+    行业与市场快照的行业轮动一致（策略接口能选到龙头）；供应链伙伴偏向同行业，权重在 0.1-1.0 之间。
+    返回 {"companies": {代码: 公司信息}, "edges": {代码: [出边]}, "industries": {行业: [代码]}}。
+    """
+    rng = random.Random(seed)
+    codes = [company_code(i) for i in range(companies)]
+    names, universe = set(), {}
+    for i, code in enumerate(codes):
+        name = "".join(rng.sample(NAME_SYLLABLES, rng.randint(2, 4)))
+        while name in names:
+            name += rng.choice(NAME_SYLLABLES)
+        names.add(name)
+        industry = industries[i % len(industries)]
+        universe[code] = {
+            "code": code,
+            "name": name,
+            "industry_primary": industry,
+            "industry_secondary": industry + rng.choice(SECONDARY_SUFFIXES),
+            "listing_time": f"{rng.randint(1995, 2022)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "market_cap": round(rng.lognormvariate(23, 1.2), 2)
+        }
+    by_industry = {industry: [code for code in codes if universe[code]["industry_primary"] == industry]
+                   for industry in industries}
+    edges = {}
+    for code in codes:
+        peers = by_industry[universe[code]["industry_primary"]]
+        partners = set()
+        while len(partners) < min(edges_per_company, companies - 1):
+            partner = rng.choice(peers) if rng.random() < 0.7 else rng.choice(codes)
+            if partner != code:
+                partners.add(partner)
+        edges[code] = sorted(({
+            "partner_code": partner,
+            "partner_name": universe[partner]["name"],
+            "relation": rng.choice(RELATIONS),
+            "weight": round(rng.uniform(0.1, 1.0), 4)
+        } for partner in partners), key=lambda edge: edge["weight"], reverse=True)
+    return {"companies": universe, "edges": edges, "industries": by_industry}
+
+
+def generate_alias_mapping(universe: dict, seed: int = 0) -> dict:
+    """与 load_alias_mapping 返回格式一致的别名表（每家公司附带截短和错字别名）"""
+    rng = random.Random(seed)
+    mapping = {}
+    for code, company in universe["companies"].items():
+        name = company["name"]
+        typo = list(name)
+        typo[rng.randrange(len(typo))] = rng.choice(NAME_SYLLABLES)
+        aliases = [name[:max(2, len(name) - 1)], "".join(typo)]
+        mapping[code] = {"name": name, "aliases": aliases, "names": [item.lower() for item in [name] + aliases]}
+    return mapping
+
+
+def generate_questions(universe: dict, count: int, seed: int = 0) -> list:
+    """知识问答请求：供应链、行业、个股信息三类问题，附带假大模型应返回的解析结果"""
+    rng = random.Random(seed)
+    codes = list(universe["companies"])
+    questions = []
+    for i in range(count):
+        company = universe["companies"][rng.choice(codes)]
+        kind = i % 3
+        if kind == 0:
+            questions.append({"question": f"查询{company['name']}的供应链",
+                              "parsed": {"intent": "supply_chain", "stock_code": company["code"],
+                                         "stock_name": company["name"], "depth": 2}})
+        elif kind == 1:
+            industry = company["industry_primary"]
+            questions.append({"question": f"{industry}行业有哪些公司",
+                              "parsed": {"intent": "industry", "industry": industry}})
+        else:
+            questions.append({"question": f"{company['code']}的基本信息和实时行情",
+                              "parsed": {"intent": "stock_info", "stock_code": company["code"]}})
+    return questions
+
+
+def generate_users(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [{"username": f"bench_user_{seed}_{i}", "password": f"pw{rng.randrange(10 ** 8):08d}",
+             "initial_funds": 10 ** 9} for i in range(count)]
+
+
+def generate_trades(universe: dict, count: int, seed: int = 0) -> list:
+    """交易请求体（以买入为主，卖出数量不超过同一用户之前的买入量）"""
+    rng = random.Random(seed)
+    codes = list(universe["companies"])
+    return [{"action": "buy" if rng.random() < 0.8 else "sell", "stock_code": rng.choice(codes),
+             "quantity": rng.choice([100, 200, 500, 1000])} for _ in range(count)]
+
+
+def generate_strategy_instructions(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    kinds = ["稳健型", "激进型", "平衡型"]
+    return [f"生成一个{rng.choice(kinds)}投资策略，资金规模{rng.choice([50, 100, 500])}万元" for _ in range(count)]
@@ -0,0 +1 @@
+# 此文件为空，用于标识stubs为一个Python包（基准测试使用的本地假服务）
@@ -0,0 +1,102 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_CONFIG = {
+    "latency": 0.005,  # 单次请求耗时（秒）
+    "jitter": 0.2,  # 耗时的相对抖动
+    "error_ratio": 0.0,  # 返回 HTTP 500 的比例
+    "seed": 0
+}
+
+
+def seeded_quote(secid: str, names: dict, seed: int) -> dict:
+    """按 secid 和种子生成固定的行情字段（价格以分为单位，与东方财富接口一致）；names 中没有的代码返回空数据"""
+    code = ("sh" if secid.startswith("1.") else "sz") + secid[2:]
+    if code not in names:
+        return None
+    rng = random.Random(zlib.crc32(f"{seed}:{secid}".encode()))
+    price = rng.randint(500, 200000)
+    return {
+        "f43": price,
+        "f44": int(price * rng.uniform(0.97, 1.03)),
+        "f45": int(price * rng.uniform(1.0, 1.05)),
+        "f46": int(price * rng.uniform(0.95, 1.0)),
+        "f51": rng.randint(10000, 5000000),
+        "f52": rng.randint(10 ** 6, 10 ** 9),
+        "f58": names[code]
+    }
+
+
+class FakeEastmoneyHandler(BaseHTTPRequestHandler):
+    """/api/qt/stock/get?secid=...：与东方财富实时行情接口相同的返回结构，按配置注入延迟和错误"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        secid = parse_qs(url.query).get("secid", [""])[0]
+        with server.lock:
+            server.stats["requests"] += 1
+            roll = server.rng.random()
+            jitter = server.rng.uniform(-1, 1)
+        config = server.config
+        time.sleep(max(0.0, config["latency"] * (1 + config["jitter"] * jitter)))
+        if roll < config["error_ratio"]:
+            with server.lock:
+                server.stats["errors"] += 1
+            self.respond(500, {"rc": 500, "data": None})
+            return
+        self.respond(200, {"rc": 0, "data": seeded_quote(secid, server.names, config["seed"])})
+
+    def respond(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_eastmoney(names: dict, port: int = 0, **config) -> ThreadingHTTPServer:
+    """在后台线程启动假行情服务（names 为 股票代码 -> 名称），server.url 可直接作为 EASTMONEY_QUOTE_URL"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeEastmoneyHandler)
+    server.daemon_threads = True
+    server.config = {**DEFAULT_CONFIG, **config}
+    server.names = names
+    server.rng = random.Random(server.config["seed"])
+    server.lock = threading.Lock()
+    server.stats = {"requests": 0, "errors": 0}
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/api/qt/stock/get"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    from benchmarks.datasets import generate_universe
+    parser = argparse.ArgumentParser(description="东方财富实时行情接口的本地替身（合成股票池）")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--companies", type=int, default=300)
+    for name, value in DEFAULT_CONFIG.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = vars(parser.parse_args())
+    universe = generate_universe(args.pop("companies"), seed=args["seed"])
+    server = start_fake_eastmoney({code: company["name"] for code, company in universe["companies"].items()}, **args)
+    print(f"fake Eastmoney listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,136 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.prompts import count_message_tokens, count_tokens
+
+DEFAULT_CONFIG = {
+    "latency": 0.05,  # 正常请求耗时（秒）
+    "jitter": 0.2,  # 正常耗时的相对抖动
+    "capacity": 0,  # 服务端处理能力（同时处理的请求数），超出后耗时按过载倍数增长；0为不限
+    "tail_ratio": 0.0,  # 长尾请求比例
+    "tail_latency": 2.0,  # 长尾请求耗时（秒）
+    "error_ratio": 0.0,  # 返回错误的比例
+    "error_status": 503,
+    "retry_after": 0.0,  # 错误响应的 Retry-After 头（秒），0为不发送
+    "fail_first": 0,  # 最先到达的N个请求固定返回错误
+    "seed": 0
+}
+
+
+def default_responder(body: dict) -> str:
+    """默认回复：要求JSON时返回回显对象，否则返回固定文本"""
+    prompt = body["messages"][-1]["content"] if body.get("messages") else ""
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        return json.dumps({"echo": prompt[:50]}, ensure_ascii=False)
+    return "ok"
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """OpenAI 兼容的 /chat/completions 接口，按配置注入延迟、长尾和错误"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.lock:
+            server.stats["requests"] += 1
+            server.active += 1
+            server.stats["max_concurrency"] = max(server.stats["max_concurrency"], server.active)
+            sequence = server.stats["requests"]
+            roll = server.rng.random()
+            jitter = server.rng.uniform(-1, 1)
+            overload = server.active / server.config["capacity"] if server.config["capacity"] else 1
+        try:
+            config = server.config
+            if sequence <= config["fail_first"] or roll < config["error_ratio"]:
+                with server.lock:
+                    server.stats["errors"] += 1
+                headers = {"Retry-After": str(config["retry_after"])} if config["retry_after"] else {}
+                self.respond(config["error_status"], {"error": {"message": "injected error", "type": "server_error"}},
+                             headers)
+                return
+            if roll < config["error_ratio"] + config["tail_ratio"]:
+                with server.lock:
+                    server.stats["tail"] += 1
+                time.sleep(config["tail_latency"])
+            else:
+                time.sleep(max(0.0, config["latency"] * (1 + config["jitter"] * jitter)) * max(1.0, overload))
+            content = server.responder(body)
+            messages = body.get("messages") or []
+            prompt_tokens = count_message_tokens(messages)
+            # 模拟服务端前缀缓存：系统消息与之前的请求完全相同时计为缓存命中
+            system = messages[0]["content"] if messages and messages[0].get("role") == "system" else None
+            with server.lock:
+                cached = count_message_tokens(messages[:1]) if system in server.prefix_cache else 0
+                if system is not None:
+                    server.prefix_cache.add(system)
+            self.respond(200, {
+                "id": f"chatcmpl-fake-{server.stats['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": count_tokens(content),
+                    "total_tokens": prompt_tokens + count_tokens(content),
+                    "prompt_cache_hit_tokens": cached,
+                    "prompt_cache_miss_tokens": prompt_tokens - cached
+                }
+            })
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端已超时断开
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def respond(self, status: int, payload: dict, headers: dict = None) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_llm(port: int = 0, responder=default_responder, **config) -> ThreadingHTTPServer:
+    """在后台线程启动假大模型服务，返回的 server.url 可直接作为 OpenAI 客户端的 base_url"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeLLMHandler)
+    server.daemon_threads = True
+    server.config = {**DEFAULT_CONFIG, **config}
+    server.responder = responder
+    server.rng = random.Random(server.config["seed"])
+    server.lock = threading.Lock()
+    server.active = 0
+    server.prefix_cache = set()
+    server.stats = {"requests": 0, "errors": 0, "tail": 0, "max_concurrency": 0}
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的假大模型服务（注入延迟与错误）")
+    parser.add_argument("--port", type=int, default=8001)
+    for name, value in DEFAULT_CONFIG.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = vars(parser.parse_args())
+    server = start_fake_llm(**args)
+    print(f"fake LLM listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
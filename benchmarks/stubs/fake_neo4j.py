@@ -0,0 +1,127 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+import re
+import threading
+import time
+from agent.strategy_tables import LEADERS_CYPHER, SUPPLY_COUNT_CYPHER
+from knowledge_graph.centrality import EDGES_CYPHER, FINGERPRINT_CYPHER, WRITE_CYPHER
+from knowledge_graph.similarity_index import FEATURES_CYPHER
+from knowledge_graph.traversal import NEIGHBORS_CYPHER, edge_weight
+from utils.replay import RecordedCursor
+
+INDUSTRY_PATTERN = re.compile(r"WHERE c\.industry_primary = '(.*)' RETURN c\.code as code, c\.name as name LIMIT (\d+)$")
+EXISTENCE_PATTERN = re.compile(r"WHERE c\.code = '(.*)' RETURN count\(c\) > 0 as exists$")
+CHAIN_PATTERN = re.compile(r"^MATCH \(c:Company\)-\[r\]->\(n\) WHERE c\.code = '(.*)' RETURN c\.code as company,")
+ALL_INDUSTRIES_CYPHER = "MATCH (c:Company) RETURN DISTINCT c.industry_primary as industry ORDER BY industry"
+
+
+def normalize(cypher: str) -> str:
+    return " ".join(cypher.split())
+
+
+class FakeGraph:
+    """进程内的图数据库替身：按项目中实际使用的查询语句返回合成供应链图上的结果
+
+    通过 knowledge_graph.graph_client.use_graph 接入（未模拟 Bolt 协议）；latency 为每次查询的固定耗时（秒），
+    未识别的查询语句抛出 NotImplementedError，便于发现新增查询尚未覆盖。
+    """
+    def __init__(self, universe: dict, latency: float = 0.002):
+        self.companies = {code: dict(company) for code, company in universe["companies"].items()}
+        self.edges = universe["edges"]
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.stats = {"queries": 0}
+        self.handlers = {normalize(cypher): handler for cypher, handler in (
+            (NEIGHBORS_CYPHER, self.neighbors),
+            (LEADERS_CYPHER, self.leaders),
+            (SUPPLY_COUNT_CYPHER, self.supply_count),
+            (FEATURES_CYPHER, self.features),
+            (EDGES_CYPHER, self.all_edges),
+            (FINGERPRINT_CYPHER, self.fingerprint),
+            (WRITE_CYPHER, self.write_centrality),
+            (ALL_INDUSTRIES_CYPHER, lambda: [{"industry": industry} for industry in
+                                             sorted({c["industry_primary"] for c in self.companies.values()})])
+        )}
+
+    def run(self, cypher: str, parameters: dict = None, **params) -> RecordedCursor:
+        params = {**(parameters or {}), **params}
+        with self.lock:
+            self.stats["queries"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        statement = normalize(cypher)
+        handler = self.handlers.get(statement)
+        if handler is not None:
+            return RecordedCursor(handler(**params))
+        if statement.startswith("CREATE INDEX"):
+            return RecordedCursor([])
+        match = INDUSTRY_PATTERN.search(statement)
+        if match:
+            industry, limit = match.group(1), int(match.group(2))
+            return RecordedCursor([{"code": code, "name": company["name"]} for code, company in self.companies.items()
+                                   if company["industry_primary"] == industry][:limit])
+        match = EXISTENCE_PATTERN.search(statement)
+        if match:
+            return RecordedCursor([{"exists": match.group(1) in self.companies}])
+        match = CHAIN_PATTERN.search(statement)
+        if match:
+            edges = self.edges.get(match.group(1), [])
+            return RecordedCursor([{"company": match.group(1), "relations": ["SUPPLY_CHAIN"],
+                                    "partners": [edge["partner_code"] for edge in edges]}] if edges else [])
+        raise NotImplementedError(f"FakeGraph 未支持的查询: {statement[:120]}")
+
+    def neighbors(self, codes: list, fanout: int) -> list:
+        return [{"code": code, "name": self.companies[code]["name"], "edges": self.edges[code][:fanout]}
+                for code in codes if self.edges.get(code)]
+
+    def leaders(self, industries: list, limit: int) -> list:
+        rows = []
+        for industry in industries:
+            members = [c for c in self.companies.values() if c["industry_primary"] == industry]
+            members.sort(key=lambda c: (c.get("pagerank") or 0.0, c["market_cap"]), reverse=True)
+            rows.extend({
+                "industry": industry, "code": c["code"], "name": c["name"], "market_cap": c["market_cap"],
+                "pagerank": c.get("pagerank"), "weighted_degree": c.get("weighted_degree"),
+                "betweenness": c.get("betweenness"), "supply_degree": c.get("supply_degree")
+            } for c in members[:limit])
+        return rows
+
+    def supply_count(self, codes: list) -> list:
+        rows = []
+        for code in codes:
+            if code not in self.companies:
+                continue
+            first = {edge["partner_code"] for edge in self.edges.get(code, [])}
+            second = {edge["partner_code"] for partner in first for edge in self.edges.get(partner, [])}
+            rows.append({"code": code, "supply_relations": len(first | second)})
+        return rows
+
+    def features(self) -> list:
+        partners = {code: set() for code in self.companies}
+        for code, edges in self.edges.items():
+            for edge in edges:
+                partners[code].add(edge["partner_code"])
+                partners[edge["partner_code"]].add(code)
+        return [{"code": code, "name": c["name"], "industry_primary": c["industry_primary"],
+                 "industry_secondary": c["industry_secondary"], "partners": sorted(partners[code])}
+                for code, c in self.companies.items()]
+
+    def all_edges(self) -> list:
+        return [{"source": code, "target": edge["partner_code"], "weight": edge["weight"]}
+                for code, edges in self.edges.items() for edge in edges]
+
+    def fingerprint(self) -> list:
+        edges = [(code, edge["partner_code"], edge_weight(edge["weight"]))
+                 for code, edges in self.edges.items() for edge in edges]
+        return [{"edges": len(edges), "weight": sum(round(weight * 1000000) for _, _, weight in edges),
+                 "endpoints": sum(hash((source, target)) % 1000000007 for source, target, _ in edges)}]
+
+    def write_centrality(self, rows: list) -> list:
+        with self.lock:
+            for row in rows:
+                company = self.companies.get(row["code"])
+                if company is not None:
+                    company.update({key: row[key] for key in ("weighted_degree", "pagerank", "betweenness", "supply_degree")})
+        return []
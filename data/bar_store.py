@@ -0,0 +1,192 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import csv
+import json
+import os
+import threading
+from data.fundamentals_store import normalize_stock_code
+from utils import snapshot_dir
+from utils.logger import Logger
+
+BAR_STORE_PATH = os.getenv("BAR_STORE_PATH", str(Path(__file__).parent / "bars"))
+BAR_FIELDS = ("open", "high", "low", "close", "volume")
+
+logger = Logger("BarStore")
+
+
+def date_key(value) -> int:
+    """交易日期统一为 YYYYMMDD 整数（兼容 20240102、2024-01-02）"""
+    return int(str(value).replace("-", "")[:8])
+
+
+def to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class BarStore:
+    """本地日线行情（OHLCV）
+
+    每个字段一个 (交易日 × 股票) 的 float64 稠密矩阵 .npy 文件（缺失为NaN），股票按代码排序、日期升序。
+    与列式基本面数据相同，以只读 mmap 方式加载，多个进程共享同一份物理内存页；每次保存写入新的版本子目录。
+    """
+    def __init__(self, codes, dates, fields: dict):
+        self.codes = codes  # S8 字节串数组，已排序
+        self.dates = dates  # YYYYMMDD 整数数组，升序
+        self.fields = fields
+
+    @classmethod
+    def build(cls, rows) -> "BarStore":
+        """由日线记录（含 stock_code、trade_date 和 OHLCV 字段的字典）构建，同一股票同一日期以最后一条为准"""
+        import numpy as np
+        bars = {}
+        for row in rows:
+            code = normalize_stock_code(row.get("stock_code"))
+            if code:
+                bars[(code, date_key(row["trade_date"]))] = row
+        codes = sorted({code for code, _ in bars})
+        dates = sorted({date for _, date in bars})
+        code_index = {code: j for j, code in enumerate(codes)}
+        date_index = {date: i for i, date in enumerate(dates)}
+        rows_at = np.fromiter((date_index[date] for _, date in bars), dtype=np.int64, count=len(bars))
+        columns_at = np.fromiter((code_index[code] for code, _ in bars), dtype=np.int64, count=len(bars))
+        fields = {}
+        for field in BAR_FIELDS:
+            matrix = np.full((len(dates), len(codes)), np.nan)
+            matrix[rows_at, columns_at] = [to_float(row.get(field)) for row in bars.values()]
+            fields[field] = matrix
+        return cls(np.array([code.encode("ascii") for code in codes], dtype="S8"), np.array(dates, dtype=np.int32), fields)
+
+    @classmethod
+    def build_from_csv(cls, path: str) -> "BarStore":
+        """由CSV文件构建（表头：stock_code,trade_date,open,high,low,close,volume）"""
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            return cls.build(csv.DictReader(f))
+
+    @classmethod
+    def build_from_fetcher(cls, codes: list, days: int, fetcher=None) -> "BarStore":
+        """逐只股票调用行情接口的历史数据构建（StockDataFetcher.get_stock_history 的返回格式）"""
+        if fetcher is None:
+            from data.web_data import StockDataFetcher
+            fetcher = StockDataFetcher()
+        rows = []
+        for code in codes:
+            for bar in fetcher.get_stock_history(code, days=days) or []:
+                rows.append({"stock_code": code, **bar})
+        return cls.build(rows)
+
+    def save(self, path: str = BAR_STORE_PATH) -> None:
+        """写入新的版本子目录后原子切换 CURRENT 指针（各矩阵同时生效，正在读取的进程仍使用已映射的旧版本）"""
+        import numpy as np
+        os.makedirs(path, exist_ok=True)
+        version = snapshot_dir.new_version(path)
+        for name, array in {"codes": self.codes, "dates": self.dates, **self.fields}.items():
+            np.save(os.path.join(version, f"{name}.npy"), array)
+        with open(os.path.join(version, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"stocks": int(len(self.codes)), "days": int(len(self.dates)),
+                       "first_date": int(self.dates[0]) if len(self.dates) else None,
+                       "last_date": int(self.dates[-1]) if len(self.dates) else None}, f)
+        snapshot_dir.publish(path, version)
+
+    @classmethod
+    def load(cls, path: str = BAR_STORE_PATH, mmap: bool = True) -> "BarStore":
+        import numpy as np
+        mode = "r" if mmap else None
+        directory = snapshot_dir.current(path)
+        return cls(np.load(os.path.join(directory, "codes.npy"), mmap_mode=mode),
+                   np.load(os.path.join(directory, "dates.npy"), mmap_mode=mode),
+                   {field: np.load(os.path.join(directory, f"{field}.npy"), mmap_mode=mode) for field in BAR_FIELDS})
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def indices(self, codes: list):
+        """股票代码对应的列号数组（二分查找），未收录的为-1"""
+        import numpy as np
+        keys = np.array([(normalize_stock_code(code) or "").encode("ascii") for code in codes], dtype="S8")
+        positions = np.clip(np.searchsorted(self.codes, keys), 0, max(len(self.codes) - 1, 0))
+        found = (self.codes[positions] == keys) if len(self.codes) else np.zeros(len(keys), dtype=bool)
+        return np.where(found, positions, -1)
+
+    def code_list(self) -> list:
+        return [code.decode("ascii") for code in self.codes]
+
+    def window(self, field: str, days: int):
+        """最近 days 个交易日的字段矩阵（只读视图）"""
+        return self.fields[field][-days:]
+
+    def latest_close(self):
+        """各股票最近一个有数据的交易日收盘价（从未有数据的为NaN）"""
+        import numpy as np
+        import pandas as pd
+        if not len(self.dates):
+            return np.full(len(self.codes), np.nan)
+        return pd.DataFrame(self.fields["close"]).ffill().to_numpy()[-1]
+
+    def returns(self, days: int):
+        """最近 days 个交易日的简单日收益率矩阵（days × 股票），停牌或缺失日计为0"""
+        import numpy as np
+        import pandas as pd
+        closes = pd.DataFrame(self.fields["close"][-(days + 1):]).ffill().to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = closes[1:] / closes[:-1] - 1.0
+        return np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+    def history(self, stock_code: str, days: int = 30) -> list:
+        """单只股票最近 days 个交易日的日线（与 StockDataFetcher.get_stock_history 格式一致），未收录时返回空列表"""
+        import numpy as np
+        j = int(self.indices([stock_code])[0])
+        if j < 0:
+            return []
+        start = max(len(self.dates) - days, 0)
+        columns = {field: self.fields[field][start:, j] for field in BAR_FIELDS}
+        return [{"trade_date": str(int(self.dates[start + i])),
+                 **{field: float(columns[field][i]) for field in BAR_FIELDS}}
+                for i in range(len(self.dates) - start) if not np.isnan(columns["close"][i])]
+
+
+_store = None
+_store_mtime = None
+_lock = threading.Lock()
+
+
+def get_bar_store(path: str = BAR_STORE_PATH):
+    """进程内共享的日线行情（mmap 只读），文件更新后自动重新加载；尚未构建时返回None"""
+    global _store, _store_mtime
+    mtime = snapshot_dir.version_token(path, "meta.json")
+    if mtime is None:
+        return None
+    if _store is None or mtime != _store_mtime:
+        with _lock:
+            if _store is None or mtime != _store_mtime:
+                _store = BarStore.load(path)
+                _store_mtime = mtime
+                logger.info(f"加载日线行情: {len(_store)}只股票，{len(_store.dates)}个交易日")
+    return _store
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="本地日线行情存储")
+    parser.add_argument("command", choices=["build", "query"])
+    parser.add_argument("--csv", help="从CSV文件构建（stock_code,trade_date,open,high,low,close,volume）")
+    parser.add_argument("--days", type=int, default=250, help="不指定CSV时，从行情接口获取的交易日数")
+    parser.add_argument("--code", default="sh600519")
+    args = parser.parse_args()
+    if args.command == "build":
+        if args.csv:
+            store = BarStore.build_from_csv(args.csv)
+        else:
+            from data.fundamentals_columnar import get_columnar_fundamentals
+            columnar = get_columnar_fundamentals()
+            if columnar is None:
+                raise SystemExit("列式基本面数据尚未构建，请先运行 python -m data.fundamentals_columnar build")
+            store = BarStore.build_from_fetcher(columnar.codes(), args.days)
+        store.save()
+        logger.info(f"日线行情构建完成: {len(store)}只股票，{len(store.dates)}个交易日 -> {BAR_STORE_PATH}")
+    else:
+        print(json.dumps(get_bar_store().history(args.code, 10), ensure_ascii=False, indent=2))
@@ -0,0 +1,248 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import json
+import os
+import threading
+from data.fundamentals_store import normalize_stock_code
+from utils import snapshot_dir
+from utils.logger import Logger
+
+FUNDAMENTALS_COLUMNAR_PATH = os.getenv("FUNDAMENTALS_COLUMNAR_PATH", str(Path(__file__).parent / "fundamentals_columnar"))
+NAME_WIDTH = 16  # 股票名称定长字符数（超长截断）
+UNKNOWN_DATE = 0
+
+logger = Logger("ColumnarFundamentals")
+
+
+def record_dtype():
+    """定长结构化记录：代码为ASCII字节，名称为定长Unicode，行业为分类编码，上市日期为YYYYMMDD整数"""
+    import numpy as np
+    return np.dtype([
+        ("code", "S8"),
+        ("name", f"U{NAME_WIDTH}"),
+        ("industry_primary", "<i2"),
+        ("industry_secondary", "<i2"),
+        ("listing_date", "<i4")
+    ])
+
+
+def date_to_int(value: str) -> int:
+    """YYYY-MM-DD 转为 YYYYMMDD 整数，未知日期为0"""
+    digits = (value or "").replace("-", "")
+    return int(digits) if len(digits) == 8 and digits.isdigit() else UNKNOWN_DATE
+
+
+class ColumnarFundamentals:
+    """列式基本面数据
+
+    由基本面数据存储构建的只读二进制副本：一个按股票代码排序的 .npy 结构化数组（通过 mmap 加载，
+    多个工作进程共享同一份物理内存页）和一个记录行业分类表的 JSON 文件，两者写在同一个版本子目录中。
+    代码查询使用二分查找，行业筛选为向量化比较。
+    """
+    def __init__(self, records, industries_primary: list, industries_secondary: list, source_version: float = 0):
+        self.records = records
+        self.source_version = source_version  # 构建时数据存储的最近写入时间
+        self.industries_primary = industries_primary
+        self.industries_secondary = industries_secondary
+        self.primary_ids = {name: i for i, name in enumerate(industries_primary)}
+        self.secondary_ids = {name: i for i, name in enumerate(industries_secondary)}
+
+    @classmethod
+    def build(cls, rows: list, source_version: float = 0) -> "ColumnarFundamentals":
+        """由基本面记录列表构建（行业字符串驻留为分类编码）"""
+        import numpy as np
+        industries_primary = sorted({row.get("industry_primary") or "未知" for row in rows})
+        industries_secondary = sorted({row.get("industry_secondary") or "未知" for row in rows})
+        primary_ids = {name: i for i, name in enumerate(industries_primary)}
+        secondary_ids = {name: i for i, name in enumerate(industries_secondary)}
+        normalized = {}
+        for row in rows:
+            code = normalize_stock_code(row.get("stock_code"))
+            if code:
+                normalized[code] = row
+        records = np.zeros(len(normalized), dtype=record_dtype())
+        for i, code in enumerate(sorted(normalized)):
+            row = normalized[code]
+            records[i] = (
+                code.encode("ascii"),
+                (row.get("stock_name") or "")[:NAME_WIDTH],
+                primary_ids[row.get("industry_primary") or "未知"],
+                secondary_ids[row.get("industry_secondary") or "未知"],
+                date_to_int(row.get("listing_time"))
+            )
+        return cls(records, industries_primary, industries_secondary, source_version)
+
+    @classmethod
+    def build_from_store(cls, store=None) -> "ColumnarFundamentals":
+        """由基本面数据存储（SQLite）构建"""
+        if store is None:
+            from data.fundamentals_store import get_fundamentals_store
+            store = get_fundamentals_store()
+        return cls.build(store.all(), store.last_updated())
+
+    def save(self, path: str = FUNDAMENTALS_COLUMNAR_PATH) -> None:
+        """写入新的版本子目录后原子切换 CURRENT 指针（记录与行业表同时生效，正在读取的进程不受影响）"""
+        import numpy as np
+        os.makedirs(path, exist_ok=True)
+        version = snapshot_dir.new_version(path)
+        np.save(os.path.join(version, "records.npy"), self.records)
+        with open(os.path.join(version, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "count": int(len(self.records)),
+                "source_version": self.source_version,
+                "industries_primary": self.industries_primary,
+                "industries_secondary": self.industries_secondary
+            }, f, ensure_ascii=False)
+        snapshot_dir.publish(path, version)
+
+    @classmethod
+    def load(cls, path: str = FUNDAMENTALS_COLUMNAR_PATH, mmap: bool = True) -> "ColumnarFundamentals":
+        """加载当前版本；mmap=True 时以只读内存映射方式打开，不复制数据"""
+        import numpy as np
+        directory = snapshot_dir.current(path)
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        records = np.load(os.path.join(directory, "records.npy"), mmap_mode="r" if mmap else None)
+        return cls(records, meta["industries_primary"], meta["industries_secondary"], meta.get("source_version", 0))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def index_of(self, stock_code: str) -> int:
+        """按股票代码二分查找行号，未找到时返回-1"""
+        import numpy as np
+        code = normalize_stock_code(stock_code)
+        if not code:
+            return -1
+        key = code.encode("ascii")
+        i = int(np.searchsorted(self.records["code"], key))
+        return i if i < len(self.records) and self.records["code"][i] == key else -1
+
+    def row(self, i: int) -> dict:
+        record = self.records[i]
+        date = int(record["listing_date"])
+        return {
+            "stock_code": record["code"].decode("ascii"),
+            "stock_name": str(record["name"]),
+            "industry_primary": self.industries_primary[record["industry_primary"]],
+            "industry_secondary": self.industries_secondary[record["industry_secondary"]],
+            "listing_time": f"{date // 10000:04d}-{date // 100 % 100:02d}-{date % 100:02d}" if date else "未知"
+        }
+
+    def get(self, stock_code: str) -> dict:
+        """按股票代码查询，未找到时返回None"""
+        i = self.index_of(stock_code)
+        return self.row(i) if i >= 0 else None
+
+    def mask(self, industry_primary: str = None, industry_secondary: str = None,
+             listed_before: str = None, listed_after: str = None):
+        """按条件生成布尔掩码（向量化比较），不存在的行业返回全False"""
+        import numpy as np
+        mask = np.ones(len(self.records), dtype=bool)
+        if industry_primary is not None:
+            mask &= self.records["industry_primary"] == self.primary_ids.get(industry_primary, -1)
+        if industry_secondary is not None:
+            mask &= self.records["industry_secondary"] == self.secondary_ids.get(industry_secondary, -1)
+        dates = self.records["listing_date"]
+        if listed_before is not None:
+            mask &= (dates != UNKNOWN_DATE) & (dates < date_to_int(listed_before))
+        if listed_after is not None:
+            mask &= dates >= date_to_int(listed_after)
+        return mask
+
+    def codes(self, **conditions) -> list:
+        """满足条件的股票代码列表"""
+        return [code.decode("ascii") for code in self.records["code"][self.mask(**conditions)]]
+
+    def find_by_industry(self, industry: str, limit: int = 100) -> list:
+        """按一级行业查询"""
+        import numpy as np
+        return [self.row(int(i)) for i in np.flatnonzero(self.mask(industry_primary=industry))[:limit]]
+
+    def industry_counts(self) -> dict:
+        """各一级行业的股票数量"""
+        import numpy as np
+        counts = np.bincount(self.records["industry_primary"], minlength=len(self.industries_primary))
+        return {name: int(counts[i]) for i, name in enumerate(self.industries_primary)}
+
+
+_columnar = None
+_columnar_mtime = None
+_lock = threading.Lock()
+
+
+def get_columnar_fundamentals(path: str = FUNDAMENTALS_COLUMNAR_PATH):
+    """进程内共享的列式基本面数据（mmap 只读），文件更新后自动重新加载；尚未构建时返回None"""
+    global _columnar, _columnar_mtime
+    mtime = snapshot_dir.version_token(path, "records.npy")
+    if mtime is None:
+        return None
+    if _columnar is None or mtime != _columnar_mtime:
+        with _lock:
+            if _columnar is None or mtime != _columnar_mtime:
+                _columnar = ColumnarFundamentals.load(path)
+                _columnar_mtime = mtime
+                logger.info(f"加载列式基本面数据: {len(_columnar)}只股票")
+    return _columnar
+
+
+def bench(path: str = FUNDAMENTALS_COLUMNAR_PATH, repeat: int = 200) -> dict:
+    """对比 CSV（pandas，GBK解码）、SQLite 存储与 mmap 列式数据的加载和查询耗时（毫秒）"""
+    import time
+    import pandas as pd
+    from data.fundamentals_store import FUNDAMENTALS_CSV_PATH, get_fundamentals_store
+
+    def timed(func, n: int = repeat) -> float:
+        started = time.perf_counter()
+        for _ in range(n):
+            result = func()
+        timed.result = result
+        return round((time.perf_counter() - started) / n * 1000, 4)
+
+    store = get_fundamentals_store()
+    columnar = ColumnarFundamentals.load(path)
+    sample_code = columnar.row(len(columnar) // 2)["stock_code"]
+    industry = max(columnar.industry_counts().items(), key=lambda item: item[1])[0]
+    csv_load = lambda: pd.read_csv(FUNDAMENTALS_CSV_PATH, encoding="gbk", dtype={"stock_code": str})
+    df = csv_load()
+    df.columns = ["stock_code", "stock_name", "industry_secondary", "listing_time", "industry_primary"]
+    return {
+        "stocks": len(columnar),
+        "load_ms": {
+            "csv_pandas": timed(csv_load, 20),
+            "sqlite_all": timed(store.all, 20),
+            "columnar_mmap": timed(lambda: ColumnarFundamentals.load(path)),
+            "columnar_copy": timed(lambda: ColumnarFundamentals.load(path, mmap=False))
+        },
+        "lookup_ms": {
+            "csv_dataframe": timed(lambda: df[df["stock_code"] == sample_code[2:]]),
+            "sqlite": timed(lambda: store.get(sample_code)),
+            "columnar": timed(lambda: columnar.get(sample_code))
+        },
+        "industry_filter_ms": {
+            "csv_dataframe": timed(lambda: df[df["industry_primary"] == industry]),
+            "sqlite": timed(lambda: store.find_by_industry(industry)),
+            "columnar": timed(lambda: columnar.codes(industry_primary=industry))
+        }
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="列式基本面数据")
+    parser.add_argument("command", choices=["build", "bench", "query"])
+    parser.add_argument("--code", default="sh600519")
+    parser.add_argument("--industry")
+    args = parser.parse_args()
+    if args.command == "build":
+        columnar = ColumnarFundamentals.build_from_store()
+        columnar.save()
+        logger.info(f"列式基本面数据构建完成: {len(columnar)}只股票，"
+                    f"{len(columnar.industries_primary)}个一级行业 -> {FUNDAMENTALS_COLUMNAR_PATH}")
+    elif args.command == "bench":
+        print(json.dumps(bench(), ensure_ascii=False, indent=2))
+    else:
+        columnar = get_columnar_fundamentals()
+        print(columnar.find_by_industry(args.industry) if args.industry else columnar.get(args.code))
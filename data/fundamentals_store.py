@@ -0,0 +1,235 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import csv
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from utils.logger import Logger
+from utils.metrics import TimedConnection
+
+FUNDAMENTALS_DB_PATH = os.getenv("FUNDAMENTALS_DB_PATH", str(Path(__file__).parent / "fundamentals.db"))
+FUNDAMENTALS_CSV_PATH = str(Path(__file__).parent / "stock_industry_data.csv")  # 迁移前的基本面数据文件
+
+FIELDS = ("stock_code", "stock_name", "industry_primary", "industry_secondary", "listing_time", "source")
+
+# CSV 表头与字段的对应关系（历史文件表头为 primary_industry，也兼容 industry_primary）
+CSV_HEADER_ALIASES = {
+    "stock_code": "stock_code",
+    "stock code": "stock_code",
+    "stock_name": "stock_name",
+    "industry_secondary": "industry_secondary",
+    "listing_time": "listing_time",
+    "listing time": "listing_time",
+    "primary_industry": "industry_primary",
+    "industry_primary": "industry_primary"
+}
+
+
+def normalize_stock_code(symbol: str) -> str:
+    """统一股票代码格式为 sh/sz+6位数字（如 600519 -> sh600519，002594.sz -> sz002594），无法识别时返回None"""
+    if not isinstance(symbol, str):
+        return None
+    symbol = symbol.strip().lower()
+    match = re.fullmatch(r"(\d{6})\.(sh|sz)", symbol)
+    if match:
+        return f"{match.group(2)}{match.group(1)}"
+    if re.fullmatch(r"(sh|sz)\d{6}", symbol):
+        return symbol
+    if len(symbol) >= 6 and symbol[-6:].isdigit():
+        code = symbol[-6:]
+        if code.startswith(('0', '3')):
+            return f"sz{code}"
+        if code.startswith('6'):
+            return f"sh{code}"
+    return None
+
+
+def normalize_listing_time(value: str) -> str:
+    """上市时间统一为 YYYY-MM-DD（如 1996/5/31 -> 1996-05-31），无法解析时原样返回"""
+    match = re.fullmatch(r"(\d{4})[/-](\d{1,2})[/-](\d{1,2})", (value or "").strip())
+    if not match:
+        return (value or "").strip() or "未知"
+    year, month, day = match.groups()
+    return f"{year}-{int(month):02d}-{int(day):02d}"
+
+
+class FundamentalsStore:
+    """股票基本面数据存储（SQLite）
+
+    以规范化的股票代码为主键，写入采用 upsert 语义，重复写入同一股票只保留最新一条；
+    WAL 模式下多线程、多进程可并发读写。首次使用时自动从历史CSV迁移一次。
+    """
+    def __init__(self, path: str = FUNDAMENTALS_DB_PATH):
+        self.logger = Logger("FundamentalsStore")
+        self.path = path
+        self.create_tables()
+
+    @contextmanager
+    def connect(self):
+        """每次操作使用独立连接（自动提交模式），可跨线程、跨进程使用"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, factory=TimedConnection)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def create_tables(self) -> None:
+        with self.connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fundamentals (
+                    stock_code TEXT PRIMARY KEY,
+                    stock_name TEXT NOT NULL,
+                    industry_primary TEXT,
+                    industry_secondary TEXT,
+                    listing_time TEXT,
+                    source TEXT,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS fundamentals_industry ON fundamentals (industry_primary)")
+            conn.execute("CREATE INDEX IF NOT EXISTS fundamentals_name ON fundamentals (stock_name)")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS migrations (
+                    name TEXT PRIMARY KEY,
+                    applied_at REAL NOT NULL
+                )
+            ''')
+
+    def _row(self, record: dict) -> tuple:
+        stock_code = normalize_stock_code(record.get("stock_code"))
+        if not stock_code:
+            raise ValueError(f"无效股票代码: {record.get('stock_code')}")
+        return (
+            stock_code,
+            (record.get("stock_name") or record.get("name") or "").strip(),
+            (record.get("industry_primary") or "未知").strip(),
+            (record.get("industry_secondary") or "未知").strip(),
+            normalize_listing_time(record.get("listing_time")),
+            record.get("source") or "local",
+            time.time()
+        )
+
+    def upsert_many(self, records: list) -> int:
+        """批量写入（按股票代码覆盖已有记录），返回写入条数"""
+        rows = [self._row(record) for record in records]
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany('''
+                    INSERT INTO fundamentals (stock_code, stock_name, industry_primary, industry_secondary,
+                                              listing_time, source, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(stock_code) DO UPDATE SET
+                        stock_name = excluded.stock_name,
+                        industry_primary = excluded.industry_primary,
+                        industry_secondary = excluded.industry_secondary,
+                        listing_time = excluded.listing_time,
+                        source = excluded.source,
+                        updated_at = excluded.updated_at
+                ''', rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def upsert(self, record: dict) -> None:
+        """写入单只股票的基本面数据"""
+        self.upsert_many([record])
+
+    def get(self, stock_code: str) -> dict:
+        """按股票代码查询（任意常见代码格式），未找到时返回None"""
+        stock_code = normalize_stock_code(stock_code)
+        if not stock_code:
+            return None
+        with self.connect() as conn:
+            row = conn.execute("SELECT * FROM fundamentals WHERE stock_code = ?", (stock_code,)).fetchone()
+        return dict(row) if row else None
+
+    def find_by_industry(self, industry: str, limit: int = 100) -> list:
+        """按一级行业查询"""
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM fundamentals WHERE industry_primary = ? ORDER BY stock_code LIMIT ?",
+                (industry, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def all(self) -> list:
+        """全部基本面数据（按股票代码排序）"""
+        with self.connect() as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM fundamentals ORDER BY stock_code")]
+
+    def count(self) -> int:
+        with self.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM fundamentals").fetchone()[0]
+
+    def last_updated(self) -> float:
+        """最近一次写入时间（用于判断列式副本是否过期），空表返回0"""
+        with self.connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(updated_at), 0) FROM fundamentals").fetchone()[0]
+
+    def migrate_csv(self, csv_path: str = FUNDAMENTALS_CSV_PATH, encoding: str = "gbk") -> int:
+        """从历史CSV一次性迁移数据（已迁移过的文件直接跳过），返回迁移条数"""
+        name = f"csv:{Path(csv_path).name}"
+        with self.connect() as conn:
+            if conn.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone():
+                return 0
+        if not os.path.exists(csv_path):
+            self.logger.warning(f"未找到待迁移的CSV文件：{csv_path}")
+            return 0
+        records = {}
+        skipped = 0
+        with open(csv_path, encoding=encoding, newline="") as f:
+            reader = csv.reader(f)
+            header = [CSV_HEADER_ALIASES.get(column.strip().lower(), column.strip()) for column in next(reader, [])]
+            for values in reader:
+                record = dict(zip(header, (value.strip() for value in values)))
+                stock_code = normalize_stock_code(record.get("stock_code"))
+                if not stock_code or not record.get("stock_name"):
+                    skipped += 1
+                    continue
+                # 历史文件中同一股票可能被追加多次，保留最后一条
+                records[stock_code] = {**record, "stock_code": stock_code, "source": "local_csv"}
+        count = self.upsert_many(list(records.values()))
+        with self.connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO migrations (name, applied_at) VALUES (?, ?)", (name, time.time()))
+        self.logger.info(f"CSV迁移完成：{csv_path}，写入{count}条，跳过{skipped}条无效记录")
+        return count
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_fundamentals_store() -> FundamentalsStore:
+    """进程内共享的基本面数据存储（首次使用时迁移历史CSV）"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = FundamentalsStore()
+                store.migrate_csv()
+                _store = store
+    return _store
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="股票基本面数据存储")
+    parser.add_argument("--migrate", metavar="CSV", nargs="?", const=FUNDAMENTALS_CSV_PATH, help="从CSV迁移数据")
+    parser.add_argument("--get", metavar="CODE", help="按股票代码查询")
+    args = parser.parse_args()
+    store = FundamentalsStore()
+    if args.migrate:
+        print(f"迁移 {store.migrate_csv(args.migrate)} 条")
+    if args.get:
+        print(store.get(args.get))
+    print(f"共 {store.count()} 只股票")
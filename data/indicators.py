@@ -0,0 +1,450 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from data.bar_store import date_key, get_bar_store
+from data.fundamentals_store import normalize_stock_code
+from data.portfolio_analytics import trade_day
+from utils.logger import Logger
+
+INDICATOR_WINDOW = int(os.getenv("INDICATOR_WINDOW", "20"))  # 均线、布林带和收益率波动率的窗口
+INDICATOR_EMA_SPANS = tuple(int(span) for span in os.getenv("INDICATOR_EMA_SPANS", "5,20").split(","))  # 额外输出的EMA周期（风险评分使用5和20）
+INDICATOR_WARMUP_DAYS = int(os.getenv("INDICATOR_WARMUP_DAYS", "60"))  # 增量状态初始化时读取的历史交易日数
+INDICATOR_CACHE_SIZE = int(os.getenv("INDICATOR_CACHE_SIZE", "2000"))  # 进程内保留增量状态的股票数
+INDICATOR_STATE_TTL = float(os.getenv("INDICATOR_STATE_TTL", "3600"))  # 增量状态按最新历史重新初始化的间隔（秒）
+RSI_PERIOD, ATR_PERIOD, BOLLINGER_K, MOMENTUM_DAYS = 14, 14, 2.0, 20
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+
+NAN = float("nan")
+logger = Logger("Indicators")
+
+
+# ========== 批量计算：输入为 (交易日 × 股票) 矩阵或一维序列，按时间方向计算，各股票之间向量化 ==========
+
+def _matrix(values):
+    """统一为 (交易日 × 股票) 的 float64 矩阵"""
+    import numpy as np
+    values = np.asarray(values, dtype=np.float64)
+    return values.reshape(len(values), -1)
+
+
+def _like(result, values):
+    return result[:, 0] if getattr(values, "ndim", 1) == 1 else result
+
+
+def _shift(matrix, periods: int = 1):
+    import numpy as np
+    shifted = np.full_like(matrix, np.nan)
+    shifted[periods:] = matrix[:-periods]
+    return shifted
+
+
+def _rolling_sums(matrix, window: int) -> tuple:
+    """滑动窗口内的 (和, 平方和)；窗口内有NaN或不足 window 行时为NaN。先减去各列均值，减小平方和相减的误差"""
+    import numpy as np
+    with np.errstate(invalid="ignore"):
+        centered = matrix - np.nanmean(matrix, axis=0) if len(matrix) else matrix
+    missing = np.isnan(centered)
+    filled = np.where(missing, 0.0, centered)
+
+    def windowed(x):
+        total = np.cumsum(np.vstack([np.zeros((1, x.shape[1])), x]), axis=0)
+        out = np.full(x.shape, np.nan)
+        out[window - 1:] = total[window:] - total[:-window]
+        return out
+
+    valid = windowed(missing.astype(np.float64)) == 0
+    return (np.where(valid, windowed(filled), np.nan), np.where(valid, windowed(filled * filled), np.nan),
+            matrix - centered)
+
+
+def sma(values, window: int = INDICATOR_WINDOW):
+    total, _, offset = _rolling_sums(_matrix(values), window)
+    return _like(total / window + offset, values)
+
+
+def rolling_std(values, window: int = INDICATOR_WINDOW):
+    """滑动窗口总体标准差（ddof=0）"""
+    import numpy as np
+    total, squares, _ = _rolling_sums(_matrix(values), window)
+    mean = total / window
+    return _like(np.sqrt(np.maximum(squares / window - mean * mean, 0.0)), values)
+
+
+def _ewm(matrix, alpha: float, adjust: bool = False, min_periods: int = 1):
+    """按时间递推、各股票向量化的指数加权平均；NaN 视为缺失，不更新状态"""
+    import numpy as np
+    decay = 1.0 - alpha
+    numerator, denominator = np.zeros(matrix.shape[1]), np.zeros(matrix.shape[1])
+    count = np.zeros(matrix.shape[1], dtype=np.int64)
+    out = np.full(matrix.shape, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for t in range(len(matrix)):
+            x = matrix[t]
+            valid = ~np.isnan(x)
+            first = valid & (count == 0)
+            if adjust:
+                numerator = np.where(valid, decay * numerator + x, numerator)
+                denominator = np.where(valid, decay * denominator + 1.0, denominator)
+            else:
+                numerator = np.where(valid, decay * numerator + alpha * x, numerator)
+                denominator = np.where(valid, 1.0, denominator)
+            numerator[first], denominator[first] = x[first], 1.0
+            count += valid
+            out[t] = np.where(count >= min_periods, numerator / denominator, np.nan)
+    return out
+
+
+def ema(values, span: int = None, alpha: float = None, adjust: bool = False, min_periods: int = 1):
+    """指数移动平均（与 pandas ewm 的定义一致，adjust=True 为按权重归一化的版本）"""
+    alpha = alpha if alpha is not None else 2.0 / (span + 1)
+    return _like(_ewm(_matrix(values), alpha, adjust, min_periods), values)
+
+
+def _pct_change(matrix, periods: int = 1):
+    import numpy as np
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return matrix / _shift(matrix, periods) - 1.0
+
+
+def simple_returns(close):
+    """简单收益率，首行为NaN"""
+    return _like(_pct_change(_matrix(close)), close)
+
+
+def volatility(close, window: int = INDICATOR_WINDOW):
+    """最近 window 个日收益率的标准差（ddof=0）"""
+    return rolling_std(simple_returns(close), window)
+
+
+def momentum(close, days: int = MOMENTUM_DAYS):
+    """相对 days 个交易日前收盘价的涨跌幅"""
+    return _like(_pct_change(_matrix(close), days), close)
+
+
+def rsi(close, period: int = RSI_PERIOD):
+    """相对强弱指数（Wilder 平滑，alpha=1/period）"""
+    import numpy as np
+    matrix = _matrix(close)
+    delta = matrix - _shift(matrix)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gain = _ewm(np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0)), 1.0 / period, min_periods=period)
+        loss = _ewm(np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0)), 1.0 / period, min_periods=period)
+        return _like(100.0 - 100.0 / (1.0 + gain / loss), close)
+
+
+def macd(close, fast: int = MACD_FAST, slow: int = MACD_SLOW, signal: int = MACD_SIGNAL) -> tuple:
+    """(MACD线, 信号线, 柱)；MACD线在 slow 个交易日后、信号线在再 signal-1 个交易日后才有值"""
+    import numpy as np
+    matrix = _matrix(close)
+    line = _ewm(matrix, 2.0 / (fast + 1)) - _ewm(matrix, 2.0 / (slow + 1))
+    signal_line = _ewm(line, 2.0 / (signal + 1))
+    line[:slow - 1] = np.nan
+    signal_line[:slow + signal - 2] = np.nan
+    return _like(line, close), _like(signal_line, close), _like(line - signal_line, close)
+
+
+def atr(high, low, close, period: int = ATR_PERIOD):
+    """平均真实波幅（Wilder 平滑），首个交易日的真实波幅为最高价减最低价"""
+    import numpy as np
+    high, low, previous = _matrix(high), _matrix(low), _shift(_matrix(close))
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+    return _like(_ewm(true_range, 1.0 / period, min_periods=period), close)
+
+
+def bollinger(close, window: int = INDICATOR_WINDOW, k: float = BOLLINGER_K) -> tuple:
+    """(中轨, 上轨, 下轨, 标准差)"""
+    middle, std = sma(close, window), rolling_std(close, window)
+    return middle, middle + k * std, middle - k * std, std
+
+
+def compute(high, low, close, ema_spans: tuple = INDICATOR_EMA_SPANS) -> dict:
+    """全部指标（与 IndicatorState.snapshot 的键一致），各值与输入形状相同"""
+    line, signal_line, histogram = macd(close)
+    middle, upper, lower, std = bollinger(close)
+    return {
+        "close": close, "sma": middle, "boll_upper": upper, "boll_lower": lower, "boll_std": std,
+        **{f"ema{span}": ema(close, span=span) for span in ema_spans},
+        "rsi": rsi(close), "macd": line, "macd_signal": signal_line, "macd_hist": histogram,
+        "atr": atr(high, low, close), "volatility": volatility(close), "momentum": momentum(close)
+    }
+
+
+def latest(bars, days: int = INDICATOR_WARMUP_DAYS) -> dict:
+    """本地日线行情中全部股票的最新指标（每个值为长度为股票数的数组）
+
+    只用最近 days 个交易日计算；停牌日按前一交易日价格填充，从未有数据的股票为NaN。
+    """
+    import pandas as pd
+    high, low, close = (pd.DataFrame(bars.fields[field][-days:]).ffill().to_numpy() for field in ("high", "low", "close"))
+    return {name: values[-1] for name, values in compute(high, low, close).items()} if len(close) else {}
+
+
+# ========== 增量计算：每根新K线 O(1) 更新；commit=False 时只计算加入该K线后的值，不改变状态 ==========
+
+class RollingWindow:
+    """定长滑动窗口的均值和总体标准差：环形缓冲区加累计和、平方和，每绕一圈按缓冲区重新求和以消除累积误差"""
+    __slots__ = ("size", "values", "position", "count", "total", "squares")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = [0.0] * size
+        self.position = self.count = 0
+        self.total = self.squares = 0.0
+
+    def update(self, x: float, commit: bool = True) -> tuple:
+        """返回加入 x 后窗口的 (均值, 标准差)，窗口未满时为NaN"""
+        out = self.values[self.position] if self.count == self.size else 0.0
+        count = min(self.count + 1, self.size)
+        total, squares = self.total - out + x, self.squares - out * out + x * x
+        if commit:
+            self.values[self.position] = x
+            self.position = (self.position + 1) % self.size
+            self.count = count
+            if self.position == 0:
+                total, squares = math.fsum(self.values), math.fsum(v * v for v in self.values)
+            self.total, self.squares = total, squares
+        if count < self.size:
+            return NAN, NAN
+        mean = total / count
+        return mean, math.sqrt(max(squares / count - mean * mean, 0.0))
+
+
+class Lag:
+    """保留最近 periods 个值，返回加入 x 前第 periods 个值（不足时为NaN）"""
+    __slots__ = ("periods", "values", "position", "count")
+
+    def __init__(self, periods: int):
+        self.periods = periods
+        self.values = [NAN] * periods
+        self.position = self.count = 0
+
+    def update(self, x: float, commit: bool = True) -> float:
+        lagged = self.values[self.position] if self.count == self.periods else NAN
+        if commit:
+            self.values[self.position] = x
+            self.position = (self.position + 1) % self.periods
+            self.count = min(self.count + 1, self.periods)
+        return lagged
+
+
+class EMAState:
+    """指数移动平均（定义同 ema()）"""
+    __slots__ = ("alpha", "adjust", "min_periods", "numerator", "denominator", "count")
+
+    def __init__(self, span: int = None, alpha: float = None, adjust: bool = False, min_periods: int = 1):
+        self.alpha = alpha if alpha is not None else 2.0 / (span + 1)
+        self.adjust = adjust
+        self.min_periods = min_periods
+        self.numerator, self.denominator, self.count = 0.0, 0.0, 0
+
+    def update(self, x: float, commit: bool = True) -> float:
+        decay = 1.0 - self.alpha
+        if self.count == 0:
+            numerator, denominator = x, 1.0
+        elif self.adjust:
+            numerator, denominator = decay * self.numerator + x, decay * self.denominator + 1.0
+        else:
+            numerator, denominator = decay * self.numerator + self.alpha * x, 1.0
+        if commit:
+            self.numerator, self.denominator, self.count = numerator, denominator, self.count + 1
+        return numerator / denominator if self.count + (not commit) >= self.min_periods else NAN
+
+
+class IndicatorState:
+    """单只股票的指标增量状态（与 compute() 定义一致）
+
+    update() 加入一根已收盘的日K线；preview() 计算当日未收盘K线（实时行情）加入后的指标，不改变状态，
+    同一交易日内可以反复调用。
+    """
+    def __init__(self, ema_spans: tuple = INDICATOR_EMA_SPANS):
+        self.date = None  # 最近一根已收盘K线的日期（YYYYMMDD）
+        self.bars = 0
+        self.values = {}  # 最近一根已收盘K线的指标
+        self.previous_close = NAN
+        self.window = RollingWindow(INDICATOR_WINDOW)
+        self.returns = RollingWindow(INDICATOR_WINDOW)
+        self.emas = {span: EMAState(span=span) for span in ema_spans}
+        self.fast, self.slow, self.signal = EMAState(span=MACD_FAST), EMAState(span=MACD_SLOW), EMAState(span=MACD_SIGNAL)
+        self.gain = EMAState(alpha=1.0 / RSI_PERIOD, min_periods=RSI_PERIOD)
+        self.loss = EMAState(alpha=1.0 / RSI_PERIOD, min_periods=RSI_PERIOD)
+        self.true_range = EMAState(alpha=1.0 / ATR_PERIOD, min_periods=ATR_PERIOD)
+        self.lag = Lag(MOMENTUM_DAYS)
+
+    @classmethod
+    def from_history(cls, history: list, ema_spans: tuple = INDICATOR_EMA_SPANS) -> "IndicatorState":
+        """由日线列表（get_stock_history 格式，日期升序）初始化"""
+        state = cls(ema_spans)
+        for bar in history:
+            state.update(bar)
+        return state
+
+    def update(self, bar: dict, commit: bool = True) -> dict:
+        close = float(bar["close"])
+        high, low = float(bar.get("high", close)), float(bar.get("low", close))
+        previous = self.previous_close
+        middle, std = self.window.update(close, commit)
+        _, vol = self.returns.update(close / previous - 1.0, commit) if previous > 0 else (NAN, NAN)
+        line = self.fast.update(close, commit) - self.slow.update(close, commit)
+        signal_line = self.signal.update(line, commit)
+        if previous == previous:
+            delta = close - previous
+            gain, loss = self.gain.update(max(delta, 0.0), commit), self.loss.update(max(-delta, 0.0), commit)
+            true_range = max(high - low, abs(high - previous), abs(low - previous))
+        else:
+            gain = loss = NAN
+            true_range = high - low
+        average_range = self.true_range.update(true_range, commit)
+        lagged = self.lag.update(close, commit)
+        bars = self.bars + 1
+        if commit:
+            self.bars, self.previous_close = bars, close
+            if "trade_date" in bar:
+                self.date = date_key(bar["trade_date"])
+        if loss == 0.0:
+            strength = 100.0 if gain > 0 else NAN
+        else:
+            strength = 100.0 - 100.0 / (1.0 + gain / loss)
+        if bars < MACD_SLOW:
+            line = NAN
+        if bars < MACD_SLOW + MACD_SIGNAL - 1:
+            signal_line = NAN
+        values = {
+            "close": close, "sma": middle, "boll_upper": middle + BOLLINGER_K * std,
+            "boll_lower": middle - BOLLINGER_K * std, "boll_std": std,
+            **{f"ema{span}": state.update(close, commit) for span, state in self.emas.items()},
+            "rsi": strength, "macd": line, "macd_signal": signal_line, "macd_hist": line - signal_line,
+            "atr": average_range, "volatility": vol, "momentum": close / lagged - 1.0 if lagged > 0 else NAN
+        }
+        if commit:
+            self.values = values
+        return values
+
+    def preview(self, bar: dict) -> dict:
+        return self.update(bar, commit=False)
+
+
+class IndicatorStream:
+    """各股票指标的增量状态，随实时行情更新
+
+    首次查询某只股票时读取 INDICATOR_WARMUP_DAYS 个交易日的历史（优先本地日线行情，否则行情接口）初始化；
+    之后行情中心推送的实时行情作为当日未收盘K线，交易日变化时把上一日K线并入状态。查询不再重新计算历史窗口。
+    本地日线行情重新构建（get_bar_store 返回新的对象）或初始化超过 INDICATOR_STATE_TTL 后，下次查询时按最新历史重新初始化。
+    股票代码统一为 sh/sz+6位数字，与行情中心推送的代码一致；无法识别的代码不读取历史。
+    """
+    def __init__(self, history=None, warmup_days: int = INDICATOR_WARMUP_DAYS, capacity: int = INDICATOR_CACHE_SIZE,
+                 ttl: float = INDICATOR_STATE_TTL):
+        self._history = history
+        self.warmup_days = warmup_days
+        self.capacity = capacity
+        self.ttl = ttl
+        self.states = OrderedDict()  # 股票代码 -> IndicatorState
+        self.sources = {}  # 股票代码 -> (初始化时的本地日线行情（未构建时为None）, 初始化时间)
+        self.pending = {}  # 股票代码 -> 当日未收盘K线
+        self.lock = threading.Lock()
+        self.warmups = self.reloads = self.ticks = self.rollovers = 0
+
+    @property
+    def history(self):
+        if self._history is None:
+            from data.web_data import StockDataFetcher
+            self._history = StockDataFetcher().get_stock_history
+        return self._history
+
+    def _load(self, code: str, store) -> list:
+        bars = store.history(code, self.warmup_days) if store is not None else []
+        return bars or self.history(code, days=self.warmup_days) or []
+
+    def _fresh(self, code: str, store) -> bool:
+        source = self.sources.get(code)
+        return source is not None and source[0] is store and time.monotonic() - source[1] < self.ttl
+
+    def state(self, code: str):
+        """股票的指标状态；代码无法识别或无法获取历史数据时返回None"""
+        code = normalize_stock_code(code)
+        if code is None:
+            return None
+        store = get_bar_store()
+        with self.lock:
+            state = self.states.get(code)
+            if state is not None and self._fresh(code, store):
+                self.states.move_to_end(code)
+                return state
+        bars = self._load(code, store)
+        with self.lock:
+            current = self.states.get(code)
+            if current is None or not self._fresh(code, store):
+                if bars:
+                    state = IndicatorState.from_history(bars)
+                    self.states[code] = state
+                    pending = self.pending.get(code)
+                    if pending is not None and state.date is not None and pending["trade_date"] <= state.date:
+                        del self.pending[code]  # 历史数据已包含该交易日
+                    if current is None:
+                        self.warmups += 1
+                    else:
+                        self.reloads += 1
+                elif current is None:
+                    return None
+                self.sources[code] = (store, time.monotonic())  # 取不到历史时沿用原状态，到期前不再重复读取
+            state = self.states[code]
+            self.states.move_to_end(code)
+            while len(self.states) > self.capacity:
+                evicted, _ = self.states.popitem(last=False)
+                self.pending.pop(evicted, None)
+                self.sources.pop(evicted, None)
+        return state
+
+    def on_quote(self, quote: dict) -> None:
+        """行情中心的回调：只更新已有状态的股票，不在事件循环中获取历史数据"""
+        code = normalize_stock_code(quote.get("code"))
+        price = quote.get("price")
+        if not code or not price:
+            return
+        day = int(time.strftime("%Y%m%d", time.gmtime(trade_day(quote.get("timestamp", time.time())) * 86400)))
+        with self.lock:
+            state = self.states.get(code)
+            if state is None or (state.date is not None and day <= state.date):
+                return
+            pending = self.pending.get(code)
+            if pending is not None and pending["trade_date"] != day:
+                state.update(pending)
+                self.rollovers += 1
+            self.pending[code] = {"trade_date": day, "close": price,
+                                  "high": quote.get("high") or price, "low": quote.get("low") or price}
+            self.ticks += 1
+
+    def snapshot(self, code: str):
+        """股票的最新指标（含当日实时行情），代码无法识别或无法获取历史数据时返回None"""
+        code = normalize_stock_code(code)
+        state = self.state(code)
+        if state is None:
+            return None
+        with self.lock:
+            pending = self.pending.get(code)
+            values = state.preview(pending) if pending is not None else dict(state.values)
+            date = pending["trade_date"] if pending is not None else state.date
+        return {"date": date, "bars": state.bars + (pending is not None), **values}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"symbols": len(self.states), "pending": len(self.pending), "warmups": self.warmups,
+                    "reloads": self.reloads, "ticks": self.ticks, "rollovers": self.rollovers}
+
+
+_stream = None
+_stream_lock = threading.Lock()
+
+
+def get_indicator_stream() -> IndicatorStream:
+    global _stream
+    if _stream is None:
+        with _stream_lock:
+            if _stream is None:
+                _stream = IndicatorStream()
+    return _stream
@@ -195,8 +195,17 @@ class MockData:
             }
         return mock_data
 
-# 生成100条数据
-MOCK_100 = MockData.generate_mock_data(100)
+_mock_100 = None
+
+def __getattr__(name):
+    """延迟生成模拟数据：首次访问 MOCK_100 时才生成100条数据"""
+    global _mock_100
+    if name == "MOCK_100":
+        if _mock_100 is None:
+            _mock_100 = MockData.generate_mock_data(100)
+        return _mock_100
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
         
 
     
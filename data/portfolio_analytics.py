@@ -0,0 +1,508 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.logger import Logger
+from utils.tracing import traced
+
+PORTFOLIO_CACHE_SIZE = int(os.getenv("PORTFOLIO_CACHE_SIZE", "1000"))  # 进程内缓存分析状态的用户数
+PORTFOLIO_QUOTE_TTL = float(os.getenv("PORTFOLIO_QUOTE_TTL", "5"))  # 持仓估值所用行情的缓存时长（秒）
+PORTFOLIO_NAV_DAYS = int(os.getenv("PORTFOLIO_NAV_DAYS", "90"))  # 默认返回的净值序列天数
+MARKET_UTC_OFFSET = 8 * 3600  # 按北京时间划分交易日
+TRADING_DAYS_PER_YEAR = 252
+LOG_RESCALE = 500.0  # 平均成本法向量化计算时的分段缩放（避免连续减仓后缩放因子下溢）
+BUY, SELL = "买入", "卖出"
+
+logger = Logger("PortfolioAnalytics")
+
+
+def trade_day(timestamp: float) -> int:
+    """成交时间所在的交易日（自1970-01-01起的天数，北京时间）"""
+    return int((timestamp + MARKET_UTC_OFFSET) // 86400)
+
+
+def day_label(day: int) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(day * 86400))
+
+
+class Holding:
+    """单只股票的持仓状态：FIFO 剩余批次、平均成本法下的持仓成本和两种方法的已实现盈亏"""
+    __slots__ = ("quantity", "lots", "cost_average", "realized_fifo", "realized_average", "last_price")
+
+    def __init__(self):
+        self.quantity = 0
+        self.lots = deque()  # [剩余数量, 买入价]，先买先出
+        self.cost_average = 0.0
+        self.realized_fifo = 0.0
+        self.realized_average = 0.0
+        self.last_price = 0.0
+
+    @property
+    def cost_fifo(self) -> float:
+        return sum(quantity * price for quantity, price in self.lots)
+
+
+def fifo_cost(cum_quantity, cum_cost, price, position):
+    """买入批次按先后排成一条数轴时，[0, position] 区间对应的累计成本（position 可为数组）"""
+    import numpy as np
+    i = np.clip(np.searchsorted(cum_quantity, position, side="left"), 0, len(cum_quantity) - 1)
+    return cum_cost[i] - (cum_quantity[i] - position) * price[i]
+
+
+class PortfolioState:
+    """单个用户的组合分析状态
+
+    build 对全部交易记录做一次向量化计算；之后新成交的记录用 apply 逐笔增量更新，两者结果一致。
+    卖出数量超过当时持仓的部分不计入持仓和盈亏（资金流水仍按记录计入）。
+    """
+    def __init__(self):
+        self.holdings = {}
+        self.marks = {}  # (交易日, 股票代码) -> 当日收盘后的 (持仓数量, 最近成交价)
+        self.flows = {}  # 交易日 -> 当日资金净流入（卖出为正、买入为负）
+        self.last_id = 0
+        self.count = 0
+        self.version = 0
+        self._nav = None  # 按日估值矩阵，首次计算净值序列时生成
+        self._pending = []  # 生成矩阵后新增、尚未写入矩阵的成交
+
+    @classmethod
+    def build(cls, rows: list) -> "PortfolioState":
+        """rows 为按 id 排序的 (id, action, stock_code, quantity, price, created_at)"""
+        import numpy as np
+        import pandas as pd
+        state = cls()
+        state.count = len(rows)
+        if not rows:
+            return state
+        df = pd.DataFrame(rows, columns=["id", "action", "stock_code", "quantity", "price", "created_at"])
+        state.last_id = int(df["id"].iloc[-1])
+        # 补列之前的历史记录没有成交时间，按其后最近一笔的时间计
+        created_at = pd.to_numeric(df["created_at"], errors="coerce").bfill().fillna(time.time()).to_numpy()
+        df["day"] = ((created_at + MARKET_UTC_OFFSET) // 86400).astype(np.int64)
+        df = df[df["action"].isin((BUY, SELL))]
+        if df.empty:
+            return state
+        sign = np.where(df["action"].to_numpy() == BUY, 1, -1)
+        quantity = df["quantity"].to_numpy(np.int64)
+        price = df["price"].to_numpy(np.float64)
+        flows = pd.Series(-sign * quantity * price).groupby(df["day"].to_numpy()).sum()
+        state.flows = {int(day): float(flow) for day, flow in flows.items()}
+
+        # 按股票分组（组内保持成交顺序）
+        order = np.lexsort((df["id"].to_numpy(), df["stock_code"].to_numpy()))
+        codes = df["stock_code"].to_numpy()[order]
+        days = df["day"].to_numpy()[order]
+        quantity, price, sign = quantity[order], price[order], sign[order]
+        group = pd.factorize(codes)[0]
+        by_stock = lambda values: pd.Series(values).groupby(group)
+
+        # 持仓不低于0：Q = S - min(0, cummin(S))，S 为带符号数量的累计和
+        cum_signed = by_stock(sign * quantity).cumsum().to_numpy()
+        position = cum_signed - np.minimum(by_stock(cum_signed).cummin().to_numpy(), 0)
+        previous = by_stock(position).shift(fill_value=0).to_numpy()
+        bought = np.where(sign > 0, quantity, 0)
+        sold = np.where(sign < 0, previous - position, 0)  # 实际卖出数量（超卖部分已剔除）
+
+        # FIFO：全部买入批次按（股票, 成交顺序）排成一条数轴，某只股票的卖出消耗其区间 [offset, offset+已卖数量]
+        cum_bought = np.cumsum(bought)
+        offset = by_stock(cum_bought - bought).transform("first").to_numpy()
+        cum_sold = by_stock(sold).cumsum().to_numpy()
+        is_buy = bought > 0
+        if is_buy.any():
+            axis = (cum_bought[is_buy].astype(np.float64), np.cumsum(bought * price)[is_buy], price[is_buy])
+            consumed = fifo_cost(*axis, offset + cum_sold) - fifo_cost(*axis, offset + cum_sold - sold)
+        else:
+            consumed = np.zeros(len(sold))
+        realized_fifo = np.where(sold > 0, sold * price - consumed, 0.0)
+
+        cost_average = average_costs(previous, position, bought, price)
+        prev_cost = by_stock(cost_average).shift(fill_value=0.0).to_numpy()
+        average_price = np.divide(prev_cost, previous, out=np.zeros(len(previous)), where=previous > 0)
+        realized_average = np.where(sold > 0, sold * (price - average_price), 0.0)
+
+        last = np.flatnonzero(np.r_[group[1:] != group[:-1], True])  # 每只股票的最后一笔
+        realized = pd.DataFrame({"fifo": realized_fifo, "average": realized_average}).groupby(group).sum().to_numpy()
+        for i, quantity_end, cost_end, price_end, (fifo, average) in zip(
+                last, position[last].tolist(), cost_average[last].tolist(), price[last].tolist(), realized[group[last]].tolist()):
+            holding = Holding()
+            holding.quantity = quantity_end
+            holding.cost_average = cost_end if quantity_end > 0 else 0.0
+            holding.realized_fifo = fifo
+            holding.realized_average = average
+            holding.last_price = price_end
+            state.holdings[codes[i]] = holding
+
+        # FIFO 剩余批次：数轴上位于 offset+总卖出量 之后的买入部分
+        end_sold = by_stock(cum_sold).transform("last").to_numpy()
+        remaining = np.minimum(bought, cum_bought - (offset + end_sold))
+        for i in np.flatnonzero(is_buy & (remaining > 0)):
+            state.holdings[codes[i]].lots.append([int(remaining[i]), float(price[i])])
+
+        # 每个交易日每只股票的最后一笔决定当日收盘后的持仓和估值价格
+        day_end = np.flatnonzero(np.r_[(group[1:] != group[:-1]) | (days[1:] != days[:-1]), True])
+        state.marks = dict(zip(zip(days[day_end].tolist(), codes[day_end].tolist()),
+                               zip(position[day_end].tolist(), price[day_end].tolist())))
+        state.version = 1
+        return state
+
+    def apply(self, rows: list) -> None:
+        """按成交顺序逐笔应用新增的交易记录"""
+        for trade_id, action, code, quantity, price, created_at in rows:
+            self.last_id = trade_id
+            self.count += 1
+            if action not in (BUY, SELL):
+                continue
+            day = trade_day(created_at if created_at is not None else time.time())
+            holding = self.holdings.setdefault(code, Holding())
+            if action == BUY:
+                holding.lots.append([quantity, price])
+                holding.cost_average += quantity * price
+                holding.quantity += quantity
+                flow = -quantity * price
+            else:
+                flow = quantity * price
+                sold = min(quantity, holding.quantity)
+                if sold > 0:
+                    cost, remaining = 0.0, sold
+                    while remaining:
+                        lot = holding.lots[0]
+                        take = min(lot[0], remaining)
+                        cost += take * lot[1]
+                        lot[0] -= take
+                        remaining -= take
+                        if lot[0] == 0:
+                            holding.lots.popleft()
+                    average_price = holding.cost_average / holding.quantity
+                    holding.realized_fifo += sold * price - cost
+                    holding.realized_average += sold * (price - average_price)
+                    holding.quantity -= sold
+                    holding.cost_average = holding.cost_average * holding.quantity / (holding.quantity + sold) \
+                        if holding.quantity else 0.0
+            holding.last_price = price
+            self.marks[(day, code)] = (holding.quantity, price)
+            self.flows[day] = self.flows.get(day, 0.0) + flow
+            self._pending.append((day, code, holding.quantity, price))
+        if rows:
+            self.version += 1
+
+    def nav_history(self) -> "NavHistory":
+        """按日的持仓数量和估值价格矩阵（按最近成交价估值），没有成交时返回None
+
+        矩阵在首次使用时由 marks 整体生成，之后只把新增成交写入其所在日期及之后的行，并补齐到今天。
+        """
+        if not self.marks:
+            return None
+        if self._nav is None or (self._pending and min(day for day, *_ in self._pending) < self._nav.days[-1]):
+            self._nav = NavHistory.from_marks(self.marks)  # 首次使用或成交日期早于已有矩阵（时钟回拨）时整体重建
+        else:
+            self._nav.update(self._pending)
+        self._pending = []
+        self._nav.extend_to(trade_day(time.time()))
+        return self._nav
+
+
+class NavHistory:
+    """组合按日估值所需的矩阵：行为日期（工作日及有成交的日期），列为股票"""
+    def __init__(self, days, codes: list, positions, prices):
+        self.days = days
+        self.codes = codes
+        self.columns = {code: j for j, code in enumerate(codes)}
+        self.positions = positions
+        self.prices = prices
+
+    @staticmethod
+    def calendar(start: int, end: int, extra=()):
+        """[start, end] 内的工作日及 extra 中的日期"""
+        import numpy as np
+        days = np.arange(start, end + 1)
+        return days[((days + 3) % 7 < 5) | np.isin(days, list(extra))]  # 1970-01-01 为周四
+
+    @classmethod
+    def from_marks(cls, marks: dict) -> "NavHistory":
+        import numpy as np
+        import pandas as pd
+        mark_days = np.fromiter((day for day, _ in marks), dtype=np.int64, count=len(marks))
+        mark_codes, column = np.unique([code for _, code in marks], return_inverse=True)
+        days = cls.calendar(int(mark_days.min()), int(mark_days.max()), np.unique(mark_days))
+        row = np.searchsorted(days, mark_days)
+        values = np.array(list(marks.values()), dtype=np.float64)
+        matrices = []
+        for k in range(2):
+            matrix = np.full((len(days), len(mark_codes)), np.nan)
+            matrix[row, column] = values[:, k]
+            matrices.append(pd.DataFrame(matrix).ffill().fillna(0.0).to_numpy(copy=True))
+        return cls(days, mark_codes.tolist(), *matrices)
+
+    def extend_to(self, end: int, extra=()) -> None:
+        """补齐到 end 日（新增行沿用最后一行）"""
+        import numpy as np
+        if end <= self.days[-1]:
+            return
+        new_days = self.calendar(int(self.days[-1]) + 1, end, extra)
+        if len(new_days):
+            self.days = np.concatenate([self.days, new_days])
+            self.positions = np.vstack([self.positions, np.repeat(self.positions[-1:], len(new_days), axis=0)])
+            self.prices = np.vstack([self.prices, np.repeat(self.prices[-1:], len(new_days), axis=0)])
+
+    def update(self, pending: list) -> None:
+        """按成交顺序写入新增的 (日期, 股票, 持仓数量, 成交价)，日期不早于矩阵最后一天"""
+        import numpy as np
+        if not pending:
+            return
+        self.extend_to(max(day for day, *_ in pending), [day for day, *_ in pending])
+        new_codes = [code for code in dict.fromkeys(code for _, code, *_ in pending) if code not in self.columns]
+        if new_codes:
+            for code in new_codes:
+                self.columns[code] = len(self.codes)
+                self.codes.append(code)
+            padding = np.zeros((len(self.days), len(new_codes)))
+            self.positions = np.hstack([self.positions, padding])
+            self.prices = np.hstack([self.prices, padding])
+        for day, code, quantity, price in pending:
+            i, j = int(np.searchsorted(self.days, day)), self.columns[code]
+            self.positions[i:, j] = quantity
+            self.prices[i:, j] = price
+
+
+def average_costs(previous, position, bought, price):
+    """平均成本法下每笔交易后的持仓成本（数组按股票分组、组内按成交顺序排列）
+
+    卖出不改变平均价，持仓成本按剩余比例缩放：C_k = G_k * (Σ 买入金额_j / G_j)，G 为卖出剩余比例的累乘。
+    持仓归零时重新开始累乘；G 以对数累加，每下降 LOG_RESCALE 换一个缩放基准，避免长期部分减仓后下溢。
+    """
+    import numpy as np
+    import pandas as pd
+    sell = position < previous
+    ratio = np.ones(len(position))
+    np.divide(position, previous, out=ratio, where=sell & (previous > 0))
+    with np.errstate(divide="ignore"):
+        log_ratio = np.log(ratio)
+    closed = position == 0
+    segment = np.cumsum(previous == 0)  # 持仓从0开始的一段（跨股票时第一笔的 previous 必为0）
+    log_g = pd.Series(np.where(closed, 0.0, log_ratio)).groupby(segment).cumsum().to_numpy()
+    level = np.floor(-log_g / LOG_RESCALE).astype(np.int64)
+    amount = bought * price
+    cost = np.zeros(len(position))
+    carry = {}  # 段 -> 已处理层级中最后一笔的行号
+    for current in range(int(level.max()) + 1 if len(level) else 0):
+        rows = level == current
+        if not rows.any():
+            continue
+        scale = np.exp(log_g[rows] + LOG_RESCALE * current)
+        partial = pd.Series(np.where(amount[rows] > 0, amount[rows] / scale, 0.0)).groupby(segment[rows]).cumsum()
+        # 本层起点：该段此前最后一笔的成本换算到本层的基准
+        base = np.array([cost[carry[seg]] / math.exp(log_g[carry[seg]] + LOG_RESCALE * current) if seg in carry else 0.0
+                         for seg in segment[rows]]) if carry else 0.0
+        cost[rows] = scale * (base + partial.to_numpy())
+        carry.update(pd.Series(np.flatnonzero(rows)).groupby(segment[rows]).last().to_dict())
+    cost[closed] = 0.0
+    return cost
+
+
+class QuoteCache:
+    """持仓估值用的行情缓存（同一股票 ttl 秒内只请求一次）"""
+    def __init__(self, source=None, ttl: float = PORTFOLIO_QUOTE_TTL):
+        self._source = source
+        self.ttl = ttl
+        self.quotes = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="portfolio-quote")
+
+    @property
+    def source(self):
+        if self._source is None:
+            from api.quote_feed import create_quote_source
+            self._source = create_quote_source()
+        return self._source
+
+    def _fetch(self, code: str):
+        try:
+            quote = self.source.fetch(code)
+        except Exception as e:
+            logger.warning(f"获取 {code} 行情失败: {str(e)}")
+            quote = None
+        if quote and quote.get("price") is not None:
+            with self.lock:
+                self.quotes[code] = (time.monotonic(), quote)
+            return quote
+        return None
+
+    def get_many(self, codes: list) -> dict:
+        """并发获取多只股票的行情；获取失败的股票不在结果中"""
+        now = time.monotonic()
+        with self.lock:
+            fresh = {code: self.quotes[code][1] for code in codes
+                     if code in self.quotes and now - self.quotes[code][0] < self.ttl}
+        missing = [code for code in codes if code not in fresh]
+        for code, quote in zip(missing, self.executor.map(self._fetch, missing)):
+            if quote:
+                fresh[code] = quote
+        return fresh
+
+
+def industry_of(code: str) -> str:
+    """股票的一级行业（优先列式基本面数据），未知时返回"未知" """
+    from data.fundamentals_columnar import get_columnar_fundamentals
+    from data.fundamentals_store import get_fundamentals_store
+    columnar = get_columnar_fundamentals()
+    record = columnar.get(code) if columnar is not None else None
+    if record is None:
+        record = get_fundamentals_store().get(code)
+    return (record or {}).get("industry_primary") or "未知"
+
+
+class PortfolioAnalytics:
+    """组合分析服务：按用户缓存分析状态，请求时只读取新增的交易记录做增量更新
+
+    记录条数减少（删除）或与新增条数对不上时整体重建；原地修改由 DatabaseManager.update_transaction 主动清除缓存
+    （多工作进程时其他进程的缓存要等到记录条数变化才会重建）。
+    """
+    def __init__(self, quotes: QuoteCache = None, cache_size: int = PORTFOLIO_CACHE_SIZE):
+        self.quotes = quotes or QuoteCache()
+        self.cache_size = cache_size
+        self.states = OrderedDict()
+        self.user_locks = {}
+        self.industries = {}
+        self.lock = threading.Lock()
+        self.counters = {"builds": 0, "incremental": 0, "unchanged": 0}
+
+    def _user_lock(self, uid: str) -> threading.RLock:
+        with self.lock:
+            return self.user_locks.setdefault(uid, threading.RLock())
+
+    def invalidate(self, uid: str) -> None:
+        with self.lock:
+            self.states.pop(uid, None)
+
+    @traced()
+    def state(self, db, uid: str) -> PortfolioState:
+        """与交易记录同步后的分析状态"""
+        with self._user_lock(uid):
+            with self.lock:
+                state = self.states.get(uid)
+            count, max_id = db.get_transaction_summary(uid)
+            if state is not None and (state.count, state.last_id) == (count, max_id):
+                result = "unchanged"
+            else:
+                rows = db.get_transactions_after(uid, state.last_id) if state is not None and max_id > state.last_id \
+                    and count > state.count else None
+                if rows is not None and state.count + len(rows) == count:
+                    state.apply(rows)
+                    result = "incremental"
+                else:
+                    state = PortfolioState.build(db.get_transactions_after(uid))
+                    result = "builds"
+            with self.lock:
+                self.counters[result] += 1
+                self.states[uid] = state
+                self.states.move_to_end(uid)
+                while len(self.states) > self.cache_size:
+                    self.states.popitem(last=False)
+            return state
+
+    def industry(self, code: str) -> str:
+        if code not in self.industries:
+            self.industries[code] = industry_of(code)
+        return self.industries[code]
+
+    @traced()
+    def report(self, db, uid: str, nav_days: int = PORTFOLIO_NAV_DAYS) -> dict:
+        """组合概况：持仓成本（FIFO/平均）、已实现和浮动盈亏、行业暴露、日净值序列和波动率"""
+        with self._user_lock(uid):  # 同一用户的并发请求不能同时更新状态
+            return self._report(db, uid, self.state(db, uid), nav_days)
+
+    def _report(self, db, uid: str, state: PortfolioState, nav_days: int) -> dict:
+        import numpy as np
+        cash = float(db.get_user_funds(uid) or 0.0)
+        open_codes = [code for code, holding in state.holdings.items() if holding.quantity > 0]
+        quotes = self.quotes.get_many(open_codes)
+
+        positions, exposure = [], {}
+        for code in open_codes:
+            holding = state.holdings[code]
+            quote = quotes.get(code)
+            price = float(quote["price"]) if quote else holding.last_price
+            market_value = holding.quantity * price
+            cost_fifo = holding.cost_fifo
+            industry = self.industry(code)
+            exposure[industry] = exposure.get(industry, 0.0) + market_value
+            positions.append({
+                "code": code,
+                "name": quote.get("name", code) if quote else code,
+                "industry": industry,
+                "quantity": holding.quantity,
+                "price": price,
+                "price_source": "quote" if quote else "last_trade",
+                "market_value": round(market_value, 2),
+                "cost_fifo": round(cost_fifo, 2),
+                "cost_average": round(holding.cost_average, 2),
+                "unrealized_fifo": round(market_value - cost_fifo, 2),
+                "unrealized_average": round(market_value - holding.cost_average, 2)
+            })
+        market_value = sum(item["market_value"] for item in positions)
+        for item in positions:
+            item["weight"] = round(item["market_value"] / market_value, 4) if market_value else 0.0
+        positions.sort(key=lambda item: item["market_value"], reverse=True)
+
+        nav, volatility = [], {"daily": None, "annualized": None}
+        history = state.nav_history()
+        if history is not None:
+            days = history.days[-(nav_days + 1):]
+            positions_tail, prices_tail = history.positions[-len(days):], history.prices[-len(days):]
+            # 当日现金 = 当前资金 - 当日之后的资金净流入
+            flow_days = np.fromiter(state.flows, dtype=np.int64, count=len(state.flows))
+            flow_values = np.fromiter(state.flows.values(), dtype=np.float64, count=len(state.flows))
+            order = np.argsort(flow_days)
+            cumulative = np.r_[0.0, np.cumsum(flow_values[order])]
+            later_flows = cumulative[-1] - cumulative[np.searchsorted(flow_days[order], days, side="right")]
+            values = cash - later_flows + (positions_tail * prices_tail).sum(axis=1)
+            for code, quote in quotes.items():  # 最新一天按实时行情估值
+                j = history.columns.get(code)
+                if j is not None:
+                    values[-1] += positions_tail[-1, j] * (float(quote["price"]) - prices_tail[-1, j])
+            nav = [{"date": day_label(day), "nav": round(value, 2)} for day, value in zip(days.tolist(), values.tolist())]
+            returns = np.diff(values) / values[:-1] if len(values) > 2 and (values[:-1] > 0).all() else None
+            if returns is not None:
+                daily = float(np.std(returns, ddof=1))
+                volatility = {"daily": round(daily, 6), "annualized": round(daily * math.sqrt(TRADING_DAYS_PER_YEAR), 6)}
+
+        realized_fifo = sum(holding.realized_fifo for holding in state.holdings.values())
+        realized_average = sum(holding.realized_average for holding in state.holdings.values())
+        return {
+            "cash": round(cash, 2),
+            "market_value": round(market_value, 2),
+            "total_value": round(cash + market_value, 2),
+            "trades": state.count,
+            "realized_pnl": {"fifo": round(realized_fifo, 2), "average": round(realized_average, 2)},
+            "unrealized_pnl": {"fifo": round(sum(item["unrealized_fifo"] for item in positions), 2),
+                               "average": round(sum(item["unrealized_average"] for item in positions), 2)},
+            "positions": positions,
+            "exposure": [{"industry": industry, "market_value": round(value, 2),
+                          "weight": round(value / market_value, 4) if market_value else 0.0}
+                         for industry, value in sorted(exposure.items(), key=lambda item: item[1], reverse=True)],
+            "nav": nav,
+            "volatility": volatility
+        }
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"cached_users": len(self.states), **self.counters}
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_portfolio_analytics() -> PortfolioAnalytics:
+    global _analytics
+    if _analytics is None:
+        with _analytics_lock:
+            if _analytics is None:
+                _analytics = PortfolioAnalytics()
+    return _analytics
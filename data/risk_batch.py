@@ -0,0 +1,298 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import json
+import math
+import os
+import sqlite3
+import time
+from statistics import NormalDist
+from data.bar_store import BAR_STORE_PATH, BarStore
+from utils import snapshot_dir
+from utils.logger import Logger
+from utils.metrics import TimedConnection
+
+RISK_DB_PATH = os.getenv("RISK_DB_PATH", "./stock_assistant.db")  # 读取持仓、写入结果的数据库（与 DatabaseManager 相同）
+RISK_BATCH_LOOKBACK = int(os.getenv("RISK_BATCH_LOOKBACK", "250"))  # 历史模拟所用的交易日数
+RISK_BATCH_CONFIDENCE = float(os.getenv("RISK_BATCH_CONFIDENCE", "0.99"))
+RISK_BATCH_HORIZON = int(os.getenv("RISK_BATCH_HORIZON", "1"))  # VaR持有期（交易日，按平方根放大）
+RISK_BATCH_CHUNK_USERS = int(os.getenv("RISK_BATCH_CHUNK_USERS", "1000"))  # 每个任务块的用户数
+RISK_STRESS_SHOCK = float(os.getenv("RISK_STRESS_SHOCK", "-0.2"))  # 默认情景中单个行业的冲击幅度
+
+# 按 uid 区间读取净持仓（买入减卖出，不为正的忽略），结果按 uid 排序
+POSITIONS_SQL = """
+SELECT uid, stock_code, SUM(CASE action WHEN '买入' THEN quantity WHEN '卖出' THEN -quantity ELSE 0 END) AS quantity
+FROM transactions
+WHERE uid >= ? AND uid <= ?
+GROUP BY uid, stock_code
+HAVING quantity > 0
+ORDER BY uid
+"""
+
+logger = Logger("RiskBatch")
+
+
+def connect(path: str):
+    conn = sqlite3.connect(path, timeout=30, factory=TimedConnection)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def create_tables(conn) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS risk_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            finished_at REAL,
+            users INTEGER,
+            confidence REAL NOT NULL,
+            horizon INTEGER NOT NULL,
+            lookback INTEGER NOT NULL,
+            bars_last_date INTEGER,
+            firm TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS risk_results (
+            run_id INTEGER NOT NULL,
+            uid TEXT NOT NULL,
+            positions INTEGER NOT NULL,
+            unpriced INTEGER NOT NULL,
+            market_value REAL NOT NULL,
+            var_historical REAL NOT NULL,
+            var_parametric REAL NOT NULL,
+            es_historical REAL NOT NULL,
+            worst_scenario TEXT,
+            worst_stress_pnl REAL,
+            stress TEXT NOT NULL,
+            PRIMARY KEY (run_id, uid)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_risk_results_uid ON risk_results (uid, run_id)")
+    conn.commit()
+
+
+def default_scenarios(industries: list, shock: float = RISK_STRESS_SHOCK) -> list:
+    """默认压力情景：全市场下跌，以及每个一级行业单独下跌"""
+    return [{"name": f"全市场{shock / 2:+.0%}", "market": shock / 2}] + \
+        [{"name": f"{industry}{shock:+.0%}", "industry": {industry: shock}} for industry in sorted(set(industries))]
+
+
+def stress_matrix(scenarios: list, industries: list):
+    """情景 × 股票的收益率冲击矩阵：market 作用于全部股票，industry 按一级行业叠加"""
+    import numpy as np
+    matrix = np.zeros((len(scenarios), len(industries)))
+    for k, scenario in enumerate(scenarios):
+        matrix[k] += scenario.get("market", 0.0)
+        shocks = scenario.get("industry", {})
+        if shocks:
+            matrix[k] += np.array([shocks.get(industry, 0.0) for industry in industries])
+    return matrix
+
+
+def stock_industries(codes: list) -> list:
+    """股票的一级行业（列式基本面数据，未收录的为"未知"）"""
+    from data.fundamentals_columnar import get_columnar_fundamentals
+    columnar = get_columnar_fundamentals()
+    if columnar is None:
+        return ["未知"] * len(codes)
+    rows = [columnar.get(code) for code in codes]
+    return [row["industry_primary"] if row else "未知" for row in rows]
+
+
+class RiskContext:
+    """一次批量计算共用的数据：收益率矩阵（按股票转置为 N×T，便于按持仓取行）、估值价格和情景冲击矩阵"""
+    def __init__(self, bars: BarStore, scenarios: list, industries: list, lookback: int = RISK_BATCH_LOOKBACK,
+                 confidence: float = RISK_BATCH_CONFIDENCE, horizon: int = RISK_BATCH_HORIZON):
+        import numpy as np
+        self.bars = bars
+        self.returns_t = np.ascontiguousarray(bars.returns(lookback).T)
+        self.prices = np.nan_to_num(bars.latest_close(), nan=0.0)
+        self.scenario_names = [scenario["name"] for scenario in scenarios]
+        self.shocks_t = np.ascontiguousarray(stress_matrix(scenarios, industries).T)
+        self.periods = self.returns_t.shape[1]
+        self.tail = max(int(math.floor((1 - confidence) * self.periods)), 0)  # 历史模拟VaR所取的次序统计量
+        self.z = NormalDist().inv_cdf(confidence)
+        self.scale = math.sqrt(horizon)
+
+    def measure(self, owners, columns, quantities) -> dict:
+        """owners 为每个持仓所属组的行号（升序），columns 为股票列号（-1 为未收录）；返回各组的风险指标数组
+
+        按持仓取出收益率行乘以市值得到 持仓 × 交易日 的盈亏，再用 reduceat 按组求和，不构造 组 × 股票 矩阵。
+        """
+        import numpy as np
+        priced = columns >= 0
+        groups = int(owners[-1]) + 1 if len(owners) else 0
+        unpriced = np.bincount(owners[~priced], minlength=groups)
+        owners, columns = owners[priced], columns[priced]
+        values = quantities[priced] * self.prices[columns]
+        market_value = np.bincount(owners, weights=values, minlength=groups)
+        pnl = np.zeros((groups, self.periods))
+        stress = np.zeros((groups, self.shocks_t.shape[1]))
+        if len(owners):
+            starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+            pnl[owners[starts]] = np.add.reduceat(self.returns_t[columns] * values[:, None], starts, axis=0)
+            stress[owners[starts]] = np.add.reduceat(self.shocks_t[columns] * values[:, None], starts, axis=0)
+        worst = np.partition(pnl, self.tail, axis=1)[:, :self.tail + 1] if self.periods else np.zeros((groups, 1))
+        return {
+            "unpriced": unpriced,
+            "market_value": market_value,
+            "var_historical": -worst[:, self.tail] * self.scale,
+            "es_historical": -worst.mean(axis=1) * self.scale,
+            "var_parametric": self.z * pnl.std(axis=1, ddof=1) * self.scale if self.periods > 1 else np.zeros(groups),
+            "stress": stress
+        }
+
+
+_context = None
+
+
+def init_worker(bar_path: str, scenarios: list, industries: list, lookback: int, confidence: float, horizon: int) -> None:
+    """工作进程初始化：mmap 打开日线行情并计算本次共用的数据（每个进程只做一次）"""
+    global _context
+    _context = RiskContext(BarStore.load(bar_path), scenarios, industries, lookback, confidence, horizon)
+
+
+def compute_chunk(db_path: str, first_uid: str, last_uid: str) -> tuple:
+    """计算一个 uid 区间内全部用户的风险指标，返回 (结果行, 该区间按股票汇总的持仓数量)"""
+    import numpy as np
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(POSITIONS_SQL, (first_uid, last_uid)).fetchall()
+    finally:
+        conn.close()
+    context = _context
+    quantities_by_stock = np.zeros(len(context.prices))
+    if not rows:
+        return [], quantities_by_stock
+    uids, owners = np.unique(np.array([row[0] for row in rows]), return_inverse=True)
+    columns = context.bars.indices([row[1] for row in rows])
+    quantities = np.array([row[2] for row in rows], dtype=np.float64)
+    positions = np.bincount(owners, minlength=len(uids))
+    metrics = context.measure(owners, columns, quantities)
+    priced = columns >= 0
+    np.add.at(quantities_by_stock, columns[priced], quantities[priced])
+    results = []
+    for i, uid in enumerate(uids.tolist()):
+        stress = metrics["stress"][i]
+        k = int(np.argmin(stress)) if len(stress) else None
+        results.append((
+            uid, int(positions[i]), int(metrics["unpriced"][i]), round(float(metrics["market_value"][i]), 2),
+            round(float(metrics["var_historical"][i]), 2), round(float(metrics["var_parametric"][i]), 2),
+            round(float(metrics["es_historical"][i]), 2),
+            context.scenario_names[k] if k is not None else None, round(float(stress[k]), 2) if k is not None else None,
+            json.dumps({name: round(float(pnl), 2) for name, pnl in zip(context.scenario_names, stress)}, ensure_ascii=False)
+        ))
+    return results, quantities_by_stock
+
+
+class RiskBatchJob:
+    """全部用户的历史模拟VaR/ES、参数法VaR和行业压力测试批量计算
+
+    按 uid 区间分块，由进程池并行计算（各进程 mmap 共享同一份日线行情），主进程按块写入 risk_results，
+    并用各块按股票汇总的持仓计算全公司指标，写入 risk_runs。净持仓按全部买入减卖出计算。
+    """
+    def __init__(self, db_path: str = RISK_DB_PATH, bar_path: str = BAR_STORE_PATH, scenarios: list = None,
+                 lookback: int = RISK_BATCH_LOOKBACK, confidence: float = RISK_BATCH_CONFIDENCE,
+                 horizon: int = RISK_BATCH_HORIZON, chunk_users: int = RISK_BATCH_CHUNK_USERS):
+        self.db_path = db_path
+        self.bar_path = bar_path
+        self.scenarios = scenarios
+        self.lookback = lookback
+        self.confidence = confidence
+        self.horizon = horizon
+        self.chunk_users = chunk_users
+
+    def chunks(self, conn) -> list:
+        uids = [row[0] for row in conn.execute("SELECT uid FROM users ORDER BY uid")]
+        return [(uids[start], uids[min(start + self.chunk_users, len(uids)) - 1])
+                for start in range(0, len(uids), self.chunk_users)]
+
+    def run(self, workers: int = 1) -> dict:
+        import numpy as np
+        started = time.time()
+        bar_dir = snapshot_dir.current(self.bar_path)  # 本次运行固定读取这一版本，期间发布的新版本不影响主进程与工作进程的一致性
+        bars = BarStore.load(bar_dir)
+        industries = stock_industries(bars.code_list())
+        scenarios = self.scenarios or default_scenarios(industries)
+        init_args = (bar_dir, scenarios, industries, self.lookback, self.confidence, self.horizon)
+        init_worker(*init_args)
+        conn = connect(self.db_path)
+        run_id, users = None, 0
+        try:
+            create_tables(conn)
+            run_id = conn.execute(
+                "INSERT INTO risk_runs (status, started_at, confidence, horizon, lookback, bars_last_date) VALUES (?,?,?,?,?,?)",
+                ("running", started, self.confidence, self.horizon, self.lookback,
+                 int(bars.dates[-1]) if len(bars.dates) else None)).lastrowid
+            conn.commit()
+            chunks = self.chunks(conn)
+            firm_quantities = np.zeros(len(bars))
+
+            def store(results: list, quantities) -> None:
+                nonlocal users
+                conn.executemany("INSERT INTO risk_results VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                                 [(run_id, *row) for row in results])
+                conn.commit()
+                firm_quantities[:] += quantities
+                users += len(results)
+
+            if workers <= 1:
+                for first_uid, last_uid in chunks:
+                    store(*compute_chunk(self.db_path, first_uid, last_uid))
+            else:
+                from concurrent.futures import ProcessPoolExecutor
+                with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=init_args) as pool:
+                    futures = [pool.submit(compute_chunk, self.db_path, first_uid, last_uid) for first_uid, last_uid in chunks]
+                    for future in futures:
+                        store(*future.result())
+
+            firm = self.firm_metrics(firm_quantities)
+            conn.execute("UPDATE risk_runs SET status = 'done', finished_at = ?, users = ?, firm = ? WHERE run_id = ?",
+                         (time.time(), users, json.dumps(firm, ensure_ascii=False), run_id))
+            conn.commit()
+        except Exception:
+            if run_id is not None:  # 已写入的分块结果保留，按 status 区分未完成的批次
+                conn.rollback()
+                conn.execute("UPDATE risk_runs SET status = 'failed', finished_at = ?, users = ? WHERE run_id = ?",
+                             (time.time(), users, run_id))
+                conn.commit()
+                logger.error(f"风险批量计算失败: 第{run_id}次，已完成{users}个用户")
+            raise
+        finally:
+            conn.close()
+        logger.info(f"风险批量计算完成: 第{run_id}次，{users}个用户，{len(chunks)}个分块，耗时{time.time() - started:.2f}秒")
+        return {"run_id": run_id, "users": users, "chunks": len(chunks), "seconds": round(time.time() - started, 3), "firm": firm}
+
+    @staticmethod
+    def firm_metrics(quantities) -> dict:
+        """全公司指标：所有用户的持仓合并为一个组合"""
+        import numpy as np
+        columns = np.flatnonzero(quantities > 0)
+        metrics = _context.measure(np.zeros(len(columns), dtype=np.int64), columns, quantities[columns])
+        if not len(columns):
+            return {"market_value": 0.0, "stress": {}}
+        return {
+            "market_value": round(float(metrics["market_value"][0]), 2),
+            "var_historical": round(float(metrics["var_historical"][0]), 2),
+            "var_parametric": round(float(metrics["var_parametric"][0]), 2),
+            "es_historical": round(float(metrics["es_historical"][0]), 2),
+            "stress": {name: round(float(pnl), 2) for name, pnl in zip(_context.scenario_names, metrics["stress"][0])}
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="全部用户的VaR与压力测试批量计算")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="计算进程数")
+    parser.add_argument("--chunk-users", type=int, default=RISK_BATCH_CHUNK_USERS, help="每个任务块的用户数")
+    parser.add_argument("--scenarios", help="压力情景JSON文件：[{\"name\": ..., \"market\": -0.1, \"industry\": {\"银行\": -0.2}}]")
+    args = parser.parse_args()
+    scenarios = None
+    if args.scenarios:
+        with open(args.scenarios, encoding="utf-8") as f:
+            scenarios = json.load(f)
+    print(json.dumps(RiskBatchJob(scenarios=scenarios, chunk_users=args.chunk_users).run(args.workers),
+                     ensure_ascii=False, indent=2))
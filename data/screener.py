@@ -0,0 +1,209 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import math
+import os
+import threading
+import time
+from data.bar_store import BAR_STORE_PATH, get_bar_store
+from data.fundamentals_columnar import FUNDAMENTALS_COLUMNAR_PATH, UNKNOWN_DATE, get_columnar_fundamentals
+from data.fundamentals_store import normalize_stock_code
+from utils import snapshot_dir
+from utils.logger import Logger
+
+SCREEN_PAGE_SIZE = int(os.getenv("SCREEN_PAGE_SIZE", "50"))
+SCREEN_MAX_PAGE_SIZE = int(os.getenv("SCREEN_MAX_PAGE_SIZE", "500"))
+SCREEN_CHECK_INTERVAL = float(os.getenv("SCREEN_CHECK_INTERVAL", "5"))  # 检查数据源是否更新的最小间隔（秒）
+
+CATEGORY_FIELDS = ("industry_primary", "industry_secondary")
+NUMERIC_FIELDS = ("listing_age", "market_cap", "close", "volatility", "momentum", "rsi", "supply_degree", "pagerank")
+RANGE_OPS = ("gt", "gte", "lt", "lte")
+
+logger = Logger("Screener")
+
+
+class ScreenError(ValueError):
+    """筛选条件不合法（未知字段、运算符或取值）"""
+
+
+def listing_age(dates, today: str):
+    """上市年限（年），未知上市日期为NaN"""
+    import numpy as np
+    known = dates != UNKNOWN_DATE
+    listed = np.array([f"{d // 10000:04d}-{d // 100 % 100:02d}-{d % 100:02d}" for d in dates[known].tolist()],
+                      dtype="datetime64[D]")
+    age = np.full(len(dates), np.nan)
+    age[known] = (np.datetime64(today, "D") - listed).astype(np.float64) / 365.25
+    return age
+
+
+class ScreenTable:
+    """选股用的内存列式表：基本面、最新技术指标和供应链中心性按股票代码对齐
+
+    每个数值列预先排好序（NaN 在最后），范围条件在有序数组上二分查找得到一段行号；
+    行业列为每个取值一个布尔位图。多个条件的结果按位与，排序直接沿用预排好的行号顺序，单次查询为 O(N) 的向量运算。
+    """
+    def __init__(self, codes, names, categories: dict, labels: dict, numeric: dict, version: tuple = ()):
+        import numpy as np
+        self.codes = codes
+        self.names = names
+        self.categories = categories  # 字段 -> 分类编码数组
+        self.labels = labels  # 字段 -> 编码对应的取值
+        self.label_ids = {field: {label: i for i, label in enumerate(values)} for field, values in labels.items()}
+        self.numeric = numeric  # 字段 -> float64 数组
+        self.version = version
+        self.bitmaps = {field: [encoded == i for i in range(len(labels[field]))]
+                        for field, encoded in categories.items()}
+        self.orders, self.descending, self.sorted_values, self.valid_counts = {}, {}, {}, {}
+        for field, values in numeric.items():
+            order = np.argsort(values, kind="stable")  # NaN 排在最后
+            valid = int(np.count_nonzero(~np.isnan(values)))
+            self.orders[field] = order
+            self.descending[field] = np.concatenate([order[:valid][::-1], order[valid:]])
+            self.sorted_values[field] = values[order]
+            self.valid_counts[field] = valid
+
+    @classmethod
+    def build(cls, columnar, bars=None, centrality: dict = None, version: tuple = ()) -> "ScreenTable":
+        """由列式基本面数据、本地日线行情（可选）和中心性侧表（可选）构建"""
+        import numpy as np
+        import pandas as pd
+        from data import indicators
+        records = columnar.records
+        count = len(records)
+        numeric = {field: np.full(count, np.nan) for field in NUMERIC_FIELDS}
+        numeric["listing_age"] = listing_age(np.asarray(records["listing_date"]), time.strftime("%Y-%m-%d"))
+        if bars is not None and len(bars.dates):
+            columns = bars.indices([code.decode("ascii") for code in records["code"]])
+            found = columns >= 0
+            latest = indicators.latest(bars)
+            for field, key in (("close", "close"), ("volatility", "volatility"), ("momentum", "momentum"), ("rsi", "rsi")):
+                numeric[field][found] = latest[key][columns[found]]
+            # 与收盘价一样取窗口内最近一个有数据的交易日（最后一天停牌的股票成交量为NaN）
+            volume = pd.DataFrame(bars.fields["volume"][-indicators.INDICATOR_WARMUP_DAYS:]).ffill().to_numpy()[-1]
+            numeric["market_cap"][found] = latest["close"][columns[found]] * volume[columns[found]]  # 与 RiskAssessment 相同，按成交量×价格估算
+        if centrality is not None:
+            index = {}
+            for i, code in enumerate(centrality["codes"].tolist()):
+                normalized = normalize_stock_code(str(code))
+                if normalized:
+                    index[normalized.encode("ascii")] = i
+            rows = np.array([index.get(code, -1) for code in records["code"].tolist()], dtype=np.int64)
+            found = rows >= 0
+            numeric["supply_degree"] = np.zeros(count)  # 不在供应链图中的公司伙伴数为0
+            numeric["supply_degree"][found] = centrality["supply_degree"][rows[found]]
+            numeric["pagerank"][found] = centrality["pagerank"][rows[found]]
+        return cls(
+            np.asarray(records["code"]), np.asarray(records["name"]),
+            {field: np.asarray(records[field]).astype(np.int64) for field in CATEGORY_FIELDS},
+            {"industry_primary": columnar.industries_primary, "industry_secondary": columnar.industries_secondary},
+            numeric, version
+        )
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _range(self, field: str, op: str, value: float):
+        """数值条件在有序数组上二分查找，返回满足条件的行号（预排序数组的一段切片）"""
+        import numpy as np
+        values = self.sorted_values[field][:self.valid_counts[field]]
+        if op in ("gt", "gte"):
+            start = np.searchsorted(values, value, side="right" if op == "gt" else "left")
+            return self.orders[field][start:self.valid_counts[field]]
+        end = np.searchsorted(values, value, side="left" if op == "lt" else "right")
+        return self.orders[field][:end]
+
+    def mask(self, filters: dict):
+        """filters 形如 {"industry_primary": ["银行", "证券"], "market_cap": {"gte": 1e9}, "momentum": {"gt": 0}}"""
+        import numpy as np
+        mask = np.ones(len(self), dtype=bool)
+        for field, condition in (filters or {}).items():
+            if field in self.categories:
+                values = [condition] if isinstance(condition, str) else condition
+                if not isinstance(values, list):
+                    raise ScreenError(f"{field} 的取值应为字符串或列表")
+                selected = np.zeros(len(self), dtype=bool)
+                for value in values:
+                    i = self.label_ids[field].get(value)
+                    if i is not None:
+                        selected |= self.bitmaps[field][i]
+                mask &= selected
+            elif field in self.numeric:
+                if not isinstance(condition, dict) or not condition:
+                    raise ScreenError(f"{field} 的条件应为 {{运算符: 数值}}，运算符为 {'/'.join(RANGE_OPS)}")
+                for op, value in condition.items():
+                    if op not in RANGE_OPS or isinstance(value, bool) or not isinstance(value, (int, float)):
+                        raise ScreenError(f"不支持的条件: {field} {op} {value}")
+                    selected = np.zeros(len(self), dtype=bool)
+                    selected[self._range(field, op, float(value))] = True
+                    mask &= selected
+            else:
+                raise ScreenError(f"未知字段: {field}")
+        return mask
+
+    def ordered(self, mask, sort: str = None):
+        """满足条件的行号，按 sort 排序（"-字段" 为降序，NaN 总在最后）；不指定时按股票代码"""
+        import numpy as np
+        if not sort:
+            return np.flatnonzero(mask)
+        field = sort.lstrip("-")
+        if field not in self.numeric:
+            raise ScreenError(f"不支持排序的字段: {field}")
+        order = self.descending[field] if sort.startswith("-") else self.orders[field]
+        return order[mask[order]]
+
+    def row(self, i: int) -> dict:
+        return {
+            "stock_code": self.codes[i].decode("ascii"),
+            "stock_name": str(self.names[i]),
+            **{field: self.labels[field][self.categories[field][i]] for field in CATEGORY_FIELDS},
+            **{field: None if math.isnan(value) else round(value, 6)
+               for field, value in ((field, float(self.numeric[field][i])) for field in NUMERIC_FIELDS)}
+        }
+
+    def query(self, filters: dict = None, sort: str = None, page: int = 1, page_size: int = SCREEN_PAGE_SIZE) -> dict:
+        page, page_size = max(int(page), 1), max(min(int(page_size), SCREEN_MAX_PAGE_SIZE), 1)
+        rows = self.ordered(self.mask(filters), sort)
+        start = (page - 1) * page_size
+        return {
+            "total": int(len(rows)),
+            "page": page,
+            "page_size": page_size,
+            "items": [self.row(int(i)) for i in rows[start:start + page_size]]
+        }
+
+    def fields(self) -> dict:
+        """可用的筛选字段：行业的全部取值，数值字段的取值范围"""
+        return {
+            **{field: self.labels[field] for field in CATEGORY_FIELDS},
+            **{field: {"min": float(self.sorted_values[field][0]), "max": float(self.sorted_values[field][valid - 1]),
+                       "count": valid} if valid else {"count": 0}
+               for field, valid in self.valid_counts.items()}
+        }
+
+
+_table = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_screen_table():
+    """进程内共享的选股表，数据源更新后自动重建；列式基本面数据尚未构建时返回None"""
+    global _table, _checked_at
+    from knowledge_graph.centrality import CENTRALITY_PATH, load_centrality
+    if _table is not None and time.monotonic() - _checked_at < SCREEN_CHECK_INTERVAL:
+        return _table
+    version = (snapshot_dir.version_token(FUNDAMENTALS_COLUMNAR_PATH, "records.npy"),
+               snapshot_dir.version_token(BAR_STORE_PATH, "meta.json"), snapshot_dir.version_token(CENTRALITY_PATH, "meta.json"))
+    if _table is None or version != _table.version:
+        with _lock:
+            if _table is None or version != _table.version:
+                columnar = get_columnar_fundamentals()
+                if columnar is None:
+                    return None
+                started = time.perf_counter()
+                _table = ScreenTable.build(columnar, get_bar_store(), load_centrality(), version)
+                logger.info(f"构建选股表: {len(_table)}只股票，耗时{(time.perf_counter() - started) * 1000:.1f}毫秒")
+    _checked_at = time.monotonic()
+    return _table
@@ -2,31 +2,29 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
-import requests
 import random
 from datetime import datetime, timedelta
-import pandas as pd
 from utils.logger import Logger
+from utils.tracing import traced
+from utils.metrics import observe_upstream
+from utils.replay import http_get
+from data.fundamentals_store import get_fundamentals_store
+from data.fundamentals_columnar import get_columnar_fundamentals
+from utils.prompts import data_messages, INDUSTRY_COMPANIES_PROMPT, STOCK_BASIC_INFO_PROMPT, SUPPLY_CHAIN_PROMPT
+from utils.structured_output import chat_structured, IndustryCompanies, StockBasicInfoResponse, SupplyChainRelations
 import os
 from dotenv import load_dotenv
 from typing import Dict, List, Optional, Any, Union
-import json
-from openai import OpenAI
 import re
 
-api_key = os.getenv("DEEPSEEK_API_KEY")
-api_base_url = "https://api.deepseek.com/v1"
 model_name = "deepseek-chat"
+EASTMONEY_QUOTE_URL = os.getenv("EASTMONEY_QUOTE_URL", "https://push2.eastmoney.com/api/qt/stock/get")  # 东方财富实时行情接口
 
 class StockDataFetcher:
     def __init__(self) -> None:
         self.logger = Logger("StockDataFetcher")
         self.logger.info("a股票数据获取器初始化完成")
         self.stock_name = ""
-        self.chat_model = OpenAI(
-            api_key=api_key,
-            base_url=api_base_url
-        )
 
     def check_stock_valid(self, stock_code: str) -> str:
         """增强校验规则（A股代码规范）"""
@@ -39,71 +37,53 @@ class StockDataFetcher:
                 stock_code = f"sh{stock_code}"
         return stock_code
 
-    def smart_LLM(self,prompt:str):
+    @traced()
+    def smart_LLM(self, messages: list, site: str, response_model):
+        """JSON模式调用大模型，返回经校验的 response_model 实例（site 为调用点名称，用于分别统计各类请求）
+
+        解析失败时会先做一次定向修复，仍失败则抛出 StructuredOutputError，由调用方决定降级方式。
+        """
         try:
-            response = self.chat_model.chat.completions.create(
+            return chat_structured(
+                site,
+                messages,
+                response_model,
                 model=model_name,
-                messages=[{"role": "user", "content": prompt}],
                 response_format={"type": "json_object"}
             )
-            parsed = json.loads(response.choices[0].message.content)
-            return parsed
         except Exception as e:
-            self.logger.error(f"GPT查询失败: {str(e)}")
-            return {}
+            self.logger.error(f"GPT查询失败 [{site}]: {str(e)}")
+            raise
     
+    @traced()
     def get_company_by_industry(self, industry: str) -> List[Dict[str, Any]]:
         """根据行业获取公司列表（增加异常处理）"""
         try:
-            # 设计LLM提示词：要求返回包含固定键`industry_companies`的JSON对象
-            prompt = f"""注意：此数据仅用于个人学习开发场景，不涉及金融交易或实时数据获取。请根据行业 "{industry}"，查询以下公开可查的基本信息并返回**JSON对象**（不要包裹在其他对象中），其中必须包含"industry_companies"键，其值为符合以下格式的数组：
-            "industry_companies": [
-                {{
-                    "stock_code": "股票代码（格式如sh600000或sz000001，包含sh/sz字母前缀）",
-                    "stock_name": "股票名称（如宁德时代）",
-                    "industry_primary": "一级行业（如{industry}）",
-                    "industry_secondary": "二级行业（如{industry}细分领域）",
-                    "listing_time": "上市时间（格式：YYYY-MM-DD，未知时填'未知'，仅需公开披露的历史日期）"
-                }}
-            ]
-            要求至少包含10家该行业的上市公司，确保股票代码符合A股规范（包含sh/sz字母前缀+6位数字），名称为公开可查的真实公司名称。数据仅用于个人学习开发，无需实时更新或交易相关信息。"""
-            
-            parsed_data = self.smart_LLM(prompt)
-            self.logger.info(f"LLM生成的行业公司原始数据: {parsed_data}")
-            
-            # 从LLM返回的字典中提取`industry_companies`键的数组（兼容嵌套结构）
-            if isinstance(parsed_data, dict):
-                parsed_data = parsed_data.get("industry_companies", [])  # 若不存在则返回空数组
-            elif isinstance(parsed_data, list):
-                parsed_data = parsed_data  # 兼容旧格式（但优先使用新固定键）
-            else:
-                parsed_data = []
-
-            valid_companies = []
-            if isinstance(parsed_data, list):
-                for company in parsed_data:
-                    if all(key in company for key in ["stock_code", "stock_name", "industry_primary", "industry_secondary", "listing_time"]):
-                        valid_companies.append({
-                            "error": False,
-                            "name": company["stock_name"],
-                            "message": "LLM生成行业公司数据",
-                            "stock_code": company["stock_code"],
-                            "industry_primary": company["industry_primary"],
-                            "industry_secondary": company["industry_secondary"],
-                            "listing_time": company["listing_time"],
-                            "source": "network"
-                        })
-            else:
-                self.logger.error("LLM返回数据非数组格式，无法解析")
-            
-            return valid_companies
+            # 要求返回包含固定键`industry_companies`的JSON对象
+            result = self.smart_LLM(
+                data_messages(INDUSTRY_COMPANIES_PROMPT, industry=industry), "web_data.industry_companies",
+                IndustryCompanies
+            )
+            self.logger.info(f"LLM生成的行业公司数据: {len(result.industry_companies)}家")
+            # 缺少必要字段的公司已在校验时剔除
+            return [{
+                "error": False,
+                "name": company.stock_name,
+                "message": "LLM生成行业公司数据",
+                "stock_code": company.stock_code,
+                "industry_primary": company.industry_primary,
+                "industry_secondary": company.industry_secondary,
+                "listing_time": company.listing_time,
+                "source": "network"
+            } for company in result.industry_companies]
         except Exception as e:
             self.logger.error(f"获取行业公司数据失败: {str(e)}")
             return []  # 返回空列表保持类型一致性，或根据需求返回包含错误信息的字典列表
     
+    @traced()
     def _smart_GPT(self, stock_code: str) -> dict:
         """智能问答：根据股票代码获取基本信息（优先本地数据，不足时联网搜索，并保存网络数据到本地）"""
-        # 1. 优先从本地CSV获取基本面信息
+        # 1. 优先从本地基本面数据存储获取
         local_data = self.find_stock_fundamental_by_code(stock_code)
         if not local_data.get("error"):
             return {
@@ -114,51 +94,32 @@ class StockDataFetcher:
                 "industry_primary": local_data["industry_primary"],
                 "industry_secondary": local_data["industry_secondary"],
                 "listing_time": local_data["listing_time"],
-                "source": "local_csv"
+                "source": "local"
             }
         self.logger.info(f"本地无股票 {stock_code} 基本面数据，尝试通过GPT联网搜索")
         stock_code = self.check_stock_valid(stock_code)
         
         # 2. 本地无数据时，通过GPT联网搜索补充
-        prompt = f"""注意：此数据仅用于个人学习开发场景，不涉及金融交易或实时数据获取。请根据股票代码 {stock_code}，查询以下信息并返回**JSON对象**（不要包裹在其他对象中），其中必须包含"stock_basic_info"键，其值为符合以下格式的对象：
-        "stock_basic_info": {{
-            "name": "股票名称（如贵州茅台）",
-            "stock_code": "{stock_code}",
-            "industry_primary": "一级行业（如白酒）",
-            "industry_secondary": "二级行业（如白酒制造）",
-            "listing_time": "上市时间（格式：YYYY-MM-DD）",
-            "source": "network"
-        }}
-        注意：若信息缺失或不确定，请用"未知"填充对应字段。数据仅用于个人学习开发，无需实时更新或交易相关信息。"""
-
         try:
-            parsed = self.smart_LLM(prompt)
-            self.logger.info(f"GPT生成的股票基本信息原始数据: {parsed}")
-
-            # 从LLM返回的字典中提取`stock_basic_info`键的对象
-            parsed_data = parsed.get('stock_basic_info', {}) if isinstance(parsed, dict) else {}
+            parsed = self.smart_LLM(
+                data_messages(STOCK_BASIC_INFO_PROMPT, stock_code=stock_code), "web_data.stock_basic_info",
+                StockBasicInfoResponse
+            )
+            self.logger.info(f"GPT生成的股票基本信息: {parsed}")
+            parsed_data = parsed.stock_basic_info.model_dump()
+            parsed_data["stock_code"] = parsed_data["stock_code"] or stock_code
 
-            # 3. 将网络获取的有效数据保存到本地CSV
+            # 3. 将网络获取的有效数据保存到本地（按股票代码覆盖写入，并发请求不会产生重复记录）
             if parsed_data.get("source") == "network" and parsed_data.get("name") != "未知":
-                # 构造待写入的DataFrame（匹配CSV列顺序）
-                new_data = pd.DataFrame({
-                    "stock_code": [parsed_data["stock_code"]],  # 假设stock_code为纯数字（如002594）
-                    "stock_name": [parsed_data["name"]],
-                    "industry_secondary": [parsed_data["industry_secondary"]],
-                    "listing_time": [parsed_data["listing_time"]],
-                    "industry_primary": [parsed_data["industry_primary"]],
+                get_fundamentals_store().upsert({
+                    "stock_code": parsed_data["stock_code"],
+                    "stock_name": parsed_data["name"],
+                    "industry_primary": parsed_data.get("industry_primary"),
+                    "industry_secondary": parsed_data.get("industry_secondary"),
+                    "listing_time": parsed_data.get("listing_time"),
+                    "source": "network"
                 })
-                
-                # 追加到CSV文件（无表头）
-                csv_path = "data/stock_industry_data.csv"
-                new_data.to_csv(
-                    csv_path,
-                    mode='a',  # 追加模式
-                    header=not os.path.exists(csv_path),  # 文件不存在时写入表头
-                    index=False,
-                    encoding='gbk'  # 与读取时编码一致
-                )
-                self.logger.info(f"成功将股票 {parsed_data['name']} ({parsed_data['stock_code']}) 数据保存到本地CSV")
+                self.logger.info(f"成功将股票 {parsed_data['name']} ({parsed_data['stock_code']}) 数据保存到本地")
             
             return {**parsed_data, "error": False, "message": "成功获取股票基本信息"}
         except Exception as e:
@@ -181,32 +142,23 @@ class StockDataFetcher:
     def get_supply_chain_relations_by_network(self, symbol: str) -> list:
         return self._smart_supply_agent(symbol)
 
-    def read_a_stock_fundamental_data(self, csv_path: str = "data/stock_industry_data.csv") -> pd.DataFrame:
+    def read_a_stock_fundamental_data(self) -> "pd.DataFrame":
         """
-        读取A股基本面信息CSV文件
+        读取全部A股基本面信息
         
-        Args:
-            csv_path: CSV文件路径（默认使用项目内的a_stock_data.csv）
-            
         Returns:
             pandas.DataFrame: 包含股票代码、行业、上市时间等信息的DataFrame
         """
+        import pandas as pd
         try:
-            # 读取CSV文件，指定列名（如果CSV无表头）
-            df = pd.read_csv(
-                csv_path,
-                names=["stock_code", 'stock_name', "industry_secondary","listing_time","industry_primary"],  # 根据实际CSV列名调整
-                # encoding="utf-8"  # 处理中文编码
-                encoding='gbk',
-                dtype={"stock_code": str}
+            df = pd.DataFrame(
+                get_fundamentals_store().all(),
+                columns=["stock_code", "stock_name", "industry_secondary", "listing_time", "industry_primary"]
             )
             self.logger.info(f"成功读取A股基本面数据，共{len(df)}条记录")
             return df
-        except FileNotFoundError:
-            self.logger.error(f"未找到CSV文件：{csv_path}")
-            raise
         except Exception as e:
-            self.logger.error(f"读取CSV文件失败：{str(e)}")
+            self.logger.error(f"读取基本面数据失败：{str(e)}")
             raise
 
     def _fallback_data(self):
@@ -231,6 +183,7 @@ class StockDataFetcher:
             "province": random.choice(["广东", "浙江", "江苏"])
         }
 
+    @traced()
     def get_stock_history(self, symbol, days=30):
         """获取股票历史数据（优先使用东方财富接口，失败时使用模拟数据）"""
         valid_symbol = self._validate_and_format_symbol(symbol)
@@ -304,8 +257,10 @@ class StockDataFetcher:
                 return f'sh{code}'
         return None
 
+    @traced()
     def get_real_time_eastmoney(self, symbol):
         """通过东方财富接口获取实时行情（含股票名称）"""
+        import requests
         valid_symbol = self._validate_and_format_symbol(symbol)  # 使用现有验证方法
         if not valid_symbol:
             self.logger.warning(f"无效股票代码: {symbol}")
@@ -314,9 +269,10 @@ class StockDataFetcher:
         try:
             # 转换为东方财富要求的 secid 格式（sh->1., sz->0.）
             secid = valid_symbol.replace("sh", "1.").replace("sz", "0.")
-            url = f"https://push2.eastmoney.com/api/qt/stock/get?secid={secid}&fields=f43,f44,f45,f46,f51,f52,f58"  # 调整为实际存在的字段
-            response = requests.get(url, timeout=5)
-            response.raise_for_status()  # 检查HTTP错误状态码
+            url = f"{EASTMONEY_QUOTE_URL}?secid={secid}&fields=f43,f44,f45,f46,f51,f52,f58"  # 调整为实际存在的字段
+            with observe_upstream("eastmoney", "realtime"):
+                response = http_get(url, timeout=5)
+                response.raise_for_status()  # 检查HTTP错误状态码
             data = response.json()
             
             if not data.get("data"):
@@ -342,9 +298,10 @@ class StockDataFetcher:
             self.logger.error(f"东方财富接口字段解析失败: {str(e)}（请检查接口字段是否变更）")
             return {}
 
+    @traced()
     def find_stock_fundamental_by_code(self, symbol: str) -> dict:
         """
-        根据股票代码查找CSV中的基本面信息
+        根据股票代码查找本地基本面信息（按主键索引查询，不再整表读取）
         
         Args:
             symbol: 股票代码（如"600000"、"sz002594"等）
@@ -357,69 +314,42 @@ class StockDataFetcher:
         if not formatted_code:
             return {"error":True, "message":"无效股票代码"}
         
-        # 读取CSV数据（复用现有方法）
         try:
-            df = self.read_a_stock_fundamental_data()
-            # self.logger.info(f'df:{df}')
+            # 先查数据存储（联网补充或重新导入后立即可见），列式只读副本可能落后于存储，只在存储读取失败时使用
+            result = get_fundamentals_store().get(formatted_code)
         except Exception as e:
-            return {"error": True, "message": f"读取CSV失败: {str(e)}"}
-        
-        # 在DataFrame中查找匹配的股票代码（假设CSV的"stock_code"列存储格式化后的代码）
-        mask = df["stock_code"] == formatted_code
-        if not mask.any():
+            columnar = get_columnar_fundamentals()
+            result = columnar.get(formatted_code) if columnar is not None else None
+            if result is None:
+                return {"error": True, "message": f"读取基本面数据失败: {str(e)}"}
+        if result is None:
             return {"error": True, "message": "未找到对应股票数据"}
         
-        # 提取首条匹配数据（假设代码唯一）
-        result = df[mask].iloc[0].to_dict()
         self.logger.info(f'find_stock_fundamental_by_code:{result["stock_code"]}存在！！！！')
         return {
             "error": False,
             "message":"本地数据存在！！！",
             "name": result["stock_name"],  # 股票名称（如"贵州茅台"）
-            "stock_code": result["stock_code"],  # 股票代码（纯数字，如600519）
+            "stock_code": result["stock_code"],  # 股票代码（如sh600519）
             "industry_primary": result["industry_primary"],      # 所属行业（如白酒、新能源等）
             "industry_secondary": result["industry_secondary"],  # 二级行业（如白酒制造、汽车制造等）
             "listing_time": result["listing_time"]  # 上市时间（格式：YYYY-MM-DD）
         }
 
 
+    @traced()
     def _smart_supply_agent(self, stock_code: str) -> list:
         """利用LLM联网搜索获取股票的供应商/客户及多级关系"""
         # 构造LLM提示词，明确要求返回固定键`supply_chain_relationships`
         stock_code = self.check_stock_valid(stock_code)
                 
-        prompt = f"""注意：此数据仅用于个人学习开发场景，不涉及金融交易或实时数据获取。请根据股票代码 {stock_code}，查询以下供应链基本信息并返回**JSON对象**（不要包裹在其他对象中），其中必须包含"supply_chain_relationships"键，其值为符合以下格式的数组：
-        "supply_chain_relationships": [
-            {{
-                "partner_code": "合作伙伴股票代码（格式如sh600000或sz000001）",
-                "name": "合作伙伴名称（如宁德时代）",
-                "type": "关系类型（可选值：供应商、供应商的供应商、客户、客户的客户）",
-                "weight": "关系权重（0-1之间的浮点数，数值越大表示关系越紧密）"
-            }}
-        ]
-        要求数组至少包含2个直接供应商、1个供应商的供应商、2个直接客户、1个客户的客户，权重需合理递减。数据仅用于个人学习开发，无需实时更新或交易相关信息。
-        """
         try:
-            # 调用LLM获取数据（复用类中已初始化的chat_model）
-            parsed_data = self.smart_LLM(prompt)
-            # self.logger.info(f'LLM返回原始数据: {parsed_data}')  # 日志记录原始结构
-            
-            # 从LLM返回的字典中提取`supply_chain_relationships`键的数组
-            if isinstance(parsed_data, dict):
-                parsed_data = parsed_data.get('supply_chain_relationships', [])  # 若不存在则返回空数组
-            
-            # 校验是否为列表
-            if not isinstance(parsed_data, list):
-                raise ValueError("LLM返回数据格式错误，预期为列表")
-
-            # 过滤无效数据项（确保必要字段存在）
-            valid_relations = []
-            for relation in parsed_data:
-                if all(key in relation for key in ["partner_code", "name", "type", "weight"]):
-                    valid_relations.append(relation)
-                else:
-                    self.logger.warning(f"忽略无效供应链关系项: {relation}")
-            
+            result = self.smart_LLM(
+                data_messages(SUPPLY_CHAIN_PROMPT, stock_code=stock_code), "web_data.supply_chain",
+                SupplyChainRelations
+            )
+            # 缺少必要字段或权重越界的关系项已在校验时剔除
+            valid_relations = [relation.model_dump() for relation in result.supply_chain_relationships]
             self.logger.info(f'有效供应链关系数量: {len(valid_relations)}')
             return valid_relations
         except Exception as e:
@@ -29,4 +29,39 @@ function checkAuth() {
         alert('请先登录！');
         window.location.href = 'login.html';
     }
-}
\ No newline at end of file
+}
+
+// 流式请求函数（读取 Server-Sent Events，逐条回调 onEvent(event, data)）
+async function streamRequest(endpoint, data, onEvent) {
+    const response = await fetch(`${API_BASE}${endpoint}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${localStorage.getItem('token')}`
+        },
+        body: JSON.stringify(data)
+    });
+    if (!response.ok || !response.body) throw new Error('流式请求失败');
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        // SSE 消息以空行分隔
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const raw = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message';
+            let payload = '';
+            raw.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) payload += line.slice(6);
+            });
+            onEvent(event, payload ? JSON.parse(payload) : {});
+        }
+    }
+}
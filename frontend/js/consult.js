@@ -31,6 +31,42 @@ async function sendMessage() {
     chatContainer.appendChild(loadingMsg);
     chatContainer.scrollTop = chatContainer.scrollHeight;
 
+    // 优先使用流式接口，逐段展示查询结果
+    let assistantContent = null;
+    let streamFailed = false;
+    try {
+        await streamRequest('/knowledge/stream', { question }, (event, data) => {
+            if (!assistantContent) {
+                chatContainer.removeChild(loadingMsg);
+                const assistantMsg = document.createElement('div');
+                assistantMsg.className = 'message assistant-message';
+                assistantMsg.innerHTML = `
+                    <img src="assets/avatars/assistant_avatar.png" class="avatar" alt="助手头像">
+                    <div class="message-content"></div>
+                `;
+                chatContainer.appendChild(assistantMsg);
+                assistantContent = assistantMsg.querySelector('.message-content');
+            }
+            if (event === 'error') {
+                assistantContent.style.background = '#ffebee';
+                assistantContent.style.color = '#b71c1c';
+                assistantContent.innerHTML += `咨询失败：${data.message || '未知错误'}`;
+            } else {
+                assistantContent.innerHTML += data.message || '';
+            }
+            chatContainer.scrollTop = chatContainer.scrollHeight;
+        });
+    } catch (error) {
+        console.warn('流式接口不可用，回退到普通接口:', error);
+        streamFailed = true;
+    }
+    if (!streamFailed) return;
+    if (assistantContent) {
+        // 流式输出中途失败时丢弃已显示的部分内容，重新请求完整结果
+        chatContainer.removeChild(assistantContent.parentElement);
+        chatContainer.appendChild(loadingMsg);
+    }
+
     try {
         const result = await apiRequest('/knowledge', 'POST', { question });
         console.log('API Response:', result);
@@ -29,13 +29,14 @@ async function loadPositions() {
 
         // 正常渲染数据（确保字段名与接口返回一致）
         tbody.innerHTML = result.data.map(pos => `
-            <tr>
+            <tr data-code="${pos.code.toLowerCase()}">
                 <td>${pos.code}</td>
                 <td>${pos.name}</td>
                 <td>${pos.quantity}</td>
-                <td>￥${pos.price.toFixed(2)}</td>
+                <td class="price-cell">￥${pos.price.toFixed(2)}</td>
             </tr>
         `).join('');
+        subscribeQuotes(result.data.map(pos => pos.code));
     } catch (error) {
         console.error('加载持仓数据异常:', error);
         const tbody = document.getElementById('positionTable').getElementsByTagName('tbody')[0];
@@ -46,7 +47,43 @@ async function loadPositions() {
         `;
     }
 };
+// 实时行情推送：订阅持仓股票，收到行情后只更新对应价格单元格
+let quoteSocket = null;
+let subscribedCodes = [];
+
+function connectQuoteFeed() {
+    const wsBase = API_BASE.replace(/^http/, 'ws');
+    quoteSocket = new WebSocket(`${wsBase}/ws/quotes?token=${localStorage.getItem('token')}`);
+    quoteSocket.onopen = () => {
+        if (subscribedCodes.length > 0) {
+            quoteSocket.send(JSON.stringify({ action: 'subscribe', symbols: subscribedCodes }));
+        }
+    };
+    quoteSocket.onmessage = (event) => {
+        const quote = JSON.parse(event.data);
+        const row = document.querySelector(`#positionTable tr[data-code="${quote.code}"]`);
+        if (row && typeof quote.price === 'number') {
+            row.querySelector('.price-cell').textContent = `￥${quote.price.toFixed(2)}`;
+        }
+    };
+    quoteSocket.onclose = () => {
+        // 断线后延迟重连
+        setTimeout(connectQuoteFeed, 5000);
+    };
+}
+
+function subscribeQuotes(codes) {
+    const normalized = codes.map(code => code.toLowerCase());
+    const removed = subscribedCodes.filter(code => !normalized.includes(code));
+    const added = normalized.filter(code => !subscribedCodes.includes(code));
+    subscribedCodes = normalized;
+    if (!quoteSocket || quoteSocket.readyState !== WebSocket.OPEN) return;
+    if (removed.length > 0) quoteSocket.send(JSON.stringify({ action: 'unsubscribe', symbols: removed }));
+    if (added.length > 0) quoteSocket.send(JSON.stringify({ action: 'subscribe', symbols: added }));
+}
+
 // 初始化加载
+connectQuoteFeed();
 loadPositions();
 // 交易表单提交处理
 document.getElementById('tradeForm').addEventListener('submit', async (e) => {
@@ -0,0 +1,244 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from knowledge_graph.traversal import edge_weight
+from utils import snapshot_dir
+from utils.logger import Logger
+
+CENTRALITY_PATH = os.getenv("CENTRALITY_PATH", str(Path(__file__).parent / "centrality"))  # 中心性侧表目录（按版本子目录保存）
+CENTRALITY_CHECK_INTERVAL = int(os.getenv("CENTRALITY_CHECK_INTERVAL", "600"))  # 图变更检查周期（秒）
+BETWEENNESS_SAMPLES = 256  # 介数中心性的抽样源点数
+WRITE_BATCH_SIZE = 5000
+CENTRALITY_ARRAYS = ("codes", "weighted_degree", "pagerank", "betweenness", "supply_degree")
+
+EDGES_CYPHER = """
+MATCH (a:Company)-[r:SUPPLY_CHAIN]->(b:Company)
+RETURN a.code AS source, b.code AS target, r.weight AS weight
+"""
+
+# 边数、权重之和（按 edge_weight 的规则取值，放大为整数求和，结果与遍历顺序无关）和端点校验和，
+# 改权重、改连接对象而边数不变时也能发现变化
+FINGERPRINT_CYPHER = """
+MATCH (a:Company)-[r:SUPPLY_CHAIN]->(b:Company)
+RETURN count(r) AS edges,
+       sum(toInteger(round(1000000 * CASE WHEN toFloat(r.weight) > 0 THEN toFloat(r.weight) ELSE 1.0 END))) AS weight,
+       sum((id(a) * 1000003 + id(b)) % 1000000007) AS endpoints
+"""
+
+WRITE_CYPHER = """
+UNWIND $rows AS row
+MATCH (c:Company {code: row.code})
+SET c.weighted_degree = row.weighted_degree,
+    c.pagerank = row.pagerank,
+    c.betweenness = row.betweenness,
+    c.supply_degree = row.supply_degree
+"""
+
+
+def build_adjacency(edges: list):
+    """将边列表转为CSR稀疏邻接矩阵，重复边的权重累加"""
+    import numpy as np
+    from scipy.sparse import csr_matrix
+    codes = sorted({edge['source'] for edge in edges} | {edge['target'] for edge in edges})
+    positions = {code: i for i, code in enumerate(codes)}
+    rows = np.fromiter((positions[edge['source']] for edge in edges), dtype=np.int64, count=len(edges))
+    cols = np.fromiter((positions[edge['target']] for edge in edges), dtype=np.int64, count=len(edges))
+    weights = np.fromiter((edge_weight(edge.get('weight')) for edge in edges), dtype=np.float64, count=len(edges))
+    adjacency = csr_matrix((weights, (rows, cols)), shape=(len(codes), len(codes)))
+    adjacency.sum_duplicates()
+    return codes, adjacency
+
+
+def weighted_degree(adjacency):
+    """加权度：出边与入边权重之和"""
+    import numpy as np
+    return np.asarray(adjacency.sum(axis=1)).ravel() + np.asarray(adjacency.sum(axis=0)).ravel()
+
+
+def pagerank(adjacency, damping: float = 0.85, tol: float = 1e-8, max_iter: int = 100):
+    """加权PageRank（幂迭代，悬挂节点的分值均匀分配）"""
+    import numpy as np
+    from scipy.sparse import diags
+    n = adjacency.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    out_weight = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inv_out = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+    transition = (diags(inv_out) @ adjacency).T.tocsr()  # 列随机矩阵的转置形式，transition @ r 即一次传播
+    scores = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        updated = damping * (transition @ scores + scores[dangling].sum() / n) + (1 - damping) / n
+        if np.abs(updated - scores).sum() < tol:
+            return updated
+        scores = updated
+    return scores
+
+
+def betweenness(adjacency, samples: int = BETWEENNESS_SAMPLES, seed: int = 0):
+    """有向无权图的近似介数中心性（Brandes算法，抽样源点后按比例放大）"""
+    import numpy as np
+    n = adjacency.shape[0]
+    scores = np.zeros(n)
+    if n == 0:
+        return scores
+    indptr, indices = adjacency.indptr.tolist(), adjacency.indices.tolist()
+    sources = range(n) if samples >= n else random.Random(seed).sample(range(n), samples)
+    for source in sources:
+        order = []
+        predecessors = [[] for _ in range(n)]
+        sigma = [0] * n
+        sigma[source] = 1
+        distance = [-1] * n
+        distance[source] = 0
+        queue = [source]
+        head = 0
+        while head < len(queue):
+            v = queue[head]
+            head += 1
+            order.append(v)
+            for w in indices[indptr[v]:indptr[v + 1]]:
+                if distance[w] < 0:
+                    distance[w] = distance[v] + 1
+                    queue.append(w)
+                if distance[w] == distance[v] + 1:
+                    sigma[w] += sigma[v]
+                    predecessors[w].append(v)
+        delta = [0.0] * n
+        for w in reversed(order):
+            for v in predecessors[w]:
+                delta[v] += sigma[v] / sigma[w] * (1 + delta[w])
+            if w != source:
+                scores[w] += delta[w]
+    return scores * (n / len(sources))
+
+
+def compute_centrality(edges: list) -> dict:
+    """根据供应链边计算各公司的加权度、PageRank、介数中心性和直接伙伴数"""
+    import numpy as np
+    codes, adjacency = build_adjacency(edges)
+    binary = adjacency.copy()
+    binary.data[:] = 1.0
+    undirected = ((binary + binary.T) > 0)
+    return {
+        "codes": np.array(codes),
+        "weighted_degree": weighted_degree(adjacency),
+        "pagerank": pagerank(adjacency),
+        "betweenness": betweenness(binary),
+        "supply_degree": np.asarray(undirected.sum(axis=1)).ravel().astype(np.int64)
+    }
+
+
+class CentralityJob:
+    """供应链图中心性离线/增量计算任务
+
+    读取全部SUPPLY_CHAIN边，用稀疏矩阵计算中心性指标，写回公司节点属性并保存一份侧表。
+    后台模式下定期检查供应链边的指纹（边数、权重和端点），图发生变化时才重新计算。
+    """
+    def __init__(self, graph=None, path: str = CENTRALITY_PATH):
+        self.logger = Logger("CentralityJob")
+        self._graph = graph
+        self.path = path
+        self.fingerprint = None
+        self.thread = None
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            from knowledge_graph.graph_client import get_graph
+            self._graph = get_graph()
+        return self._graph
+
+    def run(self) -> dict:
+        """全量计算并写回"""
+        started = time.time()
+        edges = self.graph.run(EDGES_CYPHER).data()
+        result = compute_centrality(edges)
+        rows = [
+            {
+                "code": str(code),
+                "weighted_degree": float(result["weighted_degree"][i]),
+                "pagerank": float(result["pagerank"][i]),
+                "betweenness": float(result["betweenness"][i]),
+                "supply_degree": int(result["supply_degree"][i])
+            }
+            for i, code in enumerate(result["codes"])
+        ]
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            self.graph.run(WRITE_CYPHER, rows=rows[start:start + WRITE_BATCH_SIZE])
+        save_centrality(result, self.path, len(edges))
+        self.logger.info(f"中心性计算完成: {len(rows)}家公司，{len(edges)}条边，耗时{time.time() - started:.2f}秒")
+        return result
+
+    def run_if_changed(self) -> bool:
+        """供应链边（数量、权重、端点）变化时才重新计算，返回是否执行了计算"""
+        record = (self.graph.run(FINGERPRINT_CYPHER).data() or [{}])[0]
+        fingerprint = (record.get("edges"), record.get("weight"), record.get("endpoints"))
+        if fingerprint == self.fingerprint:
+            return False
+        self.run()
+        self.fingerprint = fingerprint
+        return True
+
+    def start(self, interval: int = CENTRALITY_CHECK_INTERVAL) -> None:
+        """启动后台线程，定期增量检查"""
+        if self.thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.run_if_changed()
+                except Exception as e:
+                    self.logger.error(f"中心性计算失败: {str(e)}")
+                time.sleep(interval)
+
+        self.thread = threading.Thread(target=loop, name="centrality-job", daemon=True)
+        self.thread.start()
+
+
+def save_centrality(result: dict, path: str = CENTRALITY_PATH, edges: int = 0) -> None:
+    """写入新的版本子目录后原子切换 CURRENT 指针（各指标数组同时生效）"""
+    import numpy as np
+    os.makedirs(path, exist_ok=True)
+    version = snapshot_dir.new_version(path)
+    for key in CENTRALITY_ARRAYS:
+        np.save(os.path.join(version, f"{key}.npy"), np.asarray(result[key]))
+    with open(os.path.join(version, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"computed_at": datetime.now().isoformat(), "companies": len(result["codes"]), "edges": edges}, f)
+    snapshot_dir.publish(path, version)
+
+
+def load_centrality(path: str = CENTRALITY_PATH, mmap: bool = True) -> dict:
+    """读取当前版本的中心性侧表（mmap 只读），尚未计算时返回None"""
+    import numpy as np
+    directory = snapshot_dir.current(path)
+    try:
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    mode = "r" if mmap else None
+    return {**{key: np.load(os.path.join(directory, f"{key}.npy"), mmap_mode=mode) for key in CENTRALITY_ARRAYS},
+            "computed_at": meta["computed_at"]}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="供应链图中心性计算")
+    parser.add_argument("--watch", action="store_true", help="常驻运行，图变化时增量重算")
+    args = parser.parse_args()
+    job = CentralityJob()
+    if args.watch:
+        job.start()
+        while True:
+            time.sleep(3600)
+    else:
+        job.run()
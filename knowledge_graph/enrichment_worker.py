@@ -0,0 +1,124 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+import socket
+import threading
+import time
+import traceback
+from utils.logger import Logger
+from utils.job_queue import JobQueue, get_job_queue, PRIORITY_HIGH, PRIORITY_LOW
+
+ENRICHMENT_POLL_INTERVAL = float(os.getenv("ENRICHMENT_POLL_INTERVAL", "1"))  # 队列为空时的轮询间隔（秒）
+ENRICHMENT_EMBEDDED_WORKERS = int(os.getenv("ENRICHMENT_EMBEDDED_WORKERS", "1"))  # 后端进程内的补全线程数，0为只用独立工作进程
+# 本地图谱无数据时的补全方式：queue 提交后台任务立即返回；sync 在请求内联网导入
+KG_ENRICHMENT_MODE = os.getenv("KG_ENRICHMENT_MODE", "queue")
+ENRICHMENT_KINDS = ("supply_chain", "industry")
+
+
+def enqueue_enrichment(kind: str, key: str, priority: int = PRIORITY_LOW) -> dict:
+    """提交知识图谱补全任务（同一代码/行业排队中时不会重复提交）"""
+    payload = {"stock_code": key} if kind == "supply_chain" else {"industry": key}
+    return get_job_queue().enqueue(kind, key, payload, priority)
+
+
+class EnrichmentWorker:
+    """知识图谱补全工作进程
+
+    从任务队列领取补全任务，调用 KGImporter 联网导入数据并写入图数据库，
+    完成后记录导入后是否查询到数据；失败的任务由队列按退避策略重试。
+    """
+    def __init__(self, queue: JobQueue = None, worker_id: str = None, poll_interval: float = ENRICHMENT_POLL_INTERVAL):
+        self.logger = Logger("EnrichmentWorker")
+        self.queue = queue or get_job_queue()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = poll_interval
+        self._kg_query = None
+
+    @property
+    def kg_query(self):
+        if self._kg_query is None:
+            from knowledge_graph.kg_query import KnowledgeGraphQuery
+            self._kg_query = KnowledgeGraphQuery()
+        return self._kg_query
+
+    def handle(self, job: dict) -> dict:
+        """执行单个补全任务，返回任务结果"""
+        payload = job['payload']
+        if job['kind'] == "supply_chain":
+            stock_code = payload['stock_code']
+            self.kg_query.kg_importer.batch_import_real_data([stock_code])
+            found = len(self.kg_query._query_local(stock_code, 1))
+        elif job['kind'] == "industry":
+            industry = payload['industry']
+            self.kg_query.kg_importer.batch_import_real_data_industry(industry)
+            found = len(self.kg_query.query_industry_info_local(industry))
+        else:
+            raise ValueError(f"未知任务类型: {job['kind']}")
+        return {"found": found}
+
+    def run_once(self) -> bool:
+        """领取并执行一个任务，队列为空时返回False"""
+        job = self.queue.claim(self.worker_id, list(ENRICHMENT_KINDS))
+        if job is None:
+            return False
+        started = time.time()
+        self.logger.info(f"开始补全任务 {job['id']}: {job['kind']}:{job['key']}（第{job['attempts']}次尝试）")
+        try:
+            result = self.handle(job)
+        except Exception as e:
+            self.logger.error(f"补全任务 {job['id']} 失败: {str(e)}\n{traceback.format_exc()}")
+            self.queue.fail(job['id'], self.worker_id, str(e))
+            return True
+        if not self.queue.complete(job['id'], self.worker_id, result):
+            return True
+        self.logger.info(f"补全任务 {job['id']} 完成，导入后数据条数: {result['found']}，耗时{time.time() - started:.2f}秒")
+        return True
+
+    def run(self) -> None:
+        """常驻运行：持续领取任务，定期回收超时任务"""
+        self.logger.info(f"补全工作进程启动: {self.worker_id}")
+        last_reap = 0
+        while True:
+            if time.time() - last_reap > 60:
+                reaped = self.queue.requeue_stale()
+                if reaped:
+                    self.logger.warning(f"回收超时任务 {reaped} 个")
+                last_reap = time.time()
+            if not self.run_once():
+                time.sleep(self.poll_interval)
+
+
+def run_worker(index: int) -> None:
+    EnrichmentWorker(worker_id=f"{socket.gethostname()}:{os.getpid()}:{index}").run()
+
+
+def start_embedded_workers(count: int = ENRICHMENT_EMBEDDED_WORKERS) -> list:
+    """在当前进程内以守护线程运行补全工作循环（后端启动时调用），queue 模式以外不启动"""
+    if KG_ENRICHMENT_MODE != "queue":
+        return []
+    threads = [threading.Thread(target=EnrichmentWorker(worker_id=f"{socket.gethostname()}:{os.getpid()}:embedded{i}").run,
+                                name=f"enrichment-worker-{i}", daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+if __name__ == "__main__":
+    import argparse
+    from multiprocessing import Process
+    parser = argparse.ArgumentParser(description="知识图谱补全工作进程")
+    parser.add_argument("--workers", type=int, default=1, help="工作进程数")
+    parser.add_argument("--enqueue", nargs=2, metavar=("KIND", "KEY"), help="提交一个补全任务后退出，如 supply_chain sh600519")
+    args = parser.parse_args()
+    if args.enqueue:
+        print(enqueue_enrichment(args.enqueue[0], args.enqueue[1], PRIORITY_HIGH))
+    elif args.workers == 1:
+        run_worker(0)
+    else:
+        processes = [Process(target=run_worker, args=(i,), daemon=True) for i in range(args.workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import threading
+from utils.config import settings
+from utils.logger import Logger
+from utils.metrics import observe_upstream
+from utils.replay import REPLAY_MODE, ReplayGraph
+
+_graph = None
+_lock = threading.Lock()
+logger = Logger("GraphClient")
+
+
+class TimedGraph:
+    """图数据库连接的包装：run 调用计入上游耗时指标（operation 为语句的首个关键字），其余属性透传"""
+    def __init__(self, graph):
+        self.graph = graph
+
+    def run(self, cypher: str, *args, **kwargs):
+        parts = cypher.split(None, 1)
+        with observe_upstream("neo4j", parts[0].upper() if parts else ""):
+            return self.graph.run(cypher, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+
+def get_graph():
+    """进程内共享的图数据库连接（首次使用时连接并创建索引；回放模式下不连接数据库）"""
+    global _graph
+    if _graph is None:
+        with _lock:
+            if _graph is None and REPLAY_MODE == "replay":
+                _graph = TimedGraph(ReplayGraph())
+            if _graph is None:
+                from py2neo import Graph
+                graph = Graph(
+                    settings.NEO4J_URI,
+                    auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
+                )
+                create_indexes(graph)
+                _graph = TimedGraph(ReplayGraph(graph) if REPLAY_MODE == "record" else graph)
+    return _graph
+
+
+def use_graph(graph) -> None:
+    """替换进程内共享的图数据库连接（基准测试等场景接入本地替身，graph 需提供 run 方法）"""
+    global _graph
+    with _lock:
+        _graph = TimedGraph(graph)
+
+
+def create_indexes(graph) -> None:
+    """创建图数据库索引以加速查询"""
+    graph.run("CREATE INDEX company_code IF NOT EXISTS FOR (c:Company) ON (c.code)")
+    graph.run("CREATE INDEX industry_type IF NOT EXISTS FOR (c:Company) ON (c.industry_primary)")
+    graph.run("CREATE INDEX company_pagerank IF NOT EXISTS FOR (c:Company) ON (c.industry_primary, c.pagerank)")
+    logger.info("图数据库索引创建完成")
@@ -0,0 +1,149 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+import threading
+import time
+from typing import Callable
+from utils.logger import Logger
+
+IMPORT_NEGATIVE_TTL = int(os.getenv("IMPORT_NEGATIVE_TTL", "1800"))  # 导入后仍无数据的键，在该时长内不再触发导入（秒）
+
+
+class ImportGuard:
+    """联网导入保护
+
+    本地查询无结果时才通过LLM联网导入数据。同一个键（股票代码/行业）同时只允许一次导入，
+    其他请求等待该次导入完成后直接复用结果；导入后仍无数据的键记入带TTL的负缓存，
+    有效期内的请求直接返回空结果，不再调用LLM。
+    """
+    def __init__(self, negative_ttl: int = IMPORT_NEGATIVE_TTL):
+        self.logger = Logger("ImportGuard")
+        self.negative_ttl = negative_ttl
+        self.negatives = {}  # 键 -> 负缓存过期时间
+        self.key_locks = {}  # 键 -> 导入锁（键为股票代码/行业，数量有限，锁常驻）
+        self.in_flight = set()  # 正在执行导入的键
+        self.lock = threading.Lock()
+        self.counters = {
+            "local_hits": 0,  # 本地查询直接命中
+            "negative_hits": 0,  # 命中负缓存，跳过导入
+            "coalesced": 0,  # 等待其他请求的导入完成
+            "imports": 0,  # 实际执行的导入次数
+            "import_errors": 0,
+            "imported_hits": 0,  # 导入后查询到数据
+            "negatives_recorded": 0
+        }
+
+    def _count(self, name: str) -> None:
+        with self.lock:
+            self.counters[name] += 1
+
+    def is_negative(self, key: str) -> bool:
+        """键是否在负缓存有效期内"""
+        with self.lock:
+            expires = self.negatives.get(key)
+            if expires is None:
+                return False
+            if expires <= time.time():
+                del self.negatives[key]
+                return False
+            return True
+
+    def invalidate(self, key: str) -> None:
+        """移除负缓存（数据已通过其他途径导入时调用）"""
+        with self.lock:
+            self.negatives.pop(key, None)
+
+    def load(self, key: str, query: Callable[[], list], importer: Callable[[], None], retry: int = 2) -> list:
+        """先查本地，无结果时在保护下导入并重新查询，导入 retry 次后仍无数据则记入负缓存"""
+        result = query()
+        if result:
+            self._count("local_hits")
+            return result
+        if self.is_negative(key):
+            self._count("negative_hits")
+            return []
+
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        if not key_lock.acquire(blocking=False):
+            self._count("coalesced")
+            key_lock.acquire()
+        try:
+            # 首次查询之后、拿到锁之前，其他请求可能刚完成导入：直接复用其结果或负缓存结论
+            if self.is_negative(key):
+                self._count("negative_hits")
+                return []
+            result = query()
+            if result:
+                self._count("imported_hits")
+                return result
+            with self.lock:
+                self.in_flight.add(key)
+            for attempt in range(retry):
+                self._count("imports")
+                try:
+                    importer()
+                except Exception:
+                    self._count("import_errors")
+                    raise
+                result = query()
+                if result:
+                    self._count("imported_hits")
+                    self.logger.info(f"联网导入成功: {key}（第{attempt+1}次导入）")
+                    return result
+            with self.lock:
+                self.negatives[key] = time.time() + self.negative_ttl
+                self.counters["negatives_recorded"] += 1
+            self.logger.info(f"联网导入后仍无数据，{self.negative_ttl}秒内不再导入: {key}")
+            return []
+        finally:
+            with self.lock:
+                self.in_flight.discard(key)
+            key_lock.release()
+
+    def stats(self) -> dict:
+        """导入保护运行统计"""
+        now = time.time()
+        with self.lock:
+            return {
+                **self.counters,
+                "negative_cached": sum(1 for expires in self.negatives.values() if expires > now),
+                "in_flight": len(self.in_flight)
+            }
+
+
+_import_guard = None
+_guard_lock = threading.Lock()
+
+
+def get_import_guard() -> ImportGuard:
+    """进程内共享的联网导入保护"""
+    global _import_guard
+    if _import_guard is None:
+        with _guard_lock:
+            if _import_guard is None:
+                _import_guard = ImportGuard()
+    return _import_guard
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    guard = ImportGuard(negative_ttl=60)
+    store = {}
+
+    def slow_import(key: str, rows: list):
+        def run():
+            time.sleep(0.2)
+            store[key] = rows
+        return run
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(guard.load, "code:sh600519", lambda: store.get("code:sh600519", []),
+                               slow_import("code:sh600519", ["贵州茅台供应链"])) for _ in range(8)]
+        print([future.result() for future in futures])
+    for _ in range(3):
+        guard.load("code:sz000000", lambda: [], slow_import("code:sz000000", []))
+    print(guard.stats())
@@ -2,11 +2,10 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from py2neo import Graph, Node, Relationship  # 添加Node和Relationship导入
-from utils.config import settings
-from data.mock_data import MOCK_100
+from py2neo import Node, Relationship  # 添加Node和Relationship导入
 from utils.logger import Logger
 from data.web_data import StockDataFetcher
+from knowledge_graph.graph_client import get_graph, create_indexes
 import random
 
 class KGImporter:
@@ -14,11 +13,11 @@ class KGImporter:
         self.fetcher = StockDataFetcher()
         self.logger = Logger("KGImporter")
         self.logger.info("KGImporter初始化完成")  # 现在可以正常调用
-        self.graph = Graph(
-            settings.NEO4J_URI,
-            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
-        )
-        self._create_indexes()
+
+    @property
+    def graph(self):
+        """图数据库连接（首次使用时连接并创建索引）"""
+        return get_graph()
     
     def clear_database(self):
         """清除图数据库所有数据"""
@@ -62,9 +61,7 @@ class KGImporter:
     
     def _create_indexes(self):
         """创建图数据库索引以加速查询"""
-        self.graph.run("CREATE INDEX company_code IF NOT EXISTS FOR (c:Company) ON (c.code)")
-        self.graph.run("CREATE INDEX industry_type IF NOT EXISTS FOR (c:Company) ON (c.industry_primary)")
-        self.logger.info("图数据库索引创建完成")  # 现在可以正常调用
+        create_indexes(self.graph)
 
     def batch_import_real_data_industry(self, industry):
         try:
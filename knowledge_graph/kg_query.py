@@ -3,58 +3,132 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from datetime import datetime  # 新增datetime导入
-from py2neo import Graph
-from utils.config import settings
-from data.mock_data import MOCK_100
-from knowledge_graph.kg_importer import KGImporter
-from openai import OpenAI  # 新增OpenAI导入
-from dotenv import load_dotenv
-import os
+from knowledge_graph.graph_client import get_graph
+from knowledge_graph.import_guard import get_import_guard, IMPORT_NEGATIVE_TTL
+from knowledge_graph.enrichment_worker import KG_ENRICHMENT_MODE, enqueue_enrichment
+from utils.job_queue import get_job_queue, PRIORITY_HIGH, ACTIVE_STATUSES
+from knowledge_graph.similarity_index import get_similarity_index
+from knowledge_graph.traversal import bounded_bfs, clamp_depth, graph_neighbors
+from utils.structured_output import chat_structured, ParsedQuestion
+from utils.prompts import QUESTION_PARSER_PROMPT
+from utils.tracing import traced
+from utils.metrics import record_error
 import json  # 新增json模块导入
 import re  # 新增正则表达式模块
 from utils.logger import Logger
+import time
 import traceback  # 新增错误追踪模块
 from api.stock_api import StockAPI
-import Levenshtein
+from typing import Iterator
 
-api_key = os.getenv("DEEPSEEK_API_KEY")
-api_base_url = "https://api.deepseek.com/v1"
 model_name = "deepseek-chat"
 
 
+class EnrichmentPending(Exception):
+    """本地图谱暂无数据，已提交后台补全任务"""
+    def __init__(self, job: dict):
+        super().__init__(f"数据正在后台补全（任务 #{job['id']}，状态: {job['status']}）")
+        self.job = job
+
+
+_alias_mapping = None
+
+
+def load_alias_mapping() -> dict:
+    """股票别名表（进程内缓存，名称与别名预先转为小写）"""
+    global _alias_mapping
+    if _alias_mapping is None:
+        with open(Path(__file__).parent / "stock_alias.json", "r", encoding="utf-8") as f:
+            mapping = json.load(f)
+        _alias_mapping = {
+            code: {**info, "names": [name.lower() for name in [info["name"]] + info["aliases"]]}
+            for code, info in mapping.items()
+        }
+    return _alias_mapping
+
 
 class KnowledgeGraphQuery:
     def __init__(self):
-        self.graph = Graph(
-            settings.NEO4J_URI,
-            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
-        )
         self.logger = Logger("KnowledgeGraphQuery")
         self.logger.info("知识图谱查询初始化完成")  # 现在可以正常调用
-        self.kg_importer = KGImporter()  # 初始化导入器
         self.stock_api = StockAPI()
+        # 图数据库连接和导入器均在首次使用时创建
+        self._kg_importer = None
+
+    @property
+    def graph(self):
+        """图数据库连接（进程内共享，首次使用时连接）"""
+        return get_graph()
 
-        self.chat_model = OpenAI(
-            api_key=api_key,
-            base_url=api_base_url
-        )  # 初始化OpenAI客户端
+    @property
+    def kg_importer(self):
+        """知识图谱导入器（仅在本地查询无结果时才需要）"""
+        if self._kg_importer is None:
+            from knowledge_graph.kg_importer import KGImporter
+            self._kg_importer = KGImporter()
+        return self._kg_importer
         
-    def query_supply_chain(self, stock_code: str, depth: int = 2, retry: int = 2) -> list:
-        """供应链查询（带联网重试机制）"""
+    @traced()
+    def _load_or_enrich(self, kind: str, key: str, query, importer, retry: int, priority: int) -> list:
+        """先查本地图谱，无数据时补全
+
+        queue 模式下提交后台补全任务并抛出 EnrichmentPending（最近补全过仍无数据的键直接返回空列表）；
+        sync 模式下经导入保护在当前请求内联网导入。
+        """
+        if KG_ENRICHMENT_MODE == "sync":
+            # 同一键并发请求只导入一次，导入后仍无数据的键在TTL内不再导入
+            return get_import_guard().load(f"{kind}:{key}", query, importer, retry)
+        result = query()
+        if result:
+            return result
+        job = get_job_queue().latest(kind, key)
+        if job and job['status'] not in ACTIVE_STATUSES and job['updated_at'] > time.time() - IMPORT_NEGATIVE_TTL:
+            return []
+        raise EnrichmentPending(enqueue_enrichment(kind, key, priority))
+
+    def _supply_chain_rows(self, stock_code: str, depth: int, retry: int = 2, priority: int = PRIORITY_HIGH) -> list:
+        return self._load_or_enrich(
+            "supply_chain", stock_code,
+            lambda: self._query_local(stock_code, depth),
+            lambda: self.kg_importer.batch_import_real_data([stock_code]),
+            retry, priority
+        )
+
+    def _industry_rows(self, industry: str, retry: int = 2, priority: int = PRIORITY_HIGH) -> list:
+        return self._load_or_enrich(
+            "industry", industry,
+            lambda: self.query_industry_info_local(industry),
+            lambda: self.kg_importer.batch_import_real_data_industry(industry),
+            retry, priority
+        )
+
+    @traced()
+    def query_supply_chain(self, stock_code: str, depth: int = 2, retry: int = 2, priority: int = PRIORITY_HIGH) -> list:
+        """供应链查询（本地无数据时联网补全）"""
         # stock_code = stock_code.replace("sh", "").replace("sz", "")
         try:
-            for attempt in range(retry):
-                result = self._query_local(stock_code, depth)
-                if result:
-                    self.logger.info(f"供应链查询成功（第{attempt+1}次尝试）")
-                    return result
-                self.kg_importer.batch_import_real_data([stock_code])
+            result = self._supply_chain_rows(stock_code, depth, retry, priority)
+            if result:
+                self.logger.info("供应链查询成功")
+                return result
             raise ValueError(f"股票代码 {stock_code} 不存在，请检查后重试")
+        except EnrichmentPending as e:
+            self.logger.info(f"供应链查询: {stock_code} {str(e)}")
+            return []
         except Exception as e:
             self.logger.error(f"供应链查询失败: {str(e)}")
             self.logger.error(f"详细错误追踪：\n{traceback.format_exc()}")
             return []
     
+    @traced()
+    def query_similar_companies(self, stock_code: str, top_k: int = 5) -> list:
+        """相似公司查询（基于预计算的MinHash索引，不访问图数据库）"""
+        index = get_similarity_index()
+        if index is None:
+            self.logger.warning("相似公司索引不存在，请先运行 python -m knowledge_graph.similarity_index build")
+            return []
+        return index.top_k(stock_code, top_k)
+
     def check_stock_existence(self, stock_code: str) -> bool:
         """验证股票在知识图谱中的存在性"""
         cypher = f"MATCH (c:Company) WHERE c.code = '{stock_code}' RETURN count(c) > 0 as exists"
@@ -71,6 +145,7 @@ class KnowledgeGraphQuery:
                 stock_code = f"sh{stock_code}"
         return stock_code
         
+    @traced()
     def query_industry_chain(self, stock_code: str) -> dict:
         """查询完整产业链关系"""
         cypher = f"""
@@ -87,6 +162,7 @@ class KnowledgeGraphQuery:
             "partners": []
         }
     
+    @traced()
     def unified_query(self, question: str) -> dict:
         """统一查询入口（集成自然语言解析与业务逻辑）"""
         self.logger.info(f"收到查询请求: {question}")
@@ -94,74 +170,76 @@ class KnowledgeGraphQuery:
         self.logger.info(f"解析结果: {parsed}")
         
         if parsed['intent'] == 'supply_chain':
-            return self.handle_supply_chain(parsed)
+            result = self.handle_supply_chain(parsed)
         elif parsed['intent'] == 'industry':
-            return self.handle_industry(parsed)
+            result = self.handle_industry(parsed)
         else:
-            return self.handle_general(parsed)
+            result = self.handle_general(parsed)
+        if result.get('error_type'):
+            record_error(result['error_type'])
+        return result
 
     def _fuzzy_match_stock_name(self, input_name: str, alias_mapping: dict) -> str:
         """模糊匹配股票名称/别名，返回最接近的股票代码"""
+        import Levenshtein
         max_similarity = 0
         matched_code = ""
         
+        input_name = input_name.lower()
         for code, info in alias_mapping.items():
-            # 检查标准名称和所有别名的相似度
-            all_names = [info["name"]] + info["aliases"]
-            for name in all_names:
-                similarity = Levenshtein.ratio(input_name.lower(), name.lower())
+            # 检查标准名称和所有别名的相似度（名称已在加载时转为小写）
+            for name in info["names"]:
+                similarity = Levenshtein.ratio(input_name, name)
                 if similarity > max_similarity and similarity > 0.6:  # 阈值设为0.6（可调整）
                     max_similarity = similarity
                     matched_code = code
                     
         return matched_code
 
+    @traced()
     def _parse_question(self, question: str) -> dict:
         """DeepSeek自然语言解析"""
-        prompt = f"""将股票查询问题解析为JSON格式，字段包括：
-        intent: 查询意图（supply_chain/industry/stock_info/strategy）  # 新增strategy意图
-        stock_code: 股票代码（如存在）
-        stock_name: 股票名称（如存在，用户输入中提到的股票名称或别名）  # 新增字段用于识别名称
-        industry: 行业名称（如存在）
-        depth: 查询层级（仅供应链需要）
-        strategy_type: 策略类型（如存在"稳健型""激进型"等关键词时填写）  # 新增字段
-        
-        问题：{question}"""
-        
-        response = self.chat_model.chat.completions.create(
+        # 解析调用耗时短且可重复发送，开启对冲请求以压低长尾延迟
+        parsed = chat_structured(
+            "kg_query.parse_question",
+            # 固定的系统消息在前、问题在后，各次解析请求共享同一前缀
+            [{"role": "system", "content": QUESTION_PARSER_PROMPT}, {"role": "user", "content": question}],
+            ParsedQuestion,
+            hedge=True,
             model=model_name,
-            messages=[{"role": "user", "content": prompt}],
             response_format={"type": "json_object"}
-        )
-        parsed = json.loads(response.choices[0].message.content)
+        ).model_dump(exclude_none=True)
         # 若未解析到stock_code，尝试模糊匹配名称/别名
         if not parsed.get("stock_code"):
             # 从问题中提取可能的股票名称（简单示例：提取"查询"后的关键词）
             import re
-            alias_mapping_path = Path(__file__).parent / "stock_alias.json"
-            with open(alias_mapping_path, "r", encoding="utf-8") as f:
-                alias_mapping = json.load(f)
-                name_candidates = re.findall(r"查询(.*?)的", question)  # 匹配"查询XX的"中的XX
-                for candidate in name_candidates:
-                    matched_code = self._fuzzy_match_stock_name(candidate, alias_mapping)
-                    matched_code = self.check_stock_valid(matched_code)
-                    # self.logger.info(f"模糊匹配结果: {matched_code}")
-                    parsed['stock_code'] = matched_code  # 直接更新解析结果
-                    break
-                # self.logger.info(f"stock_code: {parsed['stock_code']}")
+            alias_mapping = load_alias_mapping()  # 进程内只读取一次
+            name_candidates = re.findall(r"查询(.*?)的", question)  # 匹配"查询XX的"中的XX
+            for candidate in name_candidates:
+                matched_code = self._fuzzy_match_stock_name(candidate, alias_mapping)
+                matched_code = self.check_stock_valid(matched_code)
+                # self.logger.info(f"模糊匹配结果: {matched_code}")
+                parsed['stock_code'] = matched_code  # 直接更新解析结果
+                break
+            # self.logger.info(f"stock_code: {parsed['stock_code']}")
         return parsed
         
     
-    def query_industry_info_local(self, industry: str) -> list:
-        """查询特定行业的公司"""
-        cypher = f"""
+    def _industry_cypher(self, industry: str) -> str:
+        """行业公司查询语句（本地查询与流式查询共用）"""
+        return f"""
         MATCH (c:Company)
         WHERE c.industry_primary = '{industry}'
         RETURN c.code as code, c.name as name
         LIMIT 50
         """
-        return [dict(item) for item in self.graph.run(cypher)]
+
+    @traced()
+    def query_industry_info_local(self, industry: str) -> list:
+        """查询特定行业的公司"""
+        return [dict(item) for item in self.graph.run(self._industry_cypher(industry))]
     
+    @traced()
     def query_all_industries(self) -> list:
         """获取所有行业分类"""
         cypher = """
@@ -171,16 +249,21 @@ class KnowledgeGraphQuery:
         """
         return [item['industry'] for item in self.graph.run(cypher)]
 
+    @traced()
     def handle_supply_chain(self, parsed: dict) -> dict:
         """处理供应链查询请求"""
         try:
             stock_code = parsed['stock_code']
-            depth = parsed.get('depth', 2)
+            depth = clamp_depth(parsed.get('depth', 2))  # LLM解析出的层级需截断，避免路径爆炸
             
             if not self.check_stock_valid(stock_code):  # 新增股票代码校验
                 raise ValueError(f"无效股票代码: {stock_code}")
                 
-            data = self.query_supply_chain(stock_code, depth)
+            try:
+                data = self._supply_chain_rows(stock_code, depth)
+            except EnrichmentPending as e:
+                return self._pending_response("supply_chain_info", str(e), e.job,
+                                              basic_info=self.stock_api.get_stock_basic_info(stock_code))
             if not data:
                 return {
                     "status": "error",
@@ -204,26 +287,31 @@ class KnowledgeGraphQuery:
                 "error_type": "supply_chain_query_error"
             }
 
-    def query_industry_info(self, industry: str, retry:int=2) -> list:
+    @traced()
+    def query_industry_info(self, industry: str, retry:int=2, priority: int = PRIORITY_HIGH) -> list:
         """查询特定行业的公司"""
         try:
-            for attempt in range(retry):
-                result = self.query_industry_info_local(industry)
-                if result:
-                    self.logger.info(f"特定行业的公司查询成功（第{attempt+1}次尝试）")
-                    return result
-                self.kg_importer.batch_import_real_data_industry(industry)
+            result = self._industry_rows(industry, retry, priority)
+            if result:
+                self.logger.info("特定行业的公司查询成功")
+            return result
+        except EnrichmentPending as e:
+            self.logger.info(f"行业公司查询: {industry} {str(e)}")
             return []
         except Exception as e:
             self.logger.error(f"特定行业的公司查询失败: {str(e)}")
             self.logger.error(f"详细错误追踪：\n{traceback.format_exc()}")
             return []
 
+    @traced()
     def handle_industry(self, parsed: dict) -> dict:
         """处理行业信息查询"""
         try:
             industry = parsed['industry']
-            data = self.query_industry_info(industry)
+            try:
+                data = self._industry_rows(industry)
+            except EnrichmentPending as e:
+                return self._pending_response("industry_info", str(e), e.job, industry=industry)
 
             if not data:
                 return {
@@ -249,6 +337,18 @@ class KnowledgeGraphQuery:
                 "error_type": "industry_query_error"
             }
 
+    def _pending_response(self, message_type: str, message: str, job: dict, **partial) -> dict:
+        """本地图谱暂无数据时的部分结果：返回补全任务状态及已有的其他信息"""
+        return {
+            "status": "pending",
+            "message_type": message_type,
+            "message": message,
+            "job": {"id": job['id'], "kind": job['kind'], "key": job['key'], "status": job['status']},
+            "data": partial,
+            "metadata": {"query_time": datetime.now().isoformat()}
+        }
+
+    @traced()
     def handle_general(self, parsed: dict) -> dict:
         """处理股票基本信息查询"""
         try:
@@ -300,21 +400,107 @@ class KnowledgeGraphQuery:
                 "error_type": "stock_info_error"
             }
 
+    @traced()
     def _query_local(self, stock_code: str, depth: int) -> list:
-        """本地知识图谱供应链查询（增加name字段）"""
-        
-        cypher = f"""
-        MATCH (c:Company)-[r:SUPPLY_CHAIN*1..{depth}]->(partner:Company)
-        WHERE c.code = '{stock_code}'
-        RETURN c.code as company_code, 
-               c.name as company_name,  // 新增公司名称
-               partner.code as partner_code,
-               partner.name as parter_name,  // 新增合作伙伴名称
-               r[-1].relationType as relation
-        LIMIT 50
+        """本地知识图谱供应链查询（有界广度优先遍历，每个伙伴只返回一次）"""
+        return list(self._query_local_stream(stock_code, depth))
+
+    def _query_local_stream(self, stock_code: str, depth: int) -> Iterator[dict]:
+        """流式供应链查询：按层展开并逐条产出，不在内存中缓存完整路径集合"""
+        return bounded_bfs(stock_code, graph_neighbors(self.graph), clamp_depth(depth))
+
+    def query_supply_chain_stream(self, stock_code: str, depth: int = 2, retry: int = 2) -> Iterator[dict]:
+        """流式供应链查询，逐条产出供应链关系（本地无数据且已提交补全任务时抛出 EnrichmentPending）"""
+        found = False
+        for row in self._query_local_stream(stock_code, depth):
+            found = True
+            yield row
+        if found:
+            self.logger.info("流式供应链查询成功")
+            return
+        # 本地无数据：补全后一次性返回（结果受节点预算限制）
+        rows = self._supply_chain_rows(stock_code, depth, retry)
+        if rows:
+            yield from rows
+            return
+        raise ValueError(f"股票代码 {stock_code} 不存在，请检查后重试")
+
+    def query_industry_info_stream(self, industry: str, retry: int = 2) -> Iterator[dict]:
+        """流式查询特定行业的公司（本地无数据且已提交补全任务时抛出 EnrichmentPending）"""
+        found = False
+        for record in self.graph.run(self._industry_cypher(industry)):
+            found = True
+            yield dict(record)
+        if found:
+            self.logger.info("流式行业公司查询成功")
+            return
+        yield from self._industry_rows(industry, retry)
+
+    def unified_query_stream(self, question: str) -> Iterator[dict]:
+        """流式统一查询入口：依次产出解析出的实体、供应链/行业结果、基本信息与实时行情
+
+        每个事件为 {"event": 事件类型, "data": 数据}，事件类型包括
+        entity / supply_chain / industry / basic_info / realtime / pending / error / done。
         """
-        result = self.graph.run(cypher).data()
-        return [dict(item) for item in result] if result else []
+        for event in self._unified_query_events(question):
+            if event["event"] == "error":
+                record_error(event["data"].get("error_type", "unknown"))
+            yield event
+
+    def _unified_query_events(self, question: str) -> Iterator[dict]:
+        self.logger.info(f"收到流式查询请求: {question}")
+        try:
+            parsed = self._parse_question(question)
+        except Exception as e:
+            yield {"event": "error", "data": {"message": f"问题解析失败: {str(e)}", "error_type": "parse_error"}}
+            return
+        self.logger.info(f"解析结果: {parsed}")
+        yield {"event": "entity", "data": parsed}
+
+        intent = parsed.get('intent')
+        try:
+            if intent == 'supply_chain':
+                stock_code = parsed.get('stock_code')
+                if not stock_code or not self.check_stock_valid(stock_code):
+                    raise ValueError(f"无效股票代码: {stock_code}")
+                count = 0
+                for row in self.query_supply_chain_stream(stock_code, parsed.get('depth') or 2):
+                    count += 1
+                    yield {"event": "supply_chain", "data": row}
+                yield {"event": "done", "data": {"message_type": "supply_chain_info", "count": count}}
+            elif intent == 'industry':
+                industry = parsed.get('industry')
+                count = 0
+                for row in self.query_industry_info_stream(industry):
+                    count += 1
+                    yield {"event": "industry", "data": row}
+                if not count:
+                    yield {"event": "error", "data": {"message": f"{industry}行业暂无上市公司数据", "error_type": "industry_query_error"}}
+                    return
+                yield {"event": "done", "data": {"message_type": "industry_info", "industry": industry, "count": count}}
+            else:
+                stock_code = parsed.get('stock_code')
+                if not stock_code:
+                    yield {"event": "error", "data": {"message": "未检测到股票代码，请在查询中包含具体股票代码（如 'sh600519' 或 'sz000001'）", "error_type": "missing_stock_code"}}
+                    return
+                basic = self.stock_api.get_stock_basic_info(stock_code)
+                if basic.get("error"):
+                    yield {"event": "error", "data": {"message": f"股票代码 {stock_code} 基本信息获取失败: {basic.get('message')}", "error_type": "handle_general_basic_info_error"}}
+                    return
+                yield {"event": "basic_info", "data": basic}
+                realtime = self.stock_api.get_stock_real_time_info_by_code(stock_code)
+                if not realtime or realtime.get("error"):
+                    yield {"event": "error", "data": {"message": f"股票代码 {stock_code} 实时行情获取失败", "error_type": "handle_general_stock_not_found"}}
+                    return
+                yield {"event": "realtime", "data": realtime}
+                yield {"event": "done", "data": {"message_type": "stock_info"}}
+        except EnrichmentPending as e:
+            job = e.job
+            yield {"event": "pending", "data": {"message": str(e), "job": {"id": job['id'], "kind": job['kind'], "key": job['key'], "status": job['status']}}}
+            yield {"event": "done", "data": {"message_type": "pending"}}
+        except Exception as e:
+            self.logger.error(f"流式查询失败: {str(e)}")
+            yield {"event": "error", "data": {"message": str(e), "error_type": f"{intent or 'stock_info'}_stream_error"}}
 
 
 
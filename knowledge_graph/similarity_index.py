@@ -0,0 +1,171 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+import threading
+import zlib
+from utils import snapshot_dir
+from utils.logger import Logger
+
+SIMILARITY_INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", str(Path(__file__).parent / "similarity_index"))  # 索引目录（按版本子目录保存）
+NUM_PERM = 64  # MinHash签名长度
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# 每家公司的特征：直接供应链伙伴（上下游均计入）+ 一级/二级行业
+FEATURES_CYPHER = """
+MATCH (c:Company)
+OPTIONAL MATCH (c)-[:SUPPLY_CHAIN]-(p:Company)
+RETURN c.code AS code, c.name AS name,
+       c.industry_primary AS industry_primary, c.industry_secondary AS industry_secondary,
+       collect(DISTINCT p.code) AS partners
+"""
+
+
+def company_tokens(row: dict) -> set:
+    """将公司特征转换为MinHash输入的词元集合"""
+    tokens = {f"p:{code}" for code in row.get('partners') or [] if code}
+    if row.get('industry_primary'):
+        tokens.add(f"i1:{row['industry_primary']}")
+    if row.get('industry_secondary'):
+        tokens.add(f"i2:{row['industry_secondary']}")
+    return tokens
+
+
+class SimilarityIndex:
+    """相似公司索引：基于供应链伙伴与行业特征的MinHash签名
+
+    签名矩阵为 (公司数, NUM_PERM) 的uint32数组，两家公司签名相同位置的比例即Jaccard相似度估计，
+    查询只需一次向量化比较，无需图遍历。
+    """
+    def __init__(self, codes, names, signatures, empty):
+        self.codes = codes
+        self.names = names
+        self.signatures = signatures
+        self.empty = empty  # 无任何特征的公司，不参与相似度比较
+        self.positions = {str(code): i for i, code in enumerate(codes)}
+
+    @staticmethod
+    def permutations(num_perm: int = NUM_PERM, seed: int = 1):
+        """生成固定的随机哈希参数 (a, b)
+
+        a、b 取自 [0, 2^32)：词元哈希为32位，a*h+b 不超过 2^64，uint64 运算不会在取模前溢出。
+        """
+        import numpy as np
+        rng = np.random.RandomState(seed)
+        a = rng.randint(1, _MAX_HASH + 1, size=num_perm, dtype=np.uint64)
+        b = rng.randint(0, _MAX_HASH + 1, size=num_perm, dtype=np.uint64)
+        return a, b
+
+    @classmethod
+    def build(cls, rows: list, num_perm: int = NUM_PERM) -> "SimilarityIndex":
+        """根据公司特征行构建索引"""
+        import numpy as np
+        a, b = cls.permutations(num_perm)
+        signatures = np.full((len(rows), num_perm), _MAX_HASH, dtype=np.uint32)
+        empty = np.zeros(len(rows), dtype=bool)
+        for i, row in enumerate(rows):
+            tokens = company_tokens(row)
+            if not tokens:
+                empty[i] = True
+                continue
+            hashes = np.array([zlib.crc32(token.encode("utf-8")) for token in tokens], dtype=np.uint64)
+            # (num_perm, 词元数) 的哈希矩阵，逐行取最小值即为签名
+            permuted = (np.outer(a, hashes) + b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+            signatures[i] = permuted.min(axis=1).astype(np.uint32)
+        codes = np.array([str(row['code']) for row in rows])
+        names = np.array([str(row.get('name') or "") for row in rows])
+        return cls(codes, names, signatures, empty)
+
+    @classmethod
+    def build_from_graph(cls, graph) -> "SimilarityIndex":
+        """从图数据库读取全部公司特征并构建索引"""
+        return cls.build(graph.run(FEATURES_CYPHER).data())
+
+    def save(self, path: str = SIMILARITY_INDEX_PATH) -> None:
+        """写入新的版本子目录后原子切换 CURRENT 指针（各数组同时生效，正在读取的进程仍使用已映射的旧版本）"""
+        import numpy as np
+        os.makedirs(path, exist_ok=True)
+        version = snapshot_dir.new_version(path)
+        for name, array in (("codes", self.codes), ("names", self.names), ("signatures", self.signatures),
+                            ("empty", self.empty)):
+            np.save(os.path.join(version, f"{name}.npy"), array)
+        snapshot_dir.publish(path, version)
+
+    @classmethod
+    def load(cls, path: str = SIMILARITY_INDEX_PATH, mmap: bool = True) -> "SimilarityIndex":
+        """加载当前版本；mmap=True 时以只读内存映射方式打开，各工作进程共享同一份签名矩阵"""
+        import numpy as np
+        directory = snapshot_dir.current(path)
+        mode = "r" if mmap else None
+        return cls(*(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+                     for name in ("codes", "names", "signatures", "empty")))
+
+    def similarities(self, stock_code: str):
+        """目标公司与所有公司的相似度向量，目标不在索引中时返回None"""
+        i = self.positions.get(stock_code)
+        if i is None or self.empty[i]:
+            return None
+        sims = (self.signatures == self.signatures[i]).mean(axis=1)
+        sims[self.empty] = 0.0
+        sims[i] = 0.0
+        return sims
+
+    def top_k(self, stock_code: str, k: int = 5) -> list:
+        """返回最相似的k家公司"""
+        import numpy as np
+        sims = self.similarities(stock_code)
+        if sims is None:
+            return []
+        k = min(k, len(sims))
+        candidates = np.argpartition(-sims, k - 1)[:k] if k > 0 else []
+        ranked = sorted(candidates, key=lambda j: sims[j], reverse=True)
+        return [
+            {"code": str(self.codes[j]), "name": str(self.names[j]), "similarity": round(float(sims[j]), 4)}
+            for j in ranked if sims[j] > 0
+        ]
+
+    def similarity(self, code_a: str, code_b: str) -> float:
+        """两家公司的相似度估计，任一不在索引中时返回0"""
+        i, j = self.positions.get(code_a), self.positions.get(code_b)
+        if i is None or j is None or self.empty[i] or self.empty[j]:
+            return 0.0
+        return float((self.signatures[i] == self.signatures[j]).mean())
+
+
+_index = None
+_index_mtime = None
+_lock = threading.Lock()
+logger = Logger("SimilarityIndex")
+
+
+def get_similarity_index(path: str = SIMILARITY_INDEX_PATH):
+    """进程内共享的相似公司索引（mmap 只读），索引更新后自动重新加载；尚未构建时返回None"""
+    global _index, _index_mtime
+    mtime = snapshot_dir.version_token(path, "signatures.npy")
+    if mtime is None:
+        return None
+    if _index is None or mtime != _index_mtime:
+        with _lock:
+            if _index is None or mtime != _index_mtime:
+                _index = SimilarityIndex.load(path)
+                _index_mtime = mtime
+                logger.info(f"加载相似公司索引: {len(_index.codes)}家公司")
+    return _index
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="相似公司索引")
+    parser.add_argument("command", choices=["build", "query"])
+    parser.add_argument("--code", default="sh600519")
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+    if args.command == "build":
+        from knowledge_graph.graph_client import get_graph
+        index = SimilarityIndex.build_from_graph(get_graph())
+        index.save()
+        logger.info(f"相似公司索引构建完成: {len(index.codes)}家公司 -> {SIMILARITY_INDEX_PATH}")
+    else:
+        print(get_similarity_index().top_k(args.code, args.top))
@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from typing import Callable, Iterator
+
+MAX_SUPPLY_CHAIN_DEPTH = 3  # 供应链查询的最大层级（LLM解析出的depth会被截断到该值）
+DEFAULT_FANOUT = 20  # 每个节点每跳最多展开的伙伴数（按关系权重从高到低）
+DEFAULT_NODE_BUDGET = 50  # 单次查询最多返回的伙伴数
+DEFAULT_EDGE_WEIGHT = 1.0  # 缺失、无法解析或非正的关系权重按此值计（不影响路径权重之积）
+
+# 按层展开：一次查询取出当前层所有节点的出边，每个节点只保留权重最高的 $fanout 条
+# 边的排序与 edge_weight 取值规则一致（缺失、无法解析或非正的权重按1.0计）
+NEIGHBORS_CYPHER = """
+UNWIND $codes AS code
+MATCH (c:Company {code: code})-[r:SUPPLY_CHAIN]->(p:Company)
+WITH c, r, p ORDER BY CASE WHEN toFloat(r.weight) > 0 THEN toFloat(r.weight) ELSE 1.0 END DESC
+WITH c, collect({partner_code: p.code, partner_name: p.name,
+                 relation: r.relationType, weight: r.weight})[..$fanout] AS edges
+RETURN c.code AS code, c.name AS name, edges
+"""
+
+
+def clamp_depth(depth, max_depth: int = MAX_SUPPLY_CHAIN_DEPTH) -> int:
+    """规范化查询层级：非法值按2处理，并限制在 [1, max_depth]"""
+    try:
+        depth = int(depth)
+    except (TypeError, ValueError):
+        depth = 2
+    return max(1, min(depth, max_depth))
+
+
+def edge_weight(value) -> float:
+    """关系权重转为浮点数（LLM生成的权重可能是字符串或缺失），遍历和中心性计算共用"""
+    try:
+        weight = float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_EDGE_WEIGHT
+    return weight if weight > 0 else DEFAULT_EDGE_WEIGHT
+
+
+def graph_neighbors(graph) -> Callable[[list, int], dict]:
+    """基于图数据库的邻居展开函数"""
+    def neighbors(codes: list, fanout: int) -> dict:
+        return {
+            row['code']: {'name': row['name'], 'edges': row['edges']}
+            for row in graph.run(NEIGHBORS_CYPHER, codes=codes, fanout=fanout).data()
+        }
+    return neighbors
+
+
+def bounded_bfs(start: str, neighbors: Callable[[list, int], dict], depth: int = 2,
+                fanout: int = DEFAULT_FANOUT, node_budget: int = DEFAULT_NODE_BUDGET) -> Iterator[dict]:
+    """有界广度优先遍历供应链
+
+    按层展开不同节点（而非枚举路径），每层按路径权重从高到低扩展，每个节点每跳最多展开 fanout 条边，
+    总伙伴数不超过 node_budget。每个伙伴只返回一次，附带最短跳数和该跳数下最强的路径权重
+    （路径上各关系权重之积）。结果按层产出，调用方可以流式消费。
+    """
+    depth = clamp_depth(depth)
+    seen = {start}
+    frontier = [(start, 1.0)]
+    company_name = None
+    emitted = 0
+    for hop in range(1, depth + 1):
+        expansions = neighbors([code for code, _ in frontier], fanout)
+        if company_name is None:
+            company_name = expansions.get(start, {}).get('name')
+        candidates = []
+        for source, source_weight in frontier:
+            for edge in expansions.get(source, {}).get('edges', [])[:fanout]:
+                candidates.append((source_weight * edge_weight(edge.get('weight')), source, edge))
+        # 同一跳内按路径权重降序处理，首次出现即为该节点在最短跳数下的最强路径
+        candidates.sort(key=lambda item: item[0], reverse=True)
+        next_frontier = []
+        for path_weight, source, edge in candidates:
+            partner_code = edge.get('partner_code')
+            if partner_code in seen:
+                continue
+            if emitted >= node_budget:
+                return
+            seen.add(partner_code)
+            next_frontier.append((partner_code, path_weight))
+            emitted += 1
+            yield {
+                'company_code': start,
+                'company_name': company_name,
+                'partner_code': partner_code,
+                'parter_name': edge.get('partner_name'),
+                'relation': edge.get('relation'),
+                'hop': hop,
+                'path_weight': round(path_weight, 6),
+                'via': source
+            }
+        if not next_frontier:
+            return
+        frontier = next_frontier
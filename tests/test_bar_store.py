@@ -0,0 +1,23 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+from benchmarks.bench_risk_batch import make_bars
+from data.bar_store import BarStore, get_bar_store
+from utils import snapshot_dir
+
+
+def test_save_swaps_all_matrices_at_once(tmp_path):
+    path = str(tmp_path / "bars")
+    small, _ = make_bars(stocks=5, days=10, industries=2, seed=0)
+    large, _ = make_bars(stocks=8, days=20, industries=2, seed=1)
+    small.save(path)
+    assert len(get_bar_store(path)) == 5
+    large.save(path)
+    store = get_bar_store(path)  # 指针切换后重新加载
+    assert (len(store), len(store.dates)) == (8, 20)
+    assert store.fields["close"].shape == (20, 8)
+    assert not [name for name in os.listdir(path) if name.endswith(".npy")]  # 根目录下没有逐个替换的文件
+    assert BarStore.load(path).codes.tolist() == large.codes.tolist()
+    assert snapshot_dir.current(path) != path
@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+from benchmarks.datasets import generate_universe
+from benchmarks.stubs.fake_neo4j import FakeGraph
+from knowledge_graph.centrality import CentralityJob, load_centrality
+
+
+def test_run_if_changed_detects_weight_and_endpoint_changes(tmp_path):
+    graph = FakeGraph(generate_universe(companies=30, edges_per_company=3), latency=0)
+    job = CentralityJob(graph=graph, path=str(tmp_path / "centrality"))
+    assert job.run_if_changed()
+    assert not job.run_if_changed()
+
+    code, edges = next((code, edges) for code, edges in graph.edges.items() if edges)
+    edges[0]["weight"] = 0.123  # 边数不变，只改权重
+    assert job.run_if_changed()
+
+    used = {edge["partner_code"] for edge in edges} | {code}
+    edges[0]["partner_code"] = next(other for other in graph.companies if other not in used)  # 边数不变，改连接对象
+    assert job.run_if_changed()
+    assert not job.run_if_changed()
+
+
+def test_side_table_is_memory_mapped(tmp_path):
+    graph = FakeGraph(generate_universe(companies=30, edges_per_company=3), latency=0)
+    path = str(tmp_path / "centrality")
+    assert load_centrality(path) is None
+    result = CentralityJob(graph=graph, path=path).run()
+
+    table = load_centrality(path)
+    assert isinstance(table["pagerank"], np.memmap)
+    assert table["codes"].tolist() == result["codes"].tolist()
+    np.testing.assert_allclose(table["pagerank"], result["pagerank"])
@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+import data.web_data as web_data
+from data.fundamentals_columnar import ColumnarFundamentals, get_columnar_fundamentals
+from utils import snapshot_dir
+
+ROWS = [
+    {"stock_code": "600519", "stock_name": "贵州茅台", "industry_primary": "食品饮料", "industry_secondary": "白酒",
+     "listing_time": "2001-08-27"},
+    {"stock_code": "002594", "stock_name": "比亚迪", "industry_primary": "汽车", "industry_secondary": "乘用车",
+     "listing_time": "2011-06-30"}
+]
+
+
+def test_save_publishes_records_and_meta_together(tmp_path):
+    path = str(tmp_path / "columnar")
+    ColumnarFundamentals.build(ROWS[:1]).save(path)
+    first = snapshot_dir.current(path)
+    ColumnarFundamentals.build(ROWS).save(path)
+    second = snapshot_dir.current(path)
+    assert first != second
+    assert sorted(os.listdir(second)) == ["meta.json", "records.npy"]
+
+    columnar = get_columnar_fundamentals(path)
+    assert len(columnar) == 2
+    assert columnar.get("sz002594")["industry_primary"] == "汽车"
+
+
+def test_old_versions_are_pruned(tmp_path):
+    path = str(tmp_path / "columnar")
+    for _ in range(4):
+        ColumnarFundamentals.build(ROWS).save(path)
+    versions = [name for name in os.listdir(path) if name.startswith("v")]
+    assert len(versions) == snapshot_dir.SNAPSHOT_KEEP
+    assert os.path.basename(snapshot_dir.current(path)) in versions
+
+
+def test_fundamental_lookup_prefers_store(monkeypatch):
+    class Store:
+        def get(self, code):
+            return {**ROWS[0], "stock_code": code, "industry_primary": "存储中的新行业"}
+
+    class Columnar:
+        def get(self, code):
+            return {**ROWS[0], "stock_code": code}
+
+    monkeypatch.setattr(web_data, "get_fundamentals_store", lambda: Store())
+    monkeypatch.setattr(web_data, "get_columnar_fundamentals", lambda: Columnar())
+    fetcher = web_data.StockDataFetcher.__new__(web_data.StockDataFetcher)
+    fetcher.logger = web_data.Logger("test")
+    assert fetcher.find_stock_fundamental_by_code("600519")["industry_primary"] == "存储中的新行业"
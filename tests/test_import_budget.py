@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import pytest
+from utils.import_budget import DEFERRED_MODULES, check_import_budget, measure_import
+
+
+def test_deferred_modules_cover_heavy_dependencies():
+    assert {"langchain", "langchain_openai", "openai", "pandas", "numpy", "py2neo", "Levenshtein",
+            "faker"} <= set(DEFERRED_MODULES)
+
+
+@pytest.mark.parametrize("module", ["backend", "main"])
+def test_startup_import_budget(module):
+    """服务入口冷启动时不导入重量级依赖，耗时在预算内（未通过时输出耗时最多的模块）"""
+    loaded = {name.split(".")[0] for name, _, _ in measure_import(module)["imports"]}
+    assert not loaded.intersection(DEFERRED_MODULES)
+    assert check_import_budget(module)
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from knowledge_graph.import_guard import ImportGuard
+
+
+def test_rechecks_after_acquiring_lock():
+    """首次查询为空、拿到锁时其他请求已导入完成：复用结果，不再导入"""
+    guard, imports, calls = ImportGuard(), [], []
+
+    def query():
+        calls.append(1)
+        return [] if len(calls) == 1 else ["贵州茅台供应链"]
+
+    assert guard.load("sh600519", query, lambda: imports.append(1)) == ["贵州茅台供应链"]
+    assert imports == []
+    assert guard.stats()["imported_hits"] == 1
+
+
+def test_rechecks_negative_after_acquiring_lock():
+    guard, imports = ImportGuard(), []
+
+    def query():
+        guard.negatives["sz000000"] = time.time() + 60  # 其他请求刚记入负缓存
+        return []
+
+    assert guard.load("sz000000", query, lambda: imports.append(1)) == []
+    assert imports == []
+    assert guard.stats()["negative_hits"] == 1
+
+
+def test_concurrent_requests_import_once():
+    guard, store, imports = ImportGuard(), {}, []
+
+    def importer():
+        imports.append(1)
+        time.sleep(0.1)
+        store["sh600519"] = ["贵州茅台供应链"]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(guard.load, "sh600519", lambda: store.get("sh600519", []), importer) for _ in range(8)]
+        results = [future.result() for future in futures]
+    assert results == [["贵州茅台供应链"]] * 8
+    assert len(imports) == 1
@@ -0,0 +1,72 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import data.indicators as indicators
+from benchmarks.bench_risk_batch import make_bars
+from data.indicators import IndicatorStream
+
+
+def test_state_rewarms_after_bar_store_reload(monkeypatch):
+    stores = [make_bars(stocks=3, days=60, industries=1, seed=0)[0]]
+    monkeypatch.setattr(indicators, "get_bar_store", lambda: stores[-1])
+    stream = IndicatorStream(history=lambda code, days: [])
+    first = stream.state("sh600000")
+    assert stream.state("sh600000") is first
+
+    stores.append(make_bars(stocks=3, days=70, industries=1, seed=1)[0])  # 重新构建，最后日期更新
+    second = stream.state("sh600000")
+    assert second is not first
+    assert second.date == int(stores[-1].dates[-1]) > first.date
+    assert stream.stats()["reloads"] == 1
+
+
+def test_state_kept_when_reloaded_store_lacks_stock(monkeypatch):
+    stores = [make_bars(stocks=3, days=60, industries=1, seed=0)[0]]
+    monkeypatch.setattr(indicators, "get_bar_store", lambda: stores[-1])
+    stream = IndicatorStream(history=lambda code, days: [])
+    first = stream.state("sh600002")
+    stores.append(make_bars(stocks=2, days=60, industries=1, seed=0)[0])
+    assert stream.state("sh600002") is first
+    assert stream.state("sh600002") is first
+
+
+def daily_history(days: int = 30):
+    """截至昨天（北京时间）的日线，价格缓慢上涨"""
+    import time
+    from data.portfolio_analytics import trade_day
+    today = trade_day(time.time())
+    return [{"trade_date": time.strftime("%Y%m%d", time.gmtime((today - days + i) * 86400)),
+             "close": 10.0 + i * 0.1, "high": 10.2 + i * 0.1, "low": 9.8 + i * 0.1} for i in range(days)]
+
+
+def test_tick_for_normalized_code_updates_snapshot(monkeypatch):
+    import time
+    monkeypatch.setattr(indicators, "get_bar_store", lambda: None)
+    stream = IndicatorStream(history=lambda code, days: daily_history())
+    before = stream.snapshot("600519.SH")
+    stream.on_quote({"code": "sh600519", "price": 20.0, "timestamp": time.time()})  # 行情中心推送规范化的代码
+    after = stream.snapshot("600519.SH")
+    assert after["bars"] == before["bars"] + 1
+    assert after["date"] > before["date"]
+    assert stream.snapshot("SH600519")["close"] == after["close"] == 20.0
+    assert stream.stats()["symbols"] == 1
+
+
+def test_unrecognized_code_is_not_fetched(monkeypatch):
+    monkeypatch.setattr(indicators, "get_bar_store", lambda: None)
+    calls = []
+    stream = IndicatorStream(history=lambda code, days: calls.append(code) or daily_history())
+    assert stream.snapshot("../etc/passwd") is None
+    assert calls == []
+
+
+def test_state_rewarms_after_ttl(monkeypatch):
+    monkeypatch.setattr(indicators, "get_bar_store", lambda: None)
+    calls = []
+    stream = IndicatorStream(history=lambda code, days: calls.append(code) or daily_history(), ttl=0)
+    first = stream.state("sh600519")
+    second = stream.state("sh600519")
+    assert second is not first
+    assert calls == ["sh600519", "sh600519"]
+    assert stream.stats()["reloads"] == 1
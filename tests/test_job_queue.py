@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import pytest
+from utils.job_queue import PRIORITY_HIGH, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"))
+
+
+def test_enqueue_deduplicates_active_job(queue):
+    first = queue.enqueue("supply_chain", "sh600519")
+    second = queue.enqueue("supply_chain", "sh600519", priority=PRIORITY_HIGH)
+    assert second["id"] == first["id"]
+    assert second["priority"] == PRIORITY_HIGH
+
+
+def test_complete_and_fail_require_current_lease(queue):
+    job = queue.enqueue("supply_chain", "sh600519")
+    queue.claim("worker-a")
+    queue.requeue_stale(timeout=-1)  # worker-a 超时，任务被回收
+    assert queue.claim("worker-b")["id"] == job["id"]
+
+    assert not queue.complete(job["id"], "worker-a", {"found": 1})
+    assert queue.fail(job["id"], "worker-a", "超时后才失败") is None
+    assert queue.get(job["id"])["status"] == "running"
+
+    assert queue.complete(job["id"], "worker-b", {"found": 2})
+    done = queue.get(job["id"])
+    assert done["status"] == "done" and done["result"] == {"found": 2}
+
+
+def test_fail_requeues_with_backoff(queue):
+    job = queue.enqueue("industry", "白酒", max_attempts=2)
+    queue.claim("worker-a")
+    retried = queue.fail(job["id"], "worker-a", "网络错误")
+    assert retried["status"] == "pending" and retried["last_error"] == "网络错误"
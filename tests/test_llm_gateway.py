@@ -0,0 +1,103 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import threading
+import time
+import pytest
+import utils.llm_gateway as llm_gateway
+from benchmarks.stubs.fake_llm import start_fake_llm
+from utils.llm_gateway import LLMGateway, LLMOverloadedError
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+@pytest.fixture
+def fake_server():
+    """按需启动假大模型服务，用例结束后统一关闭"""
+    servers = []
+
+    def start(**config):
+        server = start_fake_llm(**{"latency": 0.01, "jitter": 0, **config})
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def gateway_for(server, **kwargs) -> LLMGateway:
+    return LLMGateway(api_key="fake", base_url=server.url, model="fake", **{"rate": 0, "hedge_percentile": 0, **kwargs})
+
+
+def run_parallel(gateway: LLMGateway, sites: list) -> None:
+    threads = [threading.Thread(target=gateway.chat, args=(site, MESSAGES)) for site in sites]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_site_concurrency_limit(fake_server):
+    server = fake_server(latency=0.2)
+    gateway = gateway_for(server, max_concurrency=8, site_concurrency=2)
+    run_parallel(gateway, ["parse"] * 6)
+    assert server.stats["requests"] == 6
+    assert server.stats["max_concurrency"] == 2
+
+
+def test_global_concurrency_limit(fake_server):
+    server = fake_server(latency=0.2)
+    gateway = gateway_for(server, max_concurrency=3, site_concurrency=2)
+    run_parallel(gateway, ["parse"] * 4 + ["strategy"] * 4)
+    assert server.stats["max_concurrency"] == 3
+    assert max(stats["peak_in_flight"] for stats in gateway.stats()["sites"].values()) == 3
+
+
+def test_retry_after_is_honored(fake_server, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "LLM_BACKOFF_BASE", 0)  # 等待时间只由 Retry-After 决定
+    server = fake_server(fail_first=1, retry_after=0.3)
+    gateway = gateway_for(server)
+    started = time.monotonic()
+    assert gateway.chat("parse", MESSAGES) == "ok"
+    assert time.monotonic() - started >= 0.3
+    assert server.stats["errors"] == 1
+    counters = gateway.stats()["sites"]["parse"]
+    assert counters["retries"] == 1 and counters["successes"] == 1 and counters["failures"] == 0
+
+
+def test_slow_request_is_hedged(fake_server, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "LLM_HEDGE_MIN_SAMPLES", 5)
+    calls = []
+
+    def respond(body: dict) -> str:
+        calls.append(body)
+        if len(calls) == 6:  # 第6个请求（对冲前的主请求）落入长尾
+            time.sleep(2)
+        return "ok"
+
+    server = fake_server(responder=respond)
+    gateway = gateway_for(server, hedge_percentile=0.5)
+    for _ in range(5):
+        gateway.chat("parse", MESSAGES, hedge=True)
+    started = time.monotonic()
+    assert gateway.chat("parse", MESSAGES, hedge=True) == "ok"
+    assert time.monotonic() - started < 1
+    counters = gateway.stats()["sites"]["parse"]
+    assert counters["hedges"] == 1 and counters["hedge_wins"] == 1
+
+
+def test_saturated_slots_raise_overloaded(fake_server):
+    server = fake_server(latency=1)
+    gateway = gateway_for(server, max_concurrency=1, queue_timeout=0.1)
+    holder = threading.Thread(target=gateway.chat, args=("strategy", MESSAGES))
+    holder.start()
+    deadline = time.monotonic() + 2
+    while server.active == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(LLMOverloadedError):
+        gateway.chat("parse", MESSAGES)
+    holder.join()
+    assert gateway.stats()["sites"]["parse"]["rejected"] == 1
+    assert server.stats["requests"] == 1
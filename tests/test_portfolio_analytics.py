@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import random
+import time
+import numpy as np
+import pytest
+from data.portfolio_analytics import BUY, SELL, NavHistory, PortfolioState, trade_day
+
+CODES = ["sh600519", "sz002594", "sh601318"]
+
+
+def random_ledger(seed: int, count: int, start: float, span_days: int) -> list:
+    """随机交易记录（含超卖和非买卖记录），按 id 和时间排序"""
+    rng = random.Random(seed)
+    times = sorted(start + rng.uniform(0, span_days * 86400) for _ in range(count))
+    rows = []
+    for trade_id, created_at in enumerate(times, 1):
+        action = rng.choices([BUY, SELL, "分红"], weights=[5, 4, 1])[0]
+        rows.append((trade_id, action, rng.choice(CODES), rng.randint(1, 10) * 100,
+                     round(rng.uniform(5, 50), 2), created_at))
+    return rows
+
+
+def assert_same_state(actual: PortfolioState, expected: PortfolioState) -> None:
+    assert (actual.count, actual.last_id) == (expected.count, expected.last_id)
+    assert actual.marks.keys() == expected.marks.keys()
+    for key, (quantity, price) in expected.marks.items():
+        assert actual.marks[key] == (quantity, pytest.approx(price))
+    assert actual.flows == pytest.approx(expected.flows)
+    assert actual.holdings.keys() == expected.holdings.keys()
+    for code, holding in expected.holdings.items():
+        other = actual.holdings[code]
+        assert other.quantity == holding.quantity
+        assert [lot[0] for lot in other.lots] == [lot[0] for lot in holding.lots]
+        assert [lot[1] for lot in other.lots] == pytest.approx([lot[1] for lot in holding.lots])
+        assert other.cost_average == pytest.approx(holding.cost_average, abs=1e-6)
+        assert other.realized_fifo == pytest.approx(holding.realized_fifo, abs=1e-6)
+        assert other.realized_average == pytest.approx(holding.realized_average, abs=1e-6)
+        assert other.last_price == pytest.approx(holding.last_price)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_build_matches_apply(seed):
+    rows = random_ledger(seed, 60, time.time() - 30 * 86400, 30)
+    applied = PortfolioState()
+    applied.apply(rows)
+    assert_same_state(PortfolioState.build(rows), applied)
+
+    split = random.Random(seed).randint(0, len(rows))
+    resumed = PortfolioState.build(rows[:split])
+    resumed.apply(rows[split:])
+    assert_same_state(resumed, applied)
+
+
+def test_oversold_quantity_is_ignored():
+    now = time.time()
+    rows = [(1, BUY, "sh600519", 100, 10.0, now), (2, SELL, "sh600519", 300, 12.0, now),
+            (3, BUY, "sh600519", 100, 11.0, now)]
+    applied = PortfolioState()
+    applied.apply(rows)
+    for state in (PortfolioState.build(rows), applied):
+        holding = state.holdings["sh600519"]
+        assert holding.quantity == 100
+        assert list(holding.lots) == [[100, 11.0]]
+        assert holding.cost_average == pytest.approx(1100.0)
+        assert holding.realized_fifo == pytest.approx(200.0)  # 只有实际持有的100股计入盈亏
+        assert holding.realized_average == pytest.approx(200.0)
+        assert state.flows[trade_day(now)] == pytest.approx(-1000 + 3600 - 1100)  # 资金流水按记录全额计入
+
+
+def test_nav_update_matches_rebuild():
+    # 成交日期都在今天之后，矩阵不会提前补齐到今天，后半段成交走增量写入
+    rows = random_ledger(7, 80, time.time() + 86400, 40)
+    split = 40
+    state = PortfolioState.build(rows[:split])
+    nav = state.nav_history()
+    state.apply(rows[split:])
+    assert state.nav_history() is nav
+
+    rebuilt = NavHistory.from_marks(PortfolioState.build(rows).marks)
+    np.testing.assert_array_equal(nav.days, rebuilt.days)
+    assert sorted(nav.codes) == sorted(rebuilt.codes)
+    for code in rebuilt.codes:
+        i, j = nav.columns[code], rebuilt.columns[code]
+        np.testing.assert_allclose(nav.positions[:, i], rebuilt.positions[:, j])
+        np.testing.assert_allclose(nav.prices[:, i], rebuilt.prices[:, j])
@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import time
+import pytest
+import data.portfolio_analytics as portfolio_analytics
+from agent.pre_trade_risk import PreTradeRisk, ReturnsCache
+from benchmarks.bench_pre_trade_risk import make_history
+from utils.db_utils import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """持有 sh600000 1000股（成交价10元）的用户"""
+    monkeypatch.setattr(portfolio_analytics, "industry_of", lambda code: "测试行业")
+    db = DatabaseManager(str(tmp_path / "risk.db"))
+    db.add_user("u1", "u1", 1e6, "")
+    db.add_transaction("u1", "买入", "sh600000", 1000, 10.0)
+    yield db
+    db.close()
+
+
+def wait_fetched(returns: ReturnsCache, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while returns.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_var_unavailable_without_history(db):
+    engine = PreTradeRisk(ReturnsCache(lambda code, days: []), max_var_ratio=0.0)
+    engine.check(db, "u1", "买入", "sh600000", 100, 10.0)
+    wait_fetched(engine.returns)
+    result = engine.check(db, "u1", "买入", "sh600000", 100, 10.0)
+    assert result["allowed"]
+    assert not result["var_available"]
+    assert result["var"] is None and result["marginal_var"] is None
+
+
+def test_history_fetched_off_request_path(db):
+    engine = PreTradeRisk(ReturnsCache(make_history(61)), max_var_ratio=0.0)
+    first = engine.check(db, "u1", "买入", "sh600000", 100, 10.0)
+    assert not first["var_available"] and first["allowed"]  # 首次检查不等待历史行情
+    wait_fetched(engine.returns)
+    second = engine.check(db, "u1", "买入", "sh600000", 100, 10.0)
+    assert second["var_available"] and second["var"] > 0
+    assert not second["allowed"]
+
+
+def test_position_repriced_at_order_price(db):
+    engine = PreTradeRisk(ReturnsCache(lambda code, days: []), max_position_weight=1.0)
+    funds = db.get_user_funds("u1")
+    result = engine.check(db, "u1", "买入", "sh600000", 100, 20.0)
+    assert result["position_weight"] == round(1100 * 20.0 / (funds + 1000 * 20.0), 4)
@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import asyncio
+from api.quote_feed import FakeQuoteSource, QuoteHub, QuoteSubscriber
+
+
+async def receive(subscriber: QuoteSubscriber) -> dict:
+    return await asyncio.wait_for(subscriber.get(), timeout=2)
+
+
+def test_fan_out_to_all_subscribers():
+    async def scenario():
+        hub = QuoteHub(source=FakeQuoteSource(), interval=0.01)
+        subscribers = [QuoteSubscriber() for _ in range(3)]
+        for subscriber in subscribers:
+            hub.subscribe(subscriber, ["sh600519"])
+        quotes = [await receive(subscriber) for subscriber in subscribers]
+        hub.unsubscribe(subscribers[0])
+        hub.unsubscribe(subscribers[1])
+        hub.unsubscribe(subscribers[2])
+        return quotes
+
+    quotes = asyncio.run(scenario())
+    assert all(quote["code"] == "sh600519" for quote in quotes)
+    assert len({quote["timestamp"] for quote in quotes}) == 1  # 同一条上游行情
+
+
+def test_one_upstream_poller_per_symbol():
+    async def scenario():
+        source = FakeQuoteSource()
+        hub = QuoteHub(source=source, interval=60)
+        subscribers = [QuoteSubscriber() for _ in range(5)]
+        for subscriber in subscribers:
+            hub.subscribe(subscriber, ["sh600519", "sz002594"])
+        for subscriber in subscribers:
+            await receive(subscriber)
+            await receive(subscriber)
+        pollers = dict(hub.pollers)
+        for subscriber in subscribers:
+            hub.unsubscribe(subscriber)
+        return source, pollers
+
+    source, pollers = asyncio.run(scenario())
+    assert sorted(pollers) == ["sh600519", "sz002594"]
+    assert source.fetch_count == 2
+
+
+def test_full_queue_drops_oldest():
+    async def scenario():
+        subscriber = QuoteSubscriber(maxsize=2)
+        for price in (1, 2, 3):
+            subscriber.offer({"price": price})
+        return subscriber.dropped, [(await receive(subscriber))["price"] for _ in range(2)]
+
+    dropped, prices = asyncio.run(scenario())
+    assert dropped == 1
+    assert prices == [2, 3]
+
+
+def test_poller_stops_after_last_unsubscribe():
+    async def scenario():
+        source = FakeQuoteSource()
+        hub = QuoteHub(source=source, interval=0.01)
+        first, second = QuoteSubscriber(), QuoteSubscriber()
+        hub.subscribe(first, ["sh600519"])
+        hub.subscribe(second, ["sh600519"])
+        await receive(first)
+        poller = hub.pollers["sh600519"]
+        hub.unsubscribe(first)
+        still_polling = "sh600519" in hub.pollers
+        hub.unsubscribe(second, ["SH600519"])
+        await asyncio.sleep(0.05)
+        fetches = source.fetch_count
+        await asyncio.sleep(0.05)
+        return still_polling, poller, hub, fetches, source.fetch_count
+
+    still_polling, poller, hub, fetches, fetches_later = asyncio.run(scenario())
+    assert still_polling
+    assert poller.cancelled()
+    assert not hub.pollers and not hub.subscribers
+    assert fetches_later == fetches
+
+
+def test_subscribe_normalizes_and_limits_symbols():
+    async def scenario():
+        hub = QuoteHub(source=FakeQuoteSource(), interval=60, max_symbols=2)
+        subscriber = QuoteSubscriber()
+        rejected = hub.subscribe(subscriber, [" 600519", "SH600519", "600519.sh", "bad", 123, "sz002594", "sz000001"])
+        symbols = set(subscriber.symbols)
+        hub.unsubscribe(subscriber)
+        return rejected, symbols
+
+    rejected, symbols = asyncio.run(scenario())
+    assert symbols == {"sh600519", "sz002594"}
+    assert rejected == ["bad", 123, "sz000001"]
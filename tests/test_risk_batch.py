@@ -0,0 +1,67 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import sqlite3
+import pytest
+import data.risk_batch as risk_batch
+from benchmarks.bench_risk_batch import make_bars, make_positions
+from data.risk_batch import RiskBatchJob
+from utils import snapshot_dir
+
+
+@pytest.fixture
+def job(tmp_path, monkeypatch):
+    bars, industries = make_bars(stocks=20, days=40, industries=3, seed=0)
+    bar_path, db_path = str(tmp_path / "bars"), str(tmp_path / "risk.db")
+    bars.save(bar_path)
+    make_positions(db_path, users=30, positions=3, stocks=20, seed=0)
+    monkeypatch.setattr(risk_batch, "stock_industries", lambda codes: industries)
+    return RiskBatchJob(db_path, bar_path, lookback=30, chunk_users=10)
+
+
+def run_statuses(job: RiskBatchJob) -> list:
+    conn = sqlite3.connect(job.db_path)
+    try:
+        return conn.execute("SELECT status, users FROM risk_runs ORDER BY run_id").fetchall()
+    finally:
+        conn.close()
+
+
+def test_run_marks_done(job):
+    summary = job.run(workers=1)
+    assert summary["users"] == 30
+    assert run_statuses(job) == [("done", 30)]
+
+
+def test_failed_chunk_marks_run_failed(job, monkeypatch):
+    compute_chunk = risk_batch.compute_chunk
+    calls = []
+
+    def flaky(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError("chunk failed")
+        return compute_chunk(*args)
+
+    monkeypatch.setattr(risk_batch, "compute_chunk", flaky)
+    with pytest.raises(RuntimeError):
+        job.run(workers=1)
+    assert run_statuses(job) == [("failed", 10)]
+
+
+def test_workers_use_the_version_loaded_by_main(job, monkeypatch):
+    bars, industries = make_bars(stocks=20, days=40, industries=3, seed=1)
+    loaded = snapshot_dir.current(job.bar_path)
+    paths = []
+
+    def publish_during_run(codes):
+        bars.save(job.bar_path)  # 主进程读完行情后发布了新版本
+        return industries
+
+    init_worker = risk_batch.init_worker
+    monkeypatch.setattr(risk_batch, "stock_industries", publish_during_run)
+    monkeypatch.setattr(risk_batch, "init_worker", lambda bar_path, *args: paths.append(bar_path) or init_worker(bar_path, *args))
+    job.run(workers=1)
+    assert snapshot_dir.current(job.bar_path) != loaded
+    assert paths == [loaded]
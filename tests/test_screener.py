@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+import pytest
+from benchmarks.bench_risk_batch import make_bars
+from data.fundamentals_columnar import ColumnarFundamentals
+from data.screener import ScreenTable
+
+
+def test_market_cap_uses_last_traded_day():
+    bars, _ = make_bars(stocks=3, days=30, industries=1, seed=0)
+    for values in bars.fields.values():
+        values[-1, 1] = np.nan  # 第二只股票最后一天停牌
+    columnar = ColumnarFundamentals.build([
+        {"stock_code": code.decode("ascii"), "stock_name": code.decode("ascii"), "industry_primary": "银行"}
+        for code in bars.codes
+    ])
+    table = ScreenTable.build(columnar, bars)
+    items = {item["stock_code"]: item for item in table.query()["items"]}
+
+    suspended = items["sh600001"]
+    close, volume = bars.fields["close"][-2, 1], bars.fields["volume"][-2, 1]
+    assert suspended["market_cap"] == pytest.approx(close * volume, rel=1e-6)
+    assert items["sh600002"]["market_cap"] == pytest.approx(
+        bars.fields["close"][-1, 2] * bars.fields["volume"][-1, 2], rel=1e-6)
@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+from knowledge_graph.similarity_index import SimilarityIndex, get_similarity_index
+
+ROWS = [
+    {"code": "sh600519", "name": "贵州茅台", "industry_primary": "食品饮料", "industry_secondary": "白酒",
+     "partners": [f"sz{i:06d}" for i in range(10)]},
+    {"code": "sz000858", "name": "五粮液", "industry_primary": "食品饮料", "industry_secondary": "白酒",
+     "partners": [f"sz{i:06d}" for i in range(9)] + ["sz100000"]},
+    {"code": "sz002594", "name": "比亚迪", "industry_primary": "汽车", "industry_secondary": "乘用车",
+     "partners": [f"sh{i:06d}" for i in range(10)]},
+    {"code": "sh000001", "name": "无特征"}
+]
+
+
+def test_save_and_load_memory_mapped(tmp_path):
+    path = str(tmp_path / "similarity_index")
+    assert get_similarity_index(path) is None
+    index = SimilarityIndex.build(ROWS)
+    index.save(path)
+
+    loaded = get_similarity_index(path)
+    assert isinstance(loaded.signatures, np.memmap)
+    np.testing.assert_array_equal(loaded.signatures, index.signatures)
+    assert loaded.top_k("sh600519") == index.top_k("sh600519")
+
+
+def test_shared_partners_rank_first():
+    index = SimilarityIndex.build(ROWS)
+    top = index.top_k("sh600519", k=3)
+    assert top[0]["code"] == "sz000858"
+    assert top[0]["similarity"] > 0.6  # 真实 Jaccard 为 11/13
+    assert index.similarity("sh600519", "sz000858") > index.similarity("sh600519", "sz002594")
+    assert "sh000001" not in [item["code"] for item in top]
+
+
+def test_hash_parameters_do_not_overflow():
+    a, b = SimilarityIndex.permutations()
+    assert int(a.max()) * 0xFFFFFFFF + int(b.max()) < 1 << 64
@@ -0,0 +1,74 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import json
+import pytest
+import utils.llm_gateway as llm_gateway
+from benchmarks.stubs.fake_llm import start_fake_llm
+from utils.llm_gateway import LLMGateway
+from utils.structured_output import StrategyResult, chat_structured
+
+STRATEGY = {
+    "title": "稳健型策略", "description": "聚焦核心供应链企业", "annualReturn": "8%", "riskLevel": "低",
+    "recommendedStocks": [{"name": "贵州茅台", "code": "600519"}]
+}
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """本地假大模型服务，记录每次请求体"""
+    requests = []
+
+    def respond(body: dict) -> str:
+        requests.append(body)
+        return json.dumps(STRATEGY, ensure_ascii=False) if len(requests) > 1 or "修复" not in body["messages"][-1]["content"] \
+            else "不是JSON"
+
+    server = start_fake_llm(latency=0, responder=respond)
+    monkeypatch.setattr(llm_gateway, "_gateway",
+                        LLMGateway(api_key="fake", base_url=server.url, model="default", rate=0, hedge_percentile=0))
+    yield requests
+    server.shutdown()
+
+
+def test_model_kwarg_is_passed_to_gateway(fake_llm):
+    """调用点同时传入 pydantic 结构和大模型名称 model= 时不冲突，model 透传到请求中"""
+    result = chat_structured("test.strategy", [{"role": "user", "content": "生成策略"}], StrategyResult,
+                             model="x", response_format={"type": "json_object"})
+    assert isinstance(result, StrategyResult)
+    assert result.title == "稳健型策略"
+    assert [body["model"] for body in fake_llm] == ["x"]
+
+
+def test_repair_keeps_model(fake_llm):
+    """首次回复无法解析时的修复请求使用同一个 model"""
+    result = chat_structured("test.strategy", [{"role": "user", "content": "需要修复"}], StrategyResult, model="x")
+    assert result.riskLevel == "低"
+    assert [body["model"] for body in fake_llm] == ["x", "x"]
+
+
+def test_response_model_is_positional_only():
+    with pytest.raises(TypeError):
+        chat_structured("test.strategy", [], response_model=StrategyResult)
+
+
+def test_strategy_format_error_keeps_suggestions(monkeypatch):
+    """大模型两次都返回非JSON时，策略接口返回带建议的错误而不是500"""
+    from fastapi.testclient import TestClient
+    import backend
+    from agent.strategy_agent import StrategyAgent
+
+    server = start_fake_llm(latency=0, responder=lambda body: "不是JSON")
+    monkeypatch.setattr(llm_gateway, "_gateway",
+                        LLMGateway(api_key="fake", base_url=server.url, model="default", rate=0, hedge_percentile=0))
+    monkeypatch.setattr(StrategyAgent, "generate_strategy",
+                        lambda self, instruction: self.generate_final_strategy("上下文", []))
+    try:
+        response = TestClient(backend.app).post("/strategy", json={"instruction": "生成稳健型策略"})
+    finally:
+        server.shutdown()
+    assert response.status_code == 200
+    body = response.json()
+    assert body["success"] is False
+    assert body["suggestions"]
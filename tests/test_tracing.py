@@ -0,0 +1,16 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+from jose import jwt
+import backend
+
+
+def test_debug_traces_requires_login():
+    client = TestClient(backend.app)
+    assert client.get("/debug/traces").status_code == 401
+
+    token = jwt.encode({"sub": "1"}, backend.SECRET_KEY, algorithm=backend.ALGORITHM)
+    response = client.get("/debug/traces", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
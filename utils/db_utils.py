@@ -3,13 +3,16 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from utils.logger import Logger
+from utils.tracing import traced
+from utils.metrics import TimedConnection
 import sqlite3
+import time
 
 class DatabaseManager:
     def __init__(self, db_name='./stock_assistant.db'):
         
         self.logger = Logger("DatabaseManager")
-        self.conn = sqlite3.connect(db_name)
+        self.conn = sqlite3.connect(db_name, factory=TimedConnection)
         self.cursor = self.conn.cursor()
         self.create_tables()
         
@@ -36,10 +39,17 @@ class DatabaseManager:
                 FOREIGN KEY (uid) REFERENCES users(uid)
             )
         ''')
+        # 成交时间（组合净值按日统计用）；旧库补充该列，历史记录为空
+        columns = [row[1] for row in self.cursor.execute('PRAGMA table_info(transactions)').fetchall()]
+        if 'created_at' not in columns:
+            self.cursor.execute('ALTER TABLE transactions ADD COLUMN created_at REAL')
+        # 按用户读取交易记录（持仓、组合分析）时不再全表扫描
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_uid ON transactions (uid, id)')
         self.conn.commit()
         self.logger.info("数据库建表成功.")
 
     # 增加用户，可指定初始资金
+    @traced()
     def add_user(self, username: str, uid: str, funds: float, hashed_password: str) -> bool:
         try:
             cursor = self.conn.cursor()
@@ -56,6 +66,7 @@ class DatabaseManager:
     
 
     # 增加交易记录
+    @traced()
     def add_transaction(self, uid, action, stock_code, quantity, price):
         data = {'success':False, 'message':"操作失败: 未知错误。"}
 
@@ -88,9 +99,9 @@ class DatabaseManager:
         data['success'] = True
         # 插入交易记录
         self.cursor.execute('''
-            INSERT INTO transactions (uid, action, stock_code, quantity, price)
-            VALUES (?,?,?,?,?)
-        ''', (uid, action, stock_code, quantity, price))
+            INSERT INTO transactions (uid, action, stock_code, quantity, price, created_at)
+            VALUES (?,?,?,?,?,?)
+        ''', (uid, action, stock_code, quantity, price, time.time()))
         self.conn.commit()
         self.logger.info("操作成功: 添加交易记录。")
         return data
@@ -119,6 +130,7 @@ class DatabaseManager:
             self.conn.commit()
 
     # 修改用户信息，可修改用户名和资金
+    @traced()
     def update_user(self, uid, new_username=None, new_funds=None):
         update_values = []
         set_clauses = []
@@ -208,6 +220,8 @@ class DatabaseManager:
                 self.cursor.execute(query, tuple(update_values))
 
             self.conn.commit()
+            from data.portfolio_analytics import get_portfolio_analytics  # 原地修改无法从记录数判断，需清除分析缓存
+            get_portfolio_analytics().invalidate(old_uid)
             return self.cursor.lastrowid
 
     # 查询所有用户
@@ -216,6 +230,7 @@ class DatabaseManager:
         return self.cursor.fetchall()
 
     # 根据用户 ID 查询用户
+    @traced()
     def get_user_by_id(self, uid):
         self.cursor.execute('SELECT * FROM users WHERE uid =?', (uid,))
         return self.cursor.fetchone()
@@ -231,6 +246,7 @@ class DatabaseManager:
         return self.cursor.fetchone()
 
     # 根据用户 ID 查询该用户的所有交易记录
+    @traced()
     def get_transactions_by_user_id(self, uid):
         try:
             cursor = self.conn.cursor()
@@ -240,6 +256,21 @@ class DatabaseManager:
             self.logger.error(f"查询用户 {uid} 的交易记录失败: {str(e)}")
             return []
     
+    @traced()
+    def get_transactions_after(self, uid, last_id: int = 0) -> list:
+        """按成交顺序读取用户 id 大于 last_id 的交易记录：(id, action, stock_code, quantity, price, created_at)"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT id, action, stock_code, quantity, price, created_at FROM transactions '
+                       'WHERE uid =? AND id >? ORDER BY id', (uid, last_id))
+        return cursor.fetchall()
+
+    def get_transaction_summary(self, uid) -> tuple:
+        """用户交易记录的条数和最大 id（判断是否有新增或删除的记录）"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT COUNT(*), COALESCE(MAX(id), 0) FROM transactions WHERE uid =?', (uid,))
+        return cursor.fetchone()
+
+    @traced()
     def get_quantity_by_user_id(self, uid):
         self.cursor.execute('SELECT quantity FROM transactions WHERE uid =? ORDER BY id DESC LIMIT 1', (uid,))
         result = self.cursor.fetchone()
@@ -247,11 +278,13 @@ class DatabaseManager:
             return result[0]
         return None
     
+    @traced()
     def get_user_funds(self, uid):
         self.cursor.execute('SELECT funds FROM users WHERE uid =?', (uid,))
         result = self.cursor.fetchone()
         return result[0] if result else None
 
+    @traced()
     def get_user_by_username(self, username):
         try:
             cursor = self.conn.cursor()
@@ -260,6 +293,7 @@ class DatabaseManager:
         except Exception as e:
             self.logger.error(f"查询用户 {username} 失败: {str(e)}")
     
+    @traced()
     def get_user_by_uid(self, uid) -> bool:
         try:
             cursor = self.conn.cursor()
@@ -269,6 +303,7 @@ class DatabaseManager:
             self.logger.error(f"查询用户 {uid} 失败: {str(e)}")
             return False
     
+    @traced()
     def get_user_positions(self, uid: str) -> list:
         """计算用户当前持仓（基于交易记录），返回包含code、name、quantity、price的列表"""
         from api.stock_api import StockAPI  # 动态导入避免循环依赖
@@ -299,7 +334,7 @@ class DatabaseManager:
         result = []
         for stock_code, pos in positions.items():
             if pos['quantity'] > 0:
-                stock_info = stock_api.get_stock_info_by_code(stock_code)
+                stock_info = stock_api.get_stock_real_time_info_by_code(stock_code)
                 if stock_info:  # 避免无名称的股票（如异常数据）
                     result.append({
                         "code": stock_code,
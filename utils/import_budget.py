@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import os
+import subprocess
+
+PROJECT_ROOT = Path(__file__).parent.parent
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))  # 冷启动导入耗时上限（毫秒）
+
+# 这些重量级依赖只能在首次使用时导入，不允许出现在服务启动路径上
+DEFERRED_MODULES = ("langchain", "langchain_openai", "openai", "pandas", "numpy", "py2neo", "Levenshtein", "faker")
+
+
+def measure_import(module: str) -> dict:
+    """在全新子进程中用 python -X importtime 导入模块，返回总耗时和导入的模块列表"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+    imports = []  # (模块名, 自身耗时us, 累计耗时us)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    total_us = next((cumulative for name, _, cumulative in reversed(imports) if name == module), 0)
+    return {"module": module, "total_ms": total_us / 1000, "imports": imports}
+
+
+def check_import_budget(module: str, budget_ms: float = IMPORT_BUDGET_MS, top: int = 10) -> bool:
+    """检查模块冷启动导入耗时与重量级依赖，超出预算时打印耗时最多的模块"""
+    result = measure_import(module)
+    loaded = {name.split(".")[0] for name, _, _ in result["imports"]}
+    eager = sorted(loaded.intersection(DEFERRED_MODULES))
+    ok = result["total_ms"] <= budget_ms and not eager
+    print(f"{module}: 导入耗时 {result['total_ms']:.1f}ms（预算 {budget_ms:.0f}ms）{'通过' if ok else '未通过'}")
+    if eager:
+        print(f"  启动时不应导入的重量级依赖: {', '.join(eager)}")
+    if not ok:
+        slowest = sorted(result["imports"], key=lambda item: item[1], reverse=True)[:top]
+        for name, self_us, cumulative_us in slowest:
+            print(f"  {name}: 自身 {self_us / 1000:.1f}ms，累计 {cumulative_us / 1000:.1f}ms")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="冷启动导入耗时预算检查")
+    parser.add_argument("modules", nargs="*", default=["backend", "main"])
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    args = parser.parse_args()
+    results = [check_import_budget(module, args.budget_ms) for module in args.modules]
+    sys.exit(0 if all(results) else 1)
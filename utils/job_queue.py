@@ -0,0 +1,254 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import json
+import os
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from utils.logger import Logger
+from utils.metrics import TimedConnection
+
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "./job_queue.db")
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "10"))  # 首次重试等待时间（秒），之后按2倍递增
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "600"))
+JOB_LEASE_TIMEOUT = int(os.getenv("JOB_LEASE_TIMEOUT", "900"))  # 运行中任务超过该时长未完成视为工作进程已退出（秒）
+
+PRIORITY_LOW = 0  # 后台预取
+PRIORITY_HIGH = 10  # 用户请求触发
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+class JobQueue:
+    """基于SQLite的持久化任务队列
+
+    支持优先级（数值越大越先执行）、失败重试（指数退避加随机抖动）和按 (kind, key) 去重：
+    同一任务在排队或执行中时重复提交只会返回已有任务（必要时提高其优先级）。
+    多个工作进程可共享同一个数据库文件，通过 BEGIN IMMEDIATE 事务互斥领取任务。
+    """
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self.logger = Logger("JobQueue")
+        self.path = path
+        self.create_tables()
+
+    @contextmanager
+    def connect(self):
+        """每次操作使用独立连接（自动提交模式），可跨线程、跨进程使用"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, factory=TimedConnection)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def create_tables(self) -> None:
+        with self.connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    available_at REAL NOT NULL,
+                    locked_by TEXT,
+                    locked_at REAL,
+                    last_error TEXT,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            # 同一 (kind, key) 同时只能有一个排队或执行中的任务
+            conn.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_key
+                ON jobs (kind, key) WHERE status IN ('pending', 'running')
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS jobs_claim
+                ON jobs (status, priority DESC, available_at, id)
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_lookup ON jobs (kind, key, id)")
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def enqueue(self, kind: str, key: str, payload: dict = None, priority: int = PRIORITY_LOW,
+                max_attempts: int = JOB_MAX_ATTEMPTS) -> dict:
+        """提交任务；已有相同任务在排队或执行时直接返回该任务"""
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = conn.execute(
+                    '''INSERT OR IGNORE INTO jobs (kind, key, payload, priority, status, max_attempts,
+                                                   available_at, created_at, updated_at)
+                       VALUES (?, ?, ?, ?, 'pending', ?, ?, ?, ?)''',
+                    (kind, key, json.dumps(payload or {}, ensure_ascii=False), priority, max_attempts, now, now, now)
+                )
+                if cursor.rowcount:
+                    job_id = cursor.lastrowid
+                    self.logger.info(f"任务入队: {kind}:{key}（优先级{priority}）")
+                else:
+                    job_id = conn.execute(
+                        f"SELECT id FROM jobs WHERE kind = ? AND key = ? "
+                        f"AND status IN ({','.join('?' * len(ACTIVE_STATUSES))})",
+                        (kind, key, *ACTIVE_STATUSES)
+                    ).fetchone()['id']
+                    conn.execute(
+                        "UPDATE jobs SET priority = MAX(priority, ?), updated_at = ? WHERE id = ?",
+                        (priority, now, job_id)
+                    )
+                job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self._to_dict(job)
+
+    def claim(self, worker_id: str, kinds: list = None) -> dict:
+        """领取一个到期的最高优先级任务，没有可执行任务时返回None"""
+        now = time.time()
+        kind_filter = f"AND kind IN ({','.join('?' * len(kinds))})" if kinds else ""
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    f'''SELECT id FROM jobs WHERE status = 'pending' AND available_at <= ? {kind_filter}
+                        ORDER BY priority DESC, available_at, id LIMIT 1''',
+                    (now, *(kinds or []))
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    '''UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                                       locked_by = ?, locked_at = ?, updated_at = ?
+                       WHERE id = ?''',
+                    (worker_id, now, now, row['id'])
+                )
+                job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self._to_dict(job)
+
+    def complete(self, job_id: int, worker_id: str, result: dict = None) -> bool:
+        """标记任务完成；任务已不属于该工作进程（超时被回收后由其他进程领取）时不做修改并返回False"""
+        with self.connect() as conn:
+            cursor = conn.execute(
+                '''UPDATE jobs SET status = 'done', result = ?, locked_by = NULL, updated_at = ?
+                   WHERE id = ? AND status = 'running' AND locked_by = ?''',
+                (json.dumps(result or {}, ensure_ascii=False), time.time(), job_id, worker_id)
+            )
+        if not cursor.rowcount:
+            self.logger.warning(f"任务 {job_id} 已不属于 {worker_id}，忽略完成结果")
+        return bool(cursor.rowcount)
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> dict:
+        """任务失败：未超过最大尝试次数时按指数退避重新排队，否则标记为失败
+
+        任务已不属于该工作进程时不做修改并返回None。
+        """
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                job = conn.execute(
+                    "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = 'running' AND locked_by = ?",
+                    (job_id, worker_id)
+                ).fetchone()
+                if job is None:
+                    conn.execute("COMMIT")
+                    self.logger.warning(f"任务 {job_id} 已不属于 {worker_id}，忽略失败结果: {error}")
+                    return None
+                if job['attempts'] < job['max_attempts']:
+                    delay = min(JOB_BACKOFF_BASE * 2 ** (job['attempts'] - 1), JOB_BACKOFF_MAX)
+                    delay *= random.uniform(0.5, 1.0)
+                    conn.execute(
+                        '''UPDATE jobs SET status = 'pending', available_at = ?, last_error = ?,
+                                           locked_by = NULL, updated_at = ? WHERE id = ?''',
+                        (now + delay, error, now, job_id)
+                    )
+                    self.logger.warning(f"任务 {job_id} 失败，{delay:.0f}秒后重试: {error}")
+                else:
+                    conn.execute(
+                        '''UPDATE jobs SET status = 'failed', last_error = ?, locked_by = NULL, updated_at = ?
+                           WHERE id = ?''',
+                        (error, now, job_id)
+                    )
+                    self.logger.error(f"任务 {job_id} 已达最大尝试次数，放弃: {error}")
+                job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self._to_dict(job)
+
+    def requeue_stale(self, timeout: int = JOB_LEASE_TIMEOUT) -> int:
+        """回收超时未完成的运行中任务（工作进程异常退出），返回回收数量"""
+        now = time.time()
+        with self.connect() as conn:
+            cursor = conn.execute(
+                '''UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                                   last_error = COALESCE(last_error, '工作进程超时'),
+                                   locked_by = NULL, available_at = ?, updated_at = ?
+                   WHERE status = 'running' AND locked_at < ?''',
+                (now, now, now - timeout)
+            )
+            return cursor.rowcount
+
+    def get(self, job_id: int) -> dict:
+        """按ID查询任务"""
+        with self.connect() as conn:
+            return self._to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def latest(self, kind: str, key: str) -> dict:
+        """查询某个 (kind, key) 最近一次提交的任务"""
+        with self.connect() as conn:
+            return self._to_dict(conn.execute(
+                "SELECT * FROM jobs WHERE kind = ? AND key = ? ORDER BY id DESC LIMIT 1", (kind, key)
+            ).fetchone())
+
+    def list_jobs(self, status: str = None, limit: int = 50) -> list:
+        """按提交时间倒序列出任务"""
+        with self.connect() as conn:
+            if status:
+                rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit))
+            else:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+            return [self._to_dict(row) for row in rows.fetchall()]
+
+    def stats(self) -> dict:
+        """各状态任务数"""
+        with self.connect() as conn:
+            counts = {row['status']: row['count'] for row in conn.execute(
+                "SELECT status, COUNT(*) AS count FROM jobs GROUP BY status"
+            )}
+        return {status: counts.get(status, 0) for status in ("pending", "running", "done", "failed")}
+
+
+_job_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    """进程内共享的任务队列"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
@@ -0,0 +1,360 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.logger import Logger
+from utils.tracing import span
+from utils.metrics import observe_upstream
+from utils.replay import chat_completion
+from utils.prompts import count_message_tokens
+
+LLM_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.deepseek.com/v1")
+LLM_MODEL = os.getenv("LLM_MODEL", "deepseek-chat")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # 全局同时进行的请求数
+LLM_SITE_CONCURRENCY = int(os.getenv("LLM_SITE_CONCURRENCY", "4"))  # 单个调用点同时进行的请求数
+LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "5"))  # 每秒发出的请求数（令牌桶速率，0为不限）
+LLM_BURST = int(os.getenv("LLM_BURST", "10"))  # 令牌桶容量（允许的突发请求数）
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # 单次请求超时（秒）
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))  # 等待并发名额和令牌的最长时间（秒）
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))  # 首次重试等待上限（秒），之后按2倍递增
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))  # 对冲请求的触发分位数
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # 调用点样本不足时不对冲
+
+RETRYABLE_STATUS = (408, 409, 429)
+LATENCY_WINDOW = 200
+
+
+class LLMOverloadedError(Exception):
+    """等待并发名额或速率令牌超时（不重试，由调用方降级处理）"""
+
+
+def percentile(values, p: float) -> float:
+    """分位数（最近秩法），空序列返回0"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def is_retryable(error: Exception) -> bool:
+    """超时、连接错误、429/408/409 和 5xx 可重试，其余（参数错误、鉴权失败等）直接抛出"""
+    import openai
+    if isinstance(error, openai.APIConnectionError):  # 包括 APITimeoutError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+def retry_after(error: Exception) -> float:
+    """服务端通过 Retry-After 头要求的等待时间（秒），没有时返回0"""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after", 0)) if response is not None else 0.0
+    except ValueError:
+        return 0.0
+
+
+def usage_tokens(response, messages: list) -> tuple:
+    """(输入token, 输出token, 命中前缀缓存的输入token)；接口未返回 usage 时按本地估算记录输入token"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return count_message_tokens(messages), 0, 0
+    cached = getattr(usage, "prompt_cache_hit_tokens", None)  # DeepSeek 上下文硬盘缓存
+    if cached is None:
+        details = getattr(usage, "prompt_tokens_details", None)  # OpenAI 兼容字段
+        cached = getattr(details, "cached_tokens", None) if details is not None else None
+    return usage.prompt_tokens or 0, usage.completion_tokens or 0, cached or 0
+
+
+class TokenBucket:
+    """令牌桶限速：按固定速率补充令牌，容量决定允许的突发请求数"""
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """尝试取一个令牌，成功返回0，否则返回还需等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, timeout: float) -> bool:
+        """在 timeout 秒内取得一个令牌"""
+        deadline = time.monotonic() + timeout
+        while True:
+            delay = self.try_acquire()
+            if delay == 0:
+                return True
+            if time.monotonic() + delay > deadline:
+                return False
+            time.sleep(delay)
+
+
+class CallSiteStats:
+    """单个调用点的统计：计数器与最近请求的耗时窗口"""
+    def __init__(self):
+        self.counters = dict.fromkeys((
+            "calls", "successes", "failures", "requests", "retries", "timeouts", "rejected", "hedges", "hedge_wins",
+            "prompt_tokens", "completion_tokens", "cached_prompt_tokens"
+        ), 0)
+        self.in_flight = 0
+        self.waiting = 0  # 正在等待名额或令牌的调用数
+        self.peak_in_flight = 0  # 该调用点发出请求时全局同时进行的最大请求数
+        self.queue_wait = 0.0
+        self.request_latencies = deque(maxlen=LATENCY_WINDOW)  # 单次HTTP请求耗时（用于对冲阈值）
+        self.call_latencies = deque(maxlen=LATENCY_WINDOW)  # 含排队与重试的整体耗时
+
+    def snapshot(self) -> dict:
+        def summary(latencies) -> dict:
+            return {f"p{int(p * 100)}": round(percentile(latencies, p) * 1000, 1) for p in (0.5, 0.95, 0.99)}
+        return {
+            **self.counters,
+            "avg_prompt_tokens": round(self.counters["prompt_tokens"] / max(self.counters["requests"], 1), 1),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "peak_in_flight": self.peak_in_flight,
+            "avg_queue_wait_ms": round(self.queue_wait / max(self.counters["requests"], 1) * 1000, 2),
+            "request_latency_ms": summary(self.request_latencies),
+            "call_latency_ms": summary(self.call_latencies)
+        }
+
+
+class LLMGateway:
+    """大模型调用网关
+
+    所有模块共用一个 OpenAI 兼容客户端，并统一施加：
+    - 全局和按调用点（site）的并发上限，防止突发请求压垮服务商，也避免单个功能占满全部名额；
+    - 令牌桶速率限制；
+    - 单次请求超时，超时、连接错误、429 和 5xx 按指数退避加随机抖动重试；
+    - 可选的对冲请求：请求耗时超过该调用点近期耗时的指定分位数后，在有空闲名额时再发一份，取先返回的结果；
+    - 按调用点统计请求数、重试、超时、对冲、token用量和耗时分位数。
+    """
+    def __init__(self, api_key: str = LLM_API_KEY, base_url: str = LLM_BASE_URL, model: str = LLM_MODEL,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, site_concurrency: int = LLM_SITE_CONCURRENCY,
+                 rate: float = LLM_RATE_LIMIT, burst: int = LLM_BURST, timeout: float = LLM_TIMEOUT,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT, max_retries: int = LLM_MAX_RETRIES,
+                 hedge_percentile: float = LLM_HEDGE_PERCENTILE):
+        self.logger = Logger("LLMGateway")
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.site_concurrency = site_concurrency
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.hedge_percentile = hedge_percentile
+        self.global_slots = threading.BoundedSemaphore(max_concurrency)
+        self.site_slots = {}
+        self.bucket = TokenBucket(rate, burst)
+        self.sites = {}
+        self.lock = threading.Lock()
+        self._client = None
+        self._executor = None
+
+    @property
+    def client(self):
+        """OpenAI客户端（首次调用时创建；重试由网关负责，关闭SDK自带的重试）"""
+        if self._client is None:
+            with self.lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(api_key=self.api_key, base_url=self.base_url,
+                                          timeout=self.timeout, max_retries=0)
+        return self._client
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """对冲请求使用的线程池"""
+        if self._executor is None:
+            with self.lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency * 2,
+                                                        thread_name_prefix="llm-hedge")
+        return self._executor
+
+    def _site(self, site: str):
+        """调用点的并发信号量和统计（首次使用时创建）"""
+        with self.lock:
+            if site not in self.sites:
+                self.sites[site] = CallSiteStats()
+                self.site_slots[site] = threading.BoundedSemaphore(self.site_concurrency)
+            return self.site_slots[site], self.sites[site]
+
+    def _count(self, site: str, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.sites[site].counters[name] += value
+
+    def _reserve(self, site: str, blocking: bool = True) -> bool:
+        """依次占用调用点名额、全局名额和一个令牌；blocking=False 时任一项不可用立即放弃"""
+        slots, stats = self._site(site)
+        started = time.monotonic()
+        deadline = started + (self.queue_timeout if blocking else 0)
+        remaining = lambda: max(0.0, deadline - time.monotonic())
+        with self.lock:
+            stats.waiting += 1
+        try:
+            if not slots.acquire(timeout=remaining()):
+                return False
+            if not self.global_slots.acquire(timeout=remaining()):
+                slots.release()
+                return False
+            if not self.bucket.acquire(remaining()):
+                self.global_slots.release()
+                slots.release()
+                return False
+        finally:
+            with self.lock:
+                stats.waiting -= 1
+        with self.lock:
+            stats.queue_wait += time.monotonic() - started
+        return True
+
+    def _release(self, site: str) -> None:
+        self.global_slots.release()
+        self.site_slots[site].release()
+
+    def _acquire(self, site: str) -> None:
+        """阻塞等待名额和令牌，超过 queue_timeout 抛出 LLMOverloadedError"""
+        if not self._reserve(site):
+            self._count(site, "rejected")
+            raise LLMOverloadedError(f"{site}: 等待大模型调用名额超过{self.queue_timeout}秒")
+
+    def _request(self, site: str, messages: list, params: dict, timeout: float) -> str:
+        """发出一次HTTP请求（调用前须已占用名额，请求结束时释放），返回回复文本"""
+        _, stats = self._site(site)
+        with self.lock:
+            stats.in_flight += 1
+            stats.peak_in_flight = max(stats.peak_in_flight, sum(item.in_flight for item in self.sites.values()))
+            stats.counters["requests"] += 1
+        started = time.monotonic()
+        try:
+            with observe_upstream("llm", site):
+                response = chat_completion(lambda: self.client, messages, timeout, **params)
+            prompt_tokens, completion_tokens, cached_tokens = usage_tokens(response, messages)
+            with self.lock:
+                stats.request_latencies.append(time.monotonic() - started)
+                stats.counters["prompt_tokens"] += prompt_tokens
+                stats.counters["completion_tokens"] += completion_tokens
+                stats.counters["cached_prompt_tokens"] += cached_tokens
+            return response.choices[0].message.content
+        except Exception as e:
+            import openai
+            if isinstance(e, openai.APITimeoutError):
+                self._count(site, "timeouts")
+            raise
+        finally:
+            with self.lock:
+                stats.in_flight -= 1
+            self._release(site)
+
+    def _hedge_delay(self, site: str):
+        """对冲等待时间：调用点近期请求耗时的分位数；未开启或样本不足时返回None"""
+        if self.hedge_percentile <= 0:
+            return None
+        _, stats = self._site(site)
+        with self.lock:
+            if len(stats.request_latencies) < LLM_HEDGE_MIN_SAMPLES:
+                return None
+            return percentile(stats.request_latencies, self.hedge_percentile)
+
+    def _attempt(self, site: str, messages: list, params: dict, timeout: float, hedge: bool) -> str:
+        """一次尝试：不对冲时直接请求；对冲时主请求超过阈值仍未返回则再发一份，取先成功的结果"""
+        delay = self._hedge_delay(site) if hedge else None
+        self._acquire(site)
+        if delay is None:
+            return self._request(site, messages, params, timeout)
+        # 名额到手后才开始计时，对冲阈值只与请求本身的耗时比较；没有空闲名额时不对冲
+        primary = self.executor.submit(self._request, site, messages, params, timeout)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._reserve(site, blocking=False):
+            return primary.result()
+        self._count(site, "hedges")
+        backup = self.executor.submit(self._request, site, messages, params, timeout)
+        pending, error = {primary, backup}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count(site, "hedge_wins")
+                    return future.result()  # 落后的请求在后台自然结束，结果丢弃
+                error = future.exception()
+        raise error
+
+    def chat(self, site: str, messages: list, timeout: float = None, hedge: bool = False, **params) -> str:
+        """经网关调用对话补全，返回回复文本
+
+        site 为调用点名称（独立的并发上限与统计），params 透传给 chat.completions.create
+        （如 model、response_format、temperature）。hedge=True 适合耗时短、可重复发送的解析类调用。
+        重试用尽或不可重试的错误原样抛出；等待名额超时抛出 LLMOverloadedError。
+        """
+        params.setdefault("model", self.model)
+        timeout = timeout or self.timeout
+        _, stats = self._site(site)
+        self._count(site, "calls")
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                with span(f"llm.{site}", attempt=attempt + 1):
+                    content = self._attempt(site, messages, params, timeout, hedge)
+                with self.lock:
+                    stats.counters["successes"] += 1
+                    stats.call_latencies.append(time.monotonic() - started)
+                return content
+            except Exception as e:
+                if attempt >= self.max_retries or isinstance(e, LLMOverloadedError) or not is_retryable(e):
+                    self._count(site, "failures")
+                    self.logger.error(f"大模型调用失败 [{site}]（第{attempt + 1}次尝试）: {e}")
+                    raise
+                attempt += 1
+                self._count(site, "retries")
+                backoff = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** (attempt - 1)))
+                delay = min(LLM_BACKOFF_MAX, max(backoff, retry_after(e)))
+                self.logger.warning(f"大模型调用出错 [{site}]，{delay:.2f}秒后第{attempt}次重试: {e}")
+                time.sleep(delay)
+
+    def stats(self) -> dict:
+        """各调用点的运行统计"""
+        with self.lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "site_concurrency": self.site_concurrency,
+                "in_flight": sum(stats.in_flight for stats in self.sites.values()),
+                "sites": {site: stats.snapshot() for site, stats in self.sites.items()}
+            }
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """进程内共享的大模型调用网关"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
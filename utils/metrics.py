@@ -0,0 +1,322 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from utils.logger import Logger
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"  # 关闭后各采集点不做记录，/metrics 只输出回调类指标
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # 耗时直方图分桶（秒）
+
+logger = Logger("Metrics")
+
+
+class ThreadCells:
+    """按线程分片的累加单元：每个线程只写自己的一组数值，记录时无锁；导出时汇总各线程的值"""
+    def __init__(self, size: int):
+        self.size = size
+        self.local = threading.local()
+        self.cells = []
+        self.lock = threading.Lock()
+
+    def cell(self) -> list:
+        try:
+            return self.local.cell
+        except AttributeError:
+            cell = [0] * self.size
+            with self.lock:  # 每个线程只在首次记录时加一次锁
+                self.cells.append(cell)
+            self.local.cell = cell
+            return cell
+
+    def totals(self) -> list:
+        with self.lock:
+            cells = list(self.cells)
+        return [sum(cell[i] for cell in cells) for i in range(self.size)]
+
+
+class CounterChild:
+    __slots__ = ("cells",)
+
+    def __init__(self):
+        self.cells = ThreadCells(1)
+
+    def inc(self, amount: float = 1) -> None:
+        self.cells.cell()[0] += amount
+
+    def samples(self, name: str, labels: str) -> list:
+        return [f"{name}{labels} {format_value(self.cells.totals()[0])}"]
+
+
+class HistogramChild:
+    __slots__ = ("bounds", "cells")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.cells = ThreadCells(len(bounds) + 2)  # 各分桶计数、+Inf 分桶计数、总和
+
+    def observe(self, value: float) -> None:
+        cell = self.cells.cell()
+        cell[bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def samples(self, name: str, labels: str) -> list:
+        totals = self.cells.totals()
+        prefix = labels[:-1] + "," if labels else "{"
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds + (float("inf"),), totals):
+            cumulative += count
+            lines.append(f'{name}_bucket{prefix}le="{format_value(bound)}"}} {format_value(cumulative)}')
+        lines.append(f"{name}_sum{labels} {format_value(totals[-1])}")
+        lines.append(f"{name}_count{labels} {format_value(cumulative)}")
+        return lines
+
+
+class Metric:
+    """带标签的指标；labels() 返回对应标签值的子指标（首次出现时创建）"""
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = self.children[values] = self.new_child()
+        return child
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self.children.items()):
+            lines.extend(child.samples(self.name, format_labels(self.labelnames, values)))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def new_child(self):
+        return CounterChild()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def new_child(self):
+        return HistogramChild(self.buckets)
+
+
+class CallbackGauge(Metric):
+    """导出时调用回调取值的仪表（队列深度、缓存命中率等），记录路径上没有任何开销
+
+    回调返回 [(标签值元组, 数值)]；回调出错时该指标本次不输出。读取其他模块已有的累计计数时 kind 设为 counter。
+    """
+    def __init__(self, name: str, documentation: str, labelnames: tuple, callback, kind: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def expose(self) -> list:
+        try:
+            rows = list(self.callback())
+        except Exception as e:
+            logger.warning(f"采集指标 {self.name} 失败: {str(e)}")
+            return []
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{format_labels(self.labelnames, values)} {format_value(value)}" for values, value in rows)
+        return lines
+
+
+def format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class MetricsRegistry:
+    """进程内指标注册表（多工作进程时每个进程各自统计）"""
+    def __init__(self):
+        self.metrics = {}
+        self.cache_sources = {}  # 缓存名称 -> 返回 (命中数, 未命中数) 的回调
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def register_cache(self, cache: str, source) -> None:
+        with self.lock:
+            self.cache_sources[cache] = source
+
+    def cache_rows(self) -> list:
+        with self.lock:
+            sources = list(self.cache_sources.items())
+        rows = []
+        for cache, source in sources:
+            try:
+                hits, misses = source()
+            except Exception as e:
+                logger.warning(f"采集缓存 {cache} 命中率失败: {str(e)}")
+                continue
+            rows.append((cache, hits, misses))
+        return rows
+
+    def expose(self) -> str:
+        """Prometheus 文本格式"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def gauge_callback(name: str, documentation: str, labelnames: tuple, callback, kind: str = "gauge") -> CallbackGauge:
+    return REGISTRY.register(CallbackGauge(name, documentation, labelnames, callback, kind))
+
+
+def register_cache(cache: str, source) -> None:
+    """登记一个缓存的命中统计来源：source() 返回 (命中数, 未命中数)，导出时读取"""
+    REGISTRY.register_cache(cache, source)
+
+
+class CacheCounter:
+    """没有现成统计的缓存用它计数命中与未命中（按线程分片，无锁）"""
+    def __init__(self, cache: str):
+        self.cells = ThreadCells(2)
+        register_cache(cache, lambda: tuple(self.cells.totals()))
+
+    def hit(self) -> None:
+        if METRICS_ENABLED:
+            self.cells.cell()[0] += 1
+
+    def miss(self) -> None:
+        if METRICS_ENABLED:
+            self.cells.cell()[1] += 1
+
+
+HTTP_LATENCY = histogram("http_request_duration_seconds", "接口请求耗时（含流式响应体发送）",
+                         ("method", "route", "status"))
+UPSTREAM_LATENCY = histogram("upstream_request_duration_seconds", "上游调用耗时（大模型按调用点、东方财富、Neo4j、SQLite）",
+                             ("upstream", "operation"))
+UPSTREAM_ERRORS = counter("upstream_errors_total", "上游调用失败次数（error_type 为异常类型）",
+                          ("upstream", "operation", "error_type"))
+APP_ERRORS = counter("app_errors_total", "业务错误次数（error_type 与接口返回的错误类型一致）", ("error_type",))
+gauge_callback("cache_hits_total", "缓存命中次数", ("cache",),
+               lambda: [((cache,), hits) for cache, hits, _ in REGISTRY.cache_rows()], "counter")
+gauge_callback("cache_misses_total", "缓存未命中次数", ("cache",),
+               lambda: [((cache,), misses) for cache, _, misses in REGISTRY.cache_rows()], "counter")
+gauge_callback("cache_hit_ratio", "缓存命中率（累计）", ("cache",),
+               lambda: [((cache,), round(hits / (hits + misses), 4)) for cache, hits, misses in REGISTRY.cache_rows()
+                        if hits + misses])
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    if METRICS_ENABLED:
+        HTTP_LATENCY.labels(method, route, str(status)).observe(seconds)
+
+
+def record_error(error_type: str) -> None:
+    """记录一次业务错误"""
+    if METRICS_ENABLED:
+        APP_ERRORS.labels(error_type).inc()
+
+
+@contextmanager
+def observe_upstream(upstream: str, operation: str):
+    """记录一次上游调用的耗时；抛出的异常按类型计数后原样抛出"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        UPSTREAM_ERRORS.labels(upstream, operation, type(e).__name__).inc()
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(upstream, operation).observe(time.perf_counter() - started)
+
+
+def sqlite_operation(connection, sql: str) -> str:
+    parts = sql.split(None, 1)
+    return f"{connection.metrics_name}:{parts[0].upper() if parts else ''}"
+
+
+class TimedCursor(sqlite3.Cursor):
+    """记录每条语句执行耗时的游标（operation 为库文件名和语句类型，如 job_queue.db:SELECT）"""
+    def execute(self, sql, parameters=()):
+        if not METRICS_ENABLED:
+            return super().execute(sql, parameters)
+        operation = sqlite_operation(self.connection, sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except Exception as e:
+            UPSTREAM_ERRORS.labels("sqlite", operation, type(e).__name__).inc()
+            raise
+        finally:
+            UPSTREAM_LATENCY.labels("sqlite", operation).observe(time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        with observe_upstream("sqlite", sqlite_operation(self.connection, sql)):
+            return super().executemany(sql, seq_of_parameters)
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3.connect(..., factory=TimedConnection)：经该连接执行的语句都计入上游耗时指标"""
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.metrics_name = os.path.basename(str(database))
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def expose_metrics() -> str:
+    return REGISTRY.expose()
@@ -0,0 +1,46 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+
+def memory_usage() -> dict:
+    """当前进程内存占用（KB）
+
+    Linux 下读取 /proc/self/smaps_rollup：Pss 按共享进程数分摊共享页，Private_* 为本进程独占部分，
+    多工作进程部署时用 Private_Dirty 衡量每个进程的额外开销。其他平台仅返回最大常驻内存。
+    """
+    usage = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in SMAPS_FIELDS:
+                    usage[name.lower()] = int(value.split()[0])
+    except OSError:
+        import resource
+        usage["max_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
+
+
+def mapped_file_usage(path_fragment: str) -> dict:
+    """本进程中路径包含 path_fragment 的内存映射文件的占用（KB），用于确认只读数据集在进程间共享"""
+    usage = {}
+    current = None
+    try:
+        with open("/proc/self/smaps") as f:
+            for line in f:
+                fields = line.split()
+                if "-" in fields[0] and len(fields) >= 5 and ":" not in fields[0]:
+                    path = fields[5] if len(fields) >= 6 else ""
+                    current = path if path_fragment in path else None
+                    if current:
+                        usage.setdefault(current, {name.lower(): 0 for name in SMAPS_FIELDS})
+                elif current and fields[0].rstrip(":") in SMAPS_FIELDS:
+                    usage[current][fields[0].rstrip(":").lower()] += int(fields[1])
+    except OSError:
+        pass
+    return usage
@@ -0,0 +1,129 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import json
+import re
+import threading
+
+MESSAGE_OVERHEAD_TOKENS = 4  # 每条消息的角色与分隔符开销
+CJK_PATTERN = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder():
+    """tiktoken 编码器（cl100k_base，近似 DeepSeek 分词）；未安装或词表无法下载时返回False"""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    _encoder = False
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    """估算文本的token数
+
+    优先使用 tiktoken；不可用时按 DeepSeek 官方换算估计（中文字符约0.6 token，其他字符约0.3 token，
+    连续空白按一个字符计）。估算值用于比较提示词长度，实际计费以接口返回的 usage 为准。
+    """
+    if not text:
+        return 0
+    encoder = get_encoder()
+    if encoder:
+        return len(encoder.encode(text))
+    text = WHITESPACE_PATTERN.sub(" ", text)
+    cjk = len(CJK_PATTERN.findall(text))
+    return max(1, round(cjk * 0.6 + (len(text) - cjk) * 0.3))
+
+
+def count_message_tokens(messages: list) -> int:
+    """估算消息列表的输入token数"""
+    return sum(count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def compact_json(data) -> str:
+    """紧凑序列化（无多余空格，中文不转义），用于把上下文数据放进提示词"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def fit_lines(lines: list, budget: int) -> list:
+    """按顺序保留不超过 token 预算的整行（替代按字符数截断，避免截断半行数据）"""
+    kept, used = [], 0
+    for line in lines:
+        used += count_tokens(line) + 1
+        if used > budget:
+            break
+        kept.append(line)
+    return kept
+
+
+# 提示词模板：静态部分在前且逐字固定，变量放在最后，使同类请求共享相同前缀（服务端可缓存前缀）。
+# 联网补全类请求（行业公司、股票基本信息、供应链关系）共用同一条系统消息。
+DATA_SYSTEM_PROMPT = (
+    "你是A股公开信息助手，数据仅用于个人学习开发，不涉及交易或实时数据。"
+    "只输出JSON对象，不加其他文字；股票代码为sh/sz+6位数字；日期为YYYY-MM-DD；不确定的字段填\"未知\"。"
+)
+
+INDUSTRY_COMPANIES_PROMPT = (
+    '按格式返回该行业至少10家真实A股上市公司：{"industry_companies":[{"stock_code":"","stock_name":"",'
+    '"industry_primary":"","industry_secondary":"","listing_time":""}]}，industry_primary为所查行业。\n'
+    "行业：{industry}"
+)
+
+STOCK_BASIC_INFO_PROMPT = (
+    '按格式返回该股票的基本信息：{"stock_basic_info":{"name":"","stock_code":"","industry_primary":"",'
+    '"industry_secondary":"","listing_time":"","source":"network"}}。\n'
+    "股票代码：{stock_code}"
+)
+
+SUPPLY_CHAIN_PROMPT = (
+    '按格式返回该股票的供应链关系：{"supply_chain_relationships":[{"partner_code":"","name":"",'
+    '"type":"供应商|供应商的供应商|客户|客户的客户","weight":0.0}]}，'
+    "至少2个供应商、1个供应商的供应商、2个客户、1个客户的客户，weight为0-1且越紧密越大。\n"
+    "股票代码：{stock_code}"
+)
+
+QUESTION_PARSER_PROMPT = (
+    "把股票查询问题解析为JSON对象，字段：intent(supply_chain/industry/stock_info/strategy)、stock_code、"
+    "stock_name(问题中的股票名称或别名)、industry、depth(仅供应链)、strategy_type(如稳健型/激进型)；没有的字段省略。"
+)
+
+STRATEGY_SYSTEM_PROMPT = (
+    "你是精通供应链分析的首席投资顾问。根据用户给出的市场数据、策略类型、优选行业和核心供应链企业生成投资策略，"
+    "description需依次说明行业配置逻辑（供应链稳定性）、个股选择依据（供应链核心地位）、风险控制措施（供应链断裂风险）。"
+    '只输出JSON：{"title":"","description":"","annualReturn":"8%","riskLevel":"低/中/高",'
+    '"recommendedStocks":[{"name":"","code":""}]}'
+)
+
+
+def render(template: str, **values) -> str:
+    """填充模板中的 {name} 占位符（模板中的JSON花括号不受影响）"""
+    for name, value in values.items():
+        template = template.replace("{" + name + "}", str(value))
+    return template
+
+
+def data_messages(template: str, **values) -> list:
+    """联网补全类请求的消息（共享系统消息 + 任务模板）"""
+    return [{"role": "system", "content": DATA_SYSTEM_PROMPT}, {"role": "user", "content": render(template, **values)}]
+
+
+def strategy_context(market_data: dict, strategy_type: str, industries: list, stocks: list, budget: int) -> str:
+    """策略请求的上下文数据（紧凑格式）；企业列表超出token预算时整行舍弃排在后面的企业"""
+    header = [
+        f"估值：{compact_json(market_data['valuation'])}",
+        f"供应链景气指数：{compact_json(market_data['supply_chain_index'])}",
+        f"策略类型：{strategy_type}",
+        f"优选行业：{'、'.join(industries)}",
+        "核心供应链企业（名称,代码,供应链关系数）："
+    ]
+    lines = [f"{stock['name']},{stock['code']},{stock['supply_relations']}" for stock in stocks]
+    return "\n".join(header + fit_lines(lines, budget - count_tokens("\n".join(header))))
@@ -0,0 +1,242 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit, parse_qsl
+from utils.logger import Logger
+
+REPLAY_MODE = os.getenv("REPLAY_MODE", "off")  # off / record（真实调用并录制）/ replay（只读录制数据，不访问网络）
+REPLAY_DIR = os.getenv("REPLAY_DIR", "./fixtures")  # 录制数据目录，每个上游一个 JSON Lines 文件
+REPLAY_LATENCY = os.getenv("REPLAY_LATENCY", "none")  # 回放耗时：none / recorded（按录制耗时）/ empirical（从该上游的录制耗时中抽样）/ 固定秒数
+REPLAY_LATENCY_SCALE = float(os.getenv("REPLAY_LATENCY_SCALE", "1.0"))  # 模拟耗时的倍数
+REPLAY_MAX_PER_KEY = int(os.getenv("REPLAY_MAX_PER_KEY", "1"))  # 同一请求最多录制的响应数（多份时回放按顺序轮换）
+REPLAY_SEED = int(os.getenv("REPLAY_SEED", "0"))
+
+logger = Logger("Replay")
+
+
+class FixtureMissing(LookupError):
+    """回放模式下录制数据中没有该请求"""
+    def __init__(self, upstream: str, key: str, request: dict):
+        super().__init__(f"回放数据中没有 {upstream} 请求 {key}: {json.dumps(request, ensure_ascii=False, default=str)[:200]}")
+        self.upstream = upstream
+        self.key = key
+
+
+def request_key(request: dict) -> str:
+    """规范化请求的键：按字段排序后的JSON摘要"""
+    text = json.dumps(request, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+
+
+class FixtureStore:
+    """按上游分文件保存的录制数据（{dir}/{upstream}.jsonl，每行一条 key/request/response/latency）
+
+    回放时首次用到某个上游才加载其文件；录制时追加写入，已有足够响应的请求不再重复写入。
+    """
+    def __init__(self, directory: str = REPLAY_DIR, latency: str = REPLAY_LATENCY,
+                 scale: float = REPLAY_LATENCY_SCALE, max_per_key: int = REPLAY_MAX_PER_KEY, seed: int = REPLAY_SEED):
+        self.directory = Path(directory)
+        self.latency = latency
+        self.scale = scale
+        self.max_per_key = max_per_key
+        self.rng = random.Random(seed)
+        self.fixtures = {}  # 上游 -> {键: [录制记录]}
+        self.cursors = {}  # (上游, 键) -> 下一个回放的序号
+        self.latencies = {}  # 上游 -> 全部录制耗时（empirical 抽样用）
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def _load(self, upstream: str) -> dict:
+        """调用方须持有锁"""
+        if upstream not in self.fixtures:
+            records, latencies = {}, []
+            path = self.directory / f"{upstream}.jsonl"
+            if path.exists():
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            record = json.loads(line)
+                            records.setdefault(record["key"], []).append(record)
+                            latencies.append(record.get("latency", 0.0))
+                logger.info(f"加载 {upstream} 录制数据: {len(records)}个请求")
+            self.fixtures[upstream] = records
+            self.latencies[upstream] = latencies
+            self.counters[upstream] = {"hits": 0, "misses": 0, "recorded": 0}
+        return self.fixtures[upstream]
+
+    def lookup(self, upstream: str, request: dict) -> dict:
+        """取出该请求的下一条录制记录，没有时抛出 FixtureMissing"""
+        key = request_key(request)
+        with self.lock:
+            records = self._load(upstream).get(key)
+            if not records:
+                self.counters[upstream]["misses"] += 1
+                raise FixtureMissing(upstream, key, request)
+            index = self.cursors.get((upstream, key), 0)
+            self.cursors[(upstream, key)] = index + 1
+            self.counters[upstream]["hits"] += 1
+            return records[index % len(records)]
+
+    def record(self, upstream: str, request: dict, response, latency: float) -> None:
+        key = request_key(request)
+        record = {"key": key, "request": request, "response": response, "latency": round(latency, 4)}
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str)
+        with self.lock:
+            records = self._load(upstream).setdefault(key, [])
+            if len(records) >= self.max_per_key:
+                return
+            records.append(record)
+            self.latencies[upstream].append(record["latency"])
+            self.counters[upstream]["recorded"] += 1
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / f"{upstream}.jsonl", "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def delay(self, upstream: str, record: dict) -> float:
+        """按配置的耗时分布给出本次回放应等待的秒数"""
+        if self.latency == "none":
+            return 0.0
+        if self.latency == "recorded":
+            return record.get("latency", 0.0) * self.scale
+        if self.latency == "empirical":
+            with self.lock:
+                samples = self.latencies.get(upstream) or [0.0]
+                return self.rng.choice(samples) * self.scale
+        return float(self.latency) * self.scale
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {upstream: {**counters, "fixtures": len(self.fixtures[upstream])}
+                    for upstream, counters in self.counters.items()}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_fixture_store() -> FixtureStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FixtureStore()
+    return _store
+
+
+def replay_call(upstream: str, request: dict, call, encode=lambda result: result, decode=lambda data: data):
+    """经录制/回放层执行一次上游调用
+
+    request 为规范化后的请求（决定录制数据的键）；encode 把调用结果转为可JSON序列化的数据，decode 反之。
+    关闭时直接调用；录制时只保存成功的调用；回放时不调用 call，按配置模拟耗时后返回录制结果。
+    """
+    if REPLAY_MODE == "off":
+        return call()
+    store = get_fixture_store()
+    if REPLAY_MODE == "replay":
+        record = store.lookup(upstream, request)
+        delay = store.delay(upstream, record)
+        if delay > 0:
+            time.sleep(delay)
+        return decode(record["response"])
+    started = time.perf_counter()
+    result = call()
+    store.record(upstream, request, encode(result), time.perf_counter() - started)
+    return result
+
+
+class RecordedResponse:
+    """回放的HTTP响应（提供调用方用到的 status_code、text、json() 和 raise_for_status()）"""
+    def __init__(self, url: str, status_code: int, text: str):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+def http_get(url: str, **kwargs):
+    """requests.get 的录制/回放版本
+
+    键为路径和排序后的查询参数（不含主机，换用镜像或本地替身地址时录制数据仍可用）；
+    回放缺失时按网络不可达抛出 ConnectionError，走调用方已有的降级处理。
+    """
+    import requests
+    parts = urlsplit(url)
+    request = {"path": parts.path, "params": sorted(parse_qsl(parts.query))}
+    try:
+        return replay_call(
+            "http", request, lambda: requests.get(url, **kwargs),
+            encode=lambda response: {"status": response.status_code, "text": response.text},
+            decode=lambda data: RecordedResponse(url, data["status"], data["text"])
+        )
+    except FixtureMissing as e:
+        raise requests.ConnectionError(str(e)) from e
+
+
+def chat_completion(client, messages: list, timeout: float, **params):
+    """client.chat.completions.create 的录制/回放版本（键为模型参数与消息，不含超时）；client 为返回客户端的函数，回放时不会创建"""
+    def decode(data: dict):
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(data)
+    return replay_call(
+        "llm", {"messages": messages, **params},
+        lambda: client().chat.completions.create(messages=messages, timeout=timeout, **params),
+        encode=lambda response: response.model_dump(mode="json", exclude_unset=True),
+        decode=decode
+    )
+
+
+class RecordedCursor:
+    """py2neo 游标的回放版本：支持 data()、evaluate() 和逐行迭代（每行为字典）"""
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def data(self) -> list:
+        return [dict(row) for row in self.rows]
+
+    def evaluate(self):
+        return next(iter(self.rows[0].values())) if self.rows else None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class ReplayGraph:
+    """图数据库连接的录制/回放包装：run 的结果整体读出后录制（键为压缩空白后的语句和参数）
+
+    回放时 graph 为None，不连接数据库；事务写入（begin/commit，导入器使用）不录制，回放时不可用。
+    """
+    def __init__(self, graph=None):
+        self.graph = graph
+
+    def run(self, cypher: str, parameters: dict = None, **kwargs) -> RecordedCursor:
+        params = {**(parameters or {}), **kwargs}
+        return replay_call(
+            "neo4j", {"cypher": " ".join(cypher.split()), "params": params},
+            lambda: RecordedCursor(self.graph.run(cypher, params).data()),
+            encode=lambda cursor: cursor.rows,
+            decode=RecordedCursor
+        )
+
+    def __getattr__(self, name):
+        if self.graph is None:
+            raise AttributeError(f"回放模式下图数据库不支持 {name}")
+        return getattr(self.graph, name)
+
+
+def replay_stats() -> dict:
+    """各上游的录制/回放计数（关闭时为空）"""
+    return {} if REPLAY_MODE == "off" else get_fixture_store().stats()
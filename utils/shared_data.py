@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+from utils.logger import Logger
+
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))  # uvicorn 工作进程数
+
+logger = Logger("SharedData")
+
+
+def prepare_shared_datasets() -> dict:
+    """在启动工作进程之前（主进程中）构建一次只读数据集
+
+    工作进程只以 mmap 方式打开这些文件，同一份物理页由所有进程共享，不会随进程数复制。
+    目前包括：基本面数据存储（一次性CSV迁移）及其列式副本（副本过期时重建）。
+    """
+    from data.fundamentals_store import get_fundamentals_store
+    from data.fundamentals_columnar import ColumnarFundamentals, FUNDAMENTALS_COLUMNAR_PATH
+    store = get_fundamentals_store()
+    source_version = store.last_updated()
+    try:
+        current = ColumnarFundamentals.load(FUNDAMENTALS_COLUMNAR_PATH)
+        stale = current.source_version < source_version
+    except (OSError, ValueError):
+        stale = True
+    if stale:
+        columnar = ColumnarFundamentals.build_from_store(store)
+        columnar.save(FUNDAMENTALS_COLUMNAR_PATH)
+        logger.info(f"列式基本面数据已重建: {len(columnar)}只股票")
+    return {"fundamentals_columnar": FUNDAMENTALS_COLUMNAR_PATH, "rebuilt": stale}
+
+
+def attach_shared_datasets() -> dict:
+    """工作进程启动时映射共享数据集（只建立映射，不复制数据）"""
+    from data.fundamentals_columnar import get_columnar_fundamentals
+    columnar = get_columnar_fundamentals()
+    return {"fundamentals_columnar": len(columnar) if columnar is not None else 0}
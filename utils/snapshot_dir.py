@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+import shutil
+import time
+
+CURRENT_FILE = "CURRENT"
+SNAPSHOT_KEEP = 2  # 保留的版本数（含当前版本；刚读到旧指针的进程仍能打开上一版本的文件）
+
+
+def new_version(path: str) -> str:
+    """在 path 下新建一个版本子目录，返回其路径（写完后调用 publish 发布）"""
+    version = os.path.join(path, f"v{time.time_ns()}")
+    os.makedirs(version)
+    return version
+
+
+def publish(path: str, version: str) -> None:
+    """原子替换 CURRENT 指针使新版本生效（读取方要么看到旧版本，要么看到完整的新版本），并删除更早的版本"""
+    pointer = os.path.join(path, CURRENT_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(os.path.basename(version))
+    os.replace(pointer + ".tmp", pointer)
+    versions = sorted(name for name in os.listdir(path)
+                      if name.startswith("v") and os.path.isdir(os.path.join(path, name)))
+    for name in versions[:-SNAPSHOT_KEEP]:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)  # 已映射的文件在 Linux 上删除后仍可读
+
+
+def current(path: str) -> str:
+    """当前版本目录；没有 CURRENT 指针时为 path 本身（旧的单目录布局）"""
+    try:
+        with open(os.path.join(path, CURRENT_FILE), encoding="utf-8") as f:
+            return os.path.join(path, f.read().strip())
+    except FileNotFoundError:
+        return path
+
+
+def version_token(path: str, legacy_file: str):
+    """当前版本的标识（CURRENT 指针的修改时间，旧布局为 legacy_file 的修改时间），用于判断是否需要重新加载；没有数据时返回None"""
+    for name in (CURRENT_FILE, legacy_file):
+        try:
+            return os.stat(os.path.join(path, name)).st_mtime_ns
+        except OSError:
+            continue
+    return None
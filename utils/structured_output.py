@@ -0,0 +1,264 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import re
+import threading
+import time
+from typing import Annotated, List, Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError, WrapValidator, model_validator
+from utils.llm_gateway import get_llm_gateway
+from utils.logger import Logger
+
+FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+MAX_REPAIR_ERRORS = 10  # 修复请求中列出的校验错误条数上限
+
+logger = Logger("StructuredOutput")
+
+
+class StructuredOutputError(ValueError):
+    """模型回复经修复后仍无法解析为要求的结构（raw 为最后一次原始回复）"""
+    def __init__(self, message: str, raw: str = None):
+        super().__init__(message)
+        self.raw = raw
+
+
+# 响应模型：pydantic v2 在类定义时把校验逻辑编译为 pydantic-core 校验器，解析与校验一次完成
+class LLMModel(BaseModel):
+    """大模型响应模型基类：忽略多余字段，数字形式的代码等字段自动转为字符串"""
+    model_config = ConfigDict(extra="ignore", coerce_numbers_to_str=True)
+
+
+def skip_invalid(item_model):
+    """列表字段：逐项校验，丢弃不合格的项（不因个别坏项让整个响应失败）"""
+    adapter = TypeAdapter(item_model)
+
+    def validate(value, handler):
+        if not isinstance(value, list):
+            raise ValueError("应为数组")
+        items = []
+        for item in value:
+            try:
+                items.append(adapter.validate_python(item))
+            except ValidationError as e:
+                logger.warning(f"忽略不合格的{item_model.__name__}项: {item}（{e.errors()[0]['msg']}）")
+        return items
+    return Annotated[List[item_model], WrapValidator(validate)]
+
+
+def wrap_list(key: str):
+    """兼容模型直接返回数组（未包裹在固定键中）的情况"""
+    def wrap(cls, data):
+        return {key: data} if isinstance(data, list) else data
+    return model_validator(mode="before")(classmethod(wrap))
+
+
+class IndustryCompany(LLMModel):
+    stock_code: str
+    stock_name: str
+    industry_primary: str = "未知"
+    industry_secondary: str = "未知"
+    listing_time: str = "未知"
+
+
+class IndustryCompanies(LLMModel):
+    industry_companies: skip_invalid(IndustryCompany)
+    _wrap = wrap_list("industry_companies")
+
+
+class StockBasicInfo(LLMModel):
+    name: str
+    stock_code: str = ""
+    industry_primary: str = "未知"
+    industry_secondary: str = "未知"
+    listing_time: str = "未知"
+    source: str = "network"
+
+
+class StockBasicInfoResponse(LLMModel):
+    stock_basic_info: StockBasicInfo
+
+
+class SupplyChainRelation(LLMModel):
+    partner_code: str
+    name: str
+    type: str
+    weight: float = Field(ge=0, le=1)
+
+
+class SupplyChainRelations(LLMModel):
+    supply_chain_relationships: skip_invalid(SupplyChainRelation)
+    _wrap = wrap_list("supply_chain_relationships")
+
+
+class ParsedQuestion(LLMModel):
+    intent: Literal["supply_chain", "industry", "stock_info", "strategy"]
+    stock_code: Optional[str] = None
+    stock_name: Optional[str] = None
+    industry: Optional[str] = None
+    depth: Optional[int] = None
+    strategy_type: Optional[str] = None
+
+
+class RecommendedStock(LLMModel):
+    name: str
+    code: str
+
+
+class StrategyResult(LLMModel):
+    title: str
+    description: str
+    annualReturn: str
+    riskLevel: str
+    recommendedStocks: Optional[skip_invalid(RecommendedStock)] = None
+
+
+def matching_end(text: str, start: int):
+    """从 start 处的 { 或 [ 开始找到与之匹配的结束位置（跳过字符串内的括号），不完整时返回None"""
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return i
+    return None
+
+
+def extract_json(text: str) -> tuple:
+    """宽松提取：去掉代码块标记和前后说明文字；输出被截断时按已完整的部分解析
+
+    返回 (数据, 是否为不完整输出)。
+    """
+    import pydantic_core
+    if not text or not text.strip():
+        raise ValueError("回复为空")
+    match = FENCE_PATTERN.search(text)
+    if match:
+        text = match.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("回复中没有JSON")
+    start = min(starts)
+    end = matching_end(text, start)
+    if end is None:
+        return pydantic_core.from_json(text[start:], allow_partial=True), True
+    return pydantic_core.from_json(text[start:end + 1]), False
+
+
+class StructuredStats:
+    """按调用点统计解析结果与耗时"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sites = {}
+
+    def record(self, site: str, outcome: str, first_seconds: float, repair_seconds: float = 0.0,
+               extracted: bool = False, partial: bool = False) -> None:
+        with self.lock:
+            stats = self.sites.setdefault(site, dict.fromkeys((
+                "calls", "first_pass", "repaired", "failed", "extracted", "partial", "first_seconds", "repair_seconds"
+            ), 0))
+            stats["calls"] += 1
+            stats[outcome] += 1
+            stats["extracted"] += extracted
+            stats["partial"] += partial
+            stats["first_seconds"] += first_seconds
+            stats["repair_seconds"] += repair_seconds
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            result = {}
+            for site, stats in self.sites.items():
+                calls = max(stats["calls"], 1)
+                total = stats["first_seconds"] + stats["repair_seconds"]
+                result[site] = {
+                    **{key: stats[key] for key in ("calls", "first_pass", "repaired", "failed", "extracted", "partial")},
+                    "repair_rate": round(stats["repaired"] / calls, 4),
+                    "failure_rate": round(stats["failed"] / calls, 4),
+                    "avg_first_ms": round(stats["first_seconds"] / calls * 1000, 1),
+                    "avg_repair_ms": round(stats["repair_seconds"] / max(stats["repaired"] + stats["failed"], 1) * 1000, 1),
+                    "repair_time_share": round(stats["repair_seconds"] / total, 4) if total else 0.0
+                }
+            return result
+
+
+_stats = StructuredStats()
+
+
+def structured_output_stats() -> dict:
+    """各调用点的结构化解析统计（修复率、失败率、修复请求耗时占比）"""
+    return _stats.snapshot()
+
+
+def parse_structured(text: str, model) -> tuple:
+    """解析并校验为 model 实例，返回 (实例, 是否经宽松提取, 是否为不完整输出)
+
+    回复本身是合法JSON时直接由 pydantic-core 解析校验；否则先宽松提取再校验。
+    """
+    try:
+        return model.model_validate_json(text), False, False
+    except ValidationError as e:
+        if any(error["type"] != "json_invalid" for error in e.errors()):
+            raise  # JSON本身合法但不符合结构，提取无济于事
+    data, partial = extract_json(text)
+    return model.model_validate(data), True, partial
+
+
+def describe_error(error: Exception) -> str:
+    """修复请求中对错误的描述：校验错误逐条列出字段位置和原因"""
+    if isinstance(error, ValidationError):
+        return "；".join(
+            f"{'.'.join(str(part) for part in item['loc']) or '整体'}: {item['msg']}"
+            for item in error.errors()[:MAX_REPAIR_ERRORS]
+        )
+    return str(error)
+
+
+def chat_structured(site: str, messages: list, response_model, /, **params):
+    """调用大模型并把回复解析为 response_model 实例
+
+    首次回复无法解析或不符合结构时，把原回复和具体错误发回模型做一次定向修复（只要求改正JSON，
+    不重新生成内容；原消息前缀不变，可命中服务端前缀缓存），仍失败则抛出 StructuredOutputError。
+    网关抛出的调用错误原样向上传递。params（含大模型名称 model）透传给 LLMGateway.chat。
+    """
+    gateway = get_llm_gateway()
+    started = time.monotonic()
+    content = gateway.chat(site, messages, **params)
+    first_seconds = time.monotonic() - started
+    try:
+        result, extracted, partial = parse_structured(content, response_model)
+        _stats.record(site, "first_pass", first_seconds, extracted=extracted, partial=partial)
+        return result
+    except ValueError as e:
+        error = e
+    logger.warning(f"[{site}] 回复不符合{response_model.__name__}结构，请求修复: {describe_error(error)}")
+    repair_messages = messages + [
+        {"role": "assistant", "content": content or ""},
+        {"role": "user", "content": f"上面的回复无法按要求解析：{describe_error(error)}。请只输出修正后的完整JSON，不要添加其他文字。"}
+    ]
+    started = time.monotonic()
+    repaired = None
+    try:
+        repaired = gateway.chat(f"{site}.repair", repair_messages, **{key: value for key, value in params.items()
+                                                                      if key != "hedge"})
+        result, extracted, partial = parse_structured(repaired, response_model)
+    except ValueError as e:
+        _stats.record(site, "failed", first_seconds, time.monotonic() - started)
+        raise StructuredOutputError(f"[{site}] 修复后仍无法解析为{response_model.__name__}: {describe_error(e)}",
+                                    raw=repaired if repaired is not None else content) from e
+    except Exception:
+        _stats.record(site, "failed", first_seconds, time.monotonic() - started)
+        raise
+    _stats.record(site, "repaired", first_seconds, time.monotonic() - started, extracted=extracted, partial=partial)
+    return result
@@ -0,0 +1,240 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import contextvars
+import functools
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from utils.logger import Logger
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"  # 关闭后装饰器直接返回原函数，中间件不挂载
+TRACE_FILE = os.getenv("TRACE_FILE", "")  # 请求追踪导出文件（JSON Lines，只追加不轮转，需要时再配置），默认为空不写文件
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))  # 进程内保留的最近请求追踪条数
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))  # 单个请求最多记录的阶段数，超出部分只计数
+TRACE_EXPORT_QUEUE = 1000  # 待写文件的追踪条数上限，写入跟不上时丢弃并计数
+
+SERVER_TIMING_PATTERN = re.compile(r"[^A-Za-z0-9_.\-]")
+
+logger = Logger("Tracing")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """请求内的一个阶段（开始时间为相对请求开始的偏移）"""
+    __slots__ = ("span_id", "parent_id", "name", "start", "duration", "attrs", "error")
+
+    def __init__(self, span_id: int, parent_id, name: str, start: float, attrs: dict):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.duration = None
+        self.attrs = attrs
+        self.error = None
+
+    def to_dict(self, origin: float) -> dict:
+        data = {
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class Trace:
+    """一次请求的追踪记录；同一请求在线程池中执行的阶段也记录到这里"""
+    def __init__(self, name: str, trace_id: str = None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.name = name
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.dropped = 0
+        self.attrs = {}
+        self.lock = threading.Lock()
+
+    def open_span(self, name: str, attrs: dict):
+        parent = _current_span.get()
+        with self.lock:
+            if len(self.spans) >= TRACE_MAX_SPANS:
+                self.dropped += 1
+                return None
+            span = Span(len(self.spans) + 1, parent.span_id if parent else None, name, time.perf_counter(), attrs)
+            self.spans.append(span)
+        return span
+
+    def stages(self) -> dict:
+        """按阶段名汇总的耗时 {名称: (总毫秒, 次数)}"""
+        totals = {}
+        with self.lock:
+            for span in self.spans:
+                if span.duration is None:
+                    continue
+                total, count = totals.get(span.name, (0.0, 0))
+                totals[span.name] = (total + span.duration * 1000, count + 1)
+        return totals
+
+    def server_timing(self) -> str:
+        """Server-Timing 响应头：各阶段汇总耗时（同名阶段合并，desc 中给出调用次数）"""
+        parts = [
+            f'{SERVER_TIMING_PATTERN.sub("_", name)};dur={total:.1f}' + (f';desc="x{count}"' if count > 1 else "")
+            for name, (total, count) in self.stages().items()
+        ]
+        elapsed = self.duration if self.duration is not None else time.perf_counter() - self.start
+        parts.append(f"total;dur={elapsed * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            spans = [span.to_dict(self.start) for span in self.spans]
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "timestamp": self.wall_start,
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "attrs": self.attrs,
+            "spans": spans,
+            "dropped_spans": self.dropped,
+            "pid": os.getpid()
+        }
+
+
+class TraceExporter:
+    """已结束的追踪：保留最近若干条供查询，并由后台线程追加写入 JSONL 文件（请求线程不做文件IO）"""
+    def __init__(self, path: str = TRACE_FILE, buffer_size: int = TRACE_BUFFER_SIZE):
+        self.path = path
+        self.recent = deque(maxlen=buffer_size)
+        self.pending = queue.Queue(maxsize=TRACE_EXPORT_QUEUE)
+        self.dropped = 0
+        self.written = 0
+        self.writer = None
+        self.lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        self.recent.append(trace)
+        if not self.path:
+            return
+        self._ensure_writer()
+        try:
+            self.pending.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_writer(self) -> None:
+        if self.writer is None:
+            with self.lock:
+                if self.writer is None:
+                    self.writer = threading.Thread(target=self._write_loop, name="trace-exporter", daemon=True)
+                    self.writer.start()
+
+    def _write_loop(self) -> None:
+        # 多个工作进程写同一文件：O_APPEND 下每条记录一次 write，行不会交错
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        while True:
+            trace = self.pending.get()
+            try:
+                os.write(fd, (json.dumps(trace.to_dict(), ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+                self.written += 1
+            except Exception as e:
+                logger.error(f"写入请求追踪失败: {str(e)}")
+
+    def recent_traces(self, limit: int = 20, name: str = None) -> list:
+        traces = [trace for trace in reversed(self.recent) if name is None or trace.name == name]
+        return [trace.to_dict() for trace in traces[:limit]]
+
+    def stats(self) -> dict:
+        return {"enabled": TRACE_ENABLED, "file": self.path, "buffered": len(self.recent),
+                "written": self.written, "pending": self.pending.qsize(), "dropped": self.dropped}
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_trace_exporter() -> TraceExporter:
+    """获取进程内共享的追踪导出器（单例）"""
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = TraceExporter()
+    return _exporter
+
+
+def current_trace():
+    """当前请求的追踪（不在请求内或未开启追踪时为None）"""
+    return _current_trace.get()
+
+
+def start_trace(name: str, trace_id: str = None):
+    """开始一次请求追踪并设为当前上下文的追踪，返回 (追踪, 用于 detach_trace 的令牌)"""
+    trace = Trace(name, trace_id)
+    return trace, _current_trace.set(trace)
+
+
+def detach_trace(token) -> None:
+    """当前上下文不再关联该追踪（已复制了上下文的流式响应等仍可继续记录）"""
+    _current_trace.reset(token)
+
+
+def finish_trace(trace: Trace) -> None:
+    """结束追踪并导出（流式响应在响应体发送完后调用）"""
+    trace.duration = time.perf_counter() - trace.start
+    get_trace_exporter().export(trace)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """记录一个阶段；不在请求追踪内时不做任何记录"""
+    trace = _current_trace.get()
+    current = trace.open_span(name, attrs) if trace is not None else None
+    if current is None:
+        yield None
+        return
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current_span.reset(token)
+
+
+def traced(name: str = None):
+    """把函数或方法的每次调用记录为一个阶段（默认名称为 类名.方法名）
+
+    未开启追踪时直接返回原函数，没有任何额外开销；开启后不在请求内的调用只多一次上下文变量读取。
+    """
+    def decorate(func):
+        if not TRACE_ENABLED:
+            return func
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+